@@ -0,0 +1,54 @@
+"""Helpers shared by the benchmarks: timing and synthetic market data."""
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def timed(func, *args, **kwargs):
+    """``(result, seconds)`` of one call."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def ticker_names(n_tickers):
+    return [f"T{i:04d}" for i in range(n_tickers)]
+
+
+def make_prices(n_tickers, n_dates, seed=0, volatility=0.01, start='2020-01-02'):
+    """Dates x tickers closes following independent geometric random walks from 100."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, volatility, (n_dates, n_tickers)), axis=0))
+    return pd.DataFrame(close, index=pd.bdate_range(start, periods=n_dates), columns=ticker_names(n_tickers))
+
+
+def make_factor_returns(n_tickers, n_dates, seed=0, betas=(0.3, 1.5), drift=0.0002, volatility=0.015,
+                        start='2024-01-02', late_listings=0.0):
+    """Dates x tickers daily returns driven by one market factor.
+
+    Each ticker's beta is uniform over ``betas``; ``late_listings`` is the
+    share of tickers that list part-way through the first half of the
+    history and are NaN before it.
+    """
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0003, 0.01, (n_dates, 1))
+    returns = market * rng.uniform(*betas, n_tickers) + rng.normal(drift, volatility, (n_dates, n_tickers))
+    if late_listings:
+        listed = np.where(rng.random(n_tickers) < late_listings, rng.integers(0, n_dates // 2, n_tickers), 0)
+        returns[np.arange(n_dates)[:, None] < listed] = np.nan
+    return pd.DataFrame(returns, index=pd.bdate_range(start, periods=n_dates), columns=ticker_names(n_tickers))
+
+
+def make_positions(n_portfolios, n_positions, tickers, seed=1, etf_share=0.0):
+    """Portfolio_ID/Ticker/Asset_Class/Shares/Current_Price rows, ``n_positions`` distinct tickers per portfolio."""
+    rng = np.random.default_rng(seed)
+    picks = np.argsort(rng.random((n_portfolios, len(tickers))), axis=1)[:, :n_positions]
+    n_rows = n_portfolios * n_positions
+    return pd.DataFrame({
+        'Portfolio_ID': np.repeat([f"C{i:06d}" for i in range(n_portfolios)], n_positions),
+        'Ticker': tickers.to_numpy()[picks.ravel()],
+        'Asset_Class': np.where(rng.random(n_rows) < 1 - etf_share, 'Equity', 'ETF') if etf_share else 'Equity',
+        'Shares': rng.integers(1, 500, n_rows).astype('float64'),
+        'Current_Price': rng.uniform(10, 500, n_rows),
+    })
@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from adjustments import AdjustmentFactors, adjust_prices, compute_factors
+from storage import get_store
+from valuation import price_matrix
+
+SIZES = [(14, 252), (500, 252 * 10), (2_000, 252 * 20)]
+
+
+def make_inputs(n_tickers, n_dates, seed=0):
+    """Long price rows plus quarterly dividends for every ticker and a 2-for-1 split for one in ten."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2006-01-02', periods=n_dates)
+    tickers = np.array([f"T{i:04d}" for i in range(n_tickers)], dtype=object)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, (n_dates, n_tickers)), axis=0))
+    market_data = pd.DataFrame({
+        'Date': np.repeat(dates.strftime('%Y-%m-%d').to_numpy(dtype=object), n_tickers),
+        'Ticker': np.tile(tickers, n_dates),
+        'Close': close.ravel(),
+    })
+
+    quarters = dates[::63]
+    dividends = pd.DataFrame({
+        'Date': np.tile(quarters.strftime('%Y-%m-%d').to_numpy(dtype=object), n_tickers),
+        'Ticker': np.repeat(tickers, len(quarters)),
+        'Type': 'DIVIDEND',
+        'Value': rng.uniform(0.1, 1.0, len(quarters) * n_tickers),
+    })
+    split_tickers = tickers[::10]
+    splits = pd.DataFrame({
+        'Date': dates[rng.integers(1, n_dates, len(split_tickers))].strftime('%Y-%m-%d'),
+        'Ticker': split_tickers,
+        'Type': 'SPLIT',
+        'Value': 2.0,
+    })
+    return market_data, pd.concat([dividends, splits], ignore_index=True)
+
+
+print("=" * 96)
+print(" " * 33 + "PRICE ADJUSTMENT BENCHMARK")
+print("=" * 96)
+print(f"\n{'Tickers':>8} {'Days':>6} {'Rows':>11} {'Events':>8} {'Build (s)':>10} {'Apply (s)':>10} "
+      f"{'New day (s)':>12} {'New event (s)':>14} {'Refreshed':>10}")
+print("-" * 96)
+
+for n_tickers, n_dates in SIZES:
+    market_data, actions = make_inputs(n_tickers, n_dates)
+    prices = price_matrix(market_data.assign(Date=pd.to_datetime(market_data['Date'])))
+
+    factors = compute_factors(market_data, actions)
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        AdjustmentFactors(get_store(root, 'parquet')).update(market_data, actions)
+        build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    adjusted = adjust_prices(prices, factors, 'total_return')
+    apply_time = time.perf_counter() - start
+    assert np.allclose(adjusted.iloc[-1], prices.iloc[-1])
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = AdjustmentFactors(get_store(root, 'parquet'))
+        last_day = market_data['Date'] == market_data['Date'].iloc[-1]
+        cache.update(market_data[~last_day], actions)
+        start = time.perf_counter()
+        _, appended_refresh = cache.update(market_data, actions)
+        append_time = time.perf_counter() - start
+        assert appended_refresh == []
+
+        new_event = pd.DataFrame({'Date': [market_data['Date'].iloc[len(market_data) // 2]],
+                                  'Ticker': ['T0001'], 'Type': ['SPLIT'], 'Value': [3.0]})
+        actions = pd.concat([actions, new_event], ignore_index=True)
+        start = time.perf_counter()
+        updated, refreshed = cache.update(market_data, actions)
+        update_time = time.perf_counter() - start
+    expected = compute_factors(market_data, actions)
+    updated = updated.sort_values(['Ticker', 'Date'], ignore_index=True)
+    assert np.allclose(updated['Return_Factor'], expected['Return_Factor'])
+
+    print(f"{n_tickers:>8,} {n_dates:>6,} {len(market_data):>11,} {len(actions):>8,} {build_time:>10.3f} "
+          f"{apply_time:>10.3f} {append_time:>12.3f} {update_time:>14.3f} {len(refreshed):>10}")
+
+print("\nBuild: factors for every ticker from scratch, written to Parquet. Apply: total-return")
+print("prices from the cached factors (one multiply on the dates x tickers matrix). New day: the")
+print("last day's rows appended; no ticker is recomputed, the new rows get factor 1. New event: one")
+print("split added to one ticker; only that ticker is recomputed. Build and updates include the")
+print("Parquet writes; updates also read the saved factors back.")
+print("\n" + "=" * 96)
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import make_prices
+from incremental_risk import build_timeseries, summarize
+from portfolio_batch import PORTFOLIO_ID, value_portfolios
+from returns import holdings_flows
+from valuation import portfolio_nav
+
+SCENARIOS = [
+    # (portfolios, positions per portfolio, tickers, trading days)
+    (100, 15, 500, 252),
+    (1_000, 15, 500, 252),
+    (5_000, 25, 2_000, 252 * 3),
+]
+WORKER_COUNTS = [1, 4]
+LOOP_SAMPLE = 50
+
+
+def make_holdings(n_portfolios, n_positions, prices, seed=1):
+    rng = np.random.default_rng(seed)
+    n_rows = n_portfolios * n_positions
+    purchase = pd.DatetimeIndex(rng.choice(prices.index[:len(prices) // 2], n_rows))
+    return pd.DataFrame({
+        PORTFOLIO_ID: np.repeat([f"C{i:06d}" for i in range(n_portfolios)], n_positions),
+        'Ticker': rng.choice(prices.columns, n_rows),
+        'Shares': rng.integers(1, 500, n_rows),
+        'Purchase_Date': purchase.strftime('%Y-%m-%d'),
+    })
+
+
+def loop_metrics(holdings, prices):
+    """One full 05_risk_metrics.py calculation per portfolio."""
+    return {portfolio_id: summarize(build_timeseries(portfolio_nav(prices, portfolio),
+                                                   holdings_flows(prices, portfolio)))
+            for portfolio_id, portfolio in holdings.groupby(PORTFOLIO_ID, sort=False)}
+
+
+print("=" * 78)
+print(" " * 22 + "BATCH PORTFOLIO BENCHMARK")
+print("=" * 78)
+print(f"\n{'Portfolios':>10} {'Positions':>10} {'Days':>6} {'Loop (s)':>10} "
+      f"{'Workers':>8} {'Batch (s)':>10} {'Portfolios/s':>13} {'Speedup':>8}")
+print("-" * 82)
+
+for n_portfolios, n_positions, n_tickers, n_dates in SCENARIOS:
+    prices = make_prices(n_tickers, n_dates)
+    holdings = make_holdings(n_portfolios, n_positions, prices)
+
+    # The per-portfolio loop is timed on a sample and scaled to the full count.
+    sample_ids = holdings[PORTFOLIO_ID].unique()[:LOOP_SAMPLE]
+    sample = holdings[holdings[PORTFOLIO_ID].isin(sample_ids)]
+    start = time.perf_counter()
+    expected = loop_metrics(sample, prices)
+    loop_time = (time.perf_counter() - start) * n_portfolios / len(sample_ids)
+
+    for workers in WORKER_COUNTS:
+        _, metrics, stats = value_portfolios(holdings, prices, workers=workers)
+        metrics = metrics.set_index(PORTFOLIO_ID)
+        for portfolio_id, row in expected.items():
+            assert np.allclose(metrics.loc[portfolio_id, list(row)].to_numpy(dtype='float64'),
+                               list(row.values()), rtol=1e-9)
+        print(f"{n_portfolios:>10,} {n_positions:>10,} {n_dates:>6,} {loop_time:>10.2f} {workers:>8} "
+              f"{stats['seconds']:>10.2f} {n_portfolios / stats['seconds']:>13,.0f} "
+              f"{loop_time / stats['seconds']:>7.0f}x")
+
+print(f"\nLoop times are measured on {LOOP_SAMPLE} portfolios and scaled; batch output is")
+print("checked against the loop for those portfolios.")
+print("\n" + "=" * 78)
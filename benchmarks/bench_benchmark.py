@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import timed
+from benchmark import pair_metrics, relative_table, rolling_relative_table
+from incremental_risk import RISK_FREE_RATE, TRADING_DAYS
+
+SCENARIOS = [
+    # (portfolios, benchmarks, days)
+    (1_000, 3, 252),
+    (10_000, 3, 252),
+    (10_000, 10, 1_260),
+]
+LOOP_SAMPLE = 50
+
+
+def make_returns(n_portfolios, n_benchmarks, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2021-01-04', periods=n_days)
+    market = rng.normal(0.0004, 0.01, (n_days, 1))
+    benchmarks = market * rng.uniform(0.8, 1.2, n_benchmarks) + rng.normal(0, 0.003, (n_days, n_benchmarks))
+    portfolios = market * rng.uniform(0.5, 1.3, n_portfolios) + rng.normal(0.0001, 0.006, (n_days, n_portfolios))
+    # Portfolios opened at different times: no returns before their first day.
+    opened = rng.integers(0, n_days // 4, n_portfolios)
+    portfolios[np.arange(n_days)[:, None] < opened] = np.nan
+    return (pd.DataFrame(portfolios, index=dates, columns=[f"P{i:05d}" for i in range(n_portfolios)]),
+            pd.DataFrame(benchmarks, index=dates, columns=[f"B{i:02d}" for i in range(n_benchmarks)]))
+
+
+def pair_loop(portfolio, benchmark):
+    """One portfolio against one benchmark with pandas, the way a per-pair report would."""
+    pair = pd.concat([portfolio, benchmark], axis=1).dropna()
+    x, y = pair.iloc[:, 0], pair.iloc[:, 1]
+    beta = x.cov(y) / y.var()
+    rf = RISK_FREE_RATE / TRADING_DAYS
+    up, down = y > 0, y < 0
+    return {
+        'Tracking_Error_Pct': (x - y).std() * np.sqrt(TRADING_DAYS) * 100,
+        'Beta': beta,
+        'Alpha_Pct': ((x.mean() - rf) - beta * (y.mean() - rf)) * TRADING_DAYS * 100,
+        'Up_Capture_Pct': np.expm1(np.log1p(x[up]).mean()) / np.expm1(np.log1p(y[up]).mean()) * 100,
+        'Down_Capture_Pct': np.expm1(np.log1p(x[down]).mean()) / np.expm1(np.log1p(y[down]).mean()) * 100,
+    }
+
+
+print("=" * 96)
+print(" " * 30 + "BENCHMARK-RELATIVE ANALYTICS BENCHMARK")
+print("=" * 96)
+print(f"\n{'Portfolios':>10} {'Bench':>6} {'Days':>6} {'Full (s)':>9} {'Pairs/s':>12} {'Quarters (s)':>13} "
+      f"{'Rolling (s)':>12} {'Loop (s)':>10} {'Speedup':>8}")
+print("-" * 96)
+
+for n_portfolios, n_benchmarks, n_days in SCENARIOS:
+    portfolios, benchmarks = make_returns(n_portfolios, n_benchmarks, n_days)
+    metrics, full_time = timed(pair_metrics, portfolios, benchmarks)
+    _, table_time = timed(relative_table, portfolios, benchmarks)
+    _, rolling_time = timed(rolling_relative_table, portfolios.iloc[:, :1_000], benchmarks, (63,))
+    rolling_time *= n_portfolios / min(n_portfolios, 1_000)
+
+    start = time.perf_counter()
+    for i in range(LOOP_SAMPLE):
+        p, b = i % n_portfolios, i % n_benchmarks
+        expected = pair_loop(portfolios.iloc[:, p], benchmarks.iloc[:, b])
+        for name, value in expected.items():
+            assert np.isclose(metrics[name][p, b], value), name
+    loop_time = (time.perf_counter() - start) * n_portfolios * n_benchmarks / LOOP_SAMPLE
+
+    pairs = n_portfolios * n_benchmarks
+    print(f"{n_portfolios:>10,} {n_benchmarks:>6} {n_days:>6,} {full_time:>9.3f} {pairs / full_time:>12,.0f} "
+          f"{table_time:>13.3f} {rolling_time:>12.2f} {loop_time:>10.1f} {loop_time / full_time:>7.0f}x")
+
+print("\nFull: every metric for every portfolio x benchmark pair over the whole history (pair_metrics).")
+print("Quarters: the long table for every calendar quarter plus the full history (relative_table).")
+print("Rolling: 63-day rolling metrics for every pair, measured on up to 1,000 portfolios and scaled.")
+print(f"Loop: one pair at a time with pandas, measured on {LOOP_SAMPLE} pairs and scaled.")
+print("\n" + "=" * 96)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import make_prices
+from fetch_scheduler import FetchScheduler
+from price_cache import FlakyProvider, LocalProvider
+
+N_TICKERS = 2_000
+N_DATES = 252
+LATENCY = 0.25
+CONFIGS = [
+    # (batch size, workers, requests/sec)
+    (2_000, 1, 100.0),
+    (100, 1, 100.0),
+    (100, 4, 100.0),
+    (100, 16, 100.0),
+    (25, 16, 100.0),
+    (25, 16, 20.0),
+]
+
+
+def make_market_data(n_tickers, n_dates, seed=0):
+    prices = make_prices(n_tickers, n_dates, seed, start='2025-01-02')
+    close = prices.to_numpy().ravel()
+    return pd.DataFrame({
+        'Date': np.repeat(prices.index.strftime('%Y-%m-%d'), n_tickers),
+        'Ticker': np.tile(prices.columns.to_numpy(), n_dates),
+        'Open': close, 'High': close, 'Low': close, 'Close': close,
+        'Volume': np.full(close.size, 1e6),
+    })
+
+
+print("=" * 78)
+print(" " * 22 + "FETCH SCHEDULER BENCHMARK")
+print("=" * 78)
+print(f"\n{N_TICKERS:,} tickers, {LATENCY * 1000:.0f} ms injected latency per request, "
+      f"5% request errors, 3 always-failing tickers")
+print(f"\n{'Batch':>6} {'Workers':>8} {'Rate/s':>7} {'Requests':>9} {'Failed':>7} {'Seconds':>8} {'Tickers/sec':>12}")
+print("-" * 62)
+
+market_data = make_market_data(N_TICKERS, N_DATES)
+tickers = market_data['Ticker'].unique().tolist()
+failing = tickers[:3]
+
+for batch_size, workers, rate in CONFIGS:
+    provider = FlakyProvider(LocalProvider(market_data), latency=LATENCY, error_rate=0.05,
+                             failing_tickers=failing, seed=42)
+    scheduler = FetchScheduler(provider, batch_size=batch_size, max_workers=workers, rate=rate,
+                               burst=workers, backoff=0.1, seed=42)
+    result = scheduler.run(tickers, '2025-01-01', '2026-01-01')
+    assert sorted(result.failures) == failing
+    assert result.data['Ticker'].nunique() == N_TICKERS - len(failing)
+    print(f"{batch_size:>6,} {workers:>8} {rate:>7.0f} {result.requests:>9,} {len(result.failures):>7} "
+          f"{result.elapsed:>8.2f} {result.throughput:>12,.0f}")
+
+print("\n" + "=" * 78)
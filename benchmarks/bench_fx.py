@@ -0,0 +1,78 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import timed
+from fx import BASE_CURRENCY, FxMatrix
+
+SCENARIOS = [
+    # (days, tickers, currencies)
+    (252, 500, 4),
+    (1_260, 2_000, 10),
+    (5_040, 5_000, 25),
+]
+LOOP_SAMPLE = 200
+
+
+def make_data(n_days, n_tickers, n_currencies, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2006-01-02', periods=n_days)
+    currencies = [BASE_CURRENCY] + [f"C{i:02d}" for i in range(1, n_currencies)]
+    walks = np.exp(np.cumsum(rng.normal(0, 0.005, (n_days, n_currencies - 1)), axis=0))
+    legs = rng.uniform(0.005, 2, n_currencies - 1) * walks
+    rates = pd.DataFrame({
+        'Date': np.tile(dates.strftime('%Y-%m-%d'), n_currencies - 1),
+        'Currency': np.repeat(currencies[1:], n_days),
+        'Rate': legs.T.ravel(),
+    })
+    tickers = [f"T{i:05d}" for i in range(n_tickers)]
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_days, n_tickers)), axis=0)),
+                          index=dates, columns=tickers)
+    listing = pd.Series(rng.choice(currencies, n_tickers), index=tickers)
+    return rates, prices, listing
+
+
+def convert_loop(prices, listing, rates, reporting):
+    """One ticker at a time against a stored cross-rate series, the way a per-position report would."""
+    usd = rates.pivot(index='Date', columns='Currency', values='Rate')
+    usd.index = pd.to_datetime(usd.index)
+    usd[BASE_CURRENCY] = 1.0
+    converted = {}
+    for ticker in prices.columns:
+        cross = usd[listing[ticker]] / usd[reporting]
+        converted[ticker] = prices[ticker] * cross.reindex(prices.index).ffill().bfill()
+    return pd.DataFrame(converted)
+
+
+print("=" * 96)
+print(" " * 33 + "CURRENCY CONVERSION BENCHMARK")
+print("=" * 96)
+print(f"\n{'Days':>6} {'Tickers':>8} {'Ccys':>5} {'Stored':>7} {'Pairs':>6} {'Build (s)':>10} {'Convert (s)':>12} "
+      f"{'Cells/s':>14} {'Loop (s)':>10} {'Speedup':>8}")
+print("-" * 96)
+
+for n_days, n_tickers, n_currencies in SCENARIOS:
+    rates, prices, listing = make_data(n_days, n_tickers, n_currencies)
+    reporting = listing.iloc[-1]
+    fx, build_time = timed(FxMatrix.from_rates, rates, prices.index)
+    converted, convert_time = timed(fx.convert, prices, listing, reporting)
+
+    sample = prices.iloc[:, :LOOP_SAMPLE]
+    expected, loop_time = timed(convert_loop, sample, listing, rates, reporting)
+    loop_time *= n_tickers / sample.shape[1]
+    assert np.allclose(converted[sample.columns].to_numpy(), expected.to_numpy())
+
+    cells = prices.size
+    print(f"{n_days:>6,} {n_tickers:>8,} {n_currencies:>5} {n_currencies - 1:>7} "
+          f"{n_currencies * (n_currencies - 1):>6,} {build_time:>10.3f} {convert_time:>12.3f} "
+          f"{cells / convert_time:>14,.0f} {loop_time:>10.2f} {loop_time / convert_time:>7.0f}x")
+
+print("\nStored: USD legs kept by FxMatrix; Pairs: cross rates a full matrix would store instead.")
+print("Build: pivot, forward-fill and align the USD legs to the price dates (FxMatrix.from_rates).")
+print("Convert: every price into the reporting currency with one broadcast multiply (FxMatrix.convert).")
+print(f"Loop: one ticker at a time, measured on {LOOP_SAMPLE} tickers and scaled.")
+print("\n" + "=" * 96)
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from intraday import LiveNavBook, replay_ticks, stream_nav
+
+SCENARIOS = [
+    # (positions, ticks)
+    (50, 1_000_000),
+    (1_000, 1_000_000),
+    (10_000, 1_000_000),
+]
+CLASSES = ['Equity', 'ETF', 'Bond ETF', 'Cash']
+RECOMPUTE_SAMPLE = 20_000
+
+
+def make_book(n_positions, seed=0):
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:05d}" for i in range(n_positions)]
+    shares = rng.integers(10, 500, n_positions).astype(float)
+    prices = rng.uniform(20, 500, n_positions)
+    return LiveNavBook(tickers, shares, shares * prices * rng.uniform(0.7, 1.1, n_positions),
+                        rng.choice(CLASSES, n_positions), prices)
+
+
+def make_ticks(book, n_ticks, seed=1):
+    """Bars one second apart; a tenth of them for tickers that are not held."""
+    rng = np.random.default_rng(seed)
+    slots = rng.integers(0, len(book.tickers), n_ticks)
+    tickers = np.array(book.tickers + ['OTHER'], dtype=object)[np.where(rng.random(n_ticks) < 0.1, -1, slots)]
+    prices = np.asarray(book.prices)[slots] * np.exp(rng.normal(0, 0.001, n_ticks))
+    return pd.DataFrame({'Date': pd.date_range('2026-01-15 09:30', periods=n_ticks, freq='s'),
+                         'Ticker': tickers, 'Close': prices})
+
+
+def full_revaluation(book):
+    """``update(ticker, price)`` revaluing the whole portfolio on every tick, as re-running the valuation would.
+
+    Also returns the price vector it updates.
+    """
+    shares, prices, codes = np.array(book.shares), np.array(book.prices), np.array(book.class_codes)
+
+    def update(ticker, price):
+        slot = book.slots.get(ticker)
+        if slot is not None:
+            prices[slot] = price
+        values = shares * prices
+        nav = values.sum()
+        return nav, np.bincount(codes, weights=values, minlength=len(book.classes)) / nav
+    return update, prices
+
+
+def latencies(update, tickers, prices):
+    """Per-call latency in microseconds of ``update`` over the ticks."""
+    clock = time.perf_counter_ns
+    elapsed = np.empty(len(tickers))
+    for row, (ticker, price) in enumerate(zip(tickers, prices)):
+        start = clock()
+        update(ticker, price)
+        elapsed[row] = clock() - start
+    return elapsed / 1_000
+
+
+async def replay(book, bars):
+    snapshots = []
+    return await stream_nav(book, replay_ticks(bars), snapshots.append, interval=0.1), snapshots
+
+
+print("=" * 96)
+print(" " * 32 + "INTRADAY STREAMING NAV BENCHMARK")
+print("=" * 96)
+print(f"\n{'Positions':>10} {'Ticks':>10} {'Update/s':>12} {'p50 us':>7} {'p99 us':>7} {'Stream/s':>10} "
+      f"{'Snapshots':>10} {'Recompute/s':>12} {'p99 us':>8} {'Speedup':>8}")
+print("-" * 96)
+
+for n_positions, n_ticks in SCENARIOS:
+    book = make_book(n_positions)
+    bars = make_ticks(book, n_ticks)
+    tickers, prices = bars['Ticker'].tolist(), bars['Close'].tolist()
+
+    update_us = latencies(make_book(n_positions).update, tickers, prices)
+    start = time.perf_counter()
+    streamed, snapshots = asyncio.run(replay(book, bars))
+    stream_time = time.perf_counter() - start
+
+    slots = make_book(n_positions).slots
+    recompute, exact = full_revaluation(make_book(n_positions))
+    recompute_us = latencies(recompute, tickers[:RECOMPUTE_SAMPLE], prices[:RECOMPUTE_SAMPLE])
+    for ticker, price in zip(tickers[RECOMPUTE_SAMPLE:], prices[RECOMPUTE_SAMPLE:]):
+        if ticker in slots:
+            exact[slots[ticker]] = price
+    nav, weights = recompute(None, None)
+    assert np.isclose(streamed.nav, nav, rtol=1e-12)
+    assert np.allclose(np.asarray(streamed.class_values) / streamed.nav, weights, rtol=1e-12)
+
+    update_rate = 1e6 / update_us.mean()
+    recompute_rate = 1e6 / recompute_us.mean()
+    print(f"{n_positions:>10,} {n_ticks:>10,} {update_rate:>12,.0f} {np.percentile(update_us, 50):>7.2f} "
+          f"{np.percentile(update_us, 99):>7.2f} {n_ticks / stream_time:>10,.0f} {len(snapshots):>10,} "
+          f"{recompute_rate:>12,.0f} {np.percentile(recompute_us, 99):>8.1f} {update_rate / recompute_rate:>7.0f}x")
+
+print("\nUpdate: LiveNavBook.update on its own, timed tick by tick (p50/p99 latency).")
+print("Stream: the same ticks replayed through stream_nav on asyncio, snapshots every 0.1s, end to end.")
+print(f"Recompute: every position revalued on each tick, timed on {RECOMPUTE_SAMPLE:,} ticks.")
+print("A tenth of the ticks are for tickers not held and are ignored.")
+print("\n" + "=" * 96)
@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from incremental_risk import position_risk
+from matrix_store import MatrixStore
+from storage import ParquetStore
+from valuation import portfolio_nav, price_matrix
+
+SCENARIOS = [
+    # (tickers, years)
+    (500, 20),
+    (5_000, 20),
+]
+HELD = 50
+MB = 1024 ** 2
+
+
+def write_data(store, n_tickers, n_years, seed=0):
+    """Write the universe a year at a time; returns the holdings, 50 random tickers."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2006-01-02', periods=252 * n_years)
+    tickers = np.array([f"T{i:04d}" for i in range(n_tickers)], dtype=object)
+    level = np.full(n_tickers, np.log(100.0))
+    for first in range(0, len(dates), 252):
+        block = dates[first:first + 252]
+        walk = level + np.cumsum(rng.normal(0.0003, 0.015, (len(block), n_tickers)), axis=0)
+        level = walk[-1]
+        close = np.exp(walk).ravel()
+        # Every ticker misses a day now and then, so the matrix has gaps like real data.
+        listed = rng.random(close.size) > 0.01
+        chunk = pd.DataFrame({
+            'Date': np.repeat(block, n_tickers), 'Ticker': np.tile(tickers, len(block)),
+            'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close, 'Volume': 1_000_000,
+        })[listed]
+        (store.append if first else store.write)(chunk, 'market_data_clean', partition_by='year',
+                                                 cluster_by='Ticker')
+
+    held = np.sort(rng.choice(tickers, HELD, replace=False))
+    return pd.DataFrame({
+        'Ticker': held,
+        'Shares': rng.integers(10, 500, HELD).astype(float),
+        'Purchase_Date': dates[rng.integers(0, 60, HELD)].strftime('%Y-%m-%d'),
+    })
+
+
+def from_table(store, portfolio):
+    """Load and pivot the whole long table, then value and measure the holdings, as steps 4/5 did."""
+    prices = price_matrix(store.read('market_data_clean', columns=['Date', 'Ticker', 'Close']))[portfolio['Ticker']]
+    return portfolio_nav(prices, portfolio), position_risk(prices, portfolio['Ticker'])
+
+
+def from_matrix(root, portfolio):
+    """The same from the mapped matrix: only the held columns are read."""
+    prices = MatrixStore(root).prices(portfolio['Ticker'])
+    return portfolio_nav(prices, portfolio), position_risk(prices, portfolio['Ticker'])
+
+
+def universe_risk(root):
+    """Volatility and drawdown of every ticker, a chunk of zero-copy column views at a time."""
+    return pd.concat([position_risk(block.astype('float64'), block.columns)
+                      for block in MatrixStore(root).column_chunks()], ignore_index=True)
+
+
+def measured(func, *args):
+    """Result, seconds and peak traced allocations (numpy and Python heap) in MB."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / MB
+
+
+print("=" * 96)
+print(" " * 31 + "MEMORY-MAPPED PRICE MATRIX BENCHMARK")
+print("=" * 96)
+print(f"\n{'Tickers':>8} {'Years':>6} {'Cells':>12} {'Table (s)':>10} {'Peak MB':>8} {'Build (s)':>10} "
+      f"{'Matrix (s)':>11} {'Peak MB':>8} {'Universe (s)':>13} {'Peak MB':>8}")
+print("-" * 96)
+
+with tempfile.TemporaryDirectory() as root:
+    for n_tickers, n_years in SCENARIOS:
+        store = ParquetStore(os.path.join(root, 'processed'))
+        portfolio = write_data(store, n_tickers, n_years)
+        matrix_root = os.path.join(root, 'price_matrix')
+
+        (table_nav, table_risk), table_time, table_peak = measured(from_table, store, portfolio)
+        start = time.perf_counter()
+        matrix = MatrixStore.from_store(store, 'market_data_clean', matrix_root)
+        build_time = time.perf_counter() - start
+        (nav, risk), matrix_time, matrix_peak = measured(from_matrix, matrix_root, portfolio)
+        universe, universe_time, universe_peak = measured(universe_risk, matrix_root)
+
+        assert np.allclose(nav.to_numpy(), table_nav.to_numpy(), rtol=1e-12)
+        pd.testing.assert_frame_equal(risk, table_risk)
+        assert len(universe) == n_tickers
+        print(f"{n_tickers:>8,} {n_years:>6} {matrix.array().size:>12,} {table_time:>10.2f} {table_peak:>8,.0f} "
+              f"{build_time:>10.2f} {matrix_time:>11.3f} {matrix_peak:>8,.1f} {universe_time:>13.2f} "
+              f"{universe_peak:>8,.0f}")
+        del matrix
+
+print(f"\nTable: read the closes of the partitioned Parquet table, pivot them and value {HELD} held tickers")
+print("(steps 4/5 before, which also read the other columns).")
+print("Build: MatrixStore.from_store, one chunk of the table in memory at a time (step 3 after it saves).")
+print("Cells: dates x tickers in the matrix.")
+print(f"Matrix: the same {HELD} columns read from the memory-mapped matrix and valued.")
+print("Universe: volatility and drawdown of every ticker over zero-copy chunks of 512 columns.")
+print("Peak MB: tracemalloc peak of numpy and Python allocations (mapped file pages are not allocations).")
+print("\n" + "=" * 96)
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from monte_carlo import simulate_var
+
+# (tickers, paths): the live portfolio size at 1M paths, and a wider universe
+CASES = [(14, 1_000_000), (100, 100_000)]
+WORKER_COUNTS = [1, 2, 4]
+
+
+def make_inputs(n_tickers, n_dates=252, seed=0):
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 0.01, (n_dates, 1))
+    returns = 0.8 * factor + rng.normal(0, 0.012, (n_dates, n_tickers))
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    values = pd.Series(rng.uniform(10_000, 60_000, n_tickers), index=tickers)
+    return pd.DataFrame(returns, columns=tickers), values
+
+
+print("=" * 78)
+print(" " * 22 + "MONTE CARLO VaR BENCHMARK")
+print("=" * 78)
+print(f"\nHorizons 1/10/21 days, 95% and 99% confidence, {os.cpu_count()} CPUs")
+print(f"\n{'Tickers':>8} {'Paths':>10} {'Method':>11} {'Workers':>8} {'Chunks':>7} {'Seconds':>9} {'Paths/sec':>12} {'Same result':>12}")
+print("-" * 85)
+
+for n_tickers, n_paths in CASES:
+    returns, values = make_inputs(n_tickers)
+    for method in ('parametric', 'bootstrap'):
+        reference = None
+        for workers in WORKER_COUNTS:
+            table, stats = simulate_var(returns, values, n_paths=n_paths, method=method, seed=7, workers=workers)
+            if reference is None:
+                reference = table
+            same = table[['VaR', 'CVaR']].equals(reference[['VaR', 'CVaR']])
+            print(f"{n_tickers:>8} {n_paths:>10,} {method:>11} {workers:>8} {stats['chunks']:>7} {stats['seconds']:>9.2f} "
+                  f"{stats['paths_per_sec']:>12,.0f} {'yes' if same else 'NO':>12}")
+
+portfolio = reference[(reference['Ticker'] == 'PORTFOLIO') & (reference['Horizon_Days'] == 10)]
+print("\nSample (last run, portfolio, 10-day horizon):")
+print(portfolio[['Confidence', 'VaR_Pct', 'CVaR_Pct']].to_string(index=False))
+print("\n" + "=" * 78)
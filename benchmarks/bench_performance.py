@@ -0,0 +1,115 @@
+import contextlib
+import io
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from performance import position_performance, render_report
+
+LOT_COUNTS = [10, 10_000, 1_000_000]
+N_TICKERS = 500
+LEGACY_MAX_LOTS = 10_000
+
+
+def make_inputs(n_lots, seed=0):
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f"T{i:04d}" for i in range(N_TICKERS)])
+    current_prices = pd.Series(rng.uniform(10, 500, N_TICKERS), index=tickers)
+    purchase = pd.bdate_range('2015-01-01', '2025-12-31')
+    lot_tickers = rng.choice(tickers, n_lots)
+    portfolio = pd.DataFrame({
+        'Ticker': lot_tickers,
+        'Asset_Name': np.char.add('Company ', lot_tickers),
+        'Asset_Class': rng.choice(['Equity', 'ETF'], n_lots),
+        'Shares': rng.integers(1, 1_000, n_lots),
+        'Purchase_Date': pd.DatetimeIndex(rng.choice(purchase, n_lots)).strftime('%d/%m/%Y'),
+        'Purchase_Price': rng.uniform(10, 500, n_lots).round(2),
+    })
+    return portfolio, current_prices
+
+
+def legacy_performance(portfolio, latest_prices, latest_date):
+    """The per-row loop previously used by 04_portfolio_performance.py, console output included."""
+    results = []
+    for idx, holding in portfolio.iterrows():
+        ticker = holding['Ticker']
+        shares = holding['Shares']
+        purchase_price = holding['Purchase_Price']
+        purchase_date = holding['Purchase_Date']
+        current_price = latest_prices.loc[ticker, 'Close']
+        cost_basis = shares * purchase_price
+        current_value = shares * current_price
+        unrealized_gain = current_value - cost_basis
+        unrealized_gain_pct = (unrealized_gain / cost_basis) * 100
+        days_held = (pd.to_datetime(latest_date) - pd.to_datetime(purchase_date)).days
+        results.append({
+            'Ticker': ticker, 'Asset_Name': holding['Asset_Name'], 'Asset_Class': holding['Asset_Class'],
+            'Shares': shares, 'Purchase_Date': purchase_date, 'Purchase_Price': purchase_price,
+            'Current_Price': current_price, 'Cost_Basis': cost_basis, 'Current_Value': current_value,
+            'Unrealized_Gain': unrealized_gain, 'Unrealized_Gain_Pct': unrealized_gain_pct, 'Days_Held': days_held,
+        })
+        print(f"\n{ticker} - {holding['Asset_Name']}")
+        print(f"  {'Shares:':<20} {shares:>12,.0f}")
+        print(f"  {'Purchase Price:':<20} ${purchase_price:>11,.2f}")
+        print(f"  {'Current Price:':<20} ${current_price:>11,.2f}")
+        print(f"  {'Purchase Date:':<20} {purchase_date:>12}")
+        print(f"  {'Days Held:':<20} {days_held:>12,}")
+        print(f"  {'-'*35}")
+        print(f"  {'Cost Basis:':<20} ${cost_basis:>11,.2f}")
+        print(f"  {'Current Value:':<20} ${current_value:>11,.2f}")
+        print(f"  {'Unrealized Gain:':<20} ${unrealized_gain:>11,.2f}")
+        print(f"  {'Return:':<20} {unrealized_gain_pct:>11,.2f}%")
+    return pd.DataFrame(results)
+
+
+print("=" * 86)
+print(" " * 26 + "PERFORMANCE ENGINE BENCHMARK")
+print("=" * 86)
+print(f"\n{'Lots':>10} {'Legacy (s)':>12} {'Engine (s)':>11} {'Summary (s)':>12} "
+      f"{'Full rpt (s)':>13} {'Speedup':>9} {'Speedup+rpt':>12}")
+print("-" * 86)
+
+warnings.simplefilter('ignore', UserWarning)  # the legacy loop's day-first date warning
+latest_date = '2026-01-15'
+legacy_rate = None
+for n_lots in LOT_COUNTS:
+    portfolio, current_prices = make_inputs(n_lots)
+
+    start = time.perf_counter()
+    results = position_performance(portfolio, current_prices, latest_date)
+    engine_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render_report(results, positions=False)
+    summary_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render_report(results)
+    report_time = time.perf_counter() - start
+
+    if n_lots <= LEGACY_MAX_LOTS:
+        latest = current_prices.rename('Close').to_frame()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = legacy_performance(portfolio, latest, latest_date)
+        legacy_time = time.perf_counter() - start
+        legacy_rate = legacy_time / n_lots
+        pd.testing.assert_frame_equal(results, expected, check_dtype=False)
+        legacy = f"{legacy_time:>12.3f}"
+    else:
+        legacy_time = legacy_rate * n_lots
+        legacy = f"{legacy_time:>8.0f} est"
+
+    print(f"{n_lots:>10,} {legacy} {engine_time:>11.3f} {summary_time:>12.3f} {report_time:>13.3f} "
+          f"{legacy_time / (engine_time + summary_time):>8.1f}x {legacy_time / (engine_time + report_time):>11.1f}x")
+
+print("\nLegacy includes its per-position console output (sent to a buffer). 'Speedup' compares it")
+print("with the engine plus summary report; 'Speedup+rpt' with the engine plus the full report.")
+print(f"1M-lot legacy time is extrapolated from the {LEGACY_MAX_LOTS:,}-lot run.")
+print("\n" + "=" * 86)
@@ -0,0 +1,96 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import timed
+from benchmark import benchmark_returns, portfolio_returns, rolling_relative_table
+from incremental_powerbi import APPEND_TABLES, build_state, new_rows
+from incremental_risk import build_timeseries
+from powerbi_tables import daily_portfolio, date_dimension, rolling_risk_fact, stock_history_table
+from returns import holdings_flows
+from storage import CsvStore
+from valuation import portfolio_nav, price_matrix
+
+SCENARIOS = [
+    # (tickers, years, new days)
+    (100, 5, 1),
+    (500, 10, 1),
+    (500, 10, 5),
+]
+HELD = 50
+
+
+def make_data(n_tickers, n_years, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2010-01-04', periods=252 * n_years)
+    tickers = ['SPY', 'QQQ', 'VTI'] + [f"T{i:04d}" for i in range(n_tickers - 3)]
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, (len(dates), n_tickers)), axis=0))
+    market_data = pd.DataFrame({
+        'Date': np.repeat(dates, n_tickers),
+        'Ticker': np.tile(tickers, len(dates)),
+        'Open': close.ravel(), 'High': close.ravel() * 1.01, 'Low': close.ravel() * 0.99, 'Close': close.ravel(),
+        'Volume': 1e6,
+    })
+    held = rng.choice(tickers[3:], HELD, replace=False)
+    portfolio = pd.DataFrame({
+        'Ticker': held,
+        'Asset_Name': held,
+        'Asset_Class': rng.choice(['Equity', 'ETF'], HELD),
+        'Shares': rng.integers(10, 500, HELD).astype(float),
+        'Purchase_Date': dates[rng.integers(0, 60, HELD)].strftime('%Y-%m-%d'),
+        'Purchase_Price': 100.0,
+    })
+    prices = price_matrix(market_data)
+    timeseries = build_timeseries(portfolio_nav(prices, portfolio), holdings_flows(prices, portfolio))
+    return market_data, portfolio, timeseries
+
+
+def full_build(market_data, portfolio, timeseries):
+    """The five date-keyed tables from scratch, as a full step 6 run builds them."""
+    daily = daily_portfolio(timeseries)
+    prices = price_matrix(market_data)
+    return {
+        'dim_date': date_dimension(timeseries),
+        'fact_daily_portfolio': daily,
+        'fact_stock_history': stock_history_table(market_data, portfolio),
+        'fact_rolling_risk': rolling_risk_fact(market_data, daily),
+        'fact_benchmark_rolling': rolling_relative_table(portfolio_returns(portfolio, prices),
+                                                         benchmark_returns(prices)),
+    }
+
+
+print("=" * 96)
+print(" " * 30 + "INCREMENTAL POWER BI EXPORT BENCHMARK")
+print("=" * 96)
+print(f"\n{'Tickers':>8} {'Years':>6} {'New days':>9} {'History rows':>13} {'Full (s)':>10} {'Delta rows':>11} "
+      f"{'Delta (s)':>10} {'Rows/s':>12} {'Speedup':>8}")
+print("-" * 96)
+
+for n_tickers, n_years, n_new in SCENARIOS:
+    market_data, portfolio, timeseries = make_data(n_tickers, n_years)
+    full, full_time = timed(full_build, market_data, portfolio, timeseries)
+
+    cut = timeseries['Date'].iloc[-n_new - 1]
+    state = build_state(portfolio, timeseries[timeseries['Date'] <= cut], market_data[market_data['Date'] <= cut],
+                        None, CsvStore('unused'))
+    delta, delta_time = timed(new_rows, state, portfolio, timeseries, market_data, None)
+
+    for name in APPEND_TABLES:
+        expected = full[name][full[name]['Date'] > cut]
+        assert len(delta[name]) == len(expected), name
+    np.testing.assert_allclose(delta['fact_stock_history']['Price_Change'].to_numpy(),
+                               full['fact_stock_history'].sort_values(['Date', 'Ticker']).query('Date > @cut')
+                               .sort_values(['Ticker', 'Date'])['Price_Change'].to_numpy())
+
+    delta_count = sum(len(delta[name]) for name in APPEND_TABLES)
+    print(f"{n_tickers:>8,} {n_years:>6} {n_new:>9} {sum(len(t) for t in full.values()):>13,} {full_time:>10.2f} "
+          f"{delta_count:>11,} {delta_time:>10.3f} {delta_count / delta_time:>12,.0f} {full_time / delta_time:>7.0f}x")
+
+print(f"\nTables: {', '.join(APPEND_TABLES)}.")
+print("Full: every row rebuilt from the whole history, as a non-incremental step 6 run does.")
+print("Delta: only rows after the high-water marks, with just enough history for the rolling windows.")
+print("\n" + "=" * 96)
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import make_factor_returns, make_positions, timed
+from covariance import covariance
+from rebalance import OBJECTIVES, PositionBook, expected_returns, optimize, trade_list
+
+SCENARIOS = [
+    # (portfolios, positions per portfolio, tickers)
+    (1_000, 25, 500),
+    (10_000, 25, 2_000),
+]
+LOOKBACK = 252
+LOOP_SAMPLE = 20
+
+
+print("=" * 96)
+print(" " * 34 + "REBALANCING BENCHMARK")
+print("=" * 96)
+print(f"\n{'Portfolios':>10} {'Objective':<14} {'Cold (s)':>9} {'Iter':>6} {'Warm (s)':>9} {'Iter':>6} "
+      f"{'Portfolios/s':>13} {'Loop (s)':>10} {'Speedup':>8}")
+print("-" * 96)
+
+for n_portfolios, n_positions, n_tickers in SCENARIOS:
+    returns = make_factor_returns(n_tickers, LOOKBACK + 1)
+    # Yesterday's window and today's: the same history rolled forward one day.
+    yesterday, today = returns.iloc[:-1], returns.iloc[1:]
+    cov_yesterday, cov_today = covariance(yesterday), covariance(today)
+    mu_yesterday, mu_today = expected_returns(yesterday), expected_returns(today)
+    positions = make_positions(n_portfolios, n_positions, returns.columns)
+    book = PositionBook.from_table(positions)
+
+    for objective in OBJECTIVES:
+        previous, _ = optimize(book, cov_yesterday, mu_yesterday, objective, max_weight=0.2)
+        (cold, cold_iter), cold_time = timed(optimize, book, cov_today, mu_today, objective, max_weight=0.2)
+        (warm, warm_iter), warm_time = timed(optimize, book, cov_today, mu_today, objective, max_weight=0.2,
+                                             initial=previous)
+        assert np.allclose(cold, warm, atol=1e-5)
+        assert np.allclose(warm.sum(axis=1), 1.0) and warm.min() >= 0
+
+        sample = positions[positions['Portfolio_ID'].isin(book.portfolio_ids[:LOOP_SAMPLE])]
+        start = time.perf_counter()
+        for portfolio_id, portfolio in sample.groupby('Portfolio_ID', sort=True):
+            single = PositionBook.from_table(portfolio)
+            row = np.searchsorted(book.portfolio_ids, portfolio_id)
+            weights, _ = optimize(single, cov_today, mu_today, objective, max_weight=0.2,
+                                  initial=previous[row:row + 1])
+            assert np.allclose(weights[0], warm[row], atol=1e-5)
+        loop_time = (time.perf_counter() - start) * n_portfolios / LOOP_SAMPLE
+
+        print(f"{n_portfolios:>10,} {objective:<14} {cold_time:>9.3f} {cold_iter.mean():>6.1f} "
+              f"{warm_time:>9.3f} {warm_iter.mean():>6.1f} {n_portfolios / warm_time:>13,.0f} "
+              f"{loop_time:>10.2f} {loop_time / warm_time:>7.0f}x")
+
+    trades, trade_time = timed(trade_list, book, warm, 0.0, 10, 0.25)
+    assert (trades['Current_Shares'] + trades['Trade_Shares']).min() >= 0
+    assert (trades['Trade_Shares'] % 10 == 0).all()
+    print(f"{'':>10} {'trade list':<14} {trade_time:>9.3f} {'':>6} {'':>9} {'':>6} "
+          f"{n_portfolios / trade_time:>13,.0f}")
+
+print(f"\n{n_positions} positions per portfolio, weights capped at 20%, {LOOKBACK} days of returns.")
+print("Cold: solved from equal weights. Warm: started from the solution on the previous day's window.")
+print("Iter: mean iterations (coordinate sweeps for risk parity). Loop: one portfolio per solve,")
+print(f"warm-started, measured on {LOOP_SAMPLE} portfolios and scaled. Trade list: 10-share lots, 25% turnover cap.")
+print("\n" + "=" * 96)
@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import timed
+from reshape import FIELDS, read_yfinance_csv, wide_to_long
+
+N_DATES = 252
+SIZES = [14, 500, 5000]
+LEGACY_MAX_TICKERS = 14
+
+
+def make_yfinance_csv(path, n_tickers, n_dates=N_DATES, seed=0):
+    """Write a synthetic CSV in the layout produced by ``yf.download(..., group_by='ticker')``."""
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    dates = pd.bdate_range('2025-01-02', periods=n_dates).strftime('%Y-%m-%d')
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_dates, n_tickers)), axis=0))
+    block = np.empty((n_dates, n_tickers, len(FIELDS)))
+    block[:, :, 0] = close * (1 + rng.normal(0, 0.002, close.shape))
+    block[:, :, 1] = close * 1.01
+    block[:, :, 2] = close * 0.99
+    block[:, :, 3] = close
+    block[:, :, 4] = rng.integers(1_000, 50_000_000, close.shape)
+
+    # A few tickers list late, like a new holding with a short history.
+    block[: n_dates // 4, :: max(n_tickers // 5, 1), :] = np.nan
+
+    columns = pd.MultiIndex.from_product([tickers, FIELDS], names=['Ticker', 'Price'])
+    wide = pd.DataFrame(block.reshape(n_dates, -1), index=pd.Index(dates, name='Date'), columns=columns)
+    wide.to_csv(path)
+
+
+def legacy_reshape(path):
+    """The per-cell loop previously used by 03_clean_market_data.py, kept as the reference."""
+    market_data = pd.read_csv(path)
+    date_column = market_data.iloc[2:, 0].values
+
+    tickers = []
+    for col in market_data.columns:
+        if col not in ['Ticker', 'Price', 'Date', 'Unnamed: 0']:
+            base_ticker = col.split('.')[0]
+            if base_ticker not in tickers:
+                tickers.append(base_ticker)
+
+    cleaned_data = []
+    for i, date in enumerate(date_column):
+        row_idx = i + 2
+        if pd.notna(date):
+            for ticker in tickers:
+                ticker_cols = [col for col in market_data.columns if col == ticker or col.startswith(ticker + '.')]
+                if len(ticker_cols) >= 5:
+                    try:
+                        open_val = market_data.iloc[row_idx][ticker_cols[0]]
+                        high_val = market_data.iloc[row_idx][ticker_cols[1]]
+                        low_val = market_data.iloc[row_idx][ticker_cols[2]]
+                        close_val = market_data.iloc[row_idx][ticker_cols[3]]
+                        volume_val = market_data.iloc[row_idx][ticker_cols[4]]
+                        if pd.notna(close_val):
+                            cleaned_data.append({
+                                'Date': str(date),
+                                'Ticker': ticker,
+                                'Open': float(open_val),
+                                'High': float(high_val),
+                                'Low': float(low_val),
+                                'Close': float(close_val),
+                                'Volume': float(volume_val)
+                            })
+                    except Exception:
+                        continue
+    return pd.DataFrame(cleaned_data)
+
+
+def stack_reference(path):
+    """Independent check for sizes the legacy loop cannot reach in reasonable time."""
+    wide = read_yfinance_csv(path)
+    long_df = wide.stack(level='Ticker', future_stack=True).reset_index()
+    long_df = long_df[long_df['Close'].notna()].reset_index(drop=True)
+    return long_df[['Date', 'Ticker'] + FIELDS]
+
+
+def vectorized_reshape(path):
+    return wide_to_long(read_yfinance_csv(path))
+
+
+print("=" * 70)
+print(" " * 20 + "RESHAPE BENCHMARK")
+print("=" * 70)
+
+raw_path = 'data/raw/market_data.csv'
+clean_path = 'data/processed/market_data_clean.csv'
+if os.path.exists(raw_path) and os.path.exists(clean_path):
+    expected = pd.read_csv(clean_path, float_precision='round_trip')
+    actual, elapsed = timed(vectorized_reshape, raw_path)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    print(f"\n✓ Output identical to {clean_path} ({len(actual):,} rows, {elapsed:.3f}s)")
+
+print(f"\n{'Tickers':>8} {'Rows':>12} {'Legacy (s)':>12} {'Vectorized (s)':>16} {'Speedup':>10}")
+print("-" * 62)
+
+with tempfile.TemporaryDirectory() as tmp:
+    for n_tickers in SIZES:
+        path = os.path.join(tmp, f'market_data_{n_tickers}.csv')
+        make_yfinance_csv(path, n_tickers)
+
+        actual, new_time = timed(vectorized_reshape, path)
+
+        if n_tickers <= LEGACY_MAX_TICKERS:
+            expected, old_time = timed(legacy_reshape, path)
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+            print(f"{n_tickers:>8,} {len(actual):>12,} {old_time:>12.3f} {new_time:>16.3f} {old_time / new_time:>9.1f}x")
+        else:
+            pd.testing.assert_frame_equal(actual, stack_reference(path), check_dtype=False, check_names=False)
+            print(f"{n_tickers:>8,} {len(actual):>12,} {'skipped':>12} {new_time:>16.3f} {'-':>10}")
+
+print(f"\nLegacy loop only runs up to {LEGACY_MAX_TICKERS} tickers; beyond that it takes minutes,")
+print("so larger sizes are checked against an independent pandas stack instead.")
+print("=" * 70)
@@ -0,0 +1,140 @@
+import os
+import resource
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import timed
+from powerbi_tables import holding_dimension
+from schema import memory_bytes
+from storage import CsvStore
+
+SCENARIOS = [
+    # (tickers, years)
+    (500, 20),
+    (5_000, 20),
+]
+HELD = 50
+HOLDING_COLUMNS = ['Ticker', 'Shares', 'Purchase_Price', 'Purchase_Date', 'Asset_Name', 'Asset_Class']
+MB = 1024 ** 2
+
+
+def write_data(path, store, n_tickers, n_years, seed=0):
+    """Write the universe a year at a time: float64 as before to ``path``, typed through ``store``.
+
+    Returns the holdings, 50 random tickers bought in the first quarter.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2006-01-02', periods=252 * n_years)
+    tickers = np.array([f"T{i:04d}" for i in range(n_tickers)], dtype=object)
+    level = np.full(n_tickers, np.log(100.0))
+    for first in range(0, len(dates), 252):
+        block = dates[first:first + 252]
+        walk = level + np.cumsum(rng.normal(0.0003, 0.015, (len(block), n_tickers)), axis=0)
+        level = walk[-1]
+        close = np.exp(walk).ravel()
+        chunk = pd.DataFrame({
+            'Date': np.repeat(block, n_tickers),
+            'Ticker': np.tile(tickers, len(block)),
+            'Open': close * rng.uniform(0.99, 1.01, close.size), 'High': close * 1.01, 'Low': close * 0.99,
+            'Close': close,
+            'Volume': rng.integers(10_000, 10_000_000, close.size).astype('float64'),
+        })
+        chunk.to_csv(path, mode='a' if first else 'w', header=not first, index=False)
+        (store.append if first else store.write)(chunk, 'market_data_clean')
+
+    held = rng.choice(tickers, HELD, replace=False)
+    return pd.DataFrame({
+        'Ticker': held,
+        'Asset_Name': [f"{ticker} Inc" for ticker in held],
+        'Asset_Class': rng.choice(['Equity', 'ETF'], HELD),
+        'Shares': rng.integers(10, 500, HELD).astype(float),
+        'Purchase_Date': dates[rng.integers(0, 60, HELD)].strftime('%d/%m/%Y'),
+        'Purchase_Price': 100.0,
+    })
+
+
+def denormalized_bytes(tickers, portfolio, chunk_rows=1_000_000):
+    """Memory the old fact_stock_history merge spent repeating holding attributes on every row."""
+    attributes = portfolio[HOLDING_COLUMNS].set_index('Ticker')
+    return sum(memory_bytes(attributes.reindex(tickers[first:first + chunk_rows]))
+               for first in range(0, len(tickers), chunk_rows))
+
+
+def load_untyped(path, chunk_rows=1_000_000):
+    """Default dtypes, parsing dates right after the read the way steps 4-12 did.
+
+    Read in chunks: one read_csv of the 5,000-ticker file does not fit in 6 GB.
+    """
+    chunks = []
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        chunk['Date'] = pd.to_datetime(chunk['Date'])
+        chunks.append(chunk)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def measure_untyped(path, portfolio):
+    untyped, seconds = timed(load_untyped, path)
+    return {'seconds': seconds, 'memory': memory_bytes(untyped), 'peak': peak_rss(), 'rows': len(untyped),
+            'sample': untyped.iloc[::997].reset_index(drop=True),
+            'denormalized': denormalized_bytes(untyped['Ticker'], portfolio)}
+
+
+def measure_typed(root):
+    typed, seconds = timed(CsvStore(root).read, 'market_data_clean')
+    return {'seconds': seconds, 'memory': memory_bytes(typed), 'peak': peak_rss(),
+            'sample': typed.iloc[::997].reset_index(drop=True)}
+
+
+def isolated(func, *args):
+    """``func(*args)`` in a forked worker, so each load's peak memory is its own."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(func, *args).result()
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+print("=" * 96)
+print(" " * 33 + "TYPED DATA MODEL BENCHMARK")
+print("=" * 96)
+print(f"\n{'Tickers':>8} {'Years':>6} {'Rows':>11} {'CSV MB':>9} {'Load (s)':>9} {'Memory MB':>11} "
+      f"{'Peak MB':>11} {'Holding cols MB':>16}")
+print(f"{'':>8} {'':>6} {'':>11} {'before/after':>9} {'before/after':>9} {'before/after':>11} "
+      f"{'before/after':>11} {'per row/dim':>16}")
+print("-" * 96)
+
+with tempfile.TemporaryDirectory() as root:
+    for n_tickers, n_years in SCENARIOS:
+        before_path = os.path.join(root, 'untyped.csv')
+        store = CsvStore(os.path.join(root, 'typed'))
+        portfolio = write_data(before_path, store, n_tickers, n_years)
+
+        before = isolated(measure_untyped, before_path, portfolio)
+        after = isolated(measure_typed, store.root)
+        sample, check = before['sample'], after['sample']
+        assert (check['Ticker'].astype(str) == sample['Ticker']).all()
+        assert (check['Date'] == sample['Date']).all() and (check['Volume'] == sample['Volume']).all()
+        assert np.allclose(check['Close'], sample['Close'], rtol=1e-7)
+        dimension = memory_bytes(holding_dimension(portfolio))
+
+        sizes = [os.path.getsize(before_path) / MB, os.path.getsize(store.path('market_data_clean')) / MB]
+        print(f"{n_tickers:>8,} {n_years:>6} {before['rows']:>11,} {sizes[0]:>4,.0f}/{sizes[1]:<4,.0f} "
+              f"{before['seconds']:>4.1f}/{after['seconds']:<4.1f} "
+              f"{before['memory'] / MB:>5,.0f}/{after['memory'] / MB:<5,.0f} "
+              f"{before['peak'] / MB:>5,.0f}/{after['peak'] / MB:<5,.0f} "
+              f"{before['denormalized'] / MB:>7,.0f}/{dimension / MB:<8.3f}")
+
+print("\nBefore: float64 quotes and volume written as-is, read with default dtypes (in 1M-row chunks, as one")
+print("read_csv of the 5,000-ticker file runs out of memory on a 6 GB machine) and Date parsed after the read.")
+print("After: CsvStore with schema.MARKET_DATA - categorical Ticker, datetime64 Date, float64 OHLC, int64 Volume.")
+print("Peak: resident memory high-water mark of a worker process forked to do just that load.")
+print(f"Holding cols: Shares, purchase price/date, name and class repeated on every row ({HELD} held tickers),")
+print("against dim_holding with one row per held ticker.")
+print("\n" + "=" * 96)
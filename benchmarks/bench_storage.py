@@ -0,0 +1,94 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import timed
+from storage import CsvStore, ParquetStore
+
+TABLES = [
+    ('data/processed', 'market_data_clean', 'year'),
+    ('data/processed', 'portfolio_timeseries', None),
+    ('data/powerbi', 'fact_stock_history', 'year'),
+    ('data/powerbi', 'fact_daily_portfolio', None),
+]
+SYNTHETIC_TICKERS = 500
+SYNTHETIC_DATES = 252 * 10
+
+
+def disk_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+
+def read_csv_typed(store, name, **kwargs):
+    """CSV read plus the Date parse every downstream stage has to redo."""
+    df = store.read(name, **kwargs)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+def make_stock_history(n_tickers, n_dates, seed=0):
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f"T{i:04d}" for i in range(n_tickers)])
+    dates = pd.bdate_range('2016-01-04', periods=n_dates).strftime('%Y-%m-%d')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_dates, n_tickers)), axis=0)).ravel()
+    return pd.DataFrame({
+        'Date': np.repeat(dates, n_tickers),
+        'Ticker': np.tile(tickers, n_dates),
+        'Open': close * 0.999,
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000, 50_000_000, close.size).astype('float64'),
+    })
+
+
+def compare(label, df, partition_by, tmp):
+    csv_store = CsvStore(os.path.join(tmp, 'csv'))
+    parquet_store = ParquetStore(os.path.join(tmp, 'parquet'))
+    csv_path = csv_store.write(df, label)
+    parquet_path = parquet_store.write(df, label, partition_by=partition_by,
+                                         cluster_by='Ticker' if 'Ticker' in df.columns else None)
+
+    _, csv_full = timed(read_csv_typed, csv_store, label)
+    _, pq_full = timed(parquet_store.read, label)
+
+    ticker = df['Ticker'].iloc[0] if 'Ticker' in df.columns else None
+    if ticker is not None:
+        query = dict(columns=['Date', 'Close'], filters=[('Ticker', '==', ticker)])
+        _, csv_query = timed(read_csv_typed, csv_store, label, **query)
+        _, pq_query = timed(parquet_store.read, label, **query)
+    else:
+        csv_query = pq_query = float('nan')
+
+    csv_size = disk_size(csv_path) / 1024
+    pq_size = disk_size(parquet_path) / 1024
+    print(f"{label:<28} {len(df):>10,} {csv_size:>10,.0f} {pq_size:>10,.0f} "
+          f"{csv_full:>9.3f} {pq_full:>9.3f} {csv_query:>9.3f} {pq_query:>9.3f}")
+
+
+print("=" * 100)
+print(" " * 35 + "STORAGE BENCHMARK (CSV vs Parquet)")
+print("=" * 100)
+print(f"\n{'Table':<28} {'Rows':>10} {'CSV KB':>10} {'PQ KB':>10} "
+      f"{'CSV read':>9} {'PQ read':>9} {'CSV 1tkr':>9} {'PQ 1tkr':>9}")
+print("-" * 100)
+
+with tempfile.TemporaryDirectory() as tmp:
+    for root, name, partition_by in TABLES:
+        if os.path.exists(os.path.join(root, name + '.csv')):
+            compare(name, CsvStore(root).read(name), partition_by, tmp)
+
+    synthetic = make_stock_history(SYNTHETIC_TICKERS, SYNTHETIC_DATES)
+    compare(f'synthetic_{SYNTHETIC_TICKERS}x{SYNTHETIC_DATES}', synthetic, 'year', tmp)
+
+print("\nRead times in seconds. '1tkr' reads Date and Close for a single ticker")
+print("(column projection + row-group pushdown on Parquet, full parse + filter on CSV).")
+print("Parquet tables with a Ticker column are partitioned by year and clustered by ticker.")
+print("=" * 100)
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import make_positions, timed
+from stress import factor_betas, factor_grid, position_book, shock_matrix, stress_test
+
+SCENARIOS = [
+    # (portfolios, positions per portfolio, tickers, grid step in points)
+    (1_000, 25, 500, 1.0),
+    (10_000, 25, 2_000, 1.0),
+    (1_000, 25, 500, 0.5),
+]
+FACTORS = ['F0', 'F1']
+LOOKBACK = 252
+LOOP_SAMPLE = 50
+
+
+def make_prices(n_tickers, n_dates, seed=0):
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0003, 0.01, (n_dates, 2))
+    loadings = rng.uniform(-0.5, 1.5, (2, n_tickers))
+    returns = market @ loadings + rng.normal(0.0002, 0.015, (n_dates, n_tickers))
+    returns[:, :2] = market
+    tickers = FACTORS + [f"T{i:04d}" for i in range(n_tickers - 2)]
+    return pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), columns=tickers,
+                        index=pd.bdate_range('2024-01-02', periods=n_dates))
+
+
+print("=" * 96)
+print(" " * 36 + "STRESS TEST BENCHMARK")
+print("=" * 96)
+print(f"\n{'Portfolios':>10} {'Tickers':>8} {'Scenarios':>10} {'Shocks (s)':>11} {'Value (s)':>10} "
+      f"{'Valuations/s':>14} {'Loop (s)':>10} {'Speedup':>8}")
+print("-" * 96)
+
+for n_portfolios, n_positions, n_tickers, step in SCENARIOS:
+    prices = make_prices(n_tickers, LOOKBACK + 1)
+    positions = make_positions(n_portfolios, n_positions, prices.columns, etf_share=0.2)
+    book, tickers, asset_classes = position_book(positions)
+    definitions = factor_grid(FACTORS, step_pct=step)
+
+    def build_shocks():
+        return shock_matrix(definitions, tickers, asset_classes, factor_betas(prices[tickers], FACTORS, LOOKBACK))
+
+    (scenario_ids, shocks), shock_time = timed(build_shocks)
+    pnl, value_time = timed(stress_test, book, tickers, shocks)
+
+    # One scenario at a time: every portfolio revalued per scenario, as a scenario loop would.
+    columns = book.columns(tickers)
+    values = book.values()
+    start = time.perf_counter()
+    for row in range(LOOP_SAMPLE):
+        shocked = np.where(columns >= 0, shocks[row][columns], 0.0)
+        assert np.allclose((values * shocked).sum(axis=1), pnl[:, row])
+    loop_time = (time.perf_counter() - start) * len(scenario_ids) / LOOP_SAMPLE
+
+    print(f"{n_portfolios:>10,} {n_tickers:>8,} {len(scenario_ids):>10,} {shock_time:>11.3f} {value_time:>10.3f} "
+          f"{pnl.size / value_time:>14,.0f} {loop_time:>10.1f} {loop_time / value_time:>7.0f}x")
+
+print(f"\n{n_positions} positions per portfolio. Scenarios: every pair of two factor shocks from -30% to +10%,")
+print("passed to each ticker through betas on 252 days of returns. Shocks: betas plus the scenarios x tickers")
+print("matrix. Value: P&L of every portfolio under every scenario (one matrix product per 2,000 portfolios).")
+print(f"Loop: one scenario at a time over all portfolios, measured on {LOOP_SAMPLE} scenarios and scaled.")
+print("\n" + "=" * 96)
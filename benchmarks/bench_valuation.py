@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import make_prices
+from valuation import portfolio_nav, price_matrix
+
+SCENARIOS = [
+    # (positions, tickers, trading days)
+    (14, 14, 252),
+    (1_000, 500, 252 * 5),
+    (10_000, 1_000, 252 * 20),
+]
+LEGACY_MAX_POSITIONS = 14
+
+
+def make_market_data(n_tickers, n_dates, seed=0):
+    prices = make_prices(n_tickers, n_dates, seed, start='2006-01-02')
+    return pd.DataFrame({
+        'Date': np.repeat(prices.index, n_tickers),
+        'Ticker': np.tile(prices.columns.to_numpy(), n_dates),
+        'Close': prices.to_numpy().ravel(),
+    })
+
+
+def make_portfolio(n_positions, market_data, seed=1):
+    rng = np.random.default_rng(seed)
+    tickers = market_data['Ticker'].unique()
+    dates = market_data['Date'].unique()
+    purchase = pd.DatetimeIndex(rng.choice(dates, n_positions))
+    return pd.DataFrame({
+        'Ticker': rng.choice(tickers, n_positions),
+        'Shares': rng.integers(1, 500, n_positions),
+        'Purchase_Date': purchase.strftime('%Y-%m-%d'),
+    })
+
+
+def legacy_nav(market_data, portfolio):
+    """The per-date/per-holding loop previously used by 05_risk_metrics.py."""
+    portfolio_values = []
+    for date in sorted(market_data['Date'].unique()):
+        daily_data = market_data[market_data['Date'] == date]
+        total_value = 0
+        for idx, holding in portfolio.iterrows():
+            if date >= pd.to_datetime(holding['Purchase_Date']):
+                ticker_price = daily_data[daily_data['Ticker'] == holding['Ticker']]['Close'].values
+                if len(ticker_price) > 0:
+                    total_value += holding['Shares'] * ticker_price[0]
+        portfolio_values.append(total_value)
+    return np.array(portfolio_values, dtype='float64')
+
+
+print("=" * 70)
+print(" " * 20 + "VALUATION BENCHMARK")
+print("=" * 70)
+print(f"\n{'Positions':>10} {'Tickers':>8} {'Days':>7} {'Legacy (s)':>12} {'Matrix (s)':>12} {'Max |diff|':>12}")
+print("-" * 66)
+
+for n_positions, n_tickers, n_dates in SCENARIOS:
+    market_data = make_market_data(n_tickers, n_dates)
+    portfolio = make_portfolio(n_positions, market_data)
+
+    start = time.perf_counter()
+    nav = portfolio_nav(price_matrix(market_data), portfolio).to_numpy()
+    new_time = time.perf_counter() - start
+
+    if n_positions <= LEGACY_MAX_POSITIONS:
+        start = time.perf_counter()
+        expected = legacy_nav(market_data, portfolio)
+        old_time = time.perf_counter() - start
+        max_diff = np.abs(nav - expected).max()
+        assert np.allclose(nav, expected, rtol=1e-12, atol=1e-6)
+        print(f"{n_positions:>10,} {n_tickers:>8,} {n_dates:>7,} {old_time:>12.3f} {new_time:>12.3f} {max_diff:>12.2e}")
+    else:
+        print(f"{n_positions:>10,} {n_tickers:>8,} {n_dates:>7,} {'skipped':>12} {new_time:>12.3f} {'-':>12}")
+
+print("\n" + "=" * 70)
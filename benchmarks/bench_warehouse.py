@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from _common import timed
+from powerbi_tables import TABLE_LAYOUT
+from storage import SqlStore
+
+SCENARIOS = [
+    # (tickers, years, upserted days)
+    (100, 5, 5),
+    (500, 5, 5),
+    (500, 10, 21),
+]
+TABLE = 'fact_stock_history'
+LAYOUT = TABLE_LAYOUT[TABLE]
+LOOP_SAMPLE = 20_000
+
+
+def make_history(n_tickers, n_years, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2010-01-04', periods=252 * n_years)
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, (len(dates), n_tickers)), axis=0)).ravel()
+    shares = np.tile(rng.integers(10, 500, n_tickers), len(dates))
+    return pd.DataFrame({
+        'Date': np.repeat(dates, n_tickers),
+        'Ticker': np.tile(tickers, len(dates)),
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+        'Volume': 1e6,
+        'Shares': shares,
+        'Asset_Class': np.tile(rng.choice(['Equity', 'ETF'], n_tickers), len(dates)),
+        'Position_Value': close * shares,
+        'Price_Change_Pct': rng.normal(0, 1.5, close.size),
+    })
+
+
+def row_loop(path, history):
+    """One INSERT statement per row, the way a hand-written loader would."""
+    connection = sqlite3.connect(path)
+    columns = ', '.join(f'"{column}"' for column in history.columns)
+    sql = f"INSERT INTO loop ({columns}) VALUES ({', '.join(['?'] * history.shape[1])})"
+    connection.execute(f"CREATE TABLE loop ({columns})")
+    for row in history.assign(Date=history['Date'].dt.strftime('%Y-%m-%d')).itertuples(index=False):
+        connection.execute(sql, tuple(value.item() if hasattr(value, 'item') else value for value in row))
+    connection.commit()
+    connection.close()
+
+
+print("=" * 96)
+print(" " * 31 + "SQL WAREHOUSE LOAD BENCHMARK")
+print("=" * 96)
+print(f"\n{'Tickers':>8} {'Years':>6} {'Rows':>11} {'Load (s)':>9} {'Rows/s':>11} {'to_sql/s':>11} "
+      f"{'Loop/s':>10} {'Upsert rows':>12} {'Upsert/s':>11}")
+print("-" * 96)
+
+with tempfile.TemporaryDirectory() as root:
+    for n_tickers, n_years, n_days in SCENARIOS:
+        history = make_history(n_tickers, n_years)
+        path = os.path.join(root, f"bench_{n_tickers}_{n_years}.db")
+        store = SqlStore(root, url=f"sqlite:///{path}")
+
+        _, load_time = timed(store.write, history, TABLE, **LAYOUT)
+        _, to_sql_time = timed(history.to_sql, 'to_sql', store.engine, index=False, if_exists='replace')
+        _, loop_time = timed(row_loop, path, history.iloc[:LOOP_SAMPLE])
+        loop_rate = min(LOOP_SAMPLE, len(history)) / loop_time
+
+        # The last days restated (a price correction) plus as many new days again.
+        dates = history['Date'].unique()
+        restated = history[history['Date'] >= dates[-n_days]].assign(Close=lambda df: df['Close'] * 1.001)
+        new_days = history[history['Date'] > dates[-n_days - 1]].assign(
+            Date=lambda df: df['Date'] + pd.offsets.BDay(n_days))
+        upsert = pd.concat([restated, new_days], ignore_index=True)
+        _, upsert_time = timed(store.append, upsert, TABLE, **LAYOUT)
+
+        stored = store.read(TABLE, columns=['Date', 'Close'], filters=[('Date', '>=', dates[-n_days])])
+        assert len(store.read(TABLE, columns=['Ticker'])) == len(history) + len(new_days)
+        assert np.allclose(np.sort(stored['Close'].to_numpy()), np.sort(upsert['Close'].to_numpy()))
+
+        print(f"{n_tickers:>8,} {n_years:>6} {len(history):>11,} {load_time:>9.2f} {len(history) / load_time:>11,.0f} "
+              f"{len(history) / to_sql_time:>11,.0f} {loop_rate:>10,.0f} {len(upsert):>12,} "
+              f"{len(upsert) / upsert_time:>11,.0f}")
+        store.engine.dispose()
+
+print(f"\nTable: {TABLE} layout {LAYOUT}, in a temporary SQLite file.")
+print(f"Load: SqlStore.write, {store.chunk_rows:,}-row executemany chunks into a new table, then its indexes.")
+print("to_sql: pandas DataFrame.to_sql into a table with no key or indexes.")
+print(f"Loop: one INSERT per row, measured on {LOOP_SAMPLE:,} rows.")
+print("Upsert: SqlStore.append of the last days restated plus as many new days, ON CONFLICT (Date, Ticker).")
+print("\n" + "=" * 96)
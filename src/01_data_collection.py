@@ -1,10 +1,32 @@
 import pandas as pd
-import yfinance as yf
 from datetime import datetime, timedelta
+import argparse
 import os
 
+from adjustments import ACTIONS_TABLE
+from fetch_scheduler import FetchScheduler
+from fx import BASE_CURRENCY, RATES_TABLE, fetch_rates, holding_currencies, normalize_rates, reporting_currency
+from price_cache import PriceStore, YahooProvider
+from reshape import long_to_wide
+from storage import get_store
+
+parser = argparse.ArgumentParser(description="Fetch market data for the portfolio holdings.")
+parser.add_argument('--incremental', action='store_true',
+                    help="only fetch dates missing from the local price cache (data/cache/prices)")
+parser.add_argument('--batch-size', type=int, default=50,
+                    help="tickers per scheduled request (Yahoo is asked one ticker at a time)")
+parser.add_argument('--workers', type=int, default=4, help="concurrent download requests")
+parser.add_argument('--rate', type=float, default=2.0, help="maximum download requests per second")
+parser.add_argument('--retries', type=int, default=3, help="retries per batch before a ticker is reported failed")
+parser.add_argument('--currency', help="reporting currency whose FX rates are also fetched "
+                                       "(default: $REPORTING_CURRENCY or USD)")
+parser.add_argument('--fx-file', help="CSV of Date, Currency, Rate (USD per unit) to use instead of "
+                                      "downloading FX rates")
+args = parser.parse_args()
+
 os.makedirs('data/raw', exist_ok=True)
 os.makedirs('data/processed', exist_ok=True)
+raw_store = get_store('data/raw')
 
 print("Loading portfolio holdings...")
 portfolio = pd.read_csv('portfolio_holdings.csv')
@@ -17,21 +39,63 @@ print(f"\nTickers to fetch: {tickers}")
 print("\nFetching market data from Yahoo Finance...")
 end_date = datetime.now()
 start_date = end_date - timedelta(days=365)
+provider = YahooProvider()
+scheduler = FetchScheduler(provider, batch_size=args.batch_size, max_workers=args.workers,
+                           rate=args.rate, max_retries=args.retries)
+
+if args.incremental:
+    price_store = PriceStore()
+    calls, failures = price_store.update(provider, tickers, start_date, end_date, scheduler=scheduler)
+    print(f"Incremental update: {calls} fetch call(s)")
+    data = long_to_wide(price_store.load(tickers, start_date, end_date), tickers)
+else:
+    result = scheduler.run(tickers, start_date, end_date)
+    print(result.summary())
+    failures = result.failures
+    data = long_to_wide(result.data, tickers)
+
+if failures:
+    print(f"\n⚠ {len(failures)} ticker(s) failed to download:")
+    for ticker, error in sorted(failures.items()):
+        print(f"  {ticker:<8} {error}")
 
-data = yf.download(tickers, start=start_date, end=end_date, group_by='ticker')
+print("\nFetching corporate actions (splits and dividends)...")
+try:
+    if args.incremental:
+        actions, refreshed = price_store.update_actions(provider, tickers)
+        print(f"Incremental update: actions of {len(refreshed)} ticker(s) fetched, the rest from the cache")
+    else:
+        actions = provider.actions(tickers)
+except Exception as error:
+    print(f"⚠ Corporate actions unavailable ({error}); step 3 keeps the previous ones")
+else:
+    actions_path = raw_store.write(actions, ACTIONS_TABLE)
+    print(f"Saved {len(actions)} corporate action(s) to: {actions_path}")
+
+currencies = sorted(set(holding_currencies(portfolio)) | {reporting_currency(args.currency)})
+if args.fx_file or currencies != [BASE_CURRENCY]:
+    print("\nFetching FX rates...")
+    if args.fx_file:
+        rates, fx_failures = normalize_rates(pd.read_csv(args.fx_file)), {}
+    else:
+        rates, fx_failures = fetch_rates(provider, currencies, start_date, end_date, scheduler=scheduler)
+    for currency, error in sorted(fx_failures.items()):
+        print(f"⚠ {currency}: {error}")
+    rates_path = raw_store.write(rates, RATES_TABLE)
+    print(f"Saved {len(rates)} rate(s) for {', '.join(sorted(rates['Currency'].unique())) or 'no currency'} "
+          f"to: {rates_path}")
 
 print("\nData collection complete!")
 print(f"Date range: {start_date.date()} to {end_date.date()}")
 
 print("\nSaving raw data...")
-# Fixed: Add filename to the path
-data.to_csv('data/raw/market_data.csv')
-print("Saved to: data/raw/market_data.csv")
+raw_path = raw_store.write(data, 'market_data', index=True)
+print(f"Saved to: {raw_path}")
 
 print("\nSample data for AAPL:")
-if len(tickers) == 1:
-    print(data.tail())
-else:
+if 'AAPL' in data.columns.get_level_values(0):
     print(data['AAPL'].tail())
+else:
+    print(data.tail())
 
 print("\n✓ Data collection successful!")
\ No newline at end of file
@@ -1,12 +1,14 @@
 import pandas as pd
 
+from storage import get_store
+
 print("=" * 60)
 print("DATA STRUCTURE VERIFICATION")
 print("=" * 60)
 
 # Load market data
 print("\nLoading market data...")
-market_data = pd.read_csv('data/raw/market_data.csv', index_col=0)
+market_data = get_store('data/raw').read_wide('market_data')
 
 print(f"\n1. Data Shape: {market_data.shape}")
 print(f"   Rows (dates): {market_data.shape[0]}")
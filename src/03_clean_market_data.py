@@ -1,60 +1,27 @@
 import pandas as pd
 import numpy as np
 
+from adjustments import AdjustmentFactors, read_actions
+from matrix_store import MatrixStore, source_signature
+from reshape import wide_tickers, wide_to_long
+from storage import get_store
+
 print("=" * 60)
 print("CLEANING MARKET DATA")
 print("=" * 60)
 
 print("\nLoading raw market data...")
-market_data = pd.read_csv('data/raw/market_data.csv')
+market_data = get_store('data/raw').read_wide('market_data')
 
 print(f"Original shape: {market_data.shape}")
 
-date_column = market_data.iloc[2:, 0].values 
-
-tickers = []
-for col in market_data.columns:
-    if col not in ['Ticker', 'Price', 'Date', 'Unnamed: 0']:
-        base_ticker = col.split('.')[0]
-        if base_ticker not in tickers:
-            tickers.append(base_ticker)
+tickers = wide_tickers(market_data)
 
 print(f"\nFound {len(tickers)} tickers: {tickers}")
 
-cleaned_data = []
-
 print("\nRestructuring data...")
 
-for i, date in enumerate(date_column):
-    row_idx = i + 2 
-    
-    if pd.notna(date):
-        for ticker in tickers:
-
-            ticker_cols = [col for col in market_data.columns if col == ticker or col.startswith(ticker + '.')]
-            
-            if len(ticker_cols) >= 5:
-                try:
-                    open_val = market_data.iloc[row_idx][ticker_cols[0]]
-                    high_val = market_data.iloc[row_idx][ticker_cols[1]]
-                    low_val = market_data.iloc[row_idx][ticker_cols[2]]
-                    close_val = market_data.iloc[row_idx][ticker_cols[3]]
-                    volume_val = market_data.iloc[row_idx][ticker_cols[4]]
-                    
-                    if pd.notna(close_val):
-                        cleaned_data.append({
-                            'Date': str(date),
-                            'Ticker': ticker,
-                            'Open': float(open_val),
-                            'High': float(high_val),
-                            'Low': float(low_val),
-                            'Close': float(close_val),
-                            'Volume': float(volume_val)
-                        })
-                except Exception as e:
-                    continue
-
-cleaned_df = pd.DataFrame(cleaned_data)
+cleaned_df = wide_to_long(market_data)
 
 if len(cleaned_df) > 0:
     print(f"\n✓ Cleaned data shape: {cleaned_df.shape}")
@@ -64,8 +31,18 @@ if len(cleaned_df) > 0:
     print("\nSample of cleaned data:")
     print(cleaned_df.head(15))
 
-    cleaned_df.to_csv('data/processed/market_data_clean.csv', index=False)
-    print(f"\n✓ Cleaned data saved to: data/processed/market_data_clean.csv")
+    processed = get_store('data/processed')
+    clean_path = processed.write(cleaned_df, 'market_data_clean', partition_by='year', cluster_by='Ticker')
+    print(f"\n✓ Cleaned data saved to: {clean_path}")
+    source = source_signature(processed)
+    if source is not None:
+        matrix = MatrixStore.build(lambda: [cleaned_df], source=source)
+        print(f"✓ Price matrix: {len(matrix.dates)} dates x {len(matrix.tickers)} tickers mapped from {matrix.root}")
+
+    actions = read_actions()
+    factors, refreshed = AdjustmentFactors().update(cleaned_df, actions)
+    print(f"✓ Adjustment factors: {len(actions)} corporate action(s), "
+          f"{len(refreshed)} of {factors['Ticker'].nunique()} ticker(s) refreshed")
     
     print("\n" + "=" * 60)
     print("DATA QUALITY CHECK")
@@ -79,9 +56,9 @@ if len(cleaned_df) > 0:
     print("\n✓ Data cleaning complete!")
 else:
     print("\n❌ No data was extracted. Debugging info:")
-    print(f"Date column sample: {date_column[:5]}")
-    print(f"Number of rows: {len(date_column)}")
+    print(f"Date column sample: {market_data.index[:5].tolist()}")
+    print(f"Number of rows: {len(market_data.index)}")
 
     print("\nSample row for AAPL:")
-    aapl_cols = [col for col in market_data.columns if col == 'AAPL' or col.startswith('AAPL.')]
-    print(market_data.iloc[2][aapl_cols])
\ No newline at end of file
+    if 'AAPL' in tickers:
+        print(market_data['AAPL'].iloc[0])
\ No newline at end of file
@@ -1,84 +1,131 @@
+import argparse
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+from adjustments import VIEWS, actions_fingerprint, adjust_prices, load_factors, read_actions
+from covariance import BENCHMARK_TICKER, ESTIMATORS, CovarianceCache, return_matrix, risk_contributions
+from fx import needs_conversion, rates_fingerprint, read_rates, reporting_currency, to_reporting
+from incremental_risk import (STATE_PATH, build_state, build_timeseries, holdings_fingerprint, load_state,
+                              position_risk, save_state, state_position_risk, state_summary, summarize,
+                              update_state)
+from matrix_store import read_prices
+from monte_carlo import daily_returns, position_values, simulate_var
+from returns import align_flows, holdings_flows, period_returns
+from storage import get_store
+from tax_lots import METHODS, LotLedger, history_nav, read_ledger
+from valuation import portfolio_nav, price_matrix
+
+parser = argparse.ArgumentParser(description="Portfolio time series and risk metrics.")
+parser.add_argument('--incremental', action='store_true',
+                    help=f"only process dates after the saved state in {STATE_PATH}")
+parser.add_argument('--verify', action='store_true',
+                    help="after an incremental run, check it against a full recompute")
+parser.add_argument('--mc-paths', type=int, default=100_000,
+                    help="Monte Carlo paths for VaR/CVaR on a full run (0 to skip)")
+parser.add_argument('--mc-method', choices=['parametric', 'bootstrap'], default='parametric',
+                    help="correlated normal paths via Cholesky, or bootstrap of historical days")
+parser.add_argument('--mc-workers', type=int, default=1, help="processes for Monte Carlo simulation")
+parser.add_argument('--mc-seed', type=int, default=42, help="Monte Carlo random seed")
+parser.add_argument('--cov-method', choices=ESTIMATORS, default='sample',
+                    help="covariance estimator for risk contributions on a full run")
+parser.add_argument('--prices', choices=list(VIEWS), default='adjusted',
+                    help="price view for NAV and risk: raw, split-adjusted, or total return (splits and dividends)")
+parser.add_argument('--currency', help="reporting currency (default: $REPORTING_CURRENCY or USD); holdings "
+                                       "with a Currency column are converted with the rates saved by step 1")
+parser.add_argument('--ledger', help="value a transaction ledger CSV instead of portfolio_holdings.csv")
+parser.add_argument('--lot-method', choices=METHODS, default='fifo', help="lot matching method for --ledger")
+args = parser.parse_args()
+if args.ledger and (args.incremental or args.verify):
+    parser.error("--incremental and --verify work from portfolio_holdings.csv; drop them with --ledger")
+
 print("=" * 70)
 print(" " * 20 + "PORTFOLIO RISK ANALYSIS")
 print("=" * 70)
 
 portfolio = pd.read_csv('portfolio_holdings.csv')
-market_data = pd.read_csv('data/processed/market_data_clean.csv')
-performance = pd.read_csv('data/processed/portfolio_performance.csv')
-
-market_data['Date'] = pd.to_datetime(market_data['Date'])
-market_data = market_data.sort_values('Date')
-
-print(f"\nAnalyzing data from {market_data['Date'].min().date()} to {market_data['Date'].max().date()}")
-
-print("\nCalculating historical portfolio values...")
-
-dates = sorted(market_data['Date'].unique())
-
-portfolio_values = []
-
-for date in dates:
-    daily_data = market_data[market_data['Date'] == date]
-    
-    total_value = 0
-    for idx, holding in portfolio.iterrows():
-        ticker = holding['Ticker']
-        shares = holding['Shares']
-        purchase_date = pd.to_datetime(holding['Purchase_Date'])
-        
-        if date >= purchase_date:
-            ticker_price = daily_data[daily_data['Ticker'] == ticker]['Close'].values
-            if len(ticker_price) > 0:
-                total_value += shares * ticker_price[0]
-    
-    portfolio_values.append({
-        'Date': date,
-        'Portfolio_Value': total_value
-    })
-
-portfolio_ts = pd.DataFrame(portfolio_values)
-portfolio_ts = portfolio_ts[portfolio_ts['Portfolio_Value'] > 0]
-
-print(f"✓ Calculated {len(portfolio_ts)} daily portfolio values")
-
-portfolio_ts['Daily_Return'] = portfolio_ts['Portfolio_Value'].pct_change()
-portfolio_ts['Cumulative_Return'] = ((portfolio_ts['Portfolio_Value'] / portfolio_ts['Portfolio_Value'].iloc[0]) - 1) * 100
-
-returns = portfolio_ts['Daily_Return'].dropna()
+processed = get_store('data/processed')
+factors = load_factors(processed)
+adjustments_key = f"{args.prices}:{actions_fingerprint(read_actions())}"
+reporting = reporting_currency(args.currency)
+if needs_conversion(portfolio, reporting):
+    adjustments_key += f":{reporting}:{rates_fingerprint(read_rates())}"
+
+state = load_state() if args.incremental else None
+if state is not None and state['holdings'] != holdings_fingerprint(portfolio):
+    print("\nHoldings changed since the saved state; running a full recompute.")
+    state = None
+if state is not None and 'peak_growth' not in state:
+    print("\nSaved state predates cash-flow adjusted returns and drawdowns; running a full recompute.")
+    state = None
+if state is not None and state.get('adjustments') != adjustments_key:
+    print("\nPrice view, corporate actions or FX rates changed since the saved state; running a full recompute.")
+    state = None
+
+incremental_run = state is not None
+
+if incremental_run:
+    last_market_date = pd.Timestamp(state['last_market_date'])
+    print(f"\nIncremental update after {last_market_date.date()}")
+    prices = read_prices(processed, portfolio['Ticker'], after=last_market_date,
+                         prepare=lambda block: to_reporting(portfolio, adjust_prices(block, factors, args.prices),
+                                                            reporting)[1])
+    new_rows = update_state(state, portfolio_nav(prices, portfolio), prices,
+                            holdings_flows(prices, portfolio, since=last_market_date))
+    if len(new_rows):
+        processed.append(new_rows, 'portfolio_timeseries')
+    print(f"✓ Appended {len(new_rows)} daily portfolio values")
+
+    metrics = state_summary(state)
+    position_risk_df = state_position_risk(state)
+else:
+    ledger = LotLedger(args.lot_method).run(read_ledger(args.ledger)) if args.ledger else None
+    # Only the tickers held (or traded in the ledger) and the benchmark, a chunk of columns at a time.
+    tickers = {*portfolio['Ticker'], BENCHMARK_TICKER, *(ledger.books if ledger else ())}
+    # A ledger applies splits and dividends to its own lots, so it is valued at raw prices.
+    view = 'raw' if args.ledger else args.prices
+    prices = read_prices(processed, tickers,
+                         prepare=lambda block: to_reporting(portfolio, adjust_prices(block, factors, view),
+                                                            reporting)[1])
+
+    print(f"\nAnalyzing data from {prices.index.min().date()} to {prices.index.max().date()}")
+
+    print("\nCalculating historical portfolio values...")
+
+    if args.ledger:
+        nav = history_nav(ledger.position_history(prices), prices.index)
+        flows = align_flows(ledger.cash_flows(), prices.index)
+        portfolio = ledger.open_lots()
+        print(f"Ledger: {args.ledger} ({args.lot_method.upper()}), {len(portfolio)} open lots")
+    else:
+        nav = portfolio_nav(prices, portfolio)
+        flows = holdings_flows(prices, portfolio)
+    portfolio_ts = build_timeseries(nav, flows)
+    periods = period_returns(nav, flows)
+
+    print(f"✓ Calculated {len(portfolio_ts)} daily portfolio values")
+
+    metrics = summarize(portfolio_ts)
+    position_risk_df = position_risk(prices, portfolio['Ticker'].unique())
+    state = build_state(portfolio_ts, prices, portfolio)
+    state['adjustments'] = adjustments_key
 
 print("\n" + "=" * 70)
 print("RISK METRICS")
 print("=" * 70)
 
-total_return = (portfolio_ts['Portfolio_Value'].iloc[-1] / portfolio_ts['Portfolio_Value'].iloc[0] - 1) * 100
-days = (portfolio_ts['Date'].iloc[-1] - portfolio_ts['Date'].iloc[0]).days
-annualized_return = ((1 + total_return/100) ** (365/days) - 1) * 100
-
-volatility = returns.std() * np.sqrt(252) * 100
-
-risk_free_rate = 0.04
-sharpe_ratio = (annualized_return/100 - risk_free_rate) / (volatility/100)
-
-portfolio_ts['Peak'] = portfolio_ts['Portfolio_Value'].expanding(min_periods=1).max()
-portfolio_ts['Drawdown'] = (portfolio_ts['Portfolio_Value'] / portfolio_ts['Peak'] - 1) * 100
-max_drawdown = portfolio_ts['Drawdown'].min()
-
-var_95 = np.percentile(returns.dropna(), 5) * 100
-
 print(f"\n{'Metric':<35} {'Value':>15}")
 print("-" * 52)
-print(f"{'Total Return:':<35} {total_return:>14.2f}%")
-print(f"{'Annualized Return:':<35} {annualized_return:>14.2f}%")
-print(f"{'Annualized Volatility:':<35} {volatility:>14.2f}%")
-print(f"{'Sharpe Ratio:':<35} {sharpe_ratio:>14.2f}")
-print(f"{'Maximum Drawdown:':<35} {max_drawdown:>14.2f}%")
-print(f"{'Value at Risk (95%):':<35} {var_95:>14.2f}%")
-print(f"{'Best Daily Return:':<35} {returns.max()*100:>14.2f}%")
-print(f"{'Worst Daily Return:':<35} {returns.min()*100:>14.2f}%")
+print(f"{'Total Return:':<35} {metrics['Total_Return_Pct']:>14.2f}%")
+print(f"{'Annualized Return (time-weighted):':<35} {metrics['Annualized_Return_Pct']:>14.2f}%")
+print(f"{'Money-Weighted Return (IRR):':<35} {metrics['Money_Weighted_Return_Pct']:>14.2f}%")
+print(f"{'Annualized Volatility:':<35} {metrics['Volatility_Pct']:>14.2f}%")
+print(f"{'Sharpe Ratio:':<35} {metrics['Sharpe_Ratio']:>14.2f}")
+print(f"{'Maximum Drawdown:':<35} {metrics['Max_Drawdown_Pct']:>14.2f}%")
+print(f"{'Value at Risk (95%):':<35} {metrics['VaR_95_Pct']:>14.2f}%")
+print(f"{'Best Daily Return:':<35} {metrics['Best_Daily_Return_Pct']:>14.2f}%")
+print(f"{'Worst Daily Return:':<35} {metrics['Worst_Daily_Return_Pct']:>14.2f}%")
 
 print("\n" + "=" * 70)
 print("INDIVIDUAL POSITION RISK")
@@ -86,43 +133,100 @@ print("=" * 70)
 print(f"\n{'Ticker':<8} {'Asset Name':<30} {'Volatility':>12} {'Max Drawdown':>15}")
 print("-" * 70)
 
-position_risk = []
-
-for ticker in portfolio['Ticker']:
-    ticker_data = market_data[market_data['Ticker'] == ticker].sort_values('Date')
-    ticker_returns = ticker_data['Close'].pct_change().dropna()
-    
-    ticker_vol = ticker_returns.std() * np.sqrt(252) * 100
-    
-    ticker_data['Peak'] = ticker_data['Close'].expanding(min_periods=1).max()
-    ticker_data['DD'] = (ticker_data['Close'] / ticker_data['Peak'] - 1) * 100
-    ticker_max_dd = ticker_data['DD'].min()
-    
-    asset_name = portfolio[portfolio['Ticker'] == ticker]['Asset_Name'].values[0]
-    
-    position_risk.append({
-        'Ticker': ticker,
-        'Volatility': ticker_vol,
-        'Max_Drawdown': ticker_max_dd
-    })
-    
+position_lookup = position_risk_df.set_index('Ticker')
+position_rows = portfolio.drop_duplicates('Ticker')
+for ticker, asset_name in zip(position_rows['Ticker'], position_rows['Asset_Name']):
+    ticker_vol = position_lookup.loc[ticker, 'Volatility']
+    ticker_max_dd = position_lookup.loc[ticker, 'Max_Drawdown']
     print(f"{ticker:<8} {asset_name:<30} {ticker_vol:>11.2f}% {ticker_max_dd:>14.2f}%")
 
-portfolio_ts.to_csv('data/processed/portfolio_timeseries.csv', index=False)
+if not incremental_run:
+    print("\n" + "=" * 70)
+    print("PERIOD RETURNS")
+    print("=" * 70)
+    print(f"\n{'Period':<16} {'Start Value':>15} {'Net Flows':>15} {'TWR':>9} {'MWR':>9}")
+    print("-" * 68)
+    for _, row in periods.iterrows():
+        print(f"{row['Period']:<16} ${row['Start_Value']:>14,.2f} ${row['Net_Flows']:>14,.2f} "
+              f"{row['Time_Weighted_Return_Pct']:>8.2f}% {row['Money_Weighted_Return_Pct']:>8.2f}%")
+
+if not incremental_run:
+    print("\n" + "=" * 70)
+    print("RISK CONTRIBUTION")
+    print("=" * 70)
+
+    universe = list(dict.fromkeys([*portfolio['Ticker'], BENCHMARK_TICKER]))
+    universe = [ticker for ticker in universe if ticker in prices]
+    cov = CovarianceCache().covariance(return_matrix(prices[universe]), args.cov_method)
+    held_values = position_values(portfolio, prices[portfolio['Ticker'].unique()])
+    contributions, portfolio_risk = risk_contributions(cov, held_values)
+
+    print(f"\n{args.cov_method} covariance over {len(universe)} tickers")
+    print(f"{'Portfolio volatility:':<24} {portfolio_risk['Portfolio_Volatility_Pct']:>8.2f}%")
+    print(f"{'Portfolio beta vs ' + BENCHMARK_TICKER + ':':<24} {portfolio_risk['Portfolio_Beta']:>8.2f}")
+    print(f"\n{'Ticker':<8} {'Weight':>8} {'Volatility':>11} {'Beta':>6} {'Marginal':>9} {'Component':>10} "
+          f"{'Share':>8}")
+    print("-" * 66)
+    for _, row in contributions.iterrows():
+        print(f"{row['Ticker']:<8} {row['Weight_Pct']:>7.2f}% {row['Volatility_Pct']:>10.2f}% {row['Beta']:>6.2f} "
+              f"{row['Marginal_Risk_Pct']:>8.2f}% {row['Component_Risk_Pct']:>9.2f}% "
+              f"{row['Risk_Contribution_Pct']:>7.2f}%")
+
+if not incremental_run and args.mc_paths > 0:
+    print("\n" + "=" * 70)
+    print("MONTE CARLO VALUE AT RISK")
+    print("=" * 70)
+
+    held_prices = prices[portfolio['Ticker'].unique()]
+    mc_var, mc_stats = simulate_var(daily_returns(held_prices), position_values(portfolio, held_prices),
+                                    n_paths=args.mc_paths, method=args.mc_method,
+                                    seed=args.mc_seed, workers=args.mc_workers)
+
+    print(f"\n{mc_stats['paths']:,} {args.mc_method} paths in {mc_stats['seconds']:.2f}s "
+          f"({mc_stats['paths_per_sec']:,.0f} paths/sec)")
+    print(f"\n{'Horizon':<10} {'Confidence':>10} {'VaR':>15} {'CVaR':>15} {'VaR %':>9} {'CVaR %':>9}")
+    print("-" * 72)
+    portfolio_var = mc_var[mc_var['Ticker'] == 'PORTFOLIO']
+    for _, row in portfolio_var.iterrows():
+        print(f"{row['Horizon_Days']:>3} days   {row['Confidence']:>10.0%} ${row['VaR']:>14,.2f} "
+              f"${row['CVaR']:>14,.2f} {row['VaR_Pct']:>8.2f}% {row['CVaR_Pct']:>8.2f}%")
+
 print(f"\n{'='*70}")
-print(f"✓ Time series data saved to: data/processed/portfolio_timeseries.csv")
-
-risk_summary = pd.DataFrame([{
-    'Total_Return_Pct': total_return,
-    'Annualized_Return_Pct': annualized_return,
-    'Volatility_Pct': volatility,
-    'Sharpe_Ratio': sharpe_ratio,
-    'Max_Drawdown_Pct': max_drawdown,
-    'VaR_95_Pct': var_95,
-    'Best_Daily_Return_Pct': returns.max()*100,
-    'Worst_Daily_Return_Pct': returns.min()*100
-}])
-
-risk_summary.to_csv('data/processed/risk_metrics.csv', index=False)
-print(f"✓ Risk metrics saved to: data/processed/risk_metrics.csv")
-print(f"{'='*70}\n")
\ No newline at end of file
+if incremental_run:
+    print(f"✓ Time series data appended to: {processed.path('portfolio_timeseries')}")
+else:
+    timeseries_path = processed.write(portfolio_ts, 'portfolio_timeseries')
+    print(f"✓ Time series data saved to: {timeseries_path}")
+
+risk_summary = pd.DataFrame([metrics])
+
+risk_path = processed.write(risk_summary, 'risk_metrics')
+print(f"✓ Risk metrics saved to: {risk_path}")
+if not incremental_run:
+    print(f"✓ Period returns saved to: {processed.write(periods, 'period_returns')}")
+    print(f"✓ Risk contributions saved to: {processed.write(contributions, 'risk_contributions')}")
+if args.ledger:
+    print("Risk state not saved for ledger runs; --incremental keeps using portfolio_holdings.csv")
+else:
+    print(f"✓ Risk state saved to: {save_state(state)}")
+if not incremental_run and args.mc_paths > 0:
+    mc_path = processed.write(mc_var, 'monte_carlo_var')
+    print(f"✓ Monte Carlo VaR saved to: {mc_path}")
+
+if args.verify:
+    full_data = processed.read('market_data_clean')
+    full_data['Date'] = pd.to_datetime(full_data['Date'])
+    full_prices = to_reporting(portfolio, adjust_prices(price_matrix(full_data), factors, args.prices), reporting)[1]
+    full_ts = build_timeseries(portfolio_nav(full_prices, portfolio),
+                               holdings_flows(full_prices, portfolio)).reset_index(drop=True)
+    saved_ts = processed.read('portfolio_timeseries')
+    saved_ts['Date'] = pd.to_datetime(saved_ts['Date'])
+
+    pd.testing.assert_frame_equal(saved_ts, full_ts, check_exact=False, rtol=1e-9, check_dtype=False)
+    full_metrics = summarize(full_ts)
+    for name, value in metrics.items():
+        assert np.isclose(value, full_metrics[name], rtol=1e-9), name
+    full_positions = position_risk(full_prices, portfolio['Ticker'].unique()).set_index('Ticker')
+    assert np.allclose(position_lookup.loc[full_positions.index], full_positions, rtol=1e-9)
+    print("✓ Incremental output matches a full recompute")
+print(f"{'='*70}\n")
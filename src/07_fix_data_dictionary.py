@@ -31,11 +31,13 @@ DATA DICTIONARY FOR POWER BI
 3. fact_daily_portfolio.csv - Time Series Data
    - Date: Trading date
    - Portfolio_Value: Total portfolio value
-   - Daily_Return: Daily return as decimal
+   - Net_Flow: Contributions (+) and withdrawals (-) that day; first row is the opening value
+   - Daily_Return: Daily time-weighted return as decimal (net of that day's flows)
    - Daily_Return_Pct: Daily return as percentage
-   - Cumulative_Return: Running total return %
-   - Drawdown: Current drawdown from peak
-   - Peak: Highest portfolio value to date
+   - Cumulative_Return: Chain-linked time-weighted return % since the first date
+   - Portfolio_Gain_Loss: Value less the opening value and net flows since
+   - Drawdown: Current drawdown % of the flow-adjusted growth index (1 + Cumulative_Return) from its high
+   - Peak: Portfolio value at which that index would be back at its high (flows are not gains)
    - Return_Category: Positive/Negative/Flat
 
 4. dim_asset_class.csv - Asset Class Breakdown
@@ -47,26 +49,103 @@ DATA DICTIONARY FOR POWER BI
    - Weight_Pct: % of portfolio
    - Return_Pct: Return % by asset class
 
-5. fact_stock_history.csv - Individual Stock Performance
+5. dim_holding.csv - Holding Attributes (one row per held ticker)
+   - Ticker: Stock symbol
+   - Asset_Name: Full company/fund name
+   - Asset_Class: Equity or ETF
+   - Shares: Number of shares owned (all lots of the ticker)
+   - Purchase_Price: Share-weighted average price per share at purchase
+   - Purchase_Date: First purchase date
+
+6. fact_stock_history.csv - Individual Stock Performance
    - Date: Trading date
    - Ticker: Stock symbol
-   - Open, High, Low, Close, Volume: Daily OHLCV data
-   - Shares: Number of shares owned
-   - Position_Value: Daily position value
+   - Open, High, Low, Close, Volume: Daily OHLCV data (raw, as traded)
+   - Position_Value: Daily position value (split-adjusted close)
+   - Cost_Basis: Shares times purchase price (shares and other holding attributes are in dim_holding)
    - Unrealized_Gain: Daily profit/loss
    - Unrealized_Gain_Pct: Daily return %
-   - Price_Change: Daily price change in $
-   - Price_Change_Pct: Daily price change in %
+   - Price_Change: Daily change in split-adjusted price in $
+   - Price_Change_Pct: Daily total return in % (splits and dividends)
+   - Adj_Close: Close adjusted for splits
+   - Total_Return_Close: Close adjusted for splits and dividends
 
-6. kpi_metrics.csv - Dashboard KPIs
+7. kpi_metrics.csv - Dashboard KPIs
    - Metric_Name: KPI description
    - Metric_Value: Numeric value
    - Metric_Format: Display format (Currency/Percentage/Number)
 
+8. fact_rolling_risk.csv - Rolling Risk Metrics
+   - Date: Trading date (end of the window)
+   - Ticker: Stock symbol, or PORTFOLIO for the whole portfolio
+   - Window_Days: Window length in trading days (21, 63 or 252)
+   - Volatility_Pct: Annualized volatility over the window
+   - Sharpe_Ratio: Annualized mean return less 4% risk-free, over volatility
+   - Max_Drawdown_Pct: Worst drawdown within the window, from its highest close so far
+   - VaR_95_Pct: 5th percentile daily return over the window
+
+9. fact_correlation.csv - Correlation Matrix
+   - Period: Calendar quarter (e.g. 2025Q3), or Full for the whole history
+   - Start_Date, End_Date: First and last return date in the period
+   - Ticker_1, Ticker_2: Ticker pair (held tickers and SPY, every pair both ways)
+   - Correlation: Correlation of daily total returns
+   - Covariance: Annualized covariance of daily total returns
+
+10. fact_scenarios.csv - Stress Scenarios
+   - Scenario_ID: Scenario name (from stress_scenarios.csv, or a historical window)
+   - Scenario_Type: Custom, Historical, or Historical_Proxy (window outside the stored prices,
+     S&P 500 move applied through each ticker's beta)
+   - Ticker: Stock symbol
+   - Asset_Class: Equity or ETF
+   - Current_Value: Position value today
+   - Shock_Pct: Price move applied to the position in the scenario
+   - Stressed_Value: Position value after the shock
+   - PnL: Stressed value less current value
+   - PnL_Contribution_Pct: Position P&L as % of the whole portfolio (adds up to the portfolio's move)
+
+11. fact_benchmark_relative.csv - Benchmark-Relative Performance
+   - Benchmark: Benchmark ticker (SPY, QQQ, VTI)
+   - Period: Calendar quarter (e.g. 2025Q3), or Full for the whole history
+   - Start_Date, End_Date: First and last date in the period
+   - Days: Daily returns shared by portfolio and benchmark
+   - Portfolio_Return_Pct, Benchmark_Return_Pct: Annualized mean daily total return (x 252)
+   - Active_Return_Pct: Portfolio less benchmark annualized return
+   - Tracking_Error_Pct: Annualized volatility of the daily active return
+   - Information_Ratio: Active return over tracking error
+   - Beta: CAPM beta of daily returns to the benchmark
+   - Alpha_Pct: Annualized Jensen's alpha over the 4% risk-free rate
+   - Correlation: Correlation of daily returns
+   - Up_Capture_Pct, Down_Capture_Pct: Portfolio over benchmark geometric mean return
+     on the benchmark's up (down) days
+
+12. fact_benchmark_rolling.csv - Rolling Benchmark-Relative Metrics
+   - Date: Trading date (end of the window)
+   - Benchmark: Benchmark ticker
+   - Window_Days: Window length in trading days (63 or 252)
+   - Active_Return_Pct, Tracking_Error_Pct, Information_Ratio, Beta, Alpha_Pct, Correlation:
+     As in fact_benchmark_relative, over the window
+
+13. fact_attribution.csv - Brinson Attribution by Asset Class
+   - Period: Calendar quarter, or Full for the whole history
+   - Start_Date, End_Date: First and last date in the period
+   - Asset_Class: Equity or ETF
+   - Benchmark_Ticker: Policy benchmark for the class (Equity SPY 65%, ETF VTI 35%)
+   - Portfolio_Weight_Pct, Benchmark_Weight_Pct: Class weight at the start of the period
+   - Portfolio_Return_Pct: Time-weighted return of the class sleeve over the period
+   - Benchmark_Return_Pct: Return of the class benchmark over the period
+   - Allocation_Pct, Selection_Pct, Interaction_Pct: Brinson-Fachler effects
+   - Total_Effect_Pct: Sum of the three effects (adds up across classes to the active return)
+
 RELATIONSHIPS TO CREATE IN POWER BI:
 - fact_daily_portfolio[Date] --> dim_date[Date]
 - fact_stock_history[Date] --> dim_date[Date]
-- fact_stock_history[Ticker] --> fact_portfolio_performance[Ticker]
+- fact_stock_history[Ticker] --> dim_holding[Ticker]
+- dim_holding[Asset_Class] --> dim_asset_class[Asset_Class]
+- fact_rolling_risk[Date] --> dim_date[Date]
+- fact_correlation[Ticker_1] --> fact_portfolio_performance[Ticker]
+- fact_scenarios[Ticker] --> fact_portfolio_performance[Ticker]
+- fact_benchmark_rolling[Date] --> dim_date[Date]
+- fact_attribution[Asset_Class] --> dim_asset_class[Asset_Class]
 """
 
 with open('data/powerbi/DATA_DICTIONARY.txt', 'w', encoding='utf-8') as f:
@@ -76,12 +155,19 @@ print("✓ Data dictionary saved successfully!")
 print("\n" + "=" * 70)
 print("✓ ALL DATA READY FOR POWER BI!")
 print("=" * 70)
-print("\nYou now have 6 tables ready to import:")
+print("\nYou now have 13 tables ready to import:")
 print("  1. dim_date.csv")
 print("  2. fact_portfolio_performance.csv")
 print("  3. fact_daily_portfolio.csv")
 print("  4. dim_asset_class.csv")
-print("  5. fact_stock_history.csv")
-print("  6. kpi_metrics.csv")
+print("  5. dim_holding.csv")
+print("  6. fact_stock_history.csv")
+print("  7. kpi_metrics.csv")
+print("  8. fact_rolling_risk.csv")
+print("  9. fact_correlation.csv")
+print(" 10. fact_scenarios.csv")
+print(" 11. fact_benchmark_relative.csv")
+print(" 12. fact_benchmark_rolling.csv")
+print(" 13. fact_attribution.csv")
 print("\nLocation: data/powerbi/")
 print("\n" + "=" * 70)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import argparse
+import glob
+import os
+
+import pandas as pd
+
+from adjustments import VIEWS, adjust_prices, load_factors
+from fx import reporting_currency, to_reporting
+from incremental_risk import build_timeseries, summarize
+from portfolio_batch import PORTFOLIO_ID, load_holdings, performance_table, value_portfolios
+from returns import holdings_flows
+from storage import get_store
+from valuation import portfolio_nav, price_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Value many client portfolios against one shared price matrix.")
+    parser.add_argument('holdings', nargs='*',
+                        help="holdings CSVs (default: data/portfolios/*.csv); a file with a "
+                             "Portfolio_ID column may hold many portfolios")
+    parser.add_argument('--workers', type=int, default=1, help="processes for portfolio valuation")
+    parser.add_argument('--shard-size', type=int, default=500, help="portfolios per worker task")
+    parser.add_argument('--output', default='data/processed/batch', help="output directory")
+    parser.add_argument('--prices', choices=list(VIEWS), default='adjusted',
+                        help="price view: raw, split-adjusted, or total return")
+    parser.add_argument('--currency', help="reporting currency (default: $REPORTING_CURRENCY or USD); holdings "
+                                           "with a Currency column are converted with the rates saved by step 1")
+    parser.add_argument('--verify', action='store_true',
+                        help="check a sample of portfolios against the single-portfolio calculation")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(" " * 20 + "BATCH PORTFOLIO ANALYSIS")
+    print("=" * 70)
+
+    paths = args.holdings or sorted(glob.glob('data/portfolios/*.csv'))
+    if not paths:
+        raise SystemExit("No holdings files given and none found in data/portfolios/")
+    holdings = load_holdings(paths)
+    print(f"\nLoaded {holdings[PORTFOLIO_ID].nunique():,} portfolios "
+          f"({len(holdings):,} positions) from {len(paths)} file(s)")
+
+    print("\nLoading shared market data...")
+    market_data = get_store('data/processed').read('market_data_clean')
+    market_data['Date'] = pd.to_datetime(market_data['Date'])
+    prices = adjust_prices(price_matrix(market_data), load_factors(), args.prices)
+    holdings, prices = to_reporting(holdings, prices, reporting_currency(args.currency))
+    print(f"Price matrix: {len(prices)} dates x {len(prices.columns)} tickers, "
+          f"valued at {prices.index[-1].date()}")
+
+    performance = performance_table(holdings, prices)
+    timeseries, risk_metrics, stats = value_portfolios(holdings, prices, workers=args.workers,
+                                                       shard_size=args.shard_size)
+    print(f"\n✓ Valued {stats['portfolios']:,} portfolios in {stats['seconds']:.2f}s "
+          f"({stats['shards']} shard(s), {stats['workers']} worker(s))")
+
+    summary = performance.groupby(PORTFOLIO_ID, sort=False).agg(
+        Cost_Basis=('Cost_Basis', 'sum'), Current_Value=('Current_Value', 'sum'))
+    summary = summary.join(risk_metrics.set_index(PORTFOLIO_ID))
+
+    print("\n" + "=" * 70)
+    print("PORTFOLIO SUMMARY")
+    print("=" * 70)
+    print(f"\n{'Total Cost Basis:':<30} ${summary['Cost_Basis'].sum():>15,.2f}")
+    print(f"{'Total Current Value:':<30} ${summary['Current_Value'].sum():>15,.2f}")
+    print(f"{'Median Total Return:':<30} {summary['Total_Return_Pct'].median():>14,.2f}%")
+    print(f"{'Median Sharpe Ratio:':<30} {summary['Sharpe_Ratio'].median():>15,.2f}")
+
+    print(f"\n{'Portfolio':<20} {'Value':>15} {'Return %':>10} {'Volatility':>11} {'Sharpe':>8} {'Max DD':>9}")
+    print("-" * 78)
+    for portfolio_id, row in summary.nlargest(10, 'Current_Value').iterrows():
+        print(f"{portfolio_id:<20} ${row['Current_Value']:>14,.2f} {row['Total_Return_Pct']:>9.2f}% "
+              f"{row['Volatility_Pct']:>10.2f}% {row['Sharpe_Ratio']:>8.2f} {row['Max_Drawdown_Pct']:>8.2f}%")
+
+    os.makedirs(args.output, exist_ok=True)
+    store = get_store(args.output)
+    print(f"\n{'='*70}")
+    print(f"✓ Performance reports saved to: {store.write(performance, 'portfolio_performance')}")
+    print(f"✓ Time series data saved to: {store.write(timeseries, 'portfolio_timeseries')}")
+    print(f"✓ Risk metrics saved to: {store.write(risk_metrics, 'risk_metrics')}")
+
+    if args.verify:
+        sample = list(dict.fromkeys(holdings[PORTFOLIO_ID]))[:5]
+        for portfolio_id in sample:
+            portfolio = holdings[holdings[PORTFOLIO_ID] == portfolio_id]
+            expected = build_timeseries(portfolio_nav(prices, portfolio),
+                                        holdings_flows(prices, portfolio)).reset_index(drop=True)
+            actual = timeseries[timeseries[PORTFOLIO_ID] == portfolio_id].drop(columns=PORTFOLIO_ID)
+            pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected,
+                                          check_exact=False, rtol=1e-9, check_dtype=False)
+            metrics = risk_metrics.set_index(PORTFOLIO_ID).loc[portfolio_id]
+            for name, value in summarize(expected).items():
+                assert abs(metrics[name] - value) <= 1e-9 * max(1.0, abs(value)), (portfolio_id, name)
+        print(f"✓ Batch output matches the single-portfolio calculation for {len(sample)} portfolio(s)")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from adjustments import VIEWS, adjust_prices, load_factors
+from covariance import ESTIMATORS, CovarianceCache, return_matrix
+from fx import reporting_currency, to_reporting
+from portfolio_batch import PORTFOLIO_ID, load_holdings, performance_table
+from rebalance import (OBJECTIVES, RISK_AVERSION, STATE_TABLE, PositionBook, add_target_tickers,
+                       expected_returns, optimize, previous_weights, rebalance_summary, target_weights,
+                       trade_list, weights_state)
+from storage import get_store
+from valuation import price_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Trade lists that rebalance one or many portfolios to target or optimized weights.")
+    parser.add_argument('holdings', nargs='*', default=['portfolio_holdings.csv'],
+                        help="holdings CSVs (default: portfolio_holdings.csv); a file with a "
+                             "Portfolio_ID column may hold many portfolios")
+    parser.add_argument('--targets',
+                        help="CSV of Target_Weight_Pct by Ticker or Asset_Class (optionally per Portfolio_ID); "
+                             "without it the weights are optimized")
+    parser.add_argument('--objective', choices=OBJECTIVES, default='min_variance',
+                        help="optimization target over each portfolio's tickers")
+    parser.add_argument('--risk-aversion', type=float, default=RISK_AVERSION, help="for mean_variance")
+    parser.add_argument('--max-weight', type=float, default=1.0,
+                        help="largest weight of one position (fraction, min/mean-variance only)")
+    parser.add_argument('--cov-method', choices=ESTIMATORS, default='sample', help="covariance estimator")
+    parser.add_argument('--lookback', type=int, default=252, help="trading days of returns to estimate from")
+    parser.add_argument('--cash', type=float, default=0.0,
+                        help="cash available per portfolio, in the reporting currency")
+    parser.add_argument('--lot-size', type=int, default=1, help="trade in multiples of this many shares")
+    parser.add_argument('--max-turnover', type=float,
+                        help="cap on buys plus sales as a fraction of portfolio value")
+    parser.add_argument('--cold-start', action='store_true',
+                        help=f"ignore the previous solution saved in {STATE_TABLE}")
+    parser.add_argument('--prices', choices=list(VIEWS), default='adjusted',
+                        help="price view for returns: raw, split-adjusted, or total return")
+    parser.add_argument('--currency', help="reporting currency (default: $REPORTING_CURRENCY or USD); holdings "
+                                           "with a Currency column are converted with the rates saved by step 1")
+    parser.add_argument('--output', default='data/processed', help="output directory")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(" " * 24 + "PORTFOLIO REBALANCING")
+    print("=" * 70)
+
+    holdings = load_holdings(args.holdings)
+    print(f"\nLoaded {holdings[PORTFOLIO_ID].nunique():,} portfolio(s) "
+          f"({len(holdings):,} positions) from {len(args.holdings)} file(s)")
+
+    processed = get_store('data/processed')
+    market_data = processed.read('market_data_clean')
+    market_data['Date'] = pd.to_datetime(market_data['Date'])
+    prices = adjust_prices(price_matrix(market_data), load_factors(processed), args.prices)
+    holdings, prices = to_reporting(holdings, prices, reporting_currency(args.currency))
+    valuation_date = prices.index[-1]
+
+    positions = performance_table(holdings, prices)
+    positions = positions[positions['Days_Held'] >= 0]
+    targets = pd.read_csv(args.targets) if args.targets else None
+    if targets is not None:
+        positions = add_target_tickers(positions, targets, prices.iloc[-1])
+    book = PositionBook.from_table(positions)
+    print(f"Positions valued at {valuation_date.date()}: {int(book.mask.sum()):,} priced "
+          f"across {len(book):,} portfolio(s)")
+
+    output = get_store(args.output)
+    if targets is not None:
+        key = 'Ticker' if 'Ticker' in targets else 'Asset_Class'
+        print(f"\nTarget weights by {key} from {args.targets}")
+        weights = target_weights(book, targets)
+        if key == 'Ticker':
+            unpriced = sorted(set(targets['Ticker']) - set(book.tickers[book.mask]))
+            if unpriced:
+                print(f"⚠ No price for target ticker(s) {', '.join(unpriced)}; their weight stays in cash")
+    else:
+        tickers = pd.Index(pd.unique(book.tickers[book.mask]))
+        returns = return_matrix(prices[tickers.intersection(prices.columns)].iloc[-(args.lookback + 1):])
+        cov = CovarianceCache().covariance(returns, args.cov_method)
+        mu = expected_returns(returns) if args.objective == 'mean_variance' else None
+
+        state = None if args.cold_start or not output.exists(STATE_TABLE) else output.read(STATE_TABLE)
+        initial, warm = previous_weights(book, state, args.objective)
+        if initial is None:
+            initial = book.weights(args.cash)
+        start = time.perf_counter()
+        weights, iterations = optimize(book, cov, mu, args.objective, args.risk_aversion, args.max_weight,
+                                       initial=initial)
+        elapsed = time.perf_counter() - start
+
+        print(f"\n{args.objective} weights from {len(returns)} days of {args.cov_method} covariance")
+        if warm:
+            saved = state.loc[state['Objective'] == args.objective, 'Date'].astype(str).max()
+            print(f"Warm start: {warm:,} portfolio(s) from the {saved} solution")
+        else:
+            print("Cold start: from current weights")
+        print(f"✓ Solved {len(book):,} portfolio(s) in {elapsed:.3f}s "
+              f"({len(book) / max(elapsed, 1e-9):,.0f}/s, mean {iterations.mean():.1f} iterations, "
+              f"max {iterations.max()})")
+        print(f"✓ Solution saved to: "
+              f"{output.write(weights_state(book, weights, args.objective, valuation_date, state), STATE_TABLE)}")
+
+    trades = trade_list(book, weights, args.cash, args.lot_size, args.max_turnover)
+    summary = rebalance_summary(trades, args.cash)
+
+    print("\n" + "=" * 70)
+    print("REBALANCE SUMMARY")
+    print("=" * 70)
+    print(f"\n{'Lot size:':<30} {args.lot_size:>15,}")
+    turnover_cap = 'none' if args.max_turnover is None else f"{args.max_turnover * 100:.1f}%"
+    print(f"{'Turnover cap:':<30} {turnover_cap:>15}")
+    print(f"{'Total Buys:':<30} ${summary['Buy_Value'].sum():>14,.2f}")
+    print(f"{'Total Sales:':<30} ${summary['Sell_Value'].sum():>14,.2f}")
+    print(f"{'Median Turnover:':<30} {summary['Turnover_Pct'].median():>14,.2f}%")
+    print(f"{'Trades:':<30} {int(summary['Trades'].sum()):>15,}")
+
+    if len(summary) > 1:
+        print(f"\n{'Portfolio':<20} {'Value':>15} {'Buys':>13} {'Sales':>13} {'Turnover':>9} {'Trades':>7}")
+        print("-" * 80)
+        for row in summary.nlargest(10, 'Portfolio_Value').itertuples(index=False):
+            print(f"{row.Portfolio_ID:<20} ${row.Portfolio_Value:>14,.2f} ${row.Buy_Value:>12,.2f} "
+                  f"${row.Sell_Value:>12,.2f} {row.Turnover_Pct:>8.2f}% {row.Trades:>7,}")
+
+    largest = summary.loc[summary['Portfolio_Value'].idxmax(), PORTFOLIO_ID]
+    if len(summary) > 1:
+        print(f"\nTrades for {largest} (largest portfolio):")
+    print(f"\n{'Ticker':<8} {'Side':<5} {'Shares':>10} {'Price':>11} {'Value':>14} "
+          f"{'Now %':>7} {'Target %':>9} {'After %':>8}")
+    print("-" * 78)
+    first = trades[trades[PORTFOLIO_ID] == largest]
+    for row in first.sort_values('Trade_Value', key=np.abs, ascending=False).itertuples(index=False):
+        print(f"{row.Ticker:<8} {row.Side:<5} {abs(row.Trade_Shares):>10,.0f} ${row.Price:>10,.2f} "
+              f"${row.Trade_Value:>13,.2f} {row.Current_Weight_Pct:>6.2f}% {row.Target_Weight_Pct:>8.2f}% "
+              f"{row.Post_Trade_Weight_Pct:>7.2f}%")
+
+    print(f"\n{'='*70}")
+    print(f"✓ Trade list saved to: {output.write(trades, 'rebalance_trades')}")
+    print(f"✓ Rebalance summary saved to: {output.write(summary, 'rebalance_summary')}")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from adjustments import VIEWS, adjust_prices, load_factors
+from fx import reporting_currency, to_reporting
+from portfolio_batch import PORTFOLIO_ID, load_holdings, performance_table
+from storage import get_store
+from stress import (BETA_LOOKBACK, FACTOR_TICKERS, HISTORICAL_WINDOWS, SCENARIOS_PATH, factor_grid,
+                    position_book, read_scenarios, scenario_set, stress_results, stress_test)
+from valuation import price_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Value the current holdings under factor, ticker, asset-class and historical shocks.")
+    parser.add_argument('holdings', nargs='*', default=['portfolio_holdings.csv'],
+                        help="holdings CSVs (default: portfolio_holdings.csv); a file with a "
+                             "Portfolio_ID column may hold many portfolios")
+    parser.add_argument('--scenarios', default=SCENARIOS_PATH,
+                        help="CSV of Scenario_ID, Target_Type (Ticker, Asset_Class or Factor), Target, Shock_Pct")
+    parser.add_argument('--grid', type=float, metavar='STEP',
+                        help="add every combination of factor shocks from -30%% to +10%% in STEP-point steps")
+    parser.add_argument('--factors', default=','.join(FACTOR_TICKERS), help="factor tickers for --grid")
+    parser.add_argument('--no-history', action='store_true',
+                        help=f"leave out the historical windows ({', '.join(HISTORICAL_WINDOWS)})")
+    parser.add_argument('--lookback', type=int, default=BETA_LOOKBACK,
+                        help="trading days of returns to estimate factor betas from")
+    parser.add_argument('--prices', choices=list(VIEWS), default='total_return',
+                        help="price view for betas and historical returns")
+    parser.add_argument('--currency', help="reporting currency (default: $REPORTING_CURRENCY or USD); holdings "
+                                           "with a Currency column are converted with the rates saved by step 1")
+    parser.add_argument('--output', default='data/processed', help="output directory")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(" " * 26 + "STRESS TESTING")
+    print("=" * 70)
+
+    holdings = load_holdings(args.holdings)
+    print(f"\nLoaded {holdings[PORTFOLIO_ID].nunique():,} portfolio(s) "
+          f"({len(holdings):,} positions) from {len(args.holdings)} file(s)")
+
+    processed = get_store('data/processed')
+    market_data = processed.read('market_data_clean')
+    market_data['Date'] = pd.to_datetime(market_data['Date'])
+    holdings, raw = to_reporting(holdings, price_matrix(market_data), reporting_currency(args.currency))
+    prices = adjust_prices(raw, load_factors(processed), args.prices)
+
+    # Positions are valued at the last traded price, like step 4.
+    positions = performance_table(holdings, raw)
+    positions = positions[positions['Days_Held'] >= 0]
+    book, tickers, asset_classes = position_book(positions)
+    print(f"Positions valued at {raw.index[-1].date()}: {len(tickers):,} tickers across {len(book):,} portfolio(s)")
+
+    frames = []
+    if os.path.exists(args.scenarios):
+        frames.append(read_scenarios(args.scenarios))
+        print(f"Shocks: {frames[0]['Scenario_ID'].nunique():,} scenario(s) from {args.scenarios}")
+    if args.grid:
+        grid = factor_grid([factor for factor in args.factors.split(',') if factor], step_pct=args.grid)
+        frames.append(grid)
+        print(f"Grid: {grid['Scenario_ID'].nunique():,} factor scenario(s) in {args.grid:g}-point steps")
+    definitions = pd.concat(frames, ignore_index=True) if frames else None
+    windows = {} if args.no_history else HISTORICAL_WINDOWS
+    if definitions is None and not windows:
+        parser.error(f"no scenarios: {args.scenarios} not found, no --grid and --no-history")
+
+    scenario_ids, scenario_types, shocks = scenario_set(definitions, prices, tickers, asset_classes,
+                                                        args.lookback, windows)
+    proxied = [name for name, kind in zip(scenario_ids, scenario_types) if kind == 'Historical_Proxy']
+    if proxied:
+        print(f"⚠ {', '.join(proxied)}: outside the stored prices ({prices.index[0].date()} onwards); "
+              f"S&P 500 move applied through betas")
+
+    start = time.perf_counter()
+    pnl = stress_test(book, tickers, shocks)
+    elapsed = time.perf_counter() - start
+    cells = pnl.size
+    print(f"✓ {len(scenario_ids):,} scenarios x {len(book):,} portfolio(s) valued in {elapsed:.3f}s "
+          f"({cells / max(elapsed, 1e-9):,.0f} valuations/sec)")
+    results = stress_results(book, scenario_ids, scenario_types, pnl)
+
+    largest = book.portfolio_ids[np.argmax(book.total_value())]
+    first = results[results[PORTFOLIO_ID] == largest]
+    print("\n" + "=" * 70)
+    print("STRESS RESULTS (worst first)" if len(book) == 1 else f"STRESS RESULTS FOR {largest} (worst first)")
+    print("=" * 70)
+    print(f"\nCurrent value: ${first['Portfolio_Value'].iloc[0]:,.2f}")
+    print(f"\n{'Scenario':<28} {'Type':<17} {'P&L':>15} {'P&L %':>8} {'Stressed Value':>16}")
+    print("-" * 88)
+    shown = first.sort_values('PnL')
+    if len(shown) > 25:
+        shown = pd.concat([shown.head(20), shown[shown['Scenario_Type'] != 'Grid']]).drop_duplicates('Scenario_ID')
+    for row in shown.itertuples(index=False):
+        print(f"{row.Scenario_ID:<28} {row.Scenario_Type:<17} ${row.PnL:>14,.2f} {row.PnL_Pct:>7.2f}% "
+              f"${row.Stressed_Value:>15,.2f}")
+    if len(shown) < len(first):
+        print(f"... {len(first) - len(shown):,} more grid scenario(s) in the saved results")
+
+    if len(book) > 1:
+        worst = results.loc[results.groupby(PORTFOLIO_ID)['PnL_Pct'].idxmin()]
+        print(f"\nWorst scenario per portfolio (median {worst['PnL_Pct'].median():.2f}%):")
+        for scenario, count in worst['Scenario_ID'].value_counts().head(5).items():
+            print(f"  {scenario:<28} {count:>8,} portfolio(s)")
+
+    output = get_store(args.output)
+    print(f"\n{'='*70}")
+    print(f"✓ Stress results saved to: {output.write(results, 'stress_results')}")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
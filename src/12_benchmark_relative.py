@@ -0,0 +1,116 @@
+import argparse
+import time
+
+import pandas as pd
+
+from adjustments import VIEWS, adjust_prices, load_factors
+from benchmark import (BENCHMARKS, POLICY_BENCHMARK, ROLLING_WINDOWS, attribution_table, benchmark_returns,
+                       portfolio_returns, read_policy, relative_table, rolling_relative_table)
+from fx import reporting_currency, to_reporting
+from portfolio_batch import PORTFOLIO_ID, load_holdings
+from storage import get_store
+from valuation import price_matrix
+
+
+def number_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tracking error, information ratio, alpha/beta, capture ratios and Brinson attribution "
+                    "of one or many portfolios against benchmarks.")
+    parser.add_argument('holdings', nargs='*', default=['portfolio_holdings.csv'],
+                        help="holdings CSVs (default: portfolio_holdings.csv); a file with a "
+                             "Portfolio_ID column may hold many portfolios")
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS), help="benchmark tickers")
+    parser.add_argument('--windows', type=number_list, default=list(ROLLING_WINDOWS),
+                        help="rolling windows in trading days")
+    parser.add_argument('--policy',
+                        help="CSV of Asset_Class, Ticker and Weight_Pct for the attribution benchmark "
+                             f"(default: {', '.join(f'{c} {t} {w:g}%' for c, (t, w) in POLICY_BENCHMARK.items())})")
+    parser.add_argument('--prices', choices=list(VIEWS), default='total_return',
+                        help="price view for portfolio and benchmark returns")
+    parser.add_argument('--currency', help="reporting currency (default: $REPORTING_CURRENCY or USD); holdings "
+                                           "with a Currency column are converted with the rates saved by step 1")
+    parser.add_argument('--output', default='data/processed', help="output directory")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(" " * 18 + "BENCHMARK-RELATIVE ANALYTICS")
+    print("=" * 70)
+
+    holdings = load_holdings(args.holdings)
+    print(f"\nLoaded {holdings[PORTFOLIO_ID].nunique():,} portfolio(s) "
+          f"({len(holdings):,} positions) from {len(args.holdings)} file(s)")
+
+    processed = get_store('data/processed')
+    market_data = processed.read('market_data_clean')
+    market_data['Date'] = pd.to_datetime(market_data['Date'])
+    prices = adjust_prices(price_matrix(market_data), load_factors(processed), args.prices)
+    holdings, prices = to_reporting(holdings, prices, reporting_currency(args.currency))
+
+    wanted = [ticker for ticker in args.benchmarks.split(',') if ticker]
+    benchmarks = benchmark_returns(prices, wanted)
+    missing = sorted(set(wanted) - set(benchmarks.columns))
+    if missing:
+        print(f"⚠ No prices for benchmark(s) {', '.join(missing)}; skipped")
+    if benchmarks.empty:
+        parser.error("none of the benchmarks has prices")
+    policy = read_policy(args.policy) if args.policy else POLICY_BENCHMARK
+
+    start = time.perf_counter()
+    returns = portfolio_returns(holdings, prices)
+    relative = relative_table(returns, benchmarks)
+    rolling = rolling_relative_table(returns, benchmarks, args.windows)
+    attribution = attribution_table(holdings, prices, policy)
+    elapsed = time.perf_counter() - start
+    pairs = returns.shape[1] * benchmarks.shape[1]
+    print(f"✓ {returns.shape[1]:,} portfolio(s) x {benchmarks.shape[1]} benchmark(s) over {len(returns)} days "
+          f"in {elapsed:.3f}s ({pairs / max(elapsed, 1e-9):,.0f} pairs/sec, {args.prices} prices)")
+
+    full = relative[relative['Period'] == 'Full']
+    if returns.shape[1] > 1:
+        full = full.groupby('Benchmark', sort=False).median(numeric_only=True).reset_index()
+    print("\n" + "=" * 70)
+    print("RELATIVE PERFORMANCE (full period, annualized"
+          + (", median over portfolios)" if returns.shape[1] > 1 else ")"))
+    print("=" * 70)
+    print(f"\n{'Benchmark':<10} {'Active %':>9} {'TE %':>7} {'IR':>6} {'Beta':>6} {'Alpha %':>8} "
+          f"{'Corr':>6} {'Up %':>7} {'Down %':>7}")
+    print("-" * 74)
+    for row in full.itertuples(index=False):
+        print(f"{row.Benchmark:<10} {row.Active_Return_Pct:>9.2f} {row.Tracking_Error_Pct:>7.2f} "
+              f"{row.Information_Ratio:>6.2f} {row.Beta:>6.2f} {row.Alpha_Pct:>8.2f} {row.Correlation:>6.2f} "
+              f"{row.Up_Capture_Pct:>7.1f} {row.Down_Capture_Pct:>7.1f}")
+
+    effects = attribution[attribution['Period'] == 'Full'].groupby('Asset_Class').agg(
+        Benchmark_Ticker=('Benchmark_Ticker', 'first'), Portfolio_Weight_Pct=('Portfolio_Weight_Pct', 'mean'),
+        Benchmark_Weight_Pct=('Benchmark_Weight_Pct', 'mean'), Allocation_Pct=('Allocation_Pct', 'mean'),
+        Selection_Pct=('Selection_Pct', 'mean'), Interaction_Pct=('Interaction_Pct', 'mean'),
+        Total_Effect_Pct=('Total_Effect_Pct', 'mean')).reset_index()
+    print("\n" + "=" * 70)
+    print("BRINSON ATTRIBUTION BY ASSET CLASS (full period"
+          + (", mean over portfolios)" if returns.shape[1] > 1 else ")"))
+    print("=" * 70)
+    print(f"\n{'Asset Class':<12} {'Bench':<6} {'Weight %':>9} {'Policy %':>9} {'Alloc %':>8} {'Select %':>9} "
+          f"{'Inter %':>8} {'Total %':>8}")
+    print("-" * 76)
+    for row in effects.itertuples(index=False):
+        print(f"{row.Asset_Class:<12} {row.Benchmark_Ticker:<6} {row.Portfolio_Weight_Pct:>9.2f} "
+              f"{row.Benchmark_Weight_Pct:>9.2f} {row.Allocation_Pct:>8.2f} {row.Selection_Pct:>9.2f} "
+              f"{row.Interaction_Pct:>8.2f} {row.Total_Effect_Pct:>8.2f}")
+    print(f"{'Total':<12} {'':<6} {'':>9} {'':>9} {effects['Allocation_Pct'].sum():>8.2f} "
+          f"{effects['Selection_Pct'].sum():>9.2f} {effects['Interaction_Pct'].sum():>8.2f} "
+          f"{effects['Total_Effect_Pct'].sum():>8.2f}")
+
+    output = get_store(args.output)
+    print(f"\n{'='*70}")
+    print(f"✓ Relative metrics saved to: {output.write(relative, 'benchmark_relative')}")
+    print(f"✓ Rolling metrics saved to: {output.write(rolling, 'benchmark_rolling')}")
+    print(f"✓ Attribution saved to: {output.write(attribution, 'benchmark_attribution')}")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
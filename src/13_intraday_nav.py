@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from fx import load_fx, needs_conversion, reporting_currency, reporting_holdings, ticker_currencies
+from intraday import SNAPSHOT_INTERVAL, LiveNavBook, replay_ticks, socket_ticks, stream_nav, tail_ticks
+from matrix_store import read_prices
+from storage import get_store
+
+SNAPSHOT_TABLE = 'intraday_nav'
+
+
+def snapshot_line(row):
+    weights = '  '.join(f"{column[:-len('_Weight_Pct')]} {value:.1f}%" for column, value in row.items()
+                        if column.endswith('_Weight_Pct'))
+    last_tick = '' if row['Timestamp'] is None else f"{row['Timestamp']:%Y-%m-%d %H:%M:%S}"
+    return (f"{last_tick:<20} ${row['Portfolio_Value']:>14,.2f} ${row['Unrealized_Gain']:>13,.2f} "
+            f"{row['Unrealized_Gain_Pct']:>7.2f}% {row['Ticks']:>10,}  {weights}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Intraday NAV, unrealized gain and asset-class weights, updated on every price tick.")
+    parser.add_argument('--source', choices=['replay', 'tail', 'socket'], default='replay',
+                        help="replay stored bars, follow a file of ticks, or listen for ticks on a socket")
+    parser.add_argument('--replay-days', type=int, default=5,
+                        help="replay the last N days of market_data_clean, from the closes before them")
+    parser.add_argument('--speed', type=float,
+                        help="replay this many times faster than the bars' clock (default: as fast as possible)")
+    parser.add_argument('--path', default='data/raw/ticks.csv',
+                        help="file of 'timestamp,ticker,price' lines to follow with --source tail")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on with --source socket")
+    parser.add_argument('--port', type=int, default=9999, help="port to listen on with --source socket")
+    parser.add_argument('--interval', type=float, default=SNAPSHOT_INTERVAL, help="seconds between snapshots")
+    parser.add_argument('--no-save', action='store_true', help=f"do not append snapshots to {SNAPSHOT_TABLE}")
+    parser.add_argument('--currency', help="reporting currency (default: $REPORTING_CURRENCY or USD); ticks "
+                                           "are converted at the FX rate of the opening date")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(" " * 22 + "INTRADAY PORTFOLIO NAV")
+    print("=" * 70)
+
+    portfolio = pd.read_csv('portfolio_holdings.csv')
+    processed = get_store('data/processed')
+    closes = read_prices(processed, portfolio['Ticker'])
+    if args.source == 'replay':
+        opening_date = closes.index[max(0, len(closes) - args.replay_days - 1)]
+        bars = processed.read('market_data_clean', columns=['Date', 'Ticker', 'Close'],
+                              filters=[('Date', '>', opening_date)])
+        ticks = replay_ticks(bars, args.speed)
+        print(f"\nReplaying {len(bars):,} bars after {opening_date.date()}")
+    else:
+        opening_date = closes.index[-1]
+        if args.source == 'tail':
+            ticks = tail_ticks(args.path)
+            print(f"\nFollowing ticks appended to {args.path}")
+        else:
+            ticks = socket_ticks(args.host, args.port)
+            print(f"\nListening for ticks on {args.host}:{args.port}")
+    opening = closes.loc[:opening_date].ffill().iloc[-1]
+
+    reporting = reporting_currency(args.currency)
+    factors = None
+    if needs_conversion(portfolio, reporting):
+        fx = load_fx()
+        currencies = ticker_currencies(portfolio)
+        factors = pd.Series(fx.rates_on(np.full(len(currencies), opening_date), currencies.to_numpy(), reporting),
+                            index=currencies.index)
+        portfolio = reporting_holdings(portfolio, fx, reporting)
+        print(f"Reporting Currency: {reporting}")
+
+    book = LiveNavBook.from_holdings(portfolio, opening, factors)
+    print(f"Positions: {len(book.tickers)} tickers, opening NAV ${book.nav:,.2f} on {opening_date.date()}")
+    print(f"Snapshots every {args.interval:g}s" + ("" if args.no_save else f", appended to {SNAPSHOT_TABLE}"))
+
+    print(f"\n{'Last tick':<20} {'NAV':>15} {'Unrealized':>14} {'Gain %':>8} {'Ticks':>10}  Weights")
+    print("-" * 100)
+
+    def publish(row):
+        print(snapshot_line(row))
+        if not args.no_save:
+            processed.append(pd.DataFrame([row]), SNAPSHOT_TABLE)
+
+    try:
+        asyncio.run(stream_nav(book, ticks, publish, args.interval))
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+    print(f"\n{'='*70}")
+    print(f"✓ {book.ticks:,} ticks applied; NAV ${book.nav:,.2f}, unrealized gain ${book.unrealized_gain:,.2f}")
+    if not args.no_save:
+        print(f"✓ Snapshots saved to: {processed.path(SNAPSHOT_TABLE)}")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from storage import get_store
+
+ACTIONS_TABLE = 'corporate_actions'
+FACTORS_TABLE = 'adjustment_factors'
+FACTOR_STATE_TABLE = '_adjustment_state'
+
+ACTION_TYPES = ('SPLIT', 'DIVIDEND')
+ACTION_COLUMNS = ['Date', 'Ticker', 'Type', 'Value']
+FACTOR_COLUMNS = ['Date', 'Ticker', 'Split_Factor', 'Return_Factor']
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close']
+
+# Price view -> factor column; 'raw' leaves prices untouched.
+VIEWS = {'raw': None, 'adjusted': 'Split_Factor', 'total_return': 'Return_Factor'}
+
+
+def empty_actions():
+    return pd.DataFrame({'Date': pd.Series(dtype=str), 'Ticker': pd.Series(dtype=str),
+                         'Type': pd.Series(dtype=str), 'Value': pd.Series(dtype='float64')})
+
+
+def normalize_actions(actions):
+    """Corporate actions as sorted Date/Ticker/Type/Value rows.
+
+    ``Value`` is the ratio of new to old shares for a SPLIT (4 for a 4-for-1
+    split) and the cash paid per share for a DIVIDEND; ``Date`` is the ex-date.
+    """
+    actions = actions[ACTION_COLUMNS].copy()
+    actions['Type'] = actions['Type'].str.upper()
+    unknown = sorted(set(actions['Type'].unique()) - set(ACTION_TYPES))
+    if unknown:
+        raise ValueError(f"Unknown corporate action type(s) {unknown}. Use one of {list(ACTION_TYPES)}.")
+    actions['Date'] = pd.to_datetime(actions['Date']).dt.strftime('%Y-%m-%d')
+    actions['Value'] = actions['Value'].astype('float64')
+    return actions.sort_values(['Ticker', 'Date', 'Type'], ignore_index=True)
+
+
+def read_actions(store=None):
+    """Corporate actions saved by step 1, or an empty table if there are none."""
+    store = store or get_store('data/raw')
+    if not store.exists(ACTIONS_TABLE):
+        return empty_actions()
+    return normalize_actions(store.read(ACTIONS_TABLE))
+
+
+def actions_fingerprint(actions):
+    """Hash of the corporate actions; saved results built on adjusted prices are only reused while this matches."""
+    payload = normalize_actions(actions).to_csv(index=False).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+def _date_strings(values):
+    """``YYYY-MM-DD`` strings for date strings or timestamps, formatting each distinct value once."""
+    codes, uniques = pd.factorize(pd.Series(values))
+    labels = pd.to_datetime(pd.Series(uniques)).dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    return labels[codes]
+
+
+def _days(values):
+    """Days since the epoch for date strings or timestamps, parsing each distinct value once."""
+    codes, uniques = pd.factorize(pd.Series(values))
+    return pd.to_datetime(pd.Series(uniques)).to_numpy(dtype='datetime64[D]').astype('int64')[codes]
+
+
+def compute_factors(market_data, actions):
+    """Cumulative backward adjustment factors for every Date/Ticker row of ``market_data``.
+
+    Prices before an ex-date are scaled by ``1 / ratio`` for a split and by
+    ``1 - dividend / previous close`` for a dividend, so the latest price of
+    every ticker is unchanged. ``Split_Factor`` covers splits only;
+    ``Return_Factor`` covers splits and dividends (a total-return series).
+    All tickers are handled in one pass: events are placed with a single
+    ``searchsorted`` and the factors are a reversed cumulative product per
+    ticker. An event needs a price row before its ex-date and one on or
+    after it: events on or before a ticker's first price date, or after its
+    last, have no effect yet. Rows come back sorted by ticker, then date.
+    """
+    codes, tickers = pd.factorize(market_data['Ticker'])
+    days = _days(market_data['Date'])
+    order = np.lexsort((days, codes))
+    codes, days = codes[order], days[order]
+    close = market_data['Close'].to_numpy(dtype='float64')[order]
+    n = len(order)
+    split_step = np.ones(n)
+    return_step = np.ones(n)
+
+    actions = normalize_actions(actions)
+    actions = actions[actions['Ticker'].isin(tickers)]
+    if n and len(actions):
+        first = days.min()
+        span = days.max() - first + 2
+        keys = codes * span + (days - first)
+        event_codes = tickers.get_indexer(actions['Ticker'])
+        event_keys = event_codes * span + np.clip(_days(actions['Date']) - first, 0, span - 1)
+
+        # First row on or after the ex-date; the factor applies to the row before it.
+        position = np.searchsorted(keys, event_keys, side='left')
+        valid = (position > 0) & (position < n)
+        valid[valid] &= (codes[position[valid]] == event_codes[valid]) & \
+                        (codes[position[valid] - 1] == event_codes[valid])
+        target = position[valid] - 1
+        is_split = actions['Type'].to_numpy()[valid] == 'SPLIT'
+        value = actions['Value'].to_numpy()[valid]
+
+        step = np.where(is_split, 1.0 / np.where(is_split, value, 1.0),
+                        1.0 - np.where(is_split, 0.0, value) / close[target])
+        np.multiply.at(split_step, target[is_split], step[is_split])
+        np.multiply.at(return_step, target, step)
+
+    dates = market_data['Date']
+    if not pd.api.types.is_string_dtype(dates):
+        dates = pd.Series(_date_strings(dates), dtype=str)
+    reverse = codes[::-1]
+    return pd.DataFrame({
+        'Date': dates.array.take(order),
+        'Ticker': market_data['Ticker'].array.take(order),
+        'Split_Factor': pd.Series(split_step[::-1]).groupby(reverse).cumprod().to_numpy()[::-1],
+        'Return_Factor': pd.Series(return_step[::-1]).groupby(reverse).cumprod().to_numpy()[::-1],
+    })
+
+
+def ticker_state(market_data, actions):
+    """Per ticker: price rows, first and last date, and a hash of its corporate actions.
+
+    See :meth:`AdjustmentFactors.update` for which changes make a ticker's
+    factors stale.
+    """
+    return _ticker_state(*_ticker_days(market_data), normalize_actions(actions))
+
+
+def _ticker_days(market_data):
+    """Ticker code of every row, the tickers, and each row's days since the epoch."""
+    codes, tickers = pd.factorize(market_data['Ticker'])
+    return codes, pd.Index(tickers.astype(str)), _days(market_data['Date'])
+
+
+def _ticker_state(codes, tickers, days, normalized):
+    n = len(tickers)
+    first = np.full(n, np.iinfo('int64').max)
+    last = np.full(n, np.iinfo('int64').min)
+    np.minimum.at(first, codes, days)
+    np.maximum.at(last, codes, days)
+    state = pd.DataFrame({'Rows': np.bincount(codes, minlength=n)}, index=tickers)
+    for column, value in [('First_Date', first), ('Last_Date', last)]:
+        state[column] = value.astype('datetime64[D]').astype(str)
+
+    hashes = pd.util.hash_pandas_object(normalized[['Date', 'Type', 'Value']], index=False)
+    # Sum of row hashes: independent of row order, and the row count is part of the key.
+    digest = hashes.groupby(normalized['Ticker']).agg(['sum', 'count'])
+    actions_key = pd.Series([f"{total:016x}-{count}" for total, count in zip(digest['sum'].tolist(),
+                                                                              digest['count'].tolist())],
+                            index=digest.index, dtype=object)
+    state['Actions'] = actions_key.reindex(state.index).fillna('-').to_numpy()
+    return state.sort_index().rename_axis('Ticker').reset_index()
+
+
+class AdjustmentFactors:
+    """Adjustment factors cached in the processed store, refreshed one ticker at a time.
+
+    Next to the factors table a small per-ticker state table
+    (:func:`ticker_state`) records what each ticker's factors were built
+    from. :meth:`update` recomputes only tickers whose factors can have
+    changed, so a new split for one ticker leaves every other ticker's
+    factors as they are, and a daily append recomputes nothing.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_store('data/processed')
+
+    def load(self):
+        """Saved factors, or None before the first :meth:`update`."""
+        if not self.store.exists(FACTORS_TABLE):
+            return None
+        return self.store.read(FACTORS_TABLE)
+
+    def saved_state(self):
+        if not self.store.exists(FACTOR_STATE_TABLE) or not self.store.exists(FACTORS_TABLE):
+            return None
+        return self.store.read(FACTOR_STATE_TABLE)
+
+    def save(self, factors, state):
+        """Write ``factors`` and their per-ticker ``state``, as returned by :meth:`refresh`."""
+        self.store.write(factors[FACTOR_COLUMNS], FACTORS_TABLE)
+        self.store.write(state, FACTOR_STATE_TABLE)
+
+    def update(self, market_data, actions):
+        """:meth:`refresh` the factors and :meth:`save` them if anything changed.
+
+        Returns ``(factors, refreshed)``.
+        """
+        factors, state, refreshed, current = self._refresh(market_data, actions)
+        if not current:
+            self.save(factors, state)
+        return factors, refreshed
+
+    def refresh(self, market_data, actions):
+        """The saved factors brought in line with ``market_data`` and ``actions``, without writing them.
+
+        Factors are backward-looking, so rows appended after a ticker's last
+        date leave its saved factors as they are and get a factor of 1. A
+        ticker is recomputed when its actions change, when an action's
+        ex-date comes within its price history (new rows reach a pending
+        ex-date, or history is added before the first date), or when rows
+        inside its saved history were added or removed.
+
+        Returns ``(factors, state, refreshed)``: the full factors table, its
+        :func:`ticker_state` and the sorted list of tickers that were recomputed.
+        """
+        return self._refresh(market_data, actions)[:3]
+
+    def _refresh(self, market_data, actions):
+        """:meth:`refresh`, plus whether the saved tables already match."""
+        normalized = normalize_actions(actions)
+        codes, tickers, days = _ticker_days(market_data)
+        state = _ticker_state(codes, tickers, days, normalized)
+        saved = self.saved_state()
+        if saved is None:
+            is_stale, kept = np.ones(len(tickers), dtype=bool), None
+            appended = market_data.iloc[:0]
+        else:
+            saved = saved.astype({'Ticker': str, 'Rows': 'int64', 'First_Date': str, 'Last_Date': str,
+                                  'Actions': str}).set_index('Ticker')
+            current = state.set_index('Ticker').reindex(tickers)
+            before = saved.reindex(tickers)
+            is_stale = (before['Rows'].isna() | (current['Actions'] != before['Actions'])
+                        | (current['First_Date'] != before['First_Date'])).to_numpy(copy=True)
+
+            # Rows on or before each ticker's saved last date: their count must not have changed.
+            known = before['Last_Date'].notna().to_numpy()
+            saved_last = np.full(len(tickers), np.iinfo('int64').min)
+            saved_last[known] = _days(before['Last_Date'][known])
+            within = days <= saved_last[codes]
+            rows_within = np.bincount(codes, weights=within, minlength=len(tickers))
+            is_stale |= rows_within != before['Rows'].fillna(-1).to_numpy()
+
+            # Actions that were pending (ex-date after the saved last date) and now have a row on or after them.
+            positions = tickers.get_indexer(normalized['Ticker'])
+            held = positions >= 0
+            action_days = _days(normalized['Date'])[held]
+            positions = positions[held]
+            reached = (action_days > saved_last[positions]) & (action_days <= _days(current['Last_Date'])[positions])
+            is_stale[positions[reached]] = True
+
+            if not is_stale.any() and len(tickers) == len(saved) and within.all():
+                return self.load(), state, [], True
+            factors = self.load()
+            factor_codes, factor_tickers = pd.factorize(factors['Ticker'])
+            keep = tickers.get_indexer(pd.Index(factor_tickers.astype(str)))
+            keep = (keep >= 0) & ~is_stale[keep]
+            kept = factors[keep[factor_codes]]
+            appended = market_data[~within & ~is_stale[codes]]
+
+        stale = tickers[is_stale]
+        fresh = compute_factors(market_data[is_stale[codes]], normalized[normalized['Ticker'].isin(stale)])
+        fresh = pd.concat([fresh, pd.DataFrame({
+            'Date': pd.Series(_date_strings(appended['Date']), dtype=str), 'Ticker': appended['Ticker'].array,
+            'Split_Factor': 1.0, 'Return_Factor': 1.0})], ignore_index=True)
+        if kept is not None:
+            # Typed stores read Date back as timestamps; match both columns' dtypes so stacking stays columnar.
+            if pd.api.types.is_datetime64_any_dtype(kept['Date']):
+                fresh['Date'] = pd.to_datetime(fresh['Date']).astype(kept['Date'].dtype)
+            fresh['Ticker'] = fresh['Ticker'].astype(kept['Ticker'].dtype)
+            fresh = pd.concat([kept, fresh], ignore_index=True)
+        return fresh[FACTOR_COLUMNS], state, sorted(stale), False
+
+
+def load_factors(store=None):
+    """Saved factors from step 3, or None if they have not been built."""
+    return AdjustmentFactors(store).load()
+
+
+def _grid(factors, column):
+    """Factors as a dense (dates + 1) x (tickers + 1) array plus its date and ticker indexes.
+
+    The extra last row and column hold 1.0, so a ``get_indexer`` miss (-1)
+    reads as "no adjustment".
+    """
+    date_codes, dates = pd.factorize(factors['Date'])
+    ticker_codes, tickers = pd.factorize(factors['Ticker'])
+    grid = np.ones((len(dates) + 1, len(tickers) + 1))
+    grid[date_codes, ticker_codes] = factors[column].to_numpy(dtype='float64')
+    return grid, pd.DatetimeIndex(pd.to_datetime(pd.Series(dates))), pd.Index(tickers)
+
+
+def _gather(factors, column, dates, tickers):
+    """Factor values for each (date, ticker) pair of two aligned columns, 1.0 where there is none."""
+    grid, factor_dates, factor_tickers = _grid(factors, column)
+    codes, uniques = pd.factorize(pd.Series(dates))
+    rows = factor_dates.get_indexer(pd.to_datetime(pd.Series(uniques)))[codes]
+    codes, uniques = pd.factorize(pd.Series(tickers))
+    cols = factor_tickers.get_indexer(uniques)[codes]
+    return grid[rows, cols]
+
+
+def adjusted_view(market_data, factors, view='adjusted'):
+    """Long Date/Ticker/OHLCV rows in the requested price view.
+
+    OHLC are multiplied by the view's factor and Volume divided by the split
+    factor. Rows without a factor (or ``factors=None``) keep raw prices.
+    """
+    if VIEWS[view] is None or factors is None:
+        return market_data
+    factor = _gather(factors, VIEWS[view], market_data['Date'], market_data['Ticker'])
+    adjusted = market_data.copy()
+    for field in PRICE_FIELDS:
+        if field in adjusted:
+            adjusted[field] = adjusted[field].to_numpy(dtype='float64') * factor
+    if 'Volume' in adjusted:
+        split = _gather(factors, 'Split_Factor', market_data['Date'], market_data['Ticker'])
+        adjusted['Volume'] = adjusted['Volume'].to_numpy(dtype='float64') / split
+    return adjusted
+
+
+def factor_matrix(factors, view, prices):
+    """The view's factors as a dates x tickers matrix aligned to ``prices`` (1.0 where missing)."""
+    grid, factor_dates, factor_tickers = _grid(factors, VIEWS[view])
+    rows = factor_dates.get_indexer(pd.to_datetime(prices.index))
+    cols = factor_tickers.get_indexer(prices.columns)
+    return pd.DataFrame(grid[np.ix_(rows, cols)], index=prices.index, columns=prices.columns)
+
+
+def adjust_prices(prices, factors, view='adjusted'):
+    """A dates x tickers price matrix in the requested view: one multiply by the cached factors."""
+    if VIEWS[view] is None or factors is None:
+        return prices
+    return prices * factor_matrix(factors, view, prices)
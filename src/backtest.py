@@ -0,0 +1,227 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from portfolio_batch import summarize_arrays, timeseries_arrays
+
+FREQUENCIES = {'M': 'Monthly', 'Q': 'Quarterly', 'Y': 'Yearly'}
+BAND_WINDOW = 64
+
+SCENARIO_COLUMNS = ['Scenario_ID', 'Strategy', 'Frequency', 'Band_Pct', 'Cost_Bps']
+RESULT_COLUMNS = SCENARIO_COLUMNS + ['Final_Value', 'Rebalances', 'Costs_Paid', 'Total_Return_Pct',
+                                     'Annualized_Return_Pct', 'Volatility_Pct', 'Sharpe_Ratio',
+                                     'Max_Drawdown_Pct', 'VaR_95_Pct']
+TIMESERIES_COLUMNS = ['Date', 'Scenario_ID', 'Portfolio_Value', 'Cumulative_Return', 'Drawdown']
+
+
+def scenario_grid(frequencies=('M', 'Q', 'Y'), bands_pct=(2.0, 5.0, 10.0), costs_bps=(0.0, 10.0, 25.0)):
+    """Every strategy-parameter combination as one scenario row.
+
+    Buy-and-hold never trades, so it appears once; calendar rebalancing
+    runs once per frequency and threshold rebalancing once per band
+    (largest weight drift from target, in percentage points), each at
+    every cost level.
+    """
+    rows = [('buy_and_hold', '', np.nan, 0.0)]
+    rows += [('calendar', freq, np.nan, cost) for freq, cost in itertools.product(frequencies, costs_bps)]
+    rows += [('threshold', '', band, cost) for band, cost in itertools.product(bands_pct, costs_bps)]
+    scenarios = pd.DataFrame(rows, columns=SCENARIO_COLUMNS[1:])
+    labels = [strategy if strategy == 'buy_and_hold' else
+              f"{FREQUENCIES[freq]}_{cost:g}bps" if strategy == 'calendar' else f"Band{band:g}_{cost:g}bps"
+              for strategy, freq, band, cost in scenarios.itertuples(index=False)]
+    scenarios.insert(0, 'Scenario_ID', labels)
+    return scenarios
+
+
+def calendar_events(dates, frequencies):
+    """Dates x frequencies mask of rebalance days: the first trading day of every new period."""
+    dates = pd.DatetimeIndex(dates)
+    events = np.zeros((len(dates), len(frequencies)), dtype=bool)
+    for j, freq in enumerate(frequencies):
+        labels = dates.to_period(freq)
+        events[1:, j] = labels[1:] != labels[:-1]
+    return events
+
+
+def _schedule(dates, scenarios):
+    """Per scenario its calendar column (-1 for none), band (inf for none) and cost rate, plus the calendar mask."""
+    frequencies = sorted(set(scenarios['Frequency']) - {''})
+    events = calendar_events(dates, frequencies)
+    column = np.array([frequencies.index(freq) if strategy == 'calendar' else -1
+                       for strategy, freq in zip(scenarios['Strategy'], scenarios['Frequency'])])
+    band = np.where(scenarios['Strategy'] == 'threshold', scenarios['Band_Pct'].to_numpy(dtype='float64') / 100,
+                    np.inf)
+    cost = scenarios['Cost_Bps'].to_numpy(dtype='float64') / 10_000
+    return column, band, cost, events
+
+
+def _rebalance(value, held, price, targets, cost):
+    """New holdings, cash and cost for rows rebalancing at ``value`` (positions ``held`` plus cash).
+
+    Costs are charged on the traded value to the pre-cost targets and
+    taken out of the portfolio before it is reinvested.
+    """
+    paid = cost * np.abs(targets * value[:, None] - held).sum(axis=1)
+    invested = value - paid
+    return targets * invested[:, None] / price, invested * (1 - targets.sum()), paid
+
+
+def event_loop(prices, shares, targets, column, band, cost, events):
+    """Reference engine: every date is an event, with all scenarios handled together on each one.
+
+    At each close the scenarios' positions are valued; a scenario
+    rebalances when its calendar column fires or, for a band, when any
+    weight has drifted more than ``band`` from target. Returns
+    ``(nav, rebalances, costs_paid)`` with nav as a dates x scenarios matrix.
+    """
+    n_dates = len(prices)
+    n_scenarios = len(column)
+    holdings = np.tile(shares, (n_scenarios, 1))
+    cash = np.zeros(n_scenarios)
+    nav = np.empty((n_dates, n_scenarios))
+    rebalances = np.zeros(n_scenarios, dtype='int64')
+    costs_paid = np.zeros(n_scenarios)
+    scheduled = np.where(column >= 0, column, 0)
+    for t in range(n_dates):
+        held = holdings * prices[t]
+        value = held.sum(axis=1) + cash
+        trigger = (column >= 0) & events[t, scheduled]
+        if t:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                drift = np.abs(held / value[:, None] - targets).max(axis=1)
+            trigger |= drift > band
+        if trigger.any():
+            rows = np.flatnonzero(trigger)
+            holdings[rows], cash[rows], paid = _rebalance(value[rows], held[rows], prices[t], targets, cost[rows])
+            value[rows] -= paid
+            rebalances[rows] += 1
+            costs_paid[rows] += paid
+        nav[t] = value
+    return nav, rebalances, costs_paid
+
+
+def band_days(prices, shares, targets, bands, window=BAND_WINDOW):
+    """Rebalance days of threshold rules, one array per band, all bands stepped together.
+
+    Between rebalances the weights drift with prices alone: after a
+    rebalance on day ``e`` a position's weight is its target scaled by
+    ``prices[t] / prices[e]`` over the portfolio total, whatever the value
+    or the costs paid. So a band's rebalance days do not depend on costs
+    and every cost level can share them. Each step looks ``window`` days
+    ahead of every band's last rebalance in one array operation and jumps
+    to the first day its drift exceeds the band.
+    """
+    n_dates = len(prices)
+    bands = np.asarray(bands, dtype='float64')
+    days = [[] for _ in bands]
+    position = np.zeros(len(bands), dtype='int64')
+    reference = np.tile(shares, (len(bands), 1))
+    cash = np.zeros(len(bands))
+    offsets = np.arange(1, window + 1)
+    active = np.flatnonzero(position < n_dates - 1)
+    while len(active):
+        rows = position[active, None] + offsets
+        inside = rows < n_dates
+        held = prices[np.minimum(rows, n_dates - 1)] * reference[active, None, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weights = held / (held.sum(axis=2) + cash[active, None])[:, :, None]
+        breach = (np.abs(weights - targets).max(axis=2) > bands[active, None]) & inside
+        hit = breach.any(axis=1)
+        first = breach.argmax(axis=1)
+        rebalanced = active[hit]
+        day = rows[hit, first[hit]]
+        for band, band_day in zip(rebalanced.tolist(), day.tolist()):
+            days[band].append(band_day)
+        reference[rebalanced] = targets / prices[day]
+        cash[rebalanced] = 1.0 - targets.sum()
+        position[rebalanced] = day
+        position[active[~hit]] += window
+        active = np.flatnonzero(position < n_dates - 1)
+    return [np.array(band, dtype='int64') for band in days]
+
+
+def scheduled_path(prices, shares, targets, group, cost, schedules):
+    """NAV for scenarios whose rebalance days are known: ``schedules[group[s]]`` for scenario ``s``.
+
+    Between two rebalance days the holdings are fixed, so each segment of
+    the NAV is one ``prices[segment] @ holdings.T`` product. Scenarios on
+    the same schedule (different costs) share their segments and are done
+    together; the loop runs over rebalance days, not over dates.
+    """
+    n_dates = len(prices)
+    nav = np.empty((n_dates, len(group)))
+    rebalances = np.zeros(len(group), dtype='int64')
+    costs_paid = np.zeros(len(group))
+    for index in np.unique(group):
+        members = np.flatnonzero(group == index)
+        holdings = np.tile(shares, (len(members), 1))
+        cash = np.zeros(len(members))
+        start = 0
+        for day in schedules[index]:
+            nav[start:day, members] = prices[start:day] @ holdings.T + cash
+            held = holdings * prices[day]
+            value = held.sum(axis=1) + cash
+            holdings, cash, paid = _rebalance(value, held, prices[day], targets, cost[members])
+            nav[day, members] = value - paid
+            costs_paid[members] += paid
+            start = day + 1
+        nav[start:, members] = prices[start:] @ holdings.T + cash
+        rebalances[members] = len(schedules[index])
+    return nav, rebalances, costs_paid
+
+
+def simulate(prices, shares, targets, scenarios, fast=True):
+    """NAV of every scenario over a dates x tickers price matrix, plus rebalance counts and costs.
+
+    ``shares`` are the starting holdings and ``targets`` the target weight
+    per ticker (adding up to at most 1; the rest is held as cash after a
+    rebalance). With ``fast`` every scenario's rebalance days are worked
+    out first (calendar days, :func:`band_days` for thresholds, none for
+    buy-and-hold) and the NAV comes from :func:`scheduled_path`; without
+    it every scenario goes through :func:`event_loop`. Both give the same result.
+    """
+    values = prices.to_numpy(dtype='float64')
+    shares = np.asarray(shares, dtype='float64')
+    targets = np.asarray(targets, dtype='float64')
+    column, band, cost, events = _schedule(prices.index, scenarios)
+    if not fast:
+        return event_loop(values, shares, targets, column, band, cost, events)
+
+    schedules = [np.flatnonzero(events[:, j]) for j in range(events.shape[1])]
+    group = column.copy()
+    group[(column < 0) & ~np.isfinite(band)] = len(schedules)
+    schedules.append(np.array([], dtype='int64'))
+    bands, band_group = np.unique(band[np.isfinite(band)], return_inverse=True)
+    group[np.isfinite(band)] = len(schedules) + band_group
+    schedules.extend(band_days(values, shares, targets, bands))
+    return scheduled_path(values, shares, targets, group, cost, schedules)
+
+
+def backtest(prices, shares, targets, scenarios, fast=True):
+    """Run every scenario and score it with the same risk metrics as step 5.
+
+    Returns ``(results, timeseries)``: one row per scenario with its
+    parameters, final value, rebalance count, costs and metrics, and the
+    long Date/Scenario_ID daily series.
+    """
+    nav, rebalances, costs_paid = simulate(prices, shares, targets, scenarios, fast)
+    arrays = timeseries_arrays(nav)
+    metrics = summarize_arrays(arrays, prices.index.to_numpy(dtype='datetime64[ns]'))
+
+    results = scenarios.reset_index(drop=True).copy()
+    results['Final_Value'] = nav[-1]
+    results['Rebalances'] = rebalances
+    results['Costs_Paid'] = costs_paid
+    for name in RESULT_COLUMNS[8:]:
+        results[name] = metrics[name]
+
+    n_dates, n_scenarios = nav.shape
+    timeseries = pd.DataFrame({
+        'Date': np.repeat(prices.index.to_numpy(), n_scenarios),
+        'Scenario_ID': np.tile(scenarios['Scenario_ID'].to_numpy(dtype=object), n_dates),
+        'Portfolio_Value': nav.ravel(),
+        'Cumulative_Return': arrays['Cumulative_Return'].ravel(),
+        'Drawdown': arrays['Drawdown'].ravel(),
+    })
+    return results[RESULT_COLUMNS], timeseries[TIMESERIES_COLUMNS]
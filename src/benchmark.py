@@ -0,0 +1,278 @@
+import numpy as np
+import pandas as pd
+
+from covariance import quarter_windows
+from incremental_risk import RISK_FREE_RATE, TRADING_DAYS
+from portfolio_batch import PORTFOLIO_ID, SparsePositions, timeseries_arrays
+from rolling_risk import _shift_down
+
+BENCHMARKS = ('SPY', 'QQQ', 'VTI')
+ROLLING_WINDOWS = (63, 252)
+CHUNK_PORTFOLIOS = 500
+
+# Policy benchmark for attribution: Asset_Class -> (benchmark ticker, weight in %).
+POLICY_BENCHMARK = {'Equity': ('SPY', 65.0), 'ETF': ('VTI', 35.0)}
+
+METRIC_COLUMNS = ['Portfolio_Return_Pct', 'Benchmark_Return_Pct', 'Active_Return_Pct', 'Tracking_Error_Pct',
+                  'Information_Ratio', 'Beta', 'Alpha_Pct', 'Correlation']
+RELATIVE_COLUMNS = [PORTFOLIO_ID, 'Benchmark', 'Period', 'Start_Date', 'End_Date', 'Days', *METRIC_COLUMNS,
+                    'Up_Capture_Pct', 'Down_Capture_Pct']
+ROLLING_COLUMNS = ['Date', PORTFOLIO_ID, 'Benchmark', 'Window_Days', *METRIC_COLUMNS[2:]]
+ATTRIBUTION_COLUMNS = [PORTFOLIO_ID, 'Period', 'Start_Date', 'End_Date', 'Asset_Class', 'Benchmark_Ticker',
+                       'Portfolio_Weight_Pct', 'Benchmark_Weight_Pct', 'Portfolio_Return_Pct',
+                       'Benchmark_Return_Pct', 'Allocation_Pct', 'Selection_Pct', 'Interaction_Pct',
+                       'Total_Effect_Pct']
+
+
+def read_policy(path):
+    """Policy benchmark from a CSV of Asset_Class, Ticker and Weight_Pct, as :data:`POLICY_BENCHMARK`."""
+    policy = pd.read_csv(path)
+    return {row.Asset_Class: (row.Ticker, float(row.Weight_Pct)) for row in policy.itertuples(index=False)}
+
+
+def _holdings(holdings):
+    if PORTFOLIO_ID in holdings:
+        return holdings.astype({PORTFOLIO_ID: str})
+    return holdings.assign(**{PORTFOLIO_ID: 'Portfolio'})
+
+
+def portfolio_returns(holdings, prices):
+    """Dates x portfolios daily time-weighted returns (net of purchases) of ``holdings``.
+
+    Without a ``Portfolio_ID`` column the holdings are one portfolio
+    named ``Portfolio``. Dates before a portfolio's first position are NaN.
+    """
+    positions = SparsePositions.from_holdings(_holdings(holdings), prices)
+    values = prices.to_numpy(dtype='float64')
+    arrays = timeseries_arrays(positions.nav(values), positions.flows(values))
+    return pd.DataFrame(arrays['Daily_Return'], index=prices.index, columns=positions.portfolio_ids)
+
+
+def _masked(values):
+    values = np.asarray(values, dtype='float64')
+    observed = ~np.isnan(values)
+    return np.where(observed, values, 0.0), observed.astype('float64')
+
+
+def _metrics(n, sx, sy, sxx, syy, sxy, shift_x, shift_y):
+    """Relative metrics from pair sums of returns centred on ``shift_x`` and ``shift_y``."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x, mean_y = sx / n, sy / n
+        var_x = (sxx - sx * mean_x) / (n - 1)
+        var_y = (syy - sy * mean_y) / (n - 1)
+        cov = (sxy - sx * mean_y) / (n - 1)
+        mean_x, mean_y = mean_x + shift_x, mean_y + shift_y
+        tracking_error = np.sqrt(np.maximum(var_x + var_y - 2 * cov, 0.0) * TRADING_DAYS)
+        active = (mean_x - mean_y) * TRADING_DAYS
+        beta = cov / var_y
+        daily_rf = RISK_FREE_RATE / TRADING_DAYS
+        return {
+            'Portfolio_Return_Pct': mean_x * TRADING_DAYS * 100,
+            'Benchmark_Return_Pct': mean_y * TRADING_DAYS * 100,
+            'Active_Return_Pct': active * 100,
+            'Tracking_Error_Pct': tracking_error * 100,
+            'Information_Ratio': active / tracking_error,
+            'Beta': beta,
+            'Alpha_Pct': ((mean_x - daily_rf) - beta * (mean_y - daily_rf)) * TRADING_DAYS * 100,
+            'Correlation': np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0),
+        }
+
+
+def _capture(observed_x, log_x, log_y, days):
+    """Geometric mean portfolio return over the benchmark's on ``days``, in %."""
+    n = observed_x.T @ days
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.expm1(log_x.T @ days / n) / np.expm1(observed_x.T @ (log_y * days) / n) * 100
+
+
+def pair_metrics(portfolio, benchmark):
+    """Relative metrics of every portfolio column against every benchmark column.
+
+    Both are dates x columns daily return arrays on the same dates, NaN
+    where there is no return; each pair uses the days both have. Every
+    statistic comes from ``portfolio.T @ benchmark`` products of the masked
+    returns, their squares and their logs, so P portfolios x B benchmarks
+    take one pass. Returns a dict of P x B arrays: annualized mean returns
+    and active return, tracking error, information ratio, CAPM beta and
+    Jensen's alpha (over the risk-free rate), correlation, and the
+    geometric up/down capture ratios on the benchmark's up and down days.
+    """
+    x, observed_x = _masked(portfolio)
+    y, observed_y = _masked(benchmark)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift_x = np.nan_to_num(x.sum(axis=0) / observed_x.sum(axis=0))
+        shift_y = np.nan_to_num(y.sum(axis=0) / observed_y.sum(axis=0))
+    centered_x = (x - shift_x) * observed_x
+    centered_y = (y - shift_y) * observed_y
+
+    n = observed_x.T @ observed_y
+    metrics = _metrics(n, centered_x.T @ observed_y, observed_x.T @ centered_y,
+                       (centered_x * centered_x).T @ observed_y, observed_x.T @ (centered_y * centered_y),
+                       centered_x.T @ centered_y, shift_x[:, None], shift_y[None, :])
+    log_x, log_y = np.log1p(x), np.log1p(y)
+    metrics['Days'] = n.astype('int64')
+    metrics['Up_Capture_Pct'] = _capture(observed_x, log_x, log_y, observed_y * (y > 0))
+    metrics['Down_Capture_Pct'] = _capture(observed_x, log_x, log_y, observed_y * (y < 0))
+    return metrics
+
+
+def rolling_pair_metrics(portfolio, benchmark, window):
+    """:func:`pair_metrics` over trailing ``window``-day windows, without the capture ratios.
+
+    Returns dates x portfolios x benchmarks arrays from windowed
+    differences of cumulative sums of the same products, each series
+    centred on its mean first as in :func:`rolling_risk.rolling_moments`.
+    A value is only reported once the window holds ``window`` shared returns.
+    """
+    x, observed_x = _masked(portfolio)
+    y, observed_y = _masked(benchmark)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift_x = np.nan_to_num(x.sum(axis=0) / observed_x.sum(axis=0))
+        shift_y = np.nan_to_num(y.sum(axis=0) / observed_y.sum(axis=0))
+    both = observed_x[:, :, None] * observed_y[:, None, :]
+    x = ((x - shift_x) * observed_x)[:, :, None] * both
+    y = ((y - shift_y) * observed_y)[:, None, :] * both
+
+    def trailing(values):
+        total = np.cumsum(values, axis=0)
+        return total - _shift_down(total, window)
+
+    n = trailing(both)
+    metrics = _metrics(n, trailing(x), trailing(y), trailing(x * x), trailing(y * y), trailing(x * y),
+                       shift_x[:, None], shift_y[None, :])
+    full = n >= window
+    return {name: np.where(full, values, np.nan) for name, values in metrics.items()}
+
+
+def relative_table(portfolio, benchmark, windows=None):
+    """Long Portfolio_ID/Benchmark/Period table of :func:`pair_metrics`.
+
+    ``portfolio`` and ``benchmark`` are dates x columns return frames on
+    the same dates. One block per window from
+    :func:`covariance.quarter_windows` (each calendar quarter plus ``Full``).
+    """
+    windows = quarter_windows(portfolio.index) if windows is None else windows
+    portfolio_ids = portfolio.columns.to_numpy(dtype=object)
+    benchmarks = benchmark.columns.to_numpy(dtype=object)
+    frames = []
+    for label, start, stop in windows:
+        metrics = pair_metrics(portfolio.iloc[start:stop], benchmark.iloc[start:stop])
+        frames.append(pd.DataFrame({
+            PORTFOLIO_ID: np.repeat(portfolio_ids, len(benchmarks)),
+            'Benchmark': np.tile(benchmarks, len(portfolio_ids)),
+            'Period': label,
+            'Start_Date': portfolio.index[start],
+            'End_Date': portfolio.index[stop - 1],
+            **{name: values.ravel() for name, values in metrics.items()},
+        }))
+    return pd.concat(frames, ignore_index=True)[RELATIVE_COLUMNS]
+
+
+def rolling_relative_table(portfolio, benchmark, windows=ROLLING_WINDOWS, chunk=CHUNK_PORTFOLIOS):
+    """Long Date/Portfolio_ID/Benchmark/Window_Days table of :func:`rolling_pair_metrics`.
+
+    Portfolios are taken ``chunk`` columns at a time to bound the dates x
+    portfolios x benchmarks arrays. Rows before the first full window are dropped.
+    """
+    dates = portfolio.index.to_numpy()
+    benchmarks = benchmark.columns.to_numpy(dtype=object)
+    frames = []
+    for first in range(0, portfolio.shape[1], chunk):
+        block = portfolio.iloc[:, first:first + chunk]
+        portfolio_ids = block.columns.to_numpy(dtype=object)
+        for window in windows:
+            metrics = rolling_pair_metrics(block, benchmark, window)
+            frame = pd.DataFrame({
+                'Date': np.repeat(dates, len(portfolio_ids) * len(benchmarks)),
+                PORTFOLIO_ID: np.tile(np.repeat(portfolio_ids, len(benchmarks)), len(dates)),
+                'Benchmark': np.tile(benchmarks, len(dates) * len(portfolio_ids)),
+                'Window_Days': window,
+                **{name: metrics[name].ravel() for name in ROLLING_COLUMNS[4:]},
+            })
+            frames.append(frame[frame['Beta'].notna()])
+    table = pd.concat(frames, ignore_index=True)[ROLLING_COLUMNS]
+    return table.sort_values([PORTFOLIO_ID, 'Benchmark', 'Window_Days', 'Date'], kind='stable').reset_index(drop=True)
+
+
+def _period_return(returns, start, stop):
+    return np.expm1(np.log1p(np.nan_to_num(returns[start:stop])).sum(axis=0))
+
+
+def attribution_table(holdings, prices, policy=POLICY_BENCHMARK, windows=None):
+    """Brinson-Fachler attribution by Asset_Class against a policy benchmark, per period.
+
+    Each portfolio's asset-class sleeves are valued like whole portfolios:
+    a sleeve's return is its time-weighted return over the period and its
+    weight is its share of the portfolio at the previous close. The policy
+    benchmark holds each class's ticker at a fixed weight (normalized to
+    100%); classes outside the policy have no benchmark weight and the
+    policy return as their benchmark return. Per class:
+
+    - Allocation: (portfolio weight - benchmark weight) x (class benchmark return - policy return)
+    - Selection: benchmark weight x (portfolio class return - class benchmark return)
+    - Interaction: (portfolio weight - benchmark weight) x (portfolio class return - class benchmark return)
+
+    The effects add up to the weighted class return less the policy return.
+    """
+    holdings = _holdings(holdings)
+    sleeves, keys = pd.MultiIndex.from_frame(
+        holdings[[PORTFOLIO_ID, 'Asset_Class']].fillna('Unassigned').astype(str)).factorize()
+    positions = SparsePositions.from_holdings(holdings.assign(**{PORTFOLIO_ID: sleeves}), prices)
+    keys = keys[positions.portfolio_ids]
+    values = prices.to_numpy(dtype='float64')
+    nav = np.nan_to_num(positions.nav(values))
+    returns = timeseries_arrays(nav, positions.flows(values))['Daily_Return']
+
+    portfolio_ids, row = np.unique(keys.get_level_values(0).to_numpy(dtype=object), return_inverse=True)
+    classes = pd.Index(sorted(set(keys.get_level_values(1)) | set(policy)))
+    column = classes.get_indexer(keys.get_level_values(1))
+    benchmark_weight = np.array([policy[name][1] if name in policy else 0.0 for name in classes])
+    benchmark_weight = benchmark_weight / benchmark_weight.sum()
+    benchmark_tickers = np.array([policy[name][0] if name in policy else '' for name in classes], dtype=object)
+    in_policy = benchmark_weight > 0
+    benchmark_prices = prices.reindex(columns=benchmark_tickers[in_policy]).ffill().to_numpy(dtype='float64')
+
+    windows = quarter_windows(prices.index) if windows is None else windows
+    frames = []
+    for label, start, stop in windows:
+        before = max(start - 1, 0)
+        sleeve_value = np.zeros((len(portfolio_ids), len(classes)))
+        sleeve_value[row, column] = nav[before]
+        sleeve_return = np.zeros_like(sleeve_value)
+        sleeve_return[row, column] = _period_return(returns, start, stop)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.nan_to_num(sleeve_value / sleeve_value.sum(axis=1, keepdims=True))
+        class_return = np.zeros(len(classes))
+        class_return[in_policy] = benchmark_prices[stop - 1] / benchmark_prices[before] - 1
+        policy_return = benchmark_weight @ class_return
+        class_return[~in_policy] = policy_return
+
+        active_weight = weight - benchmark_weight
+        selection = sleeve_return - class_return
+        effects = {
+            'Allocation_Pct': active_weight * (class_return - policy_return),
+            'Selection_Pct': benchmark_weight * selection,
+            'Interaction_Pct': active_weight * selection,
+        }
+        frames.append(pd.DataFrame({
+            PORTFOLIO_ID: np.repeat(portfolio_ids, len(classes)),
+            'Period': label,
+            'Start_Date': prices.index[start],
+            'End_Date': prices.index[stop - 1],
+            'Asset_Class': np.tile(classes.to_numpy(dtype=object), len(portfolio_ids)),
+            'Benchmark_Ticker': np.tile(benchmark_tickers, len(portfolio_ids)),
+            'Portfolio_Weight_Pct': weight.ravel() * 100,
+            'Benchmark_Weight_Pct': np.tile(benchmark_weight, len(portfolio_ids)) * 100,
+            'Portfolio_Return_Pct': sleeve_return.ravel() * 100,
+            'Benchmark_Return_Pct': np.tile(class_return, len(portfolio_ids)) * 100,
+            **{name: effect.ravel() * 100 for name, effect in effects.items()},
+        }))
+    table = pd.concat(frames, ignore_index=True)
+    table['Total_Effect_Pct'] = table[['Allocation_Pct', 'Selection_Pct', 'Interaction_Pct']].sum(axis=1)
+    return table[ATTRIBUTION_COLUMNS]
+
+
+def benchmark_returns(prices, benchmarks=BENCHMARKS):
+    """Dates x benchmarks daily returns for the benchmarks priced in ``prices``."""
+    benchmarks = [ticker for ticker in benchmarks if ticker in prices.columns]
+    return prices[benchmarks].ffill().pct_change(fill_method=None)
@@ -0,0 +1,230 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+ESTIMATORS = ('sample', 'ewma', 'ledoit_wolf')
+EWMA_DECAY = 0.94
+BLOCK_TICKERS = 1_024
+CACHE_DIR = 'data/cache/covariance'
+BENCHMARK_TICKER = 'SPY'
+
+CONTRIBUTION_COLUMNS = ['Ticker', 'Weight_Pct', 'Volatility_Pct', 'Beta', 'Marginal_Risk_Pct',
+                        'Component_Risk_Pct', 'Risk_Contribution_Pct']
+CORRELATION_COLUMNS = ['Period', 'Start_Date', 'End_Date', 'Ticker_1', 'Ticker_2', 'Correlation',
+                       'Covariance']
+
+
+def return_matrix(prices):
+    """Daily simple returns of a dates x tickers price matrix, NaN where a ticker has no price.
+
+    A return spans from the ticker's previous observed price, so a gap in
+    one ticker does not cost the other tickers that day. Dates without any
+    return (the first one) are dropped.
+    """
+    observed = prices.notna().to_numpy()
+    returns = prices.ffill().pct_change(fill_method=None).to_numpy()
+    returns = pd.DataFrame(np.where(observed, returns, np.nan), index=prices.index, columns=prices.columns)
+    return returns[returns.notna().any(axis=1)]
+
+
+def _blocks(n, block):
+    return [(start, min(start + block, n)) for start in range(0, n, block)]
+
+
+def _gram(left, right, block):
+    """``left.T @ right`` computed in ``block`` x ``block`` tiles of tickers."""
+    gram = np.empty((left.shape[1], right.shape[1]), dtype=left.dtype)
+    for i, j in _blocks(left.shape[1], block):
+        for k, l in _blocks(right.shape[1], block):
+            gram[i:j, k:l] = left[:, i:j].T @ right[:, k:l]
+    return gram
+
+
+def _weights(n_dates, method, decay):
+    if method == 'ewma':
+        return decay ** np.arange(n_dates - 1, -1, -1, dtype='float64')
+    return np.ones(n_dates)
+
+
+def covariance(returns, method='sample', dtype='float64', decay=EWMA_DECAY, block=BLOCK_TICKERS):
+    """Daily covariance matrix of a dates x tickers return matrix.
+
+    * ``sample``: the usual unbiased estimate.
+    * ``ewma``: exponentially weighted, each day worth ``decay`` times the next (RiskMetrics).
+    * ``ledoit_wolf``: the maximum-likelihood estimate (divided by the
+      number of dates) shrunk towards a scaled identity by the Ledoit-Wolf
+      optimal intensity, well-conditioned even with more tickers than dates.
+
+    Missing returns are handled pairwise: each pair's cross products and
+    day count cover the dates both tickers have, around each ticker's own
+    mean (for ``ledoit_wolf`` a missing return counts as the mean). Products run in ``block`` x ``block`` tiles of tickers
+    in ``dtype`` (``float32`` halves memory and time for very wide
+    universes), and the result comes back as float64.
+    """
+    if method not in ESTIMATORS:
+        raise ValueError(f"Unknown covariance method '{method}'. Choose from: {list(ESTIMATORS)}")
+    values = returns.to_numpy(dtype='float64')
+    observed = ~np.isnan(values)
+    complete = observed.all()
+    weights = _weights(len(values), method, decay)[:, None]
+
+    # Weighted mean per ticker over its own observed days.
+    column_weight = (weights * observed).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(observed, values, 0.0).T @ weights[:, 0] / column_weight
+    centered = np.where(observed, values - means, 0.0)
+
+    if method == 'ledoit_wolf':
+        return _ledoit_wolf(centered.astype(dtype), block, returns.columns)
+
+    gram = _gram((centered * weights).astype(dtype), centered.astype(dtype), block).astype('float64')
+    if complete:
+        total = weights.sum()
+        pair_weight = np.full(gram.shape, total)
+        pair_weight_sq = np.full(gram.shape, (weights ** 2).sum())
+    else:
+        # Counts are small integers, exact in float32 whatever ``dtype`` is.
+        mask = observed.astype('float32')
+        if method == 'sample':
+            pair_weight = pair_weight_sq = _gram(mask, mask, block).astype('float64')
+        else:
+            pair_weight = _gram((mask * weights).astype(dtype), mask.astype(dtype), block).astype('float64')
+            pair_weight_sq = _gram((mask * weights ** 2).astype(dtype), mask.astype(dtype), block).astype('float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Reliability weights: V1 - V2 / V1 reduces to n - 1 for equal weights.
+        cov = gram / (pair_weight - pair_weight_sq / pair_weight)
+    return pd.DataFrame(cov, index=returns.columns, columns=returns.columns)
+
+
+def _ledoit_wolf(centered, block, tickers):
+    """Ledoit-Wolf (2004) shrinkage towards ``mu * I`` on demeaned returns."""
+    n, p = centered.shape
+    sample = _gram(centered, centered, block).astype('float64') / n
+    squared = centered.astype('float64') ** 2
+    mu = np.trace(sample) / p
+    # sum over dates of ||x_t x_t' - S||^2, without forming the p x p outer products.
+    beta = ((squared.sum(axis=1) ** 2).sum() / n - (sample ** 2).sum()) / (p * n)
+    delta = ((sample ** 2).sum() - 2 * mu * np.trace(sample) + p * mu ** 2) / p
+    shrinkage = 0.0 if delta == 0 else min(beta, delta) / delta
+    cov = (1 - shrinkage) * sample
+    cov[np.diag_indices(p)] += shrinkage * mu
+    frame = pd.DataFrame(cov, index=tickers, columns=tickers)
+    frame.attrs['shrinkage'] = shrinkage
+    return frame
+
+
+def correlation(cov):
+    """Correlation matrix from a covariance matrix."""
+    std = np.sqrt(np.diag(cov.to_numpy()))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov.to_numpy() / np.outer(std, std)
+    return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=cov.index, columns=cov.columns)
+
+
+def risk_contributions(cov, values, benchmark=BENCHMARK_TICKER):
+    """Marginal and component contributions to annualized portfolio volatility, plus beta.
+
+    ``values`` is market value per ticker (tickers missing from ``cov``
+    are dropped). Component risks add up to portfolio volatility, so
+    ``Risk_Contribution_Pct`` adds up to 100. ``Beta`` is against
+    ``benchmark`` when it is in ``cov``. Returns ``(table, summary)`` where
+    ``summary`` holds portfolio volatility and beta.
+    """
+    values = values[values.index.isin(cov.index)]
+    weights = (values / values.sum()).to_numpy()
+    sigma = cov.loc[values.index, values.index].to_numpy() * TRADING_DAYS
+    portfolio_var = weights @ sigma @ weights
+    portfolio_vol = np.sqrt(portfolio_var)
+    marginal = sigma @ weights / portfolio_vol
+    component = weights * marginal
+
+    if benchmark in cov.index:
+        benchmark_cov = cov.loc[values.index, benchmark].to_numpy()
+        beta = benchmark_cov / cov.loc[benchmark, benchmark]
+    else:
+        beta = np.full(len(values), np.nan)
+
+    table = pd.DataFrame({
+        'Ticker': values.index.to_numpy(),
+        'Weight_Pct': weights * 100,
+        'Volatility_Pct': np.sqrt(np.diag(sigma)) * 100,
+        'Beta': beta,
+        'Marginal_Risk_Pct': marginal * 100,
+        'Component_Risk_Pct': component * 100,
+        'Risk_Contribution_Pct': component / portfolio_vol * 100,
+    })
+    summary = {'Portfolio_Volatility_Pct': portfolio_vol * 100, 'Portfolio_Beta': float(weights @ beta)}
+    return table, summary
+
+
+class CovarianceCache:
+    """Covariance matrices saved under ``root``, keyed by estimator, tickers and date range.
+
+    The key also covers a hash of the returns in the window, so a window is
+    only reused while its data is unchanged: a refresh that adds new days
+    recomputes the windows that include them and loads the rest.
+    """
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, returns, method, dtype):
+        digest = hashlib.sha1(f"{method}|{dtype}|{returns.index[0]}|{returns.index[-1]}".encode())
+        digest.update('\0'.join(map(str, returns.columns)).encode())
+        digest.update(np.ascontiguousarray(returns.to_numpy(dtype='float64')).tobytes())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key[:20]}.npy")
+
+    def covariance(self, returns, method='sample', dtype='float64'):
+        """:func:`covariance` for ``returns``, loaded from the cache when this window was done before."""
+        path = self.path(self.key(returns, method, dtype))
+        if os.path.exists(path):
+            self.hits += 1
+            return pd.DataFrame(np.load(path), index=returns.columns, columns=returns.columns)
+        self.misses += 1
+        cov = covariance(returns, method, dtype)
+        os.makedirs(self.root, exist_ok=True)
+        np.save(path, cov.to_numpy())
+        return cov
+
+
+def quarter_windows(dates):
+    """``(label, start, stop)`` row ranges for every calendar quarter in ``dates`` plus the full history."""
+    labels = pd.DatetimeIndex(dates).to_period('Q')
+    bounds = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1], True])
+    windows = [(str(labels[start]), start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+    windows.append(('Full', 0, len(dates)))
+    return windows
+
+
+def correlation_table(returns, method='sample', cache=None, windows=None):
+    """Long Period/Ticker_1/Ticker_2 correlation and annualized covariance table.
+
+    One block of rows per window from :func:`quarter_windows` (every ticker
+    pair, both orders, so Power BI can lay it out as a matrix). With a
+    :class:`CovarianceCache` closed quarters are read back instead of
+    recomputed.
+    """
+    windows = quarter_windows(returns.index) if windows is None else windows
+    tickers = returns.columns.to_numpy(dtype=object)
+    frames = []
+    for label, start, stop in windows:
+        window = returns.iloc[start:stop]
+        cov = cache.covariance(window, method) if cache is not None else covariance(window, method)
+        frames.append(pd.DataFrame({
+            'Period': label,
+            'Start_Date': window.index[0],
+            'End_Date': window.index[-1],
+            'Ticker_1': np.repeat(tickers, len(tickers)),
+            'Ticker_2': np.tile(tickers, len(tickers)),
+            'Correlation': correlation(cov).to_numpy().ravel(),
+            'Covariance': cov.to_numpy().ravel() * TRADING_DAYS,
+        }))
+    return pd.concat(frames, ignore_index=True)
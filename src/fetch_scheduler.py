@@ -0,0 +1,163 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from reshape import FIELDS
+
+
+class PartialFetchError(Exception):
+    """A provider call that returned data for some tickers and failed for others.
+
+    ``data`` holds the long rows that did arrive; ``errors`` maps each failed
+    ticker to a message. The scheduler keeps ``data`` and retries only the
+    tickers in ``errors``.
+    """
+
+    def __init__(self, data, errors):
+        super().__init__(f"{len(errors)} ticker(s) failed: {sorted(errors)}")
+        self.data = data
+        self.errors = errors
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+
+class FetchResult:
+    """Outcome of one scheduler run."""
+
+    def __init__(self, data, failures, empty, requests, elapsed, n_tickers):
+        self.data = data
+        self.failures = failures
+        self.empty = empty
+        self.requests = requests
+        self.elapsed = elapsed
+        self.n_tickers = n_tickers
+
+    @property
+    def succeeded(self):
+        return self.n_tickers - len(self.failures)
+
+    @property
+    def throughput(self):
+        """Tickers fetched per second of wall-clock time."""
+        return self.succeeded / self.elapsed if self.elapsed > 0 else float('inf')
+
+    def summary(self):
+        return (f"{self.succeeded}/{self.n_tickers} tickers in {self.elapsed:.2f}s "
+                f"({self.throughput:,.1f} tickers/sec, {self.requests} requests, "
+                f"{len(self.failures)} failed, {len(self.empty)} without data)")
+
+
+class FetchScheduler:
+    """Fetch a ticker universe in batches on a bounded thread pool.
+
+    Each provider call first takes a token from a shared :class:`TokenBucket`
+    (``rate`` calls per second). Failed calls are retried with exponential
+    backoff (``backoff * 2**attempt``, capped at ``max_backoff``, with a
+    little jitter); when a provider raises :class:`PartialFetchError`, only
+    the failed tickers are retried. Tickers that still fail after
+    ``max_retries`` retries are reported per ticker instead of failing the run.
+    """
+
+    def __init__(self, provider, batch_size=50, max_workers=4, rate=2.0, burst=None,
+                 max_retries=3, backoff=1.0, max_backoff=30.0, jitter=0.1,
+                 sleep=time.sleep, seed=None):
+        self.provider = provider
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.random = random.Random(seed)
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    def batches(self, tickers):
+        return [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+
+    def _delay(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        with self._lock:
+            return delay * (1 + self.jitter * self.random.random())
+
+    def _call(self, tickers, start, end):
+        self.bucket.acquire()
+        with self._lock:
+            self._requests += 1
+        return self.provider.fetch(tickers, start, end)
+
+    def _fetch_batch(self, tickers, start, end):
+        """Fetch one batch; returns ``(frames, failures)``."""
+        frames = []
+        pending = list(tickers)
+        errors = {}
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.sleep(self._delay(attempt - 1))
+            try:
+                frames.append(self._call(pending, start, end))
+                return frames, {}
+            except PartialFetchError as exc:
+                frames.append(exc.data)
+                errors = dict(exc.errors)
+                pending = [t for t in pending if t in errors]
+            except Exception as exc:
+                errors = {t: f"{type(exc).__name__}: {exc}" for t in pending}
+        return frames, errors
+
+    def run(self, tickers, start, end):
+        """Fetch ``tickers`` over ``[start, end)`` and return a :class:`FetchResult`."""
+        tickers = list(dict.fromkeys(tickers))
+        self._requests = 0
+        started = time.perf_counter()
+
+        frames, failures = [], {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._fetch_batch, batch, start, end) for batch in self.batches(tickers)]
+            for future in as_completed(futures):
+                batch_frames, batch_failures = future.result()
+                frames.extend(f for f in batch_frames if f is not None and len(f))
+                failures.update(batch_failures)
+
+        if frames:
+            data = pd.concat(frames, ignore_index=True)
+            data = data.drop_duplicates(['Date', 'Ticker'], keep='last')
+            data = data.sort_values(['Date', 'Ticker'], kind='stable').reset_index(drop=True)
+        else:
+            data = pd.DataFrame(columns=['Date', 'Ticker'] + FIELDS)
+
+        returned = set(data['Ticker'])
+        empty = [t for t in tickers if t not in returned and t not in failures]
+        elapsed = time.perf_counter() - started
+        return FetchResult(data, failures, empty, self._requests, elapsed, len(tickers))
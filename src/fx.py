@@ -0,0 +1,273 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from adjustments import PRICE_FIELDS
+from price_cache import LocalProvider, PriceStore
+from storage import get_store
+from valuation import parse_dates
+
+BASE_CURRENCY = 'USD'
+CURRENCY_COLUMN = 'Currency'
+REPORTING_ENV = 'REPORTING_CURRENCY'
+RATES_TABLE = 'fx_rates'
+FX_CACHE_DIR = 'data/cache/fx'
+
+RATE_COLUMNS = ['Date', 'Currency', 'Rate']
+DECOMPOSITION_COLUMNS = ['Ticker', 'Currency', 'Shares', 'Purchase_Date', 'Local_Purchase_Price',
+                         'Local_Current_Price', 'Purchase_FX_Rate', 'Current_FX_Rate', 'Local_Return_Pct',
+                         'FX_Return_Pct', 'Total_Return_Pct', 'Local_Gain', 'FX_Gain', 'Unrealized_Gain']
+
+
+def reporting_currency(currency=None):
+    """``currency``, else the ``REPORTING_CURRENCY`` environment variable, else USD."""
+    return (currency or os.environ.get(REPORTING_ENV) or BASE_CURRENCY).upper()
+
+
+def fx_ticker(currency):
+    """Yahoo symbol of the USD leg of ``currency``: ``EURUSD=X`` is USD per EUR."""
+    return f"{currency}{BASE_CURRENCY}=X"
+
+
+def holding_currencies(holdings):
+    """Currency of every holding row, USD where there is no ``Currency`` column or value."""
+    if CURRENCY_COLUMN not in holdings:
+        return pd.Series(BASE_CURRENCY, index=holdings.index, name=CURRENCY_COLUMN)
+    return holdings[CURRENCY_COLUMN].fillna(BASE_CURRENCY).astype(str).str.upper()
+
+
+def ticker_currencies(holdings):
+    """Listing currency per ticker; a ticker held in two currencies is an error."""
+    currencies = pd.DataFrame({'Ticker': holdings['Ticker'], CURRENCY_COLUMN: holding_currencies(holdings)})
+    currencies = currencies.drop_duplicates()
+    clashes = sorted(currencies.loc[currencies['Ticker'].duplicated(), 'Ticker'])
+    if clashes:
+        raise ValueError(f"Ticker(s) {clashes} appear with more than one currency")
+    return currencies.set_index('Ticker')[CURRENCY_COLUMN]
+
+
+def empty_rates():
+    return pd.DataFrame({'Date': pd.Series(dtype=str), 'Currency': pd.Series(dtype=str),
+                         'Rate': pd.Series(dtype='float64')})
+
+
+def normalize_rates(rates):
+    """Date/Currency/Rate rows, ``Rate`` in USD per unit, sorted with one row per date and currency."""
+    rates = rates[RATE_COLUMNS].copy()
+    rates['Date'] = pd.to_datetime(rates['Date']).dt.strftime('%Y-%m-%d')
+    rates['Currency'] = rates['Currency'].astype(str).str.upper()
+    rates['Rate'] = rates['Rate'].astype('float64')
+    rates = rates[rates['Rate'] > 0].drop_duplicates(['Date', 'Currency'], keep='last')
+    return rates.sort_values(['Currency', 'Date']).reset_index(drop=True)
+
+
+def read_rates(store=None):
+    """FX rates saved by step 1 (or dropped into data/raw by hand), or an empty table."""
+    store = store or get_store('data/raw')
+    if not store.exists(RATES_TABLE):
+        return empty_rates()
+    return normalize_rates(store.read(RATES_TABLE))
+
+
+def rates_fingerprint(rates):
+    """Hash of the FX rates; saved results in a converted currency are only reused while this matches."""
+    payload = normalize_rates(rates).to_csv(index=False).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+def file_provider(path):
+    """Stand-in provider serving the USD legs in a Date/Currency/Rate CSV as ``EURUSD=X``-style bars."""
+    rates = normalize_rates(pd.read_csv(path))
+    bars = pd.DataFrame({'Date': rates['Date'], 'Ticker': rates['Currency'].map(fx_ticker)})
+    for field in ['Open', 'High', 'Low', 'Close']:
+        bars[field] = rates['Rate'].to_numpy()
+    bars['Volume'] = 0.0
+    return LocalProvider(bars)
+
+
+def fetch_rates(provider, currencies, start, end, scheduler=None, root=FX_CACHE_DIR):
+    """USD legs of ``currencies`` over ``[start, end)`` through a :class:`price_cache.PriceStore`.
+
+    Only the series against USD are fetched and stored, one per currency
+    (crosses are triangulated by :class:`FxMatrix`), and only ranges the
+    cache under ``root`` does not cover yet. Returns ``(rates, failures)``.
+    """
+    symbols = {fx_ticker(currency): currency for currency in sorted(set(currencies) - {BASE_CURRENCY})}
+    if not symbols:
+        return empty_rates(), {}
+    cache = PriceStore(root)
+    _, failures = cache.update(provider, list(symbols), start, end, scheduler=scheduler)
+    bars = cache.load(list(symbols), start, end)
+    rates = pd.DataFrame({'Date': bars['Date'], 'Currency': bars['Ticker'].map(symbols), 'Rate': bars['Close']})
+    return normalize_rates(rates.dropna()), failures
+
+
+class FxMatrix:
+    """Daily dates x currencies matrix of USD per unit of each currency.
+
+    Only the USD legs are kept: N currencies need N series, and any cross
+    rate is triangulated as ``usd[base] / usd[quote]`` (and cached once
+    asked for). Missing days carry the last rate forward; dates before a
+    currency's first rate use that first rate.
+    """
+
+    def __init__(self, usd):
+        self.usd = usd
+        self._crosses = {}
+
+    @classmethod
+    def from_rates(cls, rates, dates=None):
+        """Build from Date/Currency/Rate rows (see :func:`read_rates`), on ``dates`` or the rates' own dates."""
+        rates = normalize_rates(rates)
+        usd = rates.pivot(index='Date', columns='Currency', values='Rate')
+        usd.index = pd.to_datetime(usd.index)
+        dates = usd.index if dates is None else pd.DatetimeIndex(dates)
+        usd = usd.reindex(usd.index.union(dates)).ffill().bfill().reindex(dates)
+        usd[BASE_CURRENCY] = 1.0
+        return cls(usd)
+
+    def _rows(self, dates):
+        """Row of the matrix in effect on each of ``dates``: the last one on or before it, else the first."""
+        rows = np.searchsorted(self.usd.index.to_numpy(dtype='datetime64[ns]'),
+                               pd.DatetimeIndex(dates).to_numpy(dtype='datetime64[ns]'), side='right') - 1
+        return np.clip(rows, 0, len(self.usd) - 1)
+
+    def _crosses_into(self, currencies, reporting):
+        """Dates x distinct-currencies matrix of :meth:`rate` into ``reporting``, and each input's column."""
+        codes, uniques = pd.factorize(np.asarray(currencies, dtype=object))
+        missing = sorted((set(uniques) | {reporting}) - set(self.usd.columns))
+        if missing:
+            raise ValueError(f"No FX rates for {missing}; add them to data/raw/{RATES_TABLE} or run step 1")
+        crosses = np.empty((len(self.usd), len(uniques)))
+        for column, currency in enumerate(uniques):
+            crosses[:, column] = self.rate(currency, reporting).to_numpy()
+        return crosses, codes
+
+    def rate(self, base, quote):
+        """Units of ``quote`` per unit of ``base`` on every date."""
+        key = (base, quote)
+        if key not in self._crosses:
+            self._crosses[key] = self.usd[base] / self.usd[quote]
+        return self._crosses[key]
+
+    def factors(self, currencies, reporting, dates=None):
+        """Dates x len(currencies) array converting each column's currency into ``reporting``.
+
+        Rows are the matrix dates, or ``dates`` looked up as in :meth:`rates_on`.
+        """
+        crosses, codes = self._crosses_into(currencies, reporting)
+        if dates is not None and not pd.DatetimeIndex(dates).equals(self.usd.index):
+            crosses = crosses[self._rows(dates)]
+        return crosses[:, codes]
+
+    def rates_on(self, dates, currencies, reporting):
+        """Conversion rate into ``reporting`` for each (date, currency) pair, on or before the date."""
+        crosses, codes = self._crosses_into(currencies, reporting)
+        return crosses[self._rows(dates), codes]
+
+    def convert(self, prices, currencies, reporting):
+        """A dates x tickers price frame in ``reporting``, ``currencies`` giving each column's currency.
+
+        One broadcast multiply by :meth:`factors`; columns already in the
+        reporting currency are multiplied by 1, and tickers missing from
+        ``currencies`` are taken to be USD.
+        """
+        currencies = currencies.reindex(prices.columns).fillna(BASE_CURRENCY).to_numpy()
+        return prices * self.factors(currencies, reporting, prices.index)
+
+
+def needs_conversion(holdings, reporting):
+    """Whether any holding is in a currency other than ``reporting``."""
+    return bool((holding_currencies(holdings) != reporting).any())
+
+
+def load_fx(dates=None, store=None):
+    """:class:`FxMatrix` of the saved rates, on ``dates`` or the dates they were saved for."""
+    return FxMatrix.from_rates(read_rates(store), dates)
+
+
+def to_reporting(holdings, prices, reporting=BASE_CURRENCY, store=None):
+    """:func:`reporting_view` with the saved rates, or the inputs untouched when nothing needs converting."""
+    if not needs_conversion(holdings, reporting):
+        return holdings, prices
+    return reporting_view(holdings, prices, load_fx(store=store), reporting)
+
+
+def market_to_reporting(holdings, market_data, reporting=BASE_CURRENCY, store=None):
+    """:func:`to_reporting` for long Date/Ticker price rows: holdings and rows restated with the saved rates."""
+    if not needs_conversion(holdings, reporting):
+        return holdings, market_data
+    fx = load_fx(store=store)
+    return reporting_holdings(holdings, fx, reporting), reporting_market_data(market_data, holdings, fx, reporting)
+
+
+def reporting_holdings(holdings, fx, reporting=BASE_CURRENCY):
+    """Holdings with each ``Purchase_Price`` converted into ``reporting`` at the rate on its purchase date."""
+    purchase_rate = fx.rates_on(parse_dates(holdings['Purchase_Date']), holding_currencies(holdings).to_numpy(),
+                                reporting)
+    return holdings.assign(Purchase_Price=holdings['Purchase_Price'].to_numpy(dtype='float64') * purchase_rate)
+
+
+def reporting_view(holdings, prices, fx, reporting=BASE_CURRENCY):
+    """Holdings and a dates x tickers price matrix restated in ``reporting``.
+
+    Prices are converted with :meth:`FxMatrix.convert` and purchase prices
+    with :func:`reporting_holdings`, so cost basis, value and every return
+    built on them are in the reporting currency.
+    """
+    return reporting_holdings(holdings, fx, reporting), fx.convert(prices, ticker_currencies(holdings), reporting)
+
+
+def reporting_market_data(market_data, holdings, fx, reporting=BASE_CURRENCY):
+    """Long Date/Ticker rows with Open/High/Low/Close converted into ``reporting`` at the rate on each row's date.
+
+    The long-format counterpart of :meth:`FxMatrix.convert`: each ticker's
+    currency comes from ``holdings``, and tickers not held are taken to be USD.
+    """
+    currencies = ticker_currencies(holdings).reindex(market_data['Ticker'].astype(str)).fillna(BASE_CURRENCY)
+    rate = fx.rates_on(pd.to_datetime(market_data['Date']), currencies.to_numpy(), reporting)
+    converted = market_data.copy()
+    for field in PRICE_FIELDS:
+        if field in converted:
+            converted[field] = converted[field].to_numpy(dtype='float64') * rate
+    return converted
+
+
+def fx_decomposition(holdings, current_prices, valuation_date, fx, reporting=BASE_CURRENCY):
+    """Per holding, its return since purchase split into local price and currency parts.
+
+    ``current_prices`` are in each ticker's own currency. With purchase
+    and current prices ``P0``, ``P1`` and rates into ``reporting`` ``X0``,
+    ``X1``: ``Local_Gain = shares x (P1 - P0) x X0`` and
+    ``FX_Gain = shares x P1 x (X1 - X0)``, which add up to the unrealized
+    gain in the reporting currency; the returns compound,
+    ``1 + total = (1 + local) x (1 + fx)``.
+    """
+    currencies = holding_currencies(holdings).to_numpy()
+    shares = holdings['Shares'].to_numpy(dtype='float64')
+    purchase_price = holdings['Purchase_Price'].to_numpy(dtype='float64')
+    current_price = current_prices.reindex(holdings['Ticker']).to_numpy(dtype='float64')
+    purchase_rate = fx.rates_on(parse_dates(holdings['Purchase_Date']), currencies, reporting)
+    current_rate = fx.rates_on(np.full(len(holdings), pd.Timestamp(valuation_date)), currencies, reporting)
+
+    local_return = current_price / purchase_price - 1
+    fx_return = current_rate / purchase_rate - 1
+    table = pd.DataFrame({
+        'Ticker': holdings['Ticker'].to_numpy(),
+        'Currency': currencies,
+        'Shares': shares,
+        'Purchase_Date': holdings['Purchase_Date'].to_numpy(),
+        'Local_Purchase_Price': purchase_price,
+        'Local_Current_Price': current_price,
+        'Purchase_FX_Rate': purchase_rate,
+        'Current_FX_Rate': current_rate,
+        'Local_Return_Pct': local_return * 100,
+        'FX_Return_Pct': fx_return * 100,
+        'Total_Return_Pct': ((1 + local_return) * (1 + fx_return) - 1) * 100,
+        'Local_Gain': shares * (current_price - purchase_price) * purchase_rate,
+        'FX_Gain': shares * current_price * (current_rate - purchase_rate),
+    })
+    table['Unrealized_Gain'] = table['Local_Gain'] + table['FX_Gain']
+    return table[DECOMPOSITION_COLUMNS]
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+from adjustments import adjusted_view
+from benchmark import BENCHMARKS, ROLLING_WINDOWS, benchmark_returns, portfolio_returns, rolling_relative_table
+from incremental_risk import holdings_fingerprint
+from portfolio_batch import PORTFOLIO_ID
+from powerbi_tables import TABLE_LAYOUT, daily_portfolio, date_dimension, rolling_risk_fact, stock_history_table
+from rolling_risk import WINDOWS
+from schema import SCHEMA_VERSION
+from valuation import price_matrix
+
+STATE_PATH = 'data/processed/powerbi_state.json'
+
+# Date-keyed tables that only ever gain rows; every other Power BI table is a small snapshot rewritten each run.
+APPEND_TABLES = ('dim_date', 'fact_daily_portfolio', 'fact_stock_history', 'fact_rolling_risk',
+                 'fact_benchmark_rolling')
+
+# Trading days of history behind the first new date that rolling tables need: the closes
+# behind a window of returns.
+LOOKBACK_ROWS = max(*WINDOWS, *ROLLING_WINDOWS) + 1
+
+
+def _last_rows(market_data, date):
+    """Each ticker's last row on or before ``date``."""
+    before = market_data[market_data['Date'] <= date]
+    return before.loc[before.groupby('Ticker', sort=False, observed=True)['Date'].idxmax()]
+
+
+def ticker_marks(market_data, factors, date):
+    """Per ticker, its raw, split-adjusted and total-return close on its last date up to ``date``.
+
+    A change in any of them (a price correction, or a new split or
+    dividend rescaling the backward-adjusted history) means rows already
+    exported are out of date.
+    """
+    rows = _last_rows(market_data, date)
+    closes = np.column_stack([rows['Close'].to_numpy(dtype='float64'),
+                              adjusted_view(rows, factors, 'adjusted')['Close'].to_numpy(dtype='float64'),
+                              adjusted_view(rows, factors, 'total_return')['Close'].to_numpy(dtype='float64')])
+    return {ticker: values.tolist() for ticker, values in zip(rows['Ticker'], closes)}
+
+
+def build_state(portfolio, timeseries, market_data, factors, store):
+    """High-water marks of the exported tables and what their last rows were built from."""
+    timeseries = timeseries.sort_values('Date')
+    portfolio_date = timeseries['Date'].iloc[-1]
+    market_date = market_data['Date'].max()
+    return {
+        'holdings': holdings_fingerprint(portfolio),
+        'storage': store.suffix,
+        'schema': SCHEMA_VERSION,
+        'first_date': timeseries['Date'].iloc[0].strftime('%Y-%m-%d'),
+        'portfolio_date': portfolio_date.strftime('%Y-%m-%d'),
+        'portfolio_value': float(timeseries['Portfolio_Value'].iloc[-1]),
+        'contributed': float(timeseries['Portfolio_Value'].iloc[0] + timeseries['Net_Flow'].iloc[1:].sum()),
+        'market_date': market_date.strftime('%Y-%m-%d'),
+        'tickers': ticker_marks(market_data, factors, market_date),
+    }
+
+
+def stale_reason(state, portfolio, timeseries, market_data, factors, store):
+    """Why the exported tables cannot be extended in place, or None if they can."""
+    if state.get('holdings') != holdings_fingerprint(portfolio):
+        return "Holdings changed since the last export"
+    if state.get('storage') != store.suffix:
+        return "Power BI storage format changed since the last export"
+    if state.get('schema') != SCHEMA_VERSION:
+        return "Power BI table layout changed since the last export"
+    missing = [name for name in APPEND_TABLES if not store.exists(name)]
+    if missing:
+        return f"{', '.join(missing)} missing from the export"
+    portfolio_date = pd.Timestamp(state['portfolio_date'])
+    saved = timeseries[timeseries['Date'] == portfolio_date]['Portfolio_Value']
+    if timeseries['Date'].min() != pd.Timestamp(state['first_date']) or len(saved) != 1 or \
+            not np.isclose(saved.iloc[0], state['portfolio_value'], rtol=1e-9):
+        return "Portfolio time series was recomputed"
+    marks = ticker_marks(market_data, factors, pd.Timestamp(state['market_date']))
+    if marks.keys() != state['tickers'].keys() or \
+            not all(np.allclose(marks[ticker], state['tickers'][ticker], rtol=1e-12, equal_nan=True)
+                    for ticker in marks):
+        return "Prices or adjustment factors of exported dates changed"
+    return None
+
+
+def _tail(market_data, timeseries, date):
+    """Market and portfolio rows from ``LOOKBACK_ROWS`` trading days before ``date`` onwards."""
+    dates = np.sort(market_data['Date'].unique())
+    start = dates[max(0, np.searchsorted(dates, np.datetime64(date), side='right') - 1 - LOOKBACK_ROWS)]
+    return market_data[market_data['Date'] >= start], timeseries[timeseries['Date'] >= start]
+
+
+def new_rows(state, portfolio, timeseries, market_data, factors, benchmarks=BENCHMARKS):
+    """Rows of :data:`APPEND_TABLES` after the saved high-water marks, keyed by table name.
+
+    Only the delta is computed: ``dim_date`` continues the calendar,
+    ``fact_daily_portfolio`` carries the contributed total forward, price
+    changes in ``fact_stock_history`` start from each ticker's last exported
+    close, and the rolling tables see just enough history for their windows.
+    """
+    portfolio_date = pd.Timestamp(state['portfolio_date'])
+    market_date = pd.Timestamp(state['market_date'])
+    rows = {}
+
+    fresh = timeseries[timeseries['Date'] > portfolio_date]
+    if len(fresh):
+        calendar = pd.DataFrame({'Date': [portfolio_date + pd.Timedelta(days=1), fresh['Date'].max()]})
+        rows['dim_date'] = date_dimension(calendar)
+        rows['fact_daily_portfolio'] = daily_portfolio(fresh, state['contributed'])
+
+    if market_data['Date'].max() > market_date:
+        seed = _last_rows(market_data, market_date)
+        history = stock_history_table(pd.concat([seed, market_data[market_data['Date'] > market_date]]), portfolio,
+                                      factors)
+        rows['fact_stock_history'] = history[history['Date'] > market_date].reset_index(drop=True)
+
+        tail_market, tail_timeseries = _tail(market_data, timeseries, market_date)
+        rows['fact_rolling_risk'] = rolling_risk_fact(tail_market, tail_timeseries, factors, since=market_date)
+
+        prices = price_matrix(adjusted_view(tail_market, factors, 'total_return'))
+        relative = rolling_relative_table(portfolio_returns(portfolio, prices), benchmark_returns(prices, benchmarks))
+        relative = relative[relative['Date'] > market_date].drop(columns=PORTFOLIO_ID)
+        rows['fact_benchmark_rolling'] = relative.reset_index(drop=True)
+    return rows
+
+
+def append_tables(store, tables):
+    """Append ``tables`` through ``store`` with each table's layout; returns the paths written."""
+    return [store.append(tables[name], name, **layout) for name, layout in TABLE_LAYOUT.items()
+            if name in tables and len(tables[name])]
+
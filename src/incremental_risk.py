@@ -0,0 +1,251 @@
+import bisect
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from covariance import return_matrix
+from returns import DAYS_PER_YEAR, irr, money_weighted, time_weighted
+
+RISK_FREE_RATE = 0.04
+TRADING_DAYS = 252
+STATE_PATH = 'data/processed/risk_state.json'
+
+TIMESERIES_COLUMNS = ['Date', 'Portfolio_Value', 'Net_Flow', 'Daily_Return', 'Cumulative_Return', 'Peak', 'Drawdown']
+
+
+def holdings_fingerprint(portfolio):
+    """Hash of the holdings table; saved state is only reused while this matches."""
+    payload = portfolio.to_csv(index=False).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+def build_timeseries(nav, flows=None):
+    """Net flow, time-weighted daily and cumulative return, peak and drawdown columns for a NAV series.
+
+    ``flows`` are the external cash flows on the NAV dates (see
+    :func:`returns.holdings_flows`); they are taken out of each day's change
+    in value so contributions are not counted as return. Without them every
+    change in value is return. Drawdowns are measured on the same
+    flow-adjusted growth index, ``1 + Cumulative_Return / 100``; ``Peak`` is
+    the portfolio value at which that index would be back at its high, so
+    ``Drawdown`` is still ``Portfolio_Value / Peak - 1``.
+    """
+    portfolio_ts = nav.rename_axis('Date').reset_index()
+    portfolio_ts['Net_Flow'] = 0.0 if flows is None else flows.reindex(nav.index, fill_value=0.0).to_numpy()
+    portfolio_ts = portfolio_ts[portfolio_ts['Portfolio_Value'] > 0]
+    daily_return, cumulative = time_weighted(portfolio_ts['Portfolio_Value'].to_numpy(),
+                                             portfolio_ts['Net_Flow'].to_numpy())
+    portfolio_ts['Daily_Return'] = daily_return
+    portfolio_ts['Cumulative_Return'] = cumulative
+    growth = 1 + cumulative / 100
+    high = np.maximum.accumulate(growth)
+    portfolio_ts['Peak'] = portfolio_ts['Portfolio_Value'].to_numpy() * high / growth
+    portfolio_ts['Drawdown'] = (growth / high - 1) * 100
+    return portfolio_ts
+
+
+def _metrics(total_return, days, volatility, max_drawdown, var_95, best, worst, money_weighted_return):
+    annualized_return = ((1 + total_return/100) ** (365/days) - 1) * 100
+    sharpe_ratio = (annualized_return/100 - RISK_FREE_RATE) / (volatility/100)
+    return {
+        'Total_Return_Pct': total_return,
+        'Annualized_Return_Pct': annualized_return,
+        'Money_Weighted_Return_Pct': money_weighted_return,
+        'Volatility_Pct': volatility,
+        'Sharpe_Ratio': sharpe_ratio,
+        'Max_Drawdown_Pct': max_drawdown,
+        'VaR_95_Pct': var_95,
+        'Best_Daily_Return_Pct': best * 100,
+        'Worst_Daily_Return_Pct': worst * 100,
+    }
+
+
+def summarize(portfolio_ts):
+    """Full-period risk metrics from a complete portfolio time series.
+
+    Total and annualized return are time-weighted; the money-weighted
+    return is the annualized IRR of the opening value, net flows and
+    closing value.
+    """
+    returns = portfolio_ts['Daily_Return'].dropna()
+    total_return = portfolio_ts['Cumulative_Return'].iloc[-1]
+    days = (portfolio_ts['Date'].iloc[-1] - portfolio_ts['Date'].iloc[0]).days
+    volatility = returns.std() * np.sqrt(TRADING_DAYS) * 100
+    var_95 = np.percentile(returns, 5) * 100
+    mwr = money_weighted(portfolio_ts['Portfolio_Value'].to_numpy(), portfolio_ts['Net_Flow'].to_numpy(),
+                         portfolio_ts['Date'].to_numpy())
+    return _metrics(total_return, days, volatility, portfolio_ts['Drawdown'].min(),
+                    var_95, returns.max(), returns.min(), mwr)
+
+
+def position_risk(prices, tickers):
+    """Full-history volatility and max drawdown per ticker from a dates x tickers matrix.
+
+    All tickers are done column-wise at once; a ticker's returns run from
+    one observed price to the next, as if its missing dates were dropped.
+    """
+    close = prices[list(tickers)]
+    returns = return_matrix(close).to_numpy()
+    values = close.to_numpy(dtype='float64')
+    with np.errstate(invalid='ignore'):
+        drawdown = (values / np.fmax.accumulate(values, axis=0) - 1) * 100
+    return pd.DataFrame({
+        'Ticker': list(tickers),
+        'Volatility': np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS) * 100,
+        'Max_Drawdown': np.nanmin(drawdown, axis=0),
+    })
+
+
+def _moments(values):
+    values = np.asarray(values, dtype='float64')
+    if len(values) == 0:
+        return 0, 0.0, 0.0
+    mean = values.mean()
+    return len(values), float(mean), float(((values - mean) ** 2).sum())
+
+
+def _welford(n, mean, m2, value):
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    m2 += delta * (value - mean)
+    return n, mean, m2
+
+
+def _std(n, m2):
+    return math.sqrt(m2 / (n - 1)) if n > 1 else float('nan')
+
+
+def _percentile(sorted_values, q):
+    """``np.percentile(values, q)`` (linear method) on an already sorted list, in O(1)."""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    a, b, t = sorted_values[lower], sorted_values[upper], position - lower
+    # Same lerp as numpy, which anchors on the nearer endpoint.
+    return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+
+def build_state(portfolio_ts, prices, portfolio):
+    """Running totals needed to extend the time series and metrics one day at a time."""
+    returns = portfolio_ts['Daily_Return'].dropna()
+    n, mean, m2 = _moments(returns)
+    flows = portfolio_ts.iloc[1:]
+    flows = flows[flows['Net_Flow'] != 0]
+    tickers = {}
+    for ticker in dict.fromkeys(portfolio['Ticker']):
+        close = prices[ticker].dropna()
+        t_n, t_mean, t_m2 = _moments(close.pct_change().dropna())
+        drawdown = (close / close.expanding(min_periods=1).max() - 1) * 100
+        tickers[ticker] = {
+            'last_close': float(close.iloc[-1]), 'peak': float(close.max()),
+            'max_drawdown': float(drawdown.min()), 'n': t_n, 'mean': t_mean, 'm2': t_m2,
+        }
+    return {
+        'holdings': holdings_fingerprint(portfolio),
+        'first_date': portfolio_ts['Date'].iloc[0].strftime('%Y-%m-%d'),
+        'last_date': portfolio_ts['Date'].iloc[-1].strftime('%Y-%m-%d'),
+        'last_market_date': prices.index[-1].strftime('%Y-%m-%d'),
+        'first_value': float(portfolio_ts['Portfolio_Value'].iloc[0]),
+        'last_value': float(portfolio_ts['Portfolio_Value'].iloc[-1]),
+        'growth': float(1 + portfolio_ts['Cumulative_Return'].iloc[-1] / 100),
+        'flows': [[date.strftime('%Y-%m-%d'), float(flow)] for date, flow in zip(flows['Date'], flows['Net_Flow'])],
+        'peak_growth': float((1 + portfolio_ts['Cumulative_Return'] / 100).max()),
+        'max_drawdown': float(portfolio_ts['Drawdown'].min()),
+        'n': n, 'mean': mean, 'm2': m2,
+        'best': float(returns.max()), 'worst': float(returns.min()),
+        'sorted_returns': sorted(float(r) for r in returns),
+        'tickers': tickers,
+    }
+
+
+def update_state(state, nav, prices, flows=None):
+    """Advance ``state`` over new dates and return the new time-series rows.
+
+    ``nav``, ``prices`` and ``flows`` cover only dates after
+    ``state['last_market_date']``. Work is proportional to the number of new dates.
+    """
+    flows = pd.Series(0.0, index=nav.index) if flows is None else flows.reindex(nav.index, fill_value=0.0)
+    rows = []
+    for date, value, flow in zip(nav.index, nav.to_numpy(), flows.to_numpy()):
+        if value <= 0:
+            continue
+        daily_return = (value - flow) / state['last_value'] - 1
+        state['growth'] *= 1 + daily_return
+        if flow != 0:
+            state['flows'].append([date.strftime('%Y-%m-%d'), float(flow)])
+        state['peak_growth'] = max(state['peak_growth'], state['growth'])
+        drawdown = (state['growth'] / state['peak_growth'] - 1) * 100
+        state['max_drawdown'] = min(state['max_drawdown'], drawdown)
+        state['n'], state['mean'], state['m2'] = _welford(state['n'], state['mean'], state['m2'], daily_return)
+        state['best'] = max(state['best'], daily_return)
+        state['worst'] = min(state['worst'], daily_return)
+        bisect.insort(state['sorted_returns'], daily_return)
+        state['last_value'] = float(value)
+        state['last_date'] = date.strftime('%Y-%m-%d')
+        rows.append({
+            'Date': date,
+            'Portfolio_Value': value,
+            'Net_Flow': flow,
+            'Daily_Return': daily_return,
+            'Cumulative_Return': (state['growth'] - 1) * 100,
+            'Peak': value * state['peak_growth'] / state['growth'],
+            'Drawdown': drawdown,
+        })
+
+    for ticker, ticker_state in state['tickers'].items():
+        if ticker not in prices:
+            continue
+        for close in prices[ticker].dropna():
+            ticker_return = close / ticker_state['last_close'] - 1
+            ticker_state['n'], ticker_state['mean'], ticker_state['m2'] = _welford(
+                ticker_state['n'], ticker_state['mean'], ticker_state['m2'], ticker_return)
+            ticker_state['peak'] = max(ticker_state['peak'], close)
+            ticker_state['max_drawdown'] = min(ticker_state['max_drawdown'], (close / ticker_state['peak'] - 1) * 100)
+            ticker_state['last_close'] = float(close)
+
+    if len(prices.index):
+        state['last_market_date'] = prices.index[-1].strftime('%Y-%m-%d')
+    return pd.DataFrame(rows, columns=TIMESERIES_COLUMNS)
+
+
+def state_summary(state):
+    """Risk metrics from saved state, matching :func:`summarize` on the full series."""
+    total_return = (state['growth'] - 1) * 100
+    days = (pd.Timestamp(state['last_date']) - pd.Timestamp(state['first_date'])).days
+    volatility = _std(state['n'], state['m2']) * np.sqrt(TRADING_DAYS) * 100
+    var_95 = _percentile(state['sorted_returns'], 5) * 100
+
+    # Investor cash flows: opening value in, each net flow in, closing value out.
+    dates = [state['first_date']] + [date for date, _ in state['flows']] + [state['last_date']]
+    cash = [-state['first_value']] + [-flow for _, flow in state['flows']] + [state['last_value']]
+    years = (pd.to_datetime(dates) - pd.Timestamp(state['first_date'])).days.to_numpy() / DAYS_PER_YEAR
+    mwr = irr(np.array(cash), years)[0] * 100
+    return _metrics(total_return, days, volatility, state['max_drawdown'], var_95, state['best'], state['worst'],
+                    mwr)
+
+
+def state_position_risk(state):
+    return pd.DataFrame([{
+        'Ticker': ticker,
+        'Volatility': _std(s['n'], s['m2']) * np.sqrt(TRADING_DAYS) * 100,
+        'Max_Drawdown': s['max_drawdown'],
+    } for ticker, s in state['tickers'].items()])
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(state, f)
+    return path
@@ -0,0 +1,205 @@
+import asyncio
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from powerbi_tables import holding_dimension
+
+SNAPSHOT_INTERVAL = 1.0
+# Running totals are recomputed from the position vector this often, so rounding cannot build up.
+RESYNC_TICKS = 100_000
+# Ticks applied between yields to the event loop when a source has them all at hand (a fast replay).
+YIELD_TICKS = 1_000
+TAIL_POLL = 0.25
+
+
+class LiveNavBook:
+    """In-memory position vector kept marked to the latest tick.
+
+    One slot per held ticker holds its shares, cost, asset class and last
+    price. NAV, unrealized gain and each asset class's value are running
+    totals, so :meth:`update` moves them by the one position's change in
+    value: constant work per tick however many positions there are.
+    ``factors`` convert each ticker's quote into the reporting currency.
+    The per-slot state is kept in plain lists, which index several times
+    faster than numpy arrays one element at a time.
+    """
+
+    def __init__(self, tickers, shares, cost, classes, prices, factors=None):
+        self.tickers = list(tickers)
+        self.slots = {ticker: slot for slot, ticker in enumerate(self.tickers)}
+        codes, self.classes = pd.factorize(pd.Series(classes))
+        factors = np.ones(len(self.tickers)) if factors is None else np.asarray(factors, dtype='float64')
+        self.shares = np.asarray(shares, dtype='float64').tolist()
+        self.class_codes = codes.tolist()
+        self.factors = factors.tolist()
+        self.prices = (np.asarray(prices, dtype='float64') * factors).tolist()
+        self.cost = float(np.sum(cost))
+        self.ticks = 0
+        self.last_time = None
+        self.resync()
+
+    @classmethod
+    def from_holdings(cls, portfolio, current_prices, factors=None):
+        """From a holdings table (lots of one ticker add up) and the last close per ticker.
+
+        A ticker without a close starts at its average purchase price.
+        ``factors`` maps ticker to currency conversion factor.
+        """
+        dim = holding_dimension(portfolio)
+        prices = current_prices.reindex(dim['Ticker']).to_numpy(dtype='float64')
+        prices = np.where(np.isnan(prices), dim['Purchase_Price'].to_numpy(dtype='float64'), prices)
+        if factors is not None:
+            factors = factors.reindex(dim['Ticker']).fillna(1.0).to_numpy()
+        return cls(dim['Ticker'], dim['Shares'], dim['Shares'] * dim['Purchase_Price'], dim['Asset_Class'], prices,
+                   factors)
+
+    def resync(self):
+        """Recompute the running totals from the position vector."""
+        values = np.multiply(self.shares, self.prices)
+        self.nav = float(values.sum())
+        self.class_values = np.bincount(self.class_codes, weights=values, minlength=len(self.classes)).tolist()
+
+    def update(self, ticker, price, time=None):
+        """Mark ``ticker`` to ``price``; ticks for tickers not held are ignored. Returns whether it was held."""
+        slot = self.slots.get(ticker)
+        if slot is None:
+            return False
+        price *= self.factors[slot]
+        change = self.shares[slot] * (price - self.prices[slot])
+        self.prices[slot] = price
+        self.nav += change
+        self.class_values[self.class_codes[slot]] += change
+        self.ticks += 1
+        if time is not None:
+            self.last_time = time
+        if self.ticks % RESYNC_TICKS == 0:
+            self.resync()
+        return True
+
+    @property
+    def unrealized_gain(self):
+        return self.nav - self.cost
+
+    def snapshot(self):
+        """NAV, unrealized gain and asset-class weights as one flat row."""
+        gain = self.unrealized_gain
+        row = {
+            'Timestamp': None if self.last_time is None else pd.Timestamp(self.last_time),
+            'Ticks': self.ticks,
+            'Portfolio_Value': self.nav,
+            'Cost_Basis': self.cost,
+            'Unrealized_Gain': gain,
+            'Unrealized_Gain_Pct': gain / self.cost * 100 if self.cost else math.nan,
+        }
+        for asset_class, value in zip(self.classes, self.class_values):
+            row[f"{asset_class}_Weight_Pct"] = value / self.nav * 100 if self.nav else math.nan
+        return row
+
+
+def parse_tick(line):
+    """``(time, ticker, price)`` from a ``timestamp,ticker,price`` or ``ticker,price`` line, or None."""
+    parts = [part.strip() for part in line.split(',')]
+    try:
+        if len(parts) == 3:
+            return pd.Timestamp(parts[0]), parts[1], float(parts[2])
+        if len(parts) == 2:
+            return pd.Timestamp.now(), parts[0], float(parts[1])
+    except ValueError:
+        pass
+    return None
+
+
+async def replay_ticks(bars, speed=None, field='Close'):
+    """Stored long Date/Ticker bars as ticks in time order.
+
+    ``speed`` replays that many times faster than the bars' own clock (60:
+    a minute of bars per second); without it, as fast as they can be applied.
+    """
+    bars = bars.sort_values('Date', kind='stable')
+    times = pd.to_datetime(bars['Date']).to_numpy()
+    tickers = bars['Ticker'].astype(str).tolist()
+    prices = bars[field].to_numpy(dtype='float64').tolist()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for row in range(len(bars)):
+        if speed:
+            due = started + (times[row] - times[0]) / np.timedelta64(1, 's') / speed
+            if due > loop.time():
+                await asyncio.sleep(due - loop.time())
+        elif row % YIELD_TICKS == 0:
+            await asyncio.sleep(0)
+        yield times[row], tickers[row], prices[row]
+
+
+async def tail_ticks(path, poll=TAIL_POLL, from_start=False):
+    """Tick lines appended to ``path`` (see :func:`parse_tick`), following the file like ``tail -f``."""
+    with open(path, encoding='utf-8') as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        pending = ''
+        while True:
+            line = f.readline()
+            if not line:
+                await asyncio.sleep(poll)
+                continue
+            pending += line
+            if not pending.endswith('\n'):
+                continue
+            tick, pending = parse_tick(pending), ''
+            if tick is not None:
+                yield tick
+
+
+async def socket_ticks(host='127.0.0.1', port=9999):
+    """Tick lines (see :func:`parse_tick`) written by any number of clients connected to ``host:port``."""
+    queue = asyncio.Queue()
+
+    async def receive(reader, writer):
+        try:
+            while line := await reader.readline():
+                tick = parse_tick(line.decode('utf-8'))
+                if tick is not None:
+                    await queue.put(tick)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(receive, host, port)
+    async with server:
+        while True:
+            yield await queue.get()
+
+
+async def stream_nav(book, ticks, publish, interval=SNAPSHOT_INTERVAL):
+    """Apply ``ticks`` to ``book`` and call ``publish(snapshot)`` every ``interval`` seconds.
+
+    Ticks are applied as they arrive; snapshots come from a separate task on
+    the same loop, so however fast ticks come in, ``publish`` runs at most
+    once per interval, and not at all for an interval without new ticks.
+    When the source ends (or the task is cancelled) a final snapshot is
+    published. Returns the book.
+    """
+    published = None
+
+    def publish_changes():
+        nonlocal published
+        if book.ticks != published:
+            published = book.ticks
+            publish(book.snapshot())
+
+    async def publisher():
+        while True:
+            await asyncio.sleep(interval)
+            publish_changes()
+
+    task = asyncio.create_task(publisher())
+    try:
+        async for time, ticker, price in ticks:
+            book.update(ticker, price, time)
+    finally:
+        task.cancel()
+        book.resync()
+        publish_changes()
+    return book
@@ -0,0 +1,203 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from schema import PRICE_DTYPE
+from valuation import price_matrix
+
+MATRIX_DIR = 'data/processed/price_matrix'
+SOURCE_TABLE = 'market_data_clean'
+FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+CHUNK_COLUMNS = 512
+META_FILE = 'meta.json'
+
+
+def source_signature(store, name=SOURCE_TABLE):
+    """Size and modification time of a stored table, or None for stores that are not files (SQL)."""
+    path = store.path(name)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _positions(index, values, parse):
+    """Position of each of ``values`` in ``index`` (-1 if absent), parsing and looking up each distinct value once."""
+    codes, uniques = pd.factorize(values)
+    return index.get_indexer(parse(uniques))[codes]
+
+
+def _tickers(values):
+    return pd.Index(np.asarray(values, dtype=object).astype(str))
+
+
+def field_dtype(field):
+    # Quotes follow schema.PRICE_DTYPE; Volume is float64 so a missing bar can be NaN.
+    return 'float64' if field == 'Volume' else PRICE_DTYPE
+
+
+class MatrixStore:
+    """Dates x tickers price arrays memory-mapped from ``.npy`` files under ``root``.
+
+    Each field is one contiguous, C-ordered array with a row per date and a
+    column per ticker, missing prices as NaN; ``dates`` and ``tickers`` map
+    rows and columns back to labels. Opening maps the files instead of
+    reading them, so slices are views of the OS page cache: only the pages
+    touched are read, the arrays can be larger than memory, and every
+    process mapping the same files shares one copy.
+    """
+
+    def __init__(self, root=MATRIX_DIR):
+        self.root = root
+        with open(os.path.join(root, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.fields = self.meta['fields']
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(root, 'dates.npy')), name='Date')
+        self.tickers = pd.Index(np.load(os.path.join(root, 'tickers.npy')).tolist(), name='Ticker')
+        self._arrays = {}
+
+    @classmethod
+    def build(cls, chunks, root=MATRIX_DIR, fields=('Close',), source=None):
+        """Write the arrays from long Date/Ticker rows and open them.
+
+        ``chunks`` is a callable returning an iterable of long frames, such
+        as a store's ``read_chunks``. It is called twice, once to collect the
+        dates and tickers and once to scatter the prices into place, so only
+        one chunk is ever in memory. ``source`` (see :func:`source_signature`)
+        is saved so :func:`open_matrix` can tell when the table has changed.
+        The new files are written beside ``root`` and moved into place, so
+        processes that still map the old ones keep reading them unharmed.
+        """
+        dates, tickers = pd.DatetimeIndex([]), pd.Index([], dtype=str)
+        for chunk in chunks():
+            dates = dates.union(pd.to_datetime(pd.Index(chunk['Date'].unique())))
+            tickers = tickers.union(_tickers(chunk['Ticker'].unique()))
+        dates, tickers = dates.sort_values(), tickers.sort_values()
+
+        staging = root.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        np.save(os.path.join(staging, 'dates.npy'), dates.to_numpy())
+        np.save(os.path.join(staging, 'tickers.npy'), tickers.to_numpy(dtype=str))
+        arrays = {}
+        for field in fields:
+            arrays[field] = np.lib.format.open_memmap(os.path.join(staging, f"{field}.npy"), mode='w+',
+                                                      dtype=field_dtype(field), shape=(len(dates), len(tickers)))
+            arrays[field][:] = np.nan
+        for chunk in chunks():
+            rows = _positions(dates, chunk['Date'], pd.to_datetime)
+            cols = _positions(tickers, chunk['Ticker'], _tickers)
+            for field in fields:
+                arrays[field][rows, cols] = chunk[field].to_numpy(dtype=arrays[field].dtype)
+        for array in arrays.values():
+            array.flush()
+        del arrays
+        with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'fields': list(fields), 'source': source}, f)
+
+        shutil.rmtree(root, ignore_errors=True)
+        os.replace(staging, root)
+        return cls(root)
+
+    @classmethod
+    def from_store(cls, store, name=SOURCE_TABLE, root=MATRIX_DIR, fields=('Close',)):
+        """:meth:`build` from a stored long table, read a chunk at a time."""
+        columns = ['Date', 'Ticker', *fields]
+        return cls.build(lambda: store.read_chunks(name, columns=columns), root, fields,
+                         source=source_signature(store, name))
+
+    def array(self, field='Close'):
+        """The read-only memory-mapped dates x tickers array of ``field``."""
+        if field not in self._arrays:
+            if field not in self.fields:
+                raise KeyError(f"{field} is not in the price matrix at {self.root} (fields: {self.fields})")
+            self._arrays[field] = np.load(os.path.join(self.root, f"{field}.npy"), mmap_mode='r')
+        return self._arrays[field]
+
+    def _rows(self, after):
+        return slice(0 if after is None else self.dates.searchsorted(pd.Timestamp(after), side='right'), None)
+
+    def _columns(self, tickers):
+        """Sorted columns of the known ``tickers``, as a slice when they are adjacent."""
+        if tickers is None:
+            return slice(None)
+        columns = np.unique(self.tickers.get_indexer(list(tickers)))
+        columns = columns[columns >= 0]
+        if len(columns) and columns[-1] - columns[0] == len(columns) - 1:
+            return slice(columns[0], columns[-1] + 1)
+        return columns
+
+    def frame(self, tickers=None, field='Close', after=None):
+        """Dates x tickers frame of ``field`` for dates after ``after``, like :func:`valuation.price_matrix`.
+
+        Unknown tickers are left out. Every ticker, or any run of adjacent
+        ones, is a zero-copy view of the mapped file; scattered tickers are
+        gathered into a copy of just their columns.
+        """
+        rows, columns = self._rows(after), self._columns(tickers)
+        return pd.DataFrame(self.array(field)[rows, columns], index=self.dates[rows],
+                            columns=self.tickers[columns], copy=False)
+
+    def column_chunks(self, tickers=None, field='Close', after=None, chunk_columns=CHUNK_COLUMNS):
+        """:meth:`frame` ``chunk_columns`` tickers at a time."""
+        columns = self.tickers if tickers is None else self.tickers[self._columns(tickers)]
+        for first in range(0, len(columns), chunk_columns):
+            yield self.frame(columns[first:first + chunk_columns], field, after)
+
+    def prices(self, tickers=None, prepare=None, after=None, chunk_columns=CHUNK_COLUMNS):
+        """float64 closes of ``tickers``, built a chunk of columns at a time.
+
+        ``prepare`` turns each chunk into the price view wanted (adjustment,
+        currency conversion); it must work column by column. Peak memory is
+        the result plus one chunk's temporaries, however many tickers there are.
+        """
+        columns = self.tickers if tickers is None else self.tickers[self._columns(tickers)]
+        dates = self.dates[self._rows(after)]
+        values = np.empty((len(dates), len(columns)))
+        for first in range(0, len(columns), chunk_columns):
+            block = self.frame(columns[first:first + chunk_columns], 'Close', after).astype('float64')
+            if prepare is not None:
+                block = prepare(block)
+            values[:, first:first + chunk_columns] = block.to_numpy(dtype='float64')
+        return pd.DataFrame(values, index=dates, columns=columns)
+
+    def latest(self, field='Close'):
+        """Last date and each ticker's ``field`` on it, leaving out tickers without a price that day."""
+        row = pd.Series(self.array(field)[-1], index=self.tickers, name=field)
+        return self.dates[-1], row.dropna()
+
+
+def open_matrix(store, name=SOURCE_TABLE, root=MATRIX_DIR):
+    """The matrix built from ``store``'s ``name`` table, or None if there is none or the table changed since.
+
+    Also None for stores without a file signature (SQL), where a change to the
+    table could not be detected.
+    """
+    source = source_signature(store, name)
+    if source is None or not os.path.exists(os.path.join(root, META_FILE)):
+        return None
+    matrix = MatrixStore(root)
+    if matrix.meta.get('source') != source:
+        return None
+    return matrix
+
+
+def read_prices(store, tickers=None, prepare=None, after=None):
+    """float64 closes of ``tickers`` (every ticker when None) for dates after ``after``.
+
+    Read from the memory-mapped matrix a chunk of columns at a time when it
+    is current (see :meth:`MatrixStore.prices`), else by pivoting the long
+    table. Either way the frame keeps every market date, as
+    :func:`valuation.price_matrix` of the whole table does.
+    """
+    matrix = open_matrix(store)
+    if matrix is not None:
+        return matrix.prices(tickers, prepare, after)
+    filters = None if after is None else [('Date', '>', pd.Timestamp(after))]
+    prices = price_matrix(store.read(SOURCE_TABLE, filters=filters))
+    if tickers is not None:
+        prices = prices.loc[:, prices.columns.isin(list(tickers))]
+    return prices if prepare is None else prepare(prices)
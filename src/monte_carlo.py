@@ -0,0 +1,159 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from rolling_risk import PORTFOLIO_KEY
+from valuation import parse_dates
+
+HORIZONS = (1, 10, 21)
+CONFIDENCE_LEVELS = (0.95, 0.99)
+CHUNK_PATHS = 20_000
+MAX_CHUNK_FLOATS = 4_000_000
+
+
+def daily_returns(prices):
+    """Complete-case daily returns (dates x tickers) for the covariance estimate."""
+    return prices.pct_change(fill_method=None).dropna(how='any')
+
+
+def cholesky(covariance):
+    """Cholesky factor, adding the smallest diagonal jitter that makes ``covariance`` positive definite."""
+    jitter = 0.0
+    scale = np.trace(covariance) / len(covariance) if len(covariance) else 1.0
+    for _ in range(10):
+        try:
+            return np.linalg.cholesky(covariance + jitter * np.eye(len(covariance)))
+        except np.linalg.LinAlgError:
+            jitter = scale * 1e-10 if jitter == 0 else jitter * 10
+    raise np.linalg.LinAlgError("covariance matrix is not positive definite")
+
+
+def position_values(portfolio, prices):
+    """Current market value per ticker of positions held at the last price date."""
+    latest = prices.ffill().iloc[-1]
+    held = parse_dates(portfolio['Purchase_Date']) <= prices.index[-1]
+    holdings = portfolio[held.to_numpy()]
+    values = holdings['Shares'].to_numpy() * latest.reindex(holdings['Ticker']).to_numpy()
+    return pd.Series(values, index=holdings['Ticker'].to_numpy()).groupby(level=0, sort=False).sum()
+
+
+def _simulate_chunk(task):
+    """Worst ``tail`` P&L outcomes per (horizon, column) for one chunk of paths."""
+    seed, n_paths, mu, chol, history, values, horizons, tail = task
+    rng = np.random.default_rng(seed)
+    n_assets, max_h = len(values), max(horizons)
+
+    if history is not None:
+        days = rng.integers(0, len(history), size=(n_paths, max_h))
+        returns = history[days]
+    else:
+        shocks = rng.standard_normal((n_paths, max_h, n_assets))
+        returns = shocks @ chol.T + mu
+
+    growth = np.cumprod(1.0 + returns, axis=1)
+    worst = {}
+    for h in horizons:
+        pnl = (growth[:, h - 1, :] - 1.0) * values
+        pnl = np.column_stack([pnl, pnl.sum(axis=1)])
+        k = min(tail, n_paths)
+        worst[h] = np.partition(pnl, k - 1, axis=0)[:k] if k < n_paths else pnl
+    return worst
+
+
+def _merge_tail(worst, chunk, tail):
+    """Fold one chunk's worst outcomes into the running worst ``tail`` per horizon."""
+    for h, pnl in chunk.items():
+        if h in worst:
+            pnl = np.vstack([worst[h], pnl])
+        if len(pnl) > tail:
+            pnl = np.partition(pnl, tail - 1, axis=0)[:tail]
+        worst[h] = pnl
+
+
+def _chunk_sizes(n_paths, n_assets, max_h, chunk_paths):
+    per_path = max(1, n_assets * max_h)
+    size = max(1, min(chunk_paths, MAX_CHUNK_FLOATS // per_path))
+    sizes = [size] * (n_paths // size)
+    if n_paths % size:
+        sizes.append(n_paths % size)
+    return sizes
+
+
+def simulate_var(returns, values, n_paths=100_000, horizons=HORIZONS, confidence_levels=CONFIDENCE_LEVELS,
+                 method='parametric', seed=42, workers=1, chunk_paths=CHUNK_PATHS):
+    """Monte Carlo VaR and CVaR per position and for the portfolio.
+
+    ``returns`` is a dates x tickers frame of daily returns and ``values`` the
+    current market value per ticker. ``method='parametric'`` draws correlated
+    normal daily returns through the Cholesky factor of the sample
+    covariance; ``'bootstrap'`` resamples whole historical days, keeping the
+    empirical cross-section. Paths compound daily returns over each horizon.
+
+    Paths are generated in chunks so memory stays bounded, and each chunk
+    keeps only its worst ``ceil((1 - min(confidence)) * n_paths)`` outcomes,
+    which is all VaR and CVaR need. Chunk seeds are spawned from ``seed``, so
+    results are identical for any number of ``workers``.
+
+    Returns ``(table, stats)``: a long Ticker/Horizon_Days/Confidence table
+    with VaR and CVaR as P&L amounts (negative = loss) and as % of value, and
+    a dict with the path count, elapsed seconds and paths/sec.
+    """
+    tickers = list(values.index)
+    returns = returns[tickers]
+    value_vector = values.to_numpy(dtype='float64')
+    horizons = tuple(sorted(horizons))
+    tail = math.ceil((1 - min(confidence_levels)) * n_paths)
+
+    if method == 'parametric':
+        mu = returns.mean().to_numpy()
+        chol = cholesky(np.cov(returns.to_numpy(), rowvar=False).reshape(len(tickers), len(tickers)))
+        history = None
+    elif method == 'bootstrap':
+        mu = chol = None
+        history = returns.to_numpy()
+    else:
+        raise ValueError(f"Unknown method '{method}'. Choose 'parametric' or 'bootstrap'.")
+
+    sizes = _chunk_sizes(n_paths, len(tickers), max(horizons), chunk_paths)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(s, n, mu, chol, history, value_vector, horizons, tail) for s, n in zip(seeds, sizes)]
+
+    started = time.perf_counter()
+    worst = {}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk in pool.map(_simulate_chunk, tasks):
+                _merge_tail(worst, chunk, tail)
+    else:
+        for task in tasks:
+            _merge_tail(worst, _simulate_chunk(task), tail)
+
+    columns = tickers + [PORTFOLIO_KEY]
+    total_values = np.append(value_vector, value_vector.sum())
+    rows = []
+    for h in horizons:
+        tail_pnl = np.sort(worst[h], axis=0)
+        for confidence in confidence_levels:
+            n_tail = max(1, math.ceil((1 - confidence) * n_paths))
+            var = tail_pnl[n_tail - 1]
+            cvar = tail_pnl[:n_tail].mean(axis=0)
+            for i, column in enumerate(columns):
+                rows.append({
+                    'Ticker': column,
+                    'Horizon_Days': h,
+                    'Confidence': confidence,
+                    'Method': method,
+                    'Position_Value': total_values[i],
+                    'VaR': var[i],
+                    'CVaR': cvar[i],
+                    'VaR_Pct': var[i] / total_values[i] * 100,
+                    'CVaR_Pct': cvar[i] / total_values[i] * 100,
+                })
+    elapsed = time.perf_counter() - started
+
+    stats = {'paths': n_paths, 'chunks': len(sizes), 'workers': workers,
+             'seconds': elapsed, 'paths_per_sec': n_paths / elapsed if elapsed else float('inf')}
+    return pd.DataFrame(rows), stats
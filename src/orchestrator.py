@@ -0,0 +1,243 @@
+import glob
+import hashlib
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+CACHE_DIR = 'data/cache/pipeline'
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_digest(path):
+    """sha1 of a file, or of every file under a directory (partitioned Parquet tables)."""
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, '**', '*'), recursive=True))
+    else:
+        files = [path]
+    for name in files:
+        if not os.path.isfile(name):
+            continue
+        digest.update(os.path.relpath(name, path).encode('utf-8'))
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def code_version(src_dir=SRC_DIR):
+    """sha1 of the shared library modules, so a code change invalidates cached stages."""
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(src_dir, '*.py'))):
+        if os.path.basename(path)[:1].isdigit():
+            continue
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Stage:
+    """One node of the pipeline DAG.
+
+    ``func`` is called with the outputs of ``deps`` as keyword arguments
+    (named after the dependency) plus ``params``. ``sources`` are files whose
+    contents feed the cache key. ``publish`` receives the output after a run
+    and writes it wherever the stand-alone scripts would; ``published``
+    returns whether what it wrote is still in place, so a cached stage whose
+    files were deleted publishes again from the cache. ``cache=False``
+    marks cheap stages (file loads, pivots) that are recomputed instead of
+    stored.
+    """
+
+    def __init__(self, name, func, deps=(), params=None, sources=(), publish=None, published=None, cache=True):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = dict(params or {})
+        self.sources = tuple(sources)
+        self.publish = publish
+        self.published = published
+        self.cache = cache
+
+    def key(self, dep_keys, version):
+        """Hash of the code version, parameters, source file contents and upstream keys."""
+        digest = hashlib.sha1()
+        digest.update(f"{self.name}\0{version}\0{sorted(self.params.items())!r}".encode('utf-8'))
+        for path in self.sources:
+            digest.update(f"\0{path}\0{file_digest(path) if os.path.exists(path) else '-'}".encode('utf-8'))
+        for dep in self.deps:
+            digest.update(f"\0{dep}\0{dep_keys[dep]}".encode('utf-8'))
+        return digest.hexdigest()
+
+
+class StageCache:
+    """Pickled stage outputs under ``root``, one file per stage named by its key."""
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+
+    def path(self, name, key):
+        return os.path.join(self.root, f"{name}-{key[:16]}.pkl")
+
+    def has(self, name, key):
+        return os.path.exists(self.path(name, key))
+
+    def load(self, name, key):
+        with open(self.path(name, key), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, name, key, output):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(name, key)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for stale in glob.glob(os.path.join(self.root, f"{name}-*.pkl")):
+            if stale != path:
+                os.remove(stale)
+        return path
+
+
+def topological_order(stages):
+    by_name = {stage.name: stage for stage in stages}
+    order, state = [], {}
+
+    def visit(name):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Pipeline has a cycle through stage '{name}'")
+        if name not in by_name:
+            raise ValueError(f"Unknown stage '{name}'")
+        state[name] = 'visiting'
+        for dep in by_name[name].deps:
+            visit(dep)
+        state[name] = 'done'
+        order.append(by_name[name])
+
+    for stage in stages:
+        visit(stage.name)
+    return order
+
+
+def plan(stages, cache, force=()):
+    """Keys plus the action for every stage: ``'run'``, ``'load'``, ``'publish'`` or ``'skip'``.
+
+    A cacheable stage runs when its key is not cached (or it is forced);
+    otherwise it is loaded from the cache and published again if its
+    published outputs are missing, and else skipped, unless a running stage
+    needs its output, in which case it is loaded. Uncached stages run only
+    when something downstream runs.
+    """
+    order = topological_order(stages)
+    version = code_version()
+    keys = {}
+    for stage in order:
+        keys[stage.name] = stage.key(keys, version)
+
+    actions = {}
+    for stage in order:
+        if stage.cache and (stage.name in force or cache is None or not cache.has(stage.name, keys[stage.name])):
+            actions[stage.name] = 'run'
+        elif stage.cache and stage.published is not None and not stage.published():
+            actions[stage.name] = 'publish'
+
+    by_name = {stage.name: stage for stage in order}
+    pending = [name for name, action in actions.items() if action == 'run']
+    while pending:
+        for dep in by_name[pending.pop()].deps:
+            if dep in actions:
+                continue
+            if by_name[dep].cache:
+                actions[dep] = 'load'
+            else:
+                actions[dep] = 'run'
+                pending.append(dep)
+    for stage in order:
+        actions.setdefault(stage.name, 'skip')
+    return order, keys, actions
+
+
+def run_pipeline(stages, cache=None, workers=4, force=(), log=print):
+    """Run the DAG in this process, passing outputs between stages in memory.
+
+    Stages whose inputs are ready run concurrently on a thread pool of
+    ``workers`` threads; stage functions must not modify their inputs.
+    Returns ``(outputs, timings)``; ``timings`` holds one dict per stage with
+    its action, start offset, seconds and thread, plus the wall time
+    (including hashing the sources to plan the run) under ``'_total'``.
+    """
+    started = time.perf_counter()
+    order, keys, actions = plan(stages, cache, force)
+    outputs, timings = {}, {}
+    lock = threading.Lock()
+
+    def execute(stage):
+        begin = time.perf_counter()
+        if actions[stage.name] in ('load', 'publish'):
+            output = cache.load(stage.name, keys[stage.name])
+            if actions[stage.name] == 'publish':
+                stage.publish(output)
+        else:
+            with lock:
+                inputs = {dep: outputs[dep] for dep in stage.deps}
+            output = stage.func(**inputs, **stage.params)
+            if stage.publish is not None:
+                stage.publish(output)
+            if stage.cache and cache is not None:
+                cache.save(stage.name, keys[stage.name], output)
+        end = time.perf_counter()
+        return output, {'action': actions[stage.name], 'start': begin - started, 'seconds': end - begin,
+                        'thread': threading.current_thread().name}
+
+    def ready(stage):
+        return actions[stage.name] in ('load', 'publish') or all(dep in outputs for dep in stage.deps)
+
+    waiting = [stage for stage in order if actions[stage.name] != 'skip']
+    for stage in order:
+        if actions[stage.name] == 'skip':
+            timings[stage.name] = {'action': 'skip', 'start': 0.0, 'seconds': 0.0, 'thread': '-'}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='stage') as pool:
+        running = {}
+        while waiting or running:
+            for stage in [stage for stage in waiting if ready(stage)]:
+                waiting.remove(stage)
+                running[pool.submit(execute, stage)] = stage
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    output, timing = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+                with lock:
+                    outputs[stage.name] = output
+                timings[stage.name] = timing
+                if log is not None:
+                    log(f"  {timing['action']:<7} {stage.name:<18} {timing['seconds']:>8.2f}s")
+
+    timings['_total'] = {'seconds': time.perf_counter() - started}
+    return outputs, {name: timings[name] for name in [stage.name for stage in order] + ['_total']}
+
+
+def timing_report(timings):
+    """Per-stage timing table; the last line compares wall time with summed stage time."""
+    lines = [f"{'Stage':<18} {'Action':<7} {'Start (s)':>10} {'Seconds':>9}  {'Thread':<10}", "-" * 60]
+    busy = 0.0
+    for name, timing in timings.items():
+        if name == '_total':
+            continue
+        busy += timing['seconds']
+        start = f"{timing['start']:.2f}" if timing['action'] != 'skip' else '-'
+        lines.append(f"{name:<18} {timing['action']:<7} {start:>10} {timing['seconds']:>9.2f}  {timing['thread']:<10}")
+    lines.append("-" * 60)
+    total = timings['_total']['seconds']
+    lines.append(f"{'Wall time':<18} {'':<7} {'':>10} {total:>9.2f}  "
+                 f"(stage time {busy:.2f}s, {busy / total if total else 0:.1f}x overlap)")
+    return "\n".join(lines)
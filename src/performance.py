@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from valuation import parse_dates
+
+PERFORMANCE_COLUMNS = ['Ticker', 'Asset_Name', 'Asset_Class', 'Shares', 'Purchase_Date', 'Purchase_Price',
+                       'Current_Price', 'Cost_Basis', 'Current_Value', 'Unrealized_Gain', 'Unrealized_Gain_Pct',
+                       'Days_Held']
+
+
+def latest_prices(market_data):
+    """Valuation date and the close of every ticker on it, from long Date/Ticker rows."""
+    latest_date = market_data['Date'].max()
+    latest = market_data[market_data['Date'] == latest_date]
+    return latest_date, latest.set_index('Ticker')['Close']
+
+
+def position_performance(portfolio, current_prices, valuation_date):
+    """Cost basis, value, unrealized gain and days held for every lot, as column operations.
+
+    ``current_prices`` maps ticker to price. Purchase dates go through
+    :func:`valuation.parse_dates`, which parses each distinct string once.
+    """
+    shares = portfolio['Shares'].to_numpy()
+    purchase_price = portfolio['Purchase_Price'].to_numpy()
+    current_price = current_prices.reindex(portfolio['Ticker']).to_numpy()
+
+    cost_basis = shares * purchase_price
+    current_value = shares * current_price
+    unrealized_gain = current_value - cost_basis
+    purchase_dates = parse_dates(portfolio['Purchase_Date']).to_numpy()
+    days_held = (pd.Timestamp(valuation_date).to_datetime64() - purchase_dates) // np.timedelta64(1, 'D')
+
+    results = portfolio[PERFORMANCE_COLUMNS[:6]].reset_index(drop=True)
+    results['Current_Price'] = current_price
+    results['Cost_Basis'] = cost_basis
+    results['Current_Value'] = current_value
+    results['Unrealized_Gain'] = unrealized_gain
+    results['Unrealized_Gain_Pct'] = (unrealized_gain / cost_basis) * 100
+    results['Days_Held'] = days_held
+    return results
+
+
+def _position_blocks(results):
+    lines = []
+    for ticker, asset_name, shares, purchase_price, current_price, purchase_date, days_held, \
+            cost_basis, current_value, unrealized_gain, unrealized_gain_pct in zip(
+            results['Ticker'], results['Asset_Name'], results['Shares'], results['Purchase_Price'],
+            results['Current_Price'], results['Purchase_Date'], results['Days_Held'], results['Cost_Basis'],
+            results['Current_Value'], results['Unrealized_Gain'], results['Unrealized_Gain_Pct']):
+        lines.append(
+            f"\n{ticker} - {asset_name}\n"
+            f"  {'Shares:':<20} {shares:>12,.0f}\n"
+            f"  {'Purchase Price:':<20} ${purchase_price:>11,.2f}\n"
+            f"  {'Current Price:':<20} ${current_price:>11,.2f}\n"
+            f"  {'Purchase Date:':<20} {purchase_date:>12}\n"
+            f"  {'Days Held:':<20} {days_held:>12,}\n"
+            f"  {'-'*35}\n"
+            f"  {'Cost Basis:':<20} ${cost_basis:>11,.2f}\n"
+            f"  {'Current Value:':<20} ${current_value:>11,.2f}\n"
+            f"  {'Unrealized Gain:':<20} ${unrealized_gain:>11,.2f}\n"
+            f"  {'Return:':<20} {unrealized_gain_pct:>11,.2f}%"
+        )
+    return lines
+
+
+def _ranking(title, rows, value_header, value_format):
+    lines = ["\n" + "=" * 70, title, "=" * 70,
+             f"\n{'Ticker':<8} {'Asset Name':<30} {value_header}", "-" * 70]
+    lines.extend(value_format(row) for row in rows.itertuples(index=False))
+    return lines
+
+
+def render_report(results, positions=True):
+    """Console report for a performance table, as one string.
+
+    ``positions=False`` leaves out the per-position blocks, which dominate
+    the output for large ledgers; the summary, allocation and rankings are
+    always included.
+    """
+    lines = []
+    if positions:
+        lines += ["\n" + "=" * 70, "INDIVIDUAL POSITION ANALYSIS", "=" * 70]
+        lines += _position_blocks(results)
+
+    total_cost_basis = results['Cost_Basis'].sum()
+    total_current_value = results['Current_Value'].sum()
+    total_unrealized_gain = results['Unrealized_Gain'].sum()
+    total_unrealized_gain_pct = (total_unrealized_gain / total_cost_basis) * 100
+
+    lines += ["\n" + "=" * 70, " " * 25 + "PORTFOLIO SUMMARY", "=" * 70,
+              f"\n{'Total Cost Basis:':<30} ${total_cost_basis:>15,.2f}",
+              f"{'Total Current Value:':<30} ${total_current_value:>15,.2f}",
+              f"{'Total Unrealized Gain:':<30} ${total_unrealized_gain:>15,.2f}",
+              f"{'Total Return:':<30} {total_unrealized_gain_pct:>14,.2f}%"]
+
+    lines += ["\n" + "=" * 70, "ASSET ALLOCATION (by Current Value)", "=" * 70]
+    allocation = results.groupby('Asset_Class').agg({
+        'Current_Value': 'sum',
+        'Unrealized_Gain': 'sum',
+        'Cost_Basis': 'sum'
+    })
+    allocation['Weight'] = (allocation['Current_Value'] / total_current_value) * 100
+    allocation['Return_Pct'] = (allocation['Unrealized_Gain'] / allocation['Cost_Basis']) * 100
+    for asset_class, row in allocation.iterrows():
+        lines += [f"\n{asset_class}:",
+                  f"  Value: ${row['Current_Value']:,.2f} ({row['Weight']:.1f}%)",
+                  f"  Gain: ${row['Unrealized_Gain']:,.2f} ({row['Return_Pct']:.2f}%)"]
+
+    def by_return(row):
+        return (f"{row.Ticker:<8} {row.Asset_Name:<30} {row.Unrealized_Gain_Pct:>11,.2f}% "
+                f"${row.Unrealized_Gain:>13,.2f}")
+
+    def by_value(row):
+        weight = (row.Current_Value / total_current_value) * 100
+        return f"{row.Ticker:<8} {row.Asset_Name:<30} ${row.Current_Value:>13,.2f} {weight:>14,.2f}%"
+
+    return_header = f"{'Return %':>12} {'Gain ($)':>15}"
+    lines += _ranking("TOP 5 PERFORMERS (by % Return)", results.nlargest(5, 'Unrealized_Gain_Pct'),
+                      return_header, by_return)
+    lines += _ranking("BOTTOM 5 PERFORMERS (by % Return)", results.nsmallest(5, 'Unrealized_Gain_Pct'),
+                      return_header, by_return)
+    lines += _ranking("TOP 5 POSITIONS (by Current Value)", results.nlargest(5, 'Current_Value'),
+                      f"{'Value':>15} {'% of Portfolio':>15}", by_value)
+    return "\n".join(lines) + "\n"
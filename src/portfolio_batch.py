@@ -0,0 +1,227 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from incremental_risk import TIMESERIES_COLUMNS, TRADING_DAYS, _metrics
+from performance import position_performance
+from returns import entry_flows, money_weighted, time_weighted
+from valuation import CHUNK_ROWS, parse_dates
+
+PORTFOLIO_ID = 'Portfolio_ID'
+SHARD_PORTFOLIOS = 500
+
+
+def load_holdings(paths):
+    """Concatenate holdings files into one table keyed by ``Portfolio_ID``.
+
+    A file with a ``Portfolio_ID`` column may hold many portfolios; otherwise
+    the whole file is one portfolio named after the file.
+    """
+    frames = []
+    for path in paths:
+        holdings = pd.read_csv(path)
+        if PORTFOLIO_ID not in holdings:
+            holdings.insert(0, PORTFOLIO_ID, os.path.splitext(os.path.basename(path))[0])
+        frames.append(holdings)
+    holdings = pd.concat(frames, ignore_index=True)
+    holdings[PORTFOLIO_ID] = holdings[PORTFOLIO_ID].astype(str)
+    return holdings
+
+
+class SparsePositions:
+    """Portfolios x tickers positions matrix in compressed sparse row form.
+
+    Row ``p`` holds the lots of one portfolio: ``columns[indptr[p]:indptr[p + 1]]``
+    are ticker columns of the price matrix and ``shares`` the matching share
+    counts. Each lot also records ``start``, the first price row on or after
+    its purchase date, so the matrix in force on any date is the set of lots
+    already bought. Tickers missing from the price matrix point at an extra
+    all-NaN column and contribute nothing, like :func:`valuation.portfolio_nav`.
+    """
+
+    def __init__(self, portfolio_ids, indptr, columns, shares, start):
+        self.portfolio_ids = portfolio_ids
+        self.indptr = indptr
+        self.columns = columns
+        self.shares = shares
+        self.start = start
+
+    @classmethod
+    def from_holdings(cls, holdings, prices):
+        """Build from a ``Portfolio_ID``/Ticker/Shares/Purchase_Date table and a dates x tickers matrix."""
+        order = np.argsort(holdings[PORTFOLIO_ID].to_numpy(), kind='stable')
+        holdings = holdings.iloc[order]
+        portfolio_ids, counts = np.unique(holdings[PORTFOLIO_ID].to_numpy(), return_counts=True)
+
+        columns = prices.columns.get_indexer(holdings['Ticker'])
+        columns[columns < 0] = len(prices.columns)
+        purchase_dates = parse_dates(holdings['Purchase_Date']).to_numpy(dtype='datetime64[ns]')
+        start = np.searchsorted(prices.index.to_numpy(dtype='datetime64[ns]'), purchase_dates)
+
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        return cls(portfolio_ids, indptr, columns, holdings['Shares'].to_numpy(dtype='float64'), start)
+
+    def __len__(self):
+        return len(self.portfolio_ids)
+
+    @property
+    def nnz(self):
+        return len(self.columns)
+
+    def rows(self, first, last):
+        """Portfolios ``first:last`` as a new matrix, for sharding across workers."""
+        lo, hi = self.indptr[first], self.indptr[last]
+        return SparsePositions(self.portfolio_ids[first:last], self.indptr[first:last + 1] - lo,
+                               self.columns[lo:hi], self.shares[lo:hi], self.start[lo:hi])
+
+    def nav(self, prices, chunk_rows=CHUNK_ROWS):
+        """Dates x portfolios value matrix for a dates x tickers price array.
+
+        Each block of dates gathers the price of every lot, zeroes lots not
+        yet bought and missing prices, scales by shares and sums each
+        portfolio's lots with one ``np.add.reduceat`` over the row pointers.
+        """
+        nav = np.empty((len(prices), len(self)))
+        for first in range(0, len(prices), chunk_rows):
+            # Padded a block at a time, so a memory-mapped matrix is never copied whole.
+            rows = prices[first:first + chunk_rows]
+            block = np.column_stack([rows, np.full(len(rows), np.nan)])[:, self.columns]
+            held = np.arange(first, first + len(block))[:, None] >= self.start[None, :]
+            block = np.where(held & ~np.isnan(block), block, 0.0) * self.shares
+            nav[first:first + len(block)] = np.add.reduceat(block, self.indptr[:-1], axis=1)
+        return nav
+
+    def flows(self, prices):
+        """Dates x portfolios matrix of external flows: each lot's market value on the day it enters the NAV."""
+        rows, values = entry_flows(prices, self.columns, self.shares, self.start)
+        portfolio = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        flows = np.zeros((len(prices) + 1, len(self)))
+        np.add.at(flows, (rows, portfolio), values)
+        return flows[:-1]
+
+
+def timeseries_arrays(nav, flows=None):
+    """Column-wise :func:`incremental_risk.build_timeseries` on a dates x portfolios matrix.
+
+    Rows where a portfolio is worth nothing are masked with NaN; returns are
+    taken against the previous unmasked row, which is what the single
+    portfolio calculation does once those rows are dropped.
+    """
+    valid = nav > 0
+    values = np.where(valid, nav, np.nan)
+    flows = np.zeros_like(values) if flows is None else flows
+    daily_return, cumulative = time_weighted(values, flows)
+    growth = 1 + cumulative / 100
+    with np.errstate(invalid='ignore', divide='ignore'):
+        high = np.fmax.accumulate(growth, axis=0)
+        peak = values * high / growth
+        drawdown = (growth / high - 1) * 100
+
+    return {
+        'valid': valid,
+        'Portfolio_Value': values,
+        'Net_Flow': np.where(valid, flows, np.nan),
+        'Daily_Return': daily_return,
+        'Cumulative_Return': cumulative,
+        'Peak': np.where(valid, peak, np.nan),
+        'Drawdown': drawdown,
+    }
+
+
+def summarize_arrays(arrays, dates):
+    """Column-wise :func:`incremental_risk.summarize`; one dict of metric arrays per portfolio."""
+    valid = arrays['valid']
+    returns = arrays['Daily_Return']
+    n_dates = len(dates)
+    first_row = valid.argmax(axis=0)
+    last_row = n_dates - 1 - valid[::-1].argmax(axis=0)
+    cols = np.arange(valid.shape[1])
+
+    total_return = arrays['Cumulative_Return'][last_row, cols]
+    days = (dates[last_row] - dates[first_row]).astype('timedelta64[D]').astype('int64')
+    volatility = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS) * 100
+    var_95 = np.nanpercentile(returns, 5, axis=0) * 100
+    mwr = money_weighted(arrays['Portfolio_Value'], arrays['Net_Flow'], dates)
+    return _metrics(total_return, days, volatility, np.nanmin(arrays['Drawdown'], axis=0),
+                    var_95, np.nanmax(returns, axis=0), np.nanmin(returns, axis=0), mwr)
+
+
+_WORKER_PRICES = None
+_WORKER_DATES = None
+
+
+def _init_worker(prices_path, dates):
+    global _WORKER_PRICES, _WORKER_DATES
+    _WORKER_PRICES, _WORKER_DATES = np.load(prices_path, mmap_mode='r'), dates
+
+
+def _value_shard(positions, prices=None, dates=None):
+    """NAV, long time series and risk metrics for one shard of portfolios."""
+    prices = _WORKER_PRICES if prices is None else prices
+    dates = _WORKER_DATES if dates is None else dates
+    arrays = timeseries_arrays(positions.nav(prices), positions.flows(prices))
+
+    metrics = pd.DataFrame(summarize_arrays(arrays, dates))
+    metrics.insert(0, PORTFOLIO_ID, positions.portfolio_ids)
+
+    # Portfolio-major rows, each portfolio in date order, as build_timeseries lays them out.
+    keep = arrays['valid'].T.ravel()
+    timeseries = pd.DataFrame({
+        PORTFOLIO_ID: np.repeat(positions.portfolio_ids, len(dates))[keep],
+        'Date': np.tile(dates, len(positions))[keep],
+        **{column: arrays[column].T.ravel()[keep] for column in TIMESERIES_COLUMNS[1:]},
+    })
+    return timeseries, metrics
+
+
+def value_portfolios(holdings, prices, workers=1, shard_size=SHARD_PORTFOLIOS):
+    """Time series and risk metrics for every portfolio in ``holdings`` against one price matrix.
+
+    Portfolios are split into shards of ``shard_size`` rows of the sparse
+    positions matrix. With ``workers > 1`` shards run on a process pool whose
+    workers memory-map one copy of the price matrix from a temporary file,
+    instead of each unpickling a copy of their own.
+
+    Returns ``(timeseries, risk_metrics, stats)``: the long
+    ``Portfolio_ID``/Date time series, one risk-metrics row per portfolio and
+    a dict with counts and elapsed seconds.
+    """
+    started = time.perf_counter()
+    positions = SparsePositions.from_holdings(holdings, prices)
+    price_values = prices.to_numpy(dtype='float64')
+    dates = prices.index.to_numpy(dtype='datetime64[ns]')
+    shards = [positions.rows(first, min(first + shard_size, len(positions)))
+              for first in range(0, len(positions), shard_size)]
+
+    if workers > 1:
+        with tempfile.TemporaryDirectory() as root:
+            prices_path = os.path.join(root, 'prices.npy')
+            np.save(prices_path, price_values)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(prices_path, dates)) as pool:
+                results = list(pool.map(_value_shard, shards))
+    else:
+        results = [_value_shard(shard, price_values, dates) for shard in shards]
+
+    timeseries = pd.concat([result[0] for result in results], ignore_index=True)
+    metrics = pd.concat([result[1] for result in results], ignore_index=True)
+    elapsed = time.perf_counter() - started
+    stats = {'portfolios': len(positions), 'positions': positions.nnz, 'shards': len(shards),
+             'workers': workers, 'seconds': elapsed}
+    return timeseries, metrics, stats
+
+
+def performance_table(holdings, prices):
+    """``04_portfolio_performance.py`` position table for every portfolio, valued at the last price date.
+
+    Without a ``Portfolio_ID`` column the holdings are treated as one
+    portfolio and the table has exactly the columns 04 writes.
+    """
+    results = position_performance(holdings, prices.iloc[-1], prices.index[-1])
+    if PORTFOLIO_ID in holdings:
+        results.insert(0, PORTFOLIO_ID, holdings[PORTFOLIO_ID].to_numpy())
+    return results
@@ -0,0 +1,457 @@
+import os
+
+import pandas as pd
+
+from adjustments import adjusted_view
+from benchmark import (BENCHMARKS, attribution_table, benchmark_returns, portfolio_returns, relative_table,
+                       rolling_relative_table)
+from covariance import BENCHMARK_TICKER, correlation_table, return_matrix
+from portfolio_batch import PORTFOLIO_ID
+from rolling_risk import rolling_risk_table
+from schema import HOLDING_DIMENSION
+from stress import SCENARIOS_PATH, read_scenarios, scenario_positions, scenario_set
+from valuation import parse_dates, price_matrix
+
+DATA_DICTIONARY_PATH = 'data/powerbi/DATA_DICTIONARY.txt'
+
+# Table name -> storage layout options, in export order; ``key`` is the upsert key of a SQL store.
+TABLE_LAYOUT = {
+    'dim_date': {'key': ['Date']},
+    'fact_portfolio_performance': {},
+    'fact_daily_portfolio': {'key': ['Date']},
+    'dim_asset_class': {'key': ['Asset_Class']},
+    'dim_holding': {'key': ['Ticker']},
+    'fact_stock_history': {'partition_by': 'year', 'cluster_by': 'Ticker', 'key': ['Date', 'Ticker']},
+    'kpi_metrics': {'key': ['Metric_Name']},
+    'fact_rolling_risk': {'partition_by': 'year', 'cluster_by': 'Ticker', 'key': ['Date', 'Ticker', 'Window_Days']},
+    'fact_correlation': {'key': ['Period', 'Ticker_1', 'Ticker_2']},
+    'fact_scenarios': {},
+    'fact_benchmark_relative': {'key': ['Benchmark', 'Period']},
+    'fact_benchmark_rolling': {'partition_by': 'year', 'cluster_by': 'Benchmark',
+                               'key': ['Date', 'Benchmark', 'Window_Days']},
+    'fact_attribution': {'key': ['Period', 'Asset_Class']},
+}
+
+
+def date_dimension(timeseries):
+    """One row per calendar day between the first and last portfolio date."""
+    date_dim = pd.DataFrame({
+        'Date': pd.date_range(start=timeseries['Date'].min(),
+                              end=timeseries['Date'].max(),
+                              freq='D')
+    })
+
+    date_dim['Year'] = date_dim['Date'].dt.year
+    date_dim['Month'] = date_dim['Date'].dt.month
+    date_dim['Month_Name'] = date_dim['Date'].dt.strftime('%B')
+    date_dim['Quarter'] = date_dim['Date'].dt.quarter
+    date_dim['Week'] = date_dim['Date'].dt.isocalendar().week
+    date_dim['Day_of_Week'] = date_dim['Date'].dt.day_name()
+    date_dim['Is_Weekend'] = date_dim['Date'].dt.dayofweek >= 5
+    return date_dim
+
+
+def enhance_performance(performance):
+    """Position table with weight, gain/loss label and performance/size buckets."""
+    performance = performance.copy()
+    performance['Weight_Pct'] = (performance['Current_Value'] / performance['Current_Value'].sum()) * 100
+    performance['Gain_Loss_Label'] = performance['Unrealized_Gain'].apply(
+        lambda x: 'Gain' if x > 0 else 'Loss'
+    )
+    performance['Performance_Category'] = pd.cut(
+        performance['Unrealized_Gain_Pct'],
+        bins=[-100, -10, 0, 10, 25, 50, 200],
+        labels=['Large Loss', 'Small Loss', 'Small Gain', 'Moderate Gain', 'Good Gain', 'Excellent Gain']
+    )
+
+    performance['Risk_Category'] = pd.cut(
+        performance['Current_Value'],
+        bins=[0, 20000, 40000, 60000, 100000],
+        labels=['Small', 'Medium', 'Large', 'Very Large']
+    )
+    return performance
+
+
+def daily_portfolio(timeseries, contributed=None):
+    """Portfolio time series with percentage return, running gain and return category.
+
+    The running gain is the value less the opening value and every net flow
+    since. For rows continuing an earlier table, ``contributed`` is the
+    opening value plus the flows up to the last earlier row; every flow in
+    ``timeseries`` then counts.
+    """
+    timeseries = timeseries.copy()
+    timeseries['Date'] = pd.to_datetime(timeseries['Date'])
+    timeseries['Daily_Return_Pct'] = timeseries['Daily_Return'] * 100
+    if contributed is None:
+        contributed = timeseries['Portfolio_Value'].iloc[0] + timeseries['Net_Flow'].iloc[1:].cumsum().reindex(
+            timeseries.index, fill_value=0.0)
+    else:
+        contributed = contributed + timeseries['Net_Flow'].cumsum()
+    timeseries['Portfolio_Gain_Loss'] = timeseries['Portfolio_Value'] - contributed
+    timeseries['Return_Category'] = timeseries['Daily_Return_Pct'].apply(
+        lambda x: 'Positive' if x > 0 else 'Negative' if x < 0 else 'Flat'
+    )
+    return timeseries
+
+
+def asset_class_summary(performance):
+    asset_summary = performance.groupby('Asset_Class').agg({
+        'Current_Value': 'sum',
+        'Cost_Basis': 'sum',
+        'Unrealized_Gain': 'sum',
+        'Ticker': 'count'
+    }).reset_index()
+
+    asset_summary.columns = ['Asset_Class', 'Current_Value', 'Cost_Basis',
+                             'Unrealized_Gain', 'Number_of_Positions']
+    asset_summary['Weight_Pct'] = (asset_summary['Current_Value'] /
+                                    asset_summary['Current_Value'].sum()) * 100
+    asset_summary['Return_Pct'] = (asset_summary['Unrealized_Gain'] /
+                                    asset_summary['Cost_Basis']) * 100
+    return asset_summary
+
+
+def holding_dimension(portfolio):
+    """One row per held ticker with the holding attributes the fact tables refer to by ``Ticker``.
+
+    Several lots of one ticker add up to one row: total shares at their
+    share-weighted average purchase price, bought on the first lot's date.
+    """
+    holdings = portfolio.assign(Purchase_Date=parse_dates(portfolio['Purchase_Date']).to_numpy(),
+                                Cost=portfolio['Shares'] * portfolio['Purchase_Price'])
+    dim = holdings.groupby('Ticker', sort=False).agg(
+        Asset_Name=('Asset_Name', 'first'), Asset_Class=('Asset_Class', 'first'), Shares=('Shares', 'sum'),
+        Cost=('Cost', 'sum'), Purchase_Date=('Purchase_Date', 'min')).reset_index()
+    dim['Purchase_Price'] = dim['Cost'] / dim['Shares']
+    return dim[list(HOLDING_DIMENSION)]
+
+
+def stock_history_table(market_data, portfolio, factors=None):
+    """Daily OHLCV per ticker with the value of the holding in it and price changes.
+
+    OHLCV stay raw. Position value and price changes use the split-adjusted
+    and total-return closes from the adjustment ``factors`` (step 3), so they
+    do not jump on splits; without factors both equal the raw close. Shares,
+    purchase price and the other holding attributes stay in
+    :func:`holding_dimension` instead of being repeated on every day.
+    """
+    market_data = market_data.assign(Date=pd.to_datetime(market_data['Date']))
+    adj_close = adjusted_view(market_data, factors, 'adjusted')['Close'].to_numpy(dtype='float64')
+    total_return_close = adjusted_view(market_data, factors, 'total_return')['Close'].to_numpy(dtype='float64')
+    stock_history = market_data.assign(Adj_Close=adj_close, Total_Return_Close=total_return_close)
+
+    codes, tickers = pd.factorize(stock_history['Ticker'])
+    holdings = holding_dimension(portfolio).set_index('Ticker').reindex(pd.Index(tickers).astype(str))
+    shares = holdings['Shares'].to_numpy()[codes]
+    stock_history['Position_Value'] = shares * stock_history['Adj_Close']
+    stock_history['Cost_Basis'] = shares * holdings['Purchase_Price'].to_numpy()[codes]
+    stock_history['Unrealized_Gain'] = stock_history['Position_Value'] - stock_history['Cost_Basis']
+    stock_history['Unrealized_Gain_Pct'] = (stock_history['Unrealized_Gain'] /
+                                            stock_history['Cost_Basis']) * 100
+
+    stock_history = stock_history.sort_values(['Ticker', 'Date'])
+    stock_history['Price_Change'] = stock_history.groupby('Ticker', observed=True)['Adj_Close'].diff()
+    stock_history['Price_Change_Pct'] = stock_history.groupby('Ticker', observed=True)[
+        'Total_Return_Close'].pct_change() * 100
+    adjusted = ['Adj_Close', 'Total_Return_Close']
+    return stock_history[[c for c in stock_history.columns if c not in adjusted] + adjusted]
+
+
+def kpi_table(performance, risk_metrics):
+    total_value = performance['Current_Value'].sum()
+    total_cost = performance['Cost_Basis'].sum()
+    total_gain = performance['Unrealized_Gain'].sum()
+    total_return_pct = (total_gain / total_cost) * 100
+
+    return pd.DataFrame([{
+        'Metric_Name': 'Total Portfolio Value',
+        'Metric_Value': total_value,
+        'Metric_Format': 'Currency'
+    }, {
+        'Metric_Name': 'Total Cost Basis',
+        'Metric_Value': total_cost,
+        'Metric_Format': 'Currency'
+    }, {
+        'Metric_Name': 'Total Unrealized Gain',
+        'Metric_Value': total_gain,
+        'Metric_Format': 'Currency'
+    }, {
+        'Metric_Name': 'Total Return',
+        'Metric_Value': total_return_pct,
+        'Metric_Format': 'Percentage'
+    }, {
+        'Metric_Name': 'Number of Positions',
+        'Metric_Value': len(performance),
+        'Metric_Format': 'Number'
+    }, {
+        'Metric_Name': 'Annualized Return',
+        'Metric_Value': risk_metrics['Annualized_Return_Pct'].iloc[0],
+        'Metric_Format': 'Percentage'
+    }, {
+        'Metric_Name': 'Money-Weighted Return',
+        'Metric_Value': risk_metrics['Money_Weighted_Return_Pct'].iloc[0],
+        'Metric_Format': 'Percentage'
+    }, {
+        'Metric_Name': 'Sharpe Ratio',
+        'Metric_Value': risk_metrics['Sharpe_Ratio'].iloc[0],
+        'Metric_Format': 'Number'
+    }, {
+        'Metric_Name': 'Maximum Drawdown',
+        'Metric_Value': risk_metrics['Max_Drawdown_Pct'].iloc[0],
+        'Metric_Format': 'Percentage'
+    }])
+
+
+def rolling_risk_fact(market_data, timeseries, factors=None, since=None):
+    """Rolling risk per ticker on total-return prices, plus the portfolio row.
+
+    The portfolio row is measured on its time-weighted growth index, so
+    contributions do not show up as return. With ``since`` only later rows
+    are built (see :func:`rolling_risk.rolling_risk_table`).
+    """
+    timeseries = timeseries.assign(Date=pd.to_datetime(timeseries['Date']))
+    market_data = adjusted_view(market_data.assign(Date=pd.to_datetime(market_data['Date'])), factors,
+                                'total_return')
+    growth = 1 + timeseries.set_index('Date')['Cumulative_Return'] / 100
+    return rolling_risk_table(price_matrix(market_data), growth, since=since)
+
+
+def correlation_fact(market_data, portfolio, factors=None, method='sample', cache=None):
+    """Correlation table for the held tickers and SPY on total-return prices.
+
+    One block per calendar quarter plus the full history; with a
+    :class:`covariance.CovarianceCache` quarters already computed are reused.
+    """
+    tickers = list(dict.fromkeys([*portfolio['Ticker'], BENCHMARK_TICKER]))
+    market_data = market_data[market_data['Ticker'].isin(tickers)]
+    market_data = adjusted_view(market_data.assign(Date=pd.to_datetime(market_data['Date'])), factors,
+                                'total_return')
+    prices = price_matrix(market_data)
+    prices = prices[[ticker for ticker in tickers if ticker in prices]]
+    return correlation_table(return_matrix(prices), method, cache)
+
+
+def scenarios_fact(performance, market_data, factors=None, scenarios=None):
+    """Stress scenarios for the current holdings, one row per scenario and position.
+
+    ``scenarios`` are shock definitions (see :func:`stress.read_scenarios`),
+    by default ``stress_scenarios.csv`` when it exists; the historical
+    windows are always added. Betas and window returns use total-return prices.
+    """
+    if scenarios is None and os.path.exists(SCENARIOS_PATH):
+        scenarios = read_scenarios()
+    market_data = adjusted_view(market_data.assign(Date=pd.to_datetime(market_data['Date'])), factors,
+                                'total_return')
+    tickers = pd.Index(pd.unique(performance['Ticker']))
+    asset_classes = performance.drop_duplicates('Ticker').set_index('Ticker')['Asset_Class'].reindex(tickers)
+    scenario_ids, scenario_types, shocks = scenario_set(scenarios, price_matrix(market_data), tickers,
+                                                        asset_classes.to_numpy())
+    return scenario_positions(performance, scenario_ids, scenario_types,
+                              shocks[:, tickers.get_indexer(performance['Ticker'])])
+
+
+def benchmark_facts(portfolio, market_data, factors=None, benchmarks=BENCHMARKS):
+    """Benchmark-relative tables for the holdings on total-return prices, keyed by table name.
+
+    ``fact_benchmark_relative`` has tracking error, information ratio,
+    alpha/beta and capture ratios per benchmark for every quarter and the
+    full history, ``fact_benchmark_rolling`` the rolling versions and
+    ``fact_attribution`` the Brinson effects by Asset_Class against
+    :data:`benchmark.POLICY_BENCHMARK`.
+    """
+    market_data = adjusted_view(market_data.assign(Date=pd.to_datetime(market_data['Date'])), factors,
+                                'total_return')
+    prices = price_matrix(market_data)
+    returns = portfolio_returns(portfolio, prices)
+    benchmark = benchmark_returns(prices, benchmarks)
+    return {
+        'fact_benchmark_relative': relative_table(returns, benchmark).drop(columns=PORTFOLIO_ID),
+        'fact_benchmark_rolling': rolling_relative_table(returns, benchmark).drop(columns=PORTFOLIO_ID),
+        'fact_attribution': attribution_table(portfolio, prices).drop(columns=PORTFOLIO_ID),
+    }
+
+
+def build_tables(portfolio, performance, timeseries, market_data, risk_metrics, rolling=None, factors=None,
+                 correlation=None, scenarios=None, benchmark=None):
+    """All Power BI tables keyed by name, in :data:`TABLE_LAYOUT` order.
+
+    Inputs are left untouched. ``rolling``, ``correlation``, ``scenarios`` and
+    ``benchmark`` (the :func:`benchmark_facts` dict) may be passed in when
+    those tables have already been computed; ``factors`` are the
+    adjustment factors from :mod:`adjustments`.
+    """
+    timeseries = timeseries.assign(Date=pd.to_datetime(timeseries['Date']))
+    performance = enhance_performance(performance)
+    return {
+        'dim_date': date_dimension(timeseries),
+        'fact_portfolio_performance': performance,
+        'fact_daily_portfolio': daily_portfolio(timeseries),
+        'dim_asset_class': asset_class_summary(performance),
+        'dim_holding': holding_dimension(portfolio),
+        'fact_stock_history': stock_history_table(market_data, portfolio, factors),
+        'kpi_metrics': kpi_table(performance, risk_metrics),
+        'fact_rolling_risk': rolling if rolling is not None else rolling_risk_fact(market_data, timeseries, factors),
+        'fact_correlation': correlation if correlation is not None else correlation_fact(market_data, portfolio,
+                                                                                         factors),
+        'fact_scenarios': scenarios if scenarios is not None else scenarios_fact(performance, market_data, factors),
+        **(benchmark if benchmark is not None else benchmark_facts(portfolio, market_data, factors)),
+    }
+
+
+def write_tables(store, tables):
+    """Write ``tables`` through ``store`` with each table's layout; returns the paths."""
+    return [store.write(tables[name], name, **layout) for name, layout in TABLE_LAYOUT.items() if name in tables]
+
+
+def write_data_dictionary(path=DATA_DICTIONARY_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(DATA_DICTIONARY)
+    return path
+
+
+DATA_DICTIONARY = """
+DATA DICTIONARY FOR POWER BI
+=============================
+
+1. dim_date.csv - Date Dimension
+   - Date: Date value
+   - Year, Month, Quarter, Week: Time hierarchies
+   - Month_Name: Full month name
+   - Day_of_Week: Day name
+   - Is_Weekend: Boolean flag
+
+2. fact_portfolio_performance.csv - Current Holdings
+   - Ticker: Stock symbol
+   - Asset_Name: Full company/fund name
+   - Asset_Class: Equity or ETF
+   - Shares: Number of shares owned
+   - Purchase_Price: Price per share at purchase
+   - Current_Price: Latest market price
+   - Cost_Basis: Total amount invested
+   - Current_Value: Current market value
+   - Unrealized_Gain: Profit/loss in dollars
+   - Unrealized_Gain_Pct: Return percentage
+   - Weight_Pct: Position weight in portfolio
+   - Performance_Category: Performance bucket
+   - Risk_Category: Position size category
+
+3. fact_daily_portfolio.csv - Time Series Data
+   - Date: Trading date
+   - Portfolio_Value: Total portfolio value
+   - Net_Flow: Contributions (+) and withdrawals (-) that day; first row is the opening value
+   - Daily_Return: Daily time-weighted return as decimal (net of that day's flows)
+   - Daily_Return_Pct: Daily return as percentage
+   - Cumulative_Return: Chain-linked time-weighted return % since the first date
+   - Portfolio_Gain_Loss: Value less the opening value and net flows since
+   - Drawdown: Current drawdown % of the flow-adjusted growth index (1 + Cumulative_Return) from its high
+   - Peak: Portfolio value at which that index would be back at its high (flows are not gains)
+   - Return_Category: Positive/Negative/Flat
+
+4. dim_asset_class.csv - Asset Class Breakdown
+   - Asset_Class: Equity or ETF
+   - Current_Value: Total value by asset class
+   - Cost_Basis: Total invested by asset class
+   - Unrealized_Gain: Total gain by asset class
+   - Number_of_Positions: Count of holdings
+   - Weight_Pct: % of portfolio
+   - Return_Pct: Return % by asset class
+
+5. dim_holding.csv - Holding Attributes (one row per held ticker)
+   - Ticker: Stock symbol
+   - Asset_Name: Full company/fund name
+   - Asset_Class: Equity or ETF
+   - Shares: Number of shares owned (all lots of the ticker)
+   - Purchase_Price: Share-weighted average price per share at purchase
+   - Purchase_Date: First purchase date
+
+6. fact_stock_history.csv - Individual Stock Performance
+   - Date: Trading date
+   - Ticker: Stock symbol
+   - Open, High, Low, Close, Volume: Daily OHLCV data (raw, as traded)
+   - Position_Value: Daily position value (split-adjusted close)
+   - Cost_Basis: Shares times purchase price (shares and other holding attributes are in dim_holding)
+   - Unrealized_Gain: Daily profit/loss
+   - Unrealized_Gain_Pct: Daily return %
+   - Price_Change: Daily change in split-adjusted price in $
+   - Price_Change_Pct: Daily total return in % (splits and dividends)
+   - Adj_Close: Close adjusted for splits
+   - Total_Return_Close: Close adjusted for splits and dividends
+
+7. kpi_metrics.csv - Dashboard KPIs
+   - Metric_Name: KPI description
+   - Metric_Value: Numeric value
+   - Metric_Format: Display format (Currency/Percentage/Number)
+
+8. fact_rolling_risk.csv - Rolling Risk Metrics
+   - Date: Trading date (end of the window)
+   - Ticker: Stock symbol, or PORTFOLIO for the whole portfolio
+   - Window_Days: Window length in trading days (21, 63 or 252)
+   - Volatility_Pct: Annualized volatility over the window
+   - Sharpe_Ratio: Annualized mean return less 4% risk-free, over volatility
+   - Max_Drawdown_Pct: Worst drawdown within the window, from its highest close so far
+   - VaR_95_Pct: 5th percentile daily return over the window
+
+9. fact_correlation.csv - Correlation Matrix
+   - Period: Calendar quarter (e.g. 2025Q3), or Full for the whole history
+   - Start_Date, End_Date: First and last return date in the period
+   - Ticker_1, Ticker_2: Ticker pair (held tickers and SPY, every pair both ways)
+   - Correlation: Correlation of daily total returns
+   - Covariance: Annualized covariance of daily total returns
+
+10. fact_scenarios.csv - Stress Scenarios
+   - Scenario_ID: Scenario name (from stress_scenarios.csv, or a historical window)
+   - Scenario_Type: Custom, Historical, or Historical_Proxy (window outside the stored prices,
+     S&P 500 move applied through each ticker's beta)
+   - Ticker: Stock symbol
+   - Asset_Class: Equity or ETF
+   - Current_Value: Position value today
+   - Shock_Pct: Price move applied to the position in the scenario
+   - Stressed_Value: Position value after the shock
+   - PnL: Stressed value less current value
+   - PnL_Contribution_Pct: Position P&L as % of the whole portfolio (adds up to the portfolio's move)
+
+11. fact_benchmark_relative.csv - Benchmark-Relative Performance
+   - Benchmark: Benchmark ticker (SPY, QQQ, VTI)
+   - Period: Calendar quarter (e.g. 2025Q3), or Full for the whole history
+   - Start_Date, End_Date: First and last date in the period
+   - Days: Daily returns shared by portfolio and benchmark
+   - Portfolio_Return_Pct, Benchmark_Return_Pct: Annualized mean daily total return (x 252)
+   - Active_Return_Pct: Portfolio less benchmark annualized return
+   - Tracking_Error_Pct: Annualized volatility of the daily active return
+   - Information_Ratio: Active return over tracking error
+   - Beta: CAPM beta of daily returns to the benchmark
+   - Alpha_Pct: Annualized Jensen's alpha over the 4% risk-free rate
+   - Correlation: Correlation of daily returns
+   - Up_Capture_Pct, Down_Capture_Pct: Portfolio over benchmark geometric mean return
+     on the benchmark's up (down) days
+
+12. fact_benchmark_rolling.csv - Rolling Benchmark-Relative Metrics
+   - Date: Trading date (end of the window)
+   - Benchmark: Benchmark ticker
+   - Window_Days: Window length in trading days (63 or 252)
+   - Active_Return_Pct, Tracking_Error_Pct, Information_Ratio, Beta, Alpha_Pct, Correlation:
+     As in fact_benchmark_relative, over the window
+
+13. fact_attribution.csv - Brinson Attribution by Asset Class
+   - Period: Calendar quarter, or Full for the whole history
+   - Start_Date, End_Date: First and last date in the period
+   - Asset_Class: Equity or ETF
+   - Benchmark_Ticker: Policy benchmark for the class (Equity SPY 65%, ETF VTI 35%)
+   - Portfolio_Weight_Pct, Benchmark_Weight_Pct: Class weight at the start of the period
+   - Portfolio_Return_Pct: Time-weighted return of the class sleeve over the period
+   - Benchmark_Return_Pct: Return of the class benchmark over the period
+   - Allocation_Pct, Selection_Pct, Interaction_Pct: Brinson-Fachler effects
+   - Total_Effect_Pct: Sum of the three effects (adds up across classes to the active return)
+
+RELATIONSHIPS TO CREATE IN POWER BI:
+- fact_daily_portfolio[Date] → dim_date[Date]
+- fact_stock_history[Date] → dim_date[Date]
+- fact_stock_history[Ticker] → dim_holding[Ticker]
+- dim_holding[Asset_Class] → dim_asset_class[Asset_Class]
+- fact_rolling_risk[Date] → dim_date[Date]
+- fact_correlation[Ticker_1] → fact_portfolio_performance[Ticker]
+- fact_scenarios[Ticker] → fact_portfolio_performance[Ticker]
+- fact_benchmark_rolling[Date] → dim_date[Date]
+- fact_attribution[Asset_Class] → dim_asset_class[Asset_Class]
+"""
@@ -0,0 +1,342 @@
+import random
+import time
+
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr,
+                                    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday,
+                                    sunday_to_monday)
+from pandas.tseries.offsets import CustomBusinessDay
+
+from adjustments import empty_actions, normalize_actions
+from fetch_scheduler import PartialFetchError
+from reshape import FIELDS
+from storage import get_store
+
+COVERAGE_TABLE = '_coverage'
+ACTIONS_CACHE_TABLE = '_actions'
+ACTIONS_CHECKED_TABLE = '_actions_checked'
+# A bar missing for the last session of a range is asked for again until this
+# many sessions have passed after it (it may just not be published yet).
+REFETCH_SESSIONS = 2
+
+
+class ExchangeHolidays(AbstractHolidayCalendar):
+    """Full-day NYSE closures."""
+
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-06-19', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+SESSION = CustomBusinessDay(calendar=ExchangeHolidays())
+
+
+def sessions(start, end):
+    """Trading sessions in ``[start, end)``: weekdays that are not :class:`ExchangeHolidays`."""
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    if end <= start:
+        return pd.DatetimeIndex([])
+    return pd.date_range(start, end - pd.Timedelta(days=1), freq=SESSION)
+
+
+class PriceProvider:
+    """Source of daily OHLCV bars.
+
+    ``fetch`` returns long Date/Ticker/Open/High/Low/Close/Volume rows for
+    ``tickers`` between ``start`` (inclusive) and ``end`` (exclusive).
+    """
+
+    def fetch(self, tickers, start, end):
+        raise NotImplementedError
+
+    def actions(self, tickers):
+        """Splits and dividends as Date/Ticker/Type/Value rows (see :mod:`adjustments`); none by default."""
+        return empty_actions()
+
+
+class YahooProvider(PriceProvider):
+    """Downloads bars from Yahoo Finance, one ``yf.Ticker(t).history`` call per ticker.
+
+    ``yf.download`` keeps its results and per-ticker errors in module globals
+    (``yf.shared``), so concurrent batches from :class:`fetch_scheduler.FetchScheduler`
+    would read each other's failures. Per-ticker calls keep each error with
+    its ticker, and the scheduler's workers run batches side by side.
+    """
+
+    def fetch(self, tickers, start, end):
+        import yfinance as yf
+
+        frames, errors = [], {}
+        for ticker in tickers:
+            try:
+                # Unadjusted bars; splits and dividends are applied from corporate_actions in step 3.
+                history = yf.Ticker(ticker).history(start=start, end=end, auto_adjust=False, actions=False,
+                                                    raise_errors=True)
+            except Exception as error:
+                errors[ticker] = f"{type(error).__name__}: {error}"
+                continue
+            bars = history.reindex(columns=FIELDS).astype('float64')
+            bars.insert(0, 'Ticker', ticker)
+            bars.insert(0, 'Date', pd.to_datetime(history.index).strftime('%Y-%m-%d'))
+            frames.append(bars[bars['Close'].notna()].reset_index(drop=True))
+
+        bars = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['Date', 'Ticker'] + FIELDS)
+        if errors:
+            raise PartialFetchError(bars, errors)
+        return bars
+
+    def actions(self, tickers):
+        import yfinance as yf
+
+        frames = []
+        for ticker in tickers:
+            events = yf.Ticker(ticker).actions
+            if events is None or events.empty:
+                continue
+            dates = pd.to_datetime(events.index).strftime('%Y-%m-%d')
+            for column, kind in [('Stock Splits', 'SPLIT'), ('Dividends', 'DIVIDEND')]:
+                if column in events:
+                    values = events[column].to_numpy(dtype='float64')
+                    mask = values > 0
+                    frames.append(pd.DataFrame({'Date': dates[mask], 'Ticker': ticker, 'Type': kind,
+                                                'Value': values[mask]}))
+        if not frames:
+            return empty_actions()
+        return normalize_actions(pd.concat(frames, ignore_index=True))
+
+
+class LocalProvider(PriceProvider):
+    """Serves bars from an in-memory long frame; stand-in for Yahoo in tests and replays.
+
+    Every call is recorded in ``calls`` as ``(tickers, start, end)``.
+    """
+
+    def __init__(self, market_data, actions=None):
+        market_data = market_data.assign(Date=pd.to_datetime(market_data['Date']))
+        self.by_ticker = {ticker: rows for ticker, rows in market_data.groupby('Ticker', sort=False, observed=True)}
+        self.corporate_actions = empty_actions() if actions is None else normalize_actions(actions)
+        self.calls = []
+
+    def fetch(self, tickers, start, end):
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        self.calls.append((tuple(tickers), start, end))
+        frames = [self.by_ticker[t] for t in tickers if t in self.by_ticker]
+        if not frames:
+            return pd.DataFrame(columns=['Date', 'Ticker'] + FIELDS)
+        rows = pd.concat(frames)
+        rows = rows[(rows['Date'] >= start) & (rows['Date'] < end)]
+        return rows.assign(Date=rows['Date'].dt.strftime('%Y-%m-%d')).reset_index(drop=True)
+
+    def actions(self, tickers):
+        return self.corporate_actions[self.corporate_actions['Ticker'].isin(tickers)].reset_index(drop=True)
+
+
+class FlakyProvider(PriceProvider):
+    """Wraps another provider and injects latency and failures, for exercising the scheduler.
+
+    Each call sleeps ``latency`` seconds, fails outright with probability
+    ``error_rate``, and always fails for any ticker in ``failing_tickers``.
+    """
+
+    def __init__(self, provider, latency=0.0, error_rate=0.0, failing_tickers=(), seed=None):
+        self.provider = provider
+        self.latency = latency
+        self.error_rate = error_rate
+        self.failing_tickers = set(failing_tickers)
+        self.random = random.Random(seed)
+
+    def fetch(self, tickers, start, end):
+        time.sleep(self.latency)
+        if self.random.random() < self.error_rate:
+            raise ConnectionError("injected provider error")
+        bars = self.provider.fetch(tickers, start, end)
+        failed = {t: "injected ticker error" for t in tickers if t in self.failing_tickers}
+        if failed:
+            raise PartialFetchError(bars[~bars['Ticker'].isin(failed)], failed)
+        return bars
+
+
+class PriceStore:
+    """Per-ticker price cache that remembers which date ranges it has fetched.
+
+    Coverage is kept as half-open ``[Start, End)`` intervals per ticker, so a
+    range that held no trading days (weekends, holidays, pre-listing) still
+    counts as covered and is never requested again. A gap without any
+    :func:`sessions` is covered without asking the provider. When a gap's last
+    session has no bar yet, coverage stops at the last bar returned until
+    ``REFETCH_SESSIONS`` sessions have passed. Other exchanges' holidays count
+    as sessions, so such a gap is fetched as usual.
+    """
+
+    def __init__(self, root='data/cache/prices', backend=None):
+        self.store = get_store(root, backend)
+        self.coverage = self._load_coverage()
+
+    def _load_coverage(self):
+        if not self.store.exists(COVERAGE_TABLE):
+            return pd.DataFrame({
+                'Ticker': pd.Series(dtype=str),
+                'Start': pd.Series(dtype='datetime64[ns]'),
+                'End': pd.Series(dtype='datetime64[ns]'),
+            })
+        coverage = self.store.read(COVERAGE_TABLE)
+        coverage['Start'] = pd.to_datetime(coverage['Start'])
+        coverage['End'] = pd.to_datetime(coverage['End'])
+        return coverage
+
+    def _save_coverage(self):
+        coverage = self.coverage.assign(
+            Start=pd.to_datetime(self.coverage['Start']).dt.strftime('%Y-%m-%d'),
+            End=pd.to_datetime(self.coverage['End']).dt.strftime('%Y-%m-%d'),
+        )
+        self.store.write(coverage, COVERAGE_TABLE)
+
+    def covered(self, ticker):
+        """Merged ``(start, end)`` intervals already fetched for ``ticker``."""
+        rows = self.coverage[self.coverage['Ticker'] == ticker].sort_values('Start')
+        return list(zip(rows['Start'], rows['End']))
+
+    def missing_ranges(self, ticker, start, end):
+        """Sub-ranges of ``[start, end)`` not yet covered for ``ticker``."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        gaps = []
+        cursor = start
+        for covered_start, covered_end in self.covered(ticker):
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def update(self, provider, tickers, start, end, scheduler=None):
+        """Fetch whatever is missing for ``tickers`` over ``[start, end)``.
+
+        Tickers sharing the same gap are fetched together, so the usual daily
+        run (every ticker missing the same tail) is one request and newly
+        added tickers are backfilled alongside it. With a ``scheduler``
+        (a :class:`fetch_scheduler.FetchScheduler`) each gap is fetched in
+        batches with retries, and tickers that still fail are left uncovered
+        so the next run tries them again.
+
+        Returns ``(calls, failures)``: provider calls made and a dict of
+        ticker -> error message.
+        """
+        requests, closed = {}, False
+        for ticker in tickers:
+            for gap in self.missing_ranges(ticker, start, end):
+                if sessions(*gap).empty:
+                    self._cover(ticker, *gap)
+                    closed = True
+                else:
+                    requests.setdefault(gap, []).append(ticker)
+
+        calls, failures = 0, {}
+        for (gap_start, gap_end), gap_tickers in requests.items():
+            if scheduler is not None:
+                result = scheduler.run(gap_tickers, gap_start, gap_end)
+                bars, errors, calls = result.data, result.failures, calls + result.requests
+            else:
+                bars, errors, calls = provider.fetch(gap_tickers, gap_start, gap_end), {}, calls + 1
+            failures.update(errors)
+            for ticker in gap_tickers:
+                if ticker in errors:
+                    continue
+                rows = bars[bars['Ticker'] == ticker]
+                self._append(ticker, rows)
+                covered_end = self._covered_end(rows, gap_start, gap_end)
+                if covered_end > gap_start:
+                    self._cover(ticker, gap_start, covered_end)
+
+        if requests or closed:
+            self._save_coverage()
+        return calls, failures
+
+    def _covered_end(self, bars, start, end):
+        """End of the part of ``[start, end)`` that ``bars`` settle."""
+        last_session = sessions(start, end)[-1]
+        if len(sessions(last_session + pd.Timedelta(days=1), pd.Timestamp.today())) >= REFETCH_SESSIONS:
+            return end
+        if bars.empty:
+            return start
+        last_bar = pd.to_datetime(bars['Date']).max()
+        return end if last_bar >= last_session else max(start, last_bar + pd.Timedelta(days=1))
+
+    def update_actions(self, provider, tickers):
+        """Corporate actions of ``tickers``, asking ``provider`` only for tickers whose bars moved on.
+
+        Each ticker's actions are saved with the coverage end they were checked
+        through; a new ex-date needs a new session, so tickers whose coverage
+        has not grown since are served from the cache. Call it after
+        :meth:`update`. Returns
+        ``(actions, refreshed)`` with the tickers that were asked for.
+        """
+        cached = (normalize_actions(self.store.read(ACTIONS_CACHE_TABLE))
+                  if self.store.exists(ACTIONS_CACHE_TABLE) else empty_actions())
+        checked = (self.store.read(ACTIONS_CHECKED_TABLE) if self.store.exists(ACTIONS_CHECKED_TABLE)
+                   else pd.DataFrame({'Ticker': pd.Series(dtype=str), 'Through': pd.Series(dtype=str)}))
+        through = pd.Series(pd.to_datetime(checked['Through']).to_numpy(), index=checked['Ticker'].astype(str))
+        covered = self.coverage.groupby('Ticker')['End'].max()
+
+        refreshed = [t for t in tickers
+                     if t not in covered.index or t not in through.index or covered[t] > through[t]]
+        if refreshed:
+            cached = pd.concat([cached[~cached['Ticker'].isin(refreshed)], provider.actions(refreshed)],
+                               ignore_index=True)
+            cached = normalize_actions(cached) if len(cached) else empty_actions()
+            # Tickers without bars yet are asked for again next run.
+            through = pd.concat([through.drop(refreshed, errors='ignore'), covered.reindex(refreshed).dropna()])
+            self.store.write(cached, ACTIONS_CACHE_TABLE)
+            self.store.write(pd.DataFrame({'Ticker': through.index,
+                                           'Through': through.dt.strftime('%Y-%m-%d').to_numpy()}),
+                             ACTIONS_CHECKED_TABLE)
+        return cached[cached['Ticker'].isin(tickers)].reset_index(drop=True), refreshed
+
+    def _append(self, ticker, bars):
+        if bars.empty:
+            return
+        if self.store.exists(ticker):
+            bars = pd.concat([self.store.read(ticker), bars])
+        bars = bars.assign(Date=pd.to_datetime(bars['Date']).dt.strftime('%Y-%m-%d'))
+        bars = bars.drop_duplicates('Date', keep='last').sort_values('Date')
+        self.store.write(bars[['Date', 'Ticker'] + FIELDS], ticker)
+
+    def _cover(self, ticker, start, end):
+        intervals = self.covered(ticker) + [(start, end)]
+        intervals.sort()
+        merged = [intervals[0]]
+        for interval_start, interval_end in intervals[1:]:
+            last_start, last_end = merged[-1]
+            if interval_start <= last_end:
+                merged[-1] = (last_start, max(last_end, interval_end))
+            else:
+                merged.append((interval_start, interval_end))
+        others = self.coverage[self.coverage['Ticker'] != ticker]
+        mine = pd.DataFrame(merged, columns=['Start', 'End']).assign(Ticker=ticker)
+        self.coverage = pd.concat([others, mine[['Ticker', 'Start', 'End']]], ignore_index=True)
+
+    def load(self, tickers, start, end):
+        """Cached Date/Ticker/OHLCV rows for ``tickers`` over ``[start, end)``, one block per ticker."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        frames = []
+        for ticker in tickers:
+            if self.store.exists(ticker):
+                bars = self.store.read(ticker)
+                dates = pd.to_datetime(bars['Date'])
+                frames.append(bars[(dates >= start) & (dates < end)])
+        if not frames:
+            return pd.DataFrame(columns=['Date', 'Ticker'] + FIELDS)
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,514 @@
+import numpy as np
+import pandas as pd
+
+from covariance import TRADING_DAYS
+from portfolio_batch import PORTFOLIO_ID
+
+OBJECTIVES = ('min_variance', 'mean_variance', 'risk_parity')
+RISK_AVERSION = 4.0
+SOLVER_TOLERANCE = 1e-7
+SOLVER_MAX_ITER = 5_000
+POLISH_EVERY = 10
+CHUNK_PORTFOLIOS = 2_000
+STATE_TABLE = 'rebalance_weights'
+
+STATE_COLUMNS = [PORTFOLIO_ID, 'Ticker', 'Objective', 'Weight', 'Date']
+TRADE_COLUMNS = [PORTFOLIO_ID, 'Ticker', 'Asset_Class', 'Price', 'Current_Shares', 'Target_Shares',
+                 'Trade_Shares', 'Side', 'Trade_Value', 'Current_Weight_Pct', 'Target_Weight_Pct',
+                 'Post_Trade_Weight_Pct']
+SUMMARY_COLUMNS = [PORTFOLIO_ID, 'Portfolio_Value', 'Buy_Value', 'Sell_Value', 'Turnover_Pct', 'Trades',
+                   'Cash_After']
+
+
+class PositionBook:
+    """Current positions of many portfolios as padded portfolios x slots arrays.
+
+    Row ``p`` is portfolio ``portfolio_ids[p]``; slot ``k`` holds one ticker
+    (``tickers[p, k]``) with its asset class, share count and price. Rows
+    are padded to the widest portfolio and ``mask`` marks the real slots.
+    Every solver and the trade list work on these arrays, so thousands of
+    portfolios are handled in the same few array operations as one.
+    """
+
+    def __init__(self, portfolio_ids, tickers, asset_classes, shares, prices, mask):
+        self.portfolio_ids = portfolio_ids
+        self.tickers = tickers
+        self.asset_classes = asset_classes
+        self.shares = shares
+        self.prices = prices
+        self.mask = mask
+
+    @classmethod
+    def from_table(cls, positions):
+        """Build from a position table in the ``04_portfolio_performance.py`` layout.
+
+        Needs Ticker, Asset_Class, Shares and Current_Price, plus
+        ``Portfolio_ID`` for more than one portfolio. Lots of the same
+        ticker are added up. Positions without a price stay in the book
+        but are never traded.
+        """
+        positions = positions.copy()
+        if PORTFOLIO_ID not in positions:
+            positions[PORTFOLIO_ID] = 'Portfolio'
+        positions[PORTFOLIO_ID] = positions[PORTFOLIO_ID].astype(str)
+        grouped = positions.groupby([PORTFOLIO_ID, 'Ticker'], sort=True).agg(
+            Asset_Class=('Asset_Class', 'first'), Shares=('Shares', 'sum'),
+            Current_Price=('Current_Price', 'first')).reset_index()
+
+        portfolio_ids, start, counts = np.unique(grouped[PORTFOLIO_ID].to_numpy(), return_index=True,
+                                                 return_counts=True)
+        rows = np.repeat(np.arange(len(portfolio_ids)), counts)
+        slots = np.arange(len(grouped)) - np.repeat(start, counts)
+        shape = (len(portfolio_ids), max(int(counts.max(initial=0)), 1))
+
+        def padded(values, fill, dtype):
+            array = np.full(shape, fill, dtype=dtype)
+            array[rows, slots] = values
+            return array
+
+        price = grouped['Current_Price'].to_numpy(dtype='float64')
+        return cls(portfolio_ids,
+                   padded(grouped['Ticker'].to_numpy(dtype=object), None, object),
+                   padded(grouped['Asset_Class'].fillna('Unassigned').to_numpy(dtype=object), None, object),
+                   padded(grouped['Shares'].to_numpy(dtype='float64'), 0.0, 'float64'),
+                   padded(price, np.nan, 'float64'),
+                   padded(np.isfinite(price) & (price > 0), False, bool))
+
+    def __len__(self):
+        return len(self.portfolio_ids)
+
+    def values(self):
+        """Market value of every slot, 0 for padding and unpriced positions."""
+        return np.where(self.mask, self.shares * np.nan_to_num(self.prices), 0.0)
+
+    def total_value(self, cash=0.0):
+        """Value of each portfolio's priced positions plus ``cash`` (scalar or one per portfolio)."""
+        return self.values().sum(axis=1) + np.broadcast_to(np.asarray(cash, dtype='float64'), len(self))
+
+    def weights(self, cash=0.0):
+        """Current weight of every slot in its portfolio's value (including cash)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.nan_to_num(self.values() / self.total_value(cash)[:, None])
+
+    def columns(self, tickers):
+        """Position of every slot's ticker in ``tickers`` (an Index), -1 for padding and misses."""
+        flat = pd.Index(tickers).get_indexer(pd.Series(self.tickers.ravel()).fillna(''))
+        return np.where(self.mask, flat.reshape(self.tickers.shape), -1)
+
+
+def add_target_tickers(positions, targets, prices):
+    """Append zero-share rows for target tickers a portfolio does not hold yet.
+
+    ``prices`` maps ticker to its latest price; the asset class is taken
+    from ``targets`` when it has one, otherwise from any portfolio that
+    holds the ticker.
+    """
+    if 'Ticker' not in targets:
+        return positions
+    targets = targets[targets['Target_Weight_Pct'] > 0]
+    if PORTFOLIO_ID in targets:
+        wanted = targets[[PORTFOLIO_ID, 'Ticker']]
+    else:
+        portfolio_ids = positions[PORTFOLIO_ID].unique() if PORTFOLIO_ID in positions else ['Portfolio']
+        wanted = pd.MultiIndex.from_product([portfolio_ids, targets['Ticker'].unique()],
+                                            names=[PORTFOLIO_ID, 'Ticker']).to_frame(index=False)
+    held = positions if PORTFOLIO_ID in positions else positions.assign(**{PORTFOLIO_ID: 'Portfolio'})
+    wanted = wanted.astype({PORTFOLIO_ID: str}).merge(held[[PORTFOLIO_ID, 'Ticker']].astype({PORTFOLIO_ID: str}),
+                                                      how='left', indicator=True)
+    new = wanted[wanted['_merge'] == 'left_only'].drop(columns='_merge')
+    if new.empty:
+        return positions
+
+    classes = positions.drop_duplicates('Ticker').set_index('Ticker')['Asset_Class']
+    if 'Asset_Class' in targets:
+        classes = targets.drop_duplicates('Ticker').set_index('Ticker')['Asset_Class'].combine_first(classes)
+    new = new.assign(Asset_Class=classes.reindex(new['Ticker']).to_numpy(), Shares=0.0,
+                     Current_Price=pd.Series(prices).reindex(new['Ticker']).to_numpy(dtype='float64'))
+    if PORTFOLIO_ID not in positions:
+        new = new.drop(columns=PORTFOLIO_ID)
+    return pd.concat([positions, new], ignore_index=True)
+
+
+def target_weights(book, targets):
+    """Target weights for every slot of ``book`` from a targets table.
+
+    ``targets`` has ``Target_Weight_Pct`` and either ``Ticker`` or
+    ``Asset_Class``, optionally per ``Portfolio_ID``. An asset-class target
+    is split between the portfolio's tickers in that class by current value
+    (equally where the class holds nothing yet). Anything without a target
+    is sold. Targets may add up to less than 100; the rest is held as cash.
+    """
+    key = 'Ticker' if 'Ticker' in targets else 'Asset_Class'
+    labels = book.tickers if key == 'Ticker' else book.asset_classes
+    if PORTFOLIO_ID in targets:
+        lookup = targets.assign(**{PORTFOLIO_ID: targets[PORTFOLIO_ID].astype(str)}).set_index(
+            [PORTFOLIO_ID, key])['Target_Weight_Pct']
+        index = pd.MultiIndex.from_arrays([np.repeat(book.portfolio_ids, labels.shape[1]),
+                                           pd.Series(labels.ravel()).fillna('')])
+        weights = lookup.reindex(index).to_numpy(dtype='float64').reshape(labels.shape)
+    else:
+        lookup = targets.set_index(key)['Target_Weight_Pct']
+        weights = lookup.reindex(pd.Series(labels.ravel()).fillna('')).to_numpy(dtype='float64').reshape(
+            labels.shape)
+    weights = np.where(book.mask, np.nan_to_num(weights), 0.0) / 100
+
+    if key == 'Asset_Class':
+        # Every slot of a class carries the class target; share it out within the class.
+        codes, _ = pd.factorize(pd.Series(labels.ravel()).fillna(''))
+        group = np.arange(len(book))[:, None] * (codes.max(initial=0) + 1) + codes.reshape(labels.shape)
+        values = np.where(book.mask, book.values(), 0.0).ravel()
+        members = book.mask.ravel().astype('float64')
+        class_value = np.bincount(group.ravel(), values, minlength=group.max() + 1)[group.ravel()]
+        class_count = np.bincount(group.ravel(), members, minlength=group.max() + 1)[group.ravel()]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = np.where(class_value > 0, values / class_value, members / class_count)
+        weights = weights * np.nan_to_num(share).reshape(labels.shape)
+
+    over = weights.sum(axis=1) > 1 + 1e-9
+    if over.any():
+        raise ValueError(f"Target weights add up to more than 100% for {int(over.sum())} portfolio(s), "
+                         f"e.g. {book.portfolio_ids[over][0]}")
+    return weights
+
+
+def expected_returns(returns):
+    """Annualized mean of each column of a dates x tickers daily return matrix."""
+    return returns.mean() * TRADING_DAYS
+
+
+def project_simplex(values, mask, cap=1.0):
+    """Euclidean projection of each row onto ``{w : 0 <= w <= cap, sum(w) = 1}`` over its masked slots.
+
+    The projection is ``clip(values - tau, 0, cap)`` for the row's threshold
+    ``tau``. The sum is piecewise linear in ``tau`` with breakpoints at
+    ``values`` and ``values - cap``; it is evaluated at every breakpoint of
+    every row at once and ``tau`` interpolated in the piece that crosses 1,
+    so the result is exact without iterating. ``cap`` (scalar or one per
+    row) below ``1 / slots`` is raised to it. Empty rows come back 0.
+    """
+    count = mask.sum(axis=1)
+    cap = np.maximum(cap, 1.0 / np.maximum(count, 1))[:, None]
+    values = np.where(mask, values, -np.inf)
+    breaks = np.where(mask, values, np.inf)
+    breaks = np.sort(np.concatenate([breaks, breaks - cap], axis=1), axis=1)
+    totals = np.clip(values[:, None, :] - breaks[:, :, None], 0.0, cap[:, :, None]).sum(axis=2)
+    # Totals fall as tau rises; the last breakpoint still at or above 1 starts the crossing piece.
+    piece = np.maximum((totals >= 1.0).sum(axis=1) - 1, 0)
+    last = np.minimum(piece + 1, breaks.shape[1] - 1)
+    rows = np.arange(len(values))
+    left, right = breaks[rows, piece], breaks[rows, last]
+    s_left, s_right = totals[rows, piece], totals[rows, last]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tau = np.where(s_left > s_right, left + (s_left - 1.0) * (right - left) / (s_left - s_right), left)
+    tau = np.nan_to_num(tau)
+    return np.where(mask, np.clip(values - tau[:, None], 0.0, cap), 0.0)
+
+
+def covariance_blocks(cov, columns, mask):
+    """Each portfolio's slots x slots block of an annualized ``cov`` array, 0 outside ``mask``."""
+    safe = np.where(mask, columns, 0)
+    blocks = cov[safe[:, :, None], safe[:, None, :]] * TRADING_DAYS
+    pair = mask[:, :, None] & mask[:, None, :]
+    return np.where(pair, np.nan_to_num(blocks), 0.0)
+
+
+def _lipschitz(blocks, iterations=30):
+    """Largest eigenvalue of every block: power iteration, bounded above by Gershgorin."""
+    vector = np.ones(blocks.shape[:2])
+    for _ in range(iterations):
+        vector = np.einsum('pij,pj->pi', blocks, vector)
+        vector /= np.maximum(np.linalg.norm(vector, axis=1, keepdims=True), 1e-300)
+    rayleigh = np.einsum('pi,pij,pj->p', vector, blocks, vector)
+    gershgorin = np.abs(blocks).sum(axis=2).max(axis=1)
+    return np.maximum(np.minimum(1.05 * rayleigh, gershgorin), 1e-12)
+
+
+def _polish(blocks, mu, mask, weights, risk_aversion, cap, tol=1e-10):
+    """Exact solution on each row's current active set, and whether it satisfies the KKT conditions.
+
+    Slots at 0 or at ``cap`` stay there; the free slots solve the
+    equality-constrained problem (stationarity plus the budget) in one
+    batched linear solve. A row is optimal when the free weights stay
+    inside the bounds and every bound slot's gradient has the right sign
+    against the budget multiplier.
+    """
+    n, width = mask.shape
+    at_zero = mask & (weights <= 1e-12)
+    at_cap = mask & (weights >= cap[:, None] - 1e-12)
+    free = mask & ~at_zero & ~at_cap
+    bound = np.where(at_cap, cap[:, None], 0.0)
+
+    system = np.zeros((n, width + 1, width + 1))
+    system[:, :width, :width] = risk_aversion * blocks * (free[:, :, None] & free[:, None, :])
+    system[:, :width, width] = -free.astype('float64')
+    system[:, width, :width] = free
+    system[:, np.arange(width), np.arange(width)] += ~free
+    # Without free slots the budget multiplier is left to the sign check below.
+    any_free = free.any(axis=1)
+    system[:, width, width] = ~any_free
+    rhs = np.zeros((n, width + 1))
+    rhs[:, :width] = np.where(free, mu - risk_aversion * np.einsum('pij,pj->pi', blocks, bound), bound)
+    rhs[:, width] = np.where(any_free, 1.0 - bound.sum(axis=1), 0.0)
+    try:
+        solution = np.linalg.solve(system, rhs[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # A singular block (a ticker with no variance); the KKT check below still applies.
+        solution = (np.linalg.pinv(system) @ rhs[:, :, None])[:, :, 0]
+
+    exact = np.where(mask, solution[:, :width], 0.0)
+    gradient = risk_aversion * np.einsum('pij,pj->pi', blocks, exact) - mu
+    highest_capped = np.where(at_cap, gradient, -np.inf).max(axis=1)
+    budget = np.where(any_free, solution[:, width], np.where(np.isfinite(highest_capped), highest_capped, 0.0))
+    slack = np.where(mask, gradient - budget[:, None], 0.0)
+    feasible = ~(free & ((exact < -tol) | (exact > cap[:, None] + tol))).any(axis=1)
+    feasible &= np.abs(exact.sum(axis=1) - 1.0) <= 1e-9
+    signs = ~((at_zero & (slack < -tol)) | (at_cap & (slack > tol))).any(axis=1)
+    optimal = (feasible & signs & np.isfinite(solution).all(axis=1)) | ~mask.any(axis=1)
+    return np.where(mask, np.clip(exact, 0.0, cap[:, None]), 0.0), optimal
+
+
+def solve_quadratic(blocks, mu, mask, risk_aversion=RISK_AVERSION, cap=1.0, initial=None,
+                    tol=SOLVER_TOLERANCE, max_iter=SOLVER_MAX_ITER, polish_every=POLISH_EVERY):
+    """Long-only mean-variance weights for every portfolio at once.
+
+    Minimizes ``risk_aversion / 2 * w' S w - mu' w`` per row over the
+    capped simplex (``mu = 0`` gives minimum variance). Accelerated
+    projected gradient (FISTA with adaptive restart) finds which weights
+    sit at 0 or at ``cap``; every ``polish_every`` iterations, starting
+    with the first, :func:`_polish` solves each row exactly on its current
+    active set and retires the rows where that is optimal. Started from
+    the previous day's solution (``initial``) the active set rarely
+    changes, so most rows finish on the first pass. Rows not retired stop
+    once no weight moves by more than ``tol``. Returns ``(weights, iterations)``.
+    """
+    n = len(blocks)
+    cap = np.maximum(cap, 1.0 / np.maximum(mask.sum(axis=1), 1))
+    step = 1.0 / (risk_aversion * _lipschitz(blocks))[:, None]
+    start = np.full(mask.shape, 1.0) if initial is None else initial
+    weights = project_simplex(np.where(mask, start, 0.0), mask, cap)
+    momentum = weights.copy()
+    theta = np.ones(n)
+    iterations = np.zeros(n, dtype='int64')
+    active = np.flatnonzero(mask.any(axis=1))
+
+    for iteration in range(max_iter):
+        if not len(active):
+            break
+        iterations[active] += 1
+        if iteration % polish_every == 0:
+            exact, optimal = _polish(blocks[active], mu[active], mask[active], weights[active],
+                                     risk_aversion, cap[active])
+            weights[active[optimal]] = exact[optimal]
+            active = active[~optimal]
+            if not len(active):
+                break
+
+        b, m, y, w = blocks[active], mask[active], momentum[active], weights[active]
+        gradient = risk_aversion * np.einsum('pij,pj->pi', b, y) - mu[active]
+        new = project_simplex(y - step[active] * gradient, m, cap[active])
+        change = np.abs(new - w).max(axis=1)
+
+        t = theta[active]
+        t_next = 0.5 * (1 + np.sqrt(1 + 4 * t * t))
+        # Restart the momentum when it points uphill (O'Donoghue & Candes).
+        restart = ((y - new) * (new - w)).sum(axis=1) > 0
+        t_next = np.where(restart, 1.0, t_next)
+        beta = np.where(restart, 0.0, (t - 1) / t_next)
+        weights[active] = new
+        momentum[active] = new + beta[:, None] * (new - w)
+        theta[active] = t_next
+        active = active[change > tol]
+    return weights, iterations
+
+
+def solve_risk_parity(blocks, mask, initial=None, tol=SOLVER_TOLERANCE, max_iter=SOLVER_MAX_ITER):
+    """Equal-risk-contribution weights for every portfolio at once.
+
+    Solves ``S y = b / y`` (``b`` equal budgets) by cyclical coordinate
+    descent (Griveau-Billion, Richard & Roncalli): each slot has a closed-form
+    update given the others, applied to all portfolios together, and a sweep
+    visits every slot. ``initial`` weights are rescaled to the fixed point's
+    scale, so yesterday's solution starts close. Weights are ``y / sum(y)``;
+    rows stop once a sweep moves no weight by more than ``tol``.
+    Returns ``(weights, iterations)`` with iterations counted in sweeps.
+    """
+    n, width = mask.shape
+    count = np.maximum(mask.sum(axis=1), 1)
+    budget = np.where(mask, 1.0 / count[:, None], 0.0)
+    diagonal = np.einsum('pii->pi', blocks)
+    start = np.where(mask, 1.0, 0.0) if initial is None else np.where(mask, np.maximum(initial, 1e-6), 0.0)
+    scale = np.sqrt(np.maximum(np.einsum('pi,pij,pj->p', start, blocks, start), 1e-300))
+    y = start / scale[:, None]
+    weights = y / np.maximum(y.sum(axis=1, keepdims=True), 1e-300)
+    iterations = np.zeros(n, dtype='int64')
+    active = np.flatnonzero(mask.any(axis=1))
+
+    for _ in range(max_iter):
+        if not len(active):
+            break
+        b, m, d, ya = blocks[active], mask[active], diagonal[active], y[active]
+        for k in range(width):
+            others = np.einsum('pj,pj->p', b[:, k, :], ya) - d[:, k] * ya[:, k]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                update = (-others + np.sqrt(others ** 2 + 4 * d[:, k] * budget[active, k])) / (2 * d[:, k])
+            ya[:, k] = np.where(m[:, k] & (d[:, k] > 0), update, 0.0)
+        new = ya / np.maximum(ya.sum(axis=1, keepdims=True), 1e-300)
+        change = np.abs(new - weights[active]).max(axis=1)
+        y[active], weights[active] = ya, new
+        iterations[active] += 1
+        active = active[change > tol]
+    return weights, iterations
+
+
+def optimize(book, cov, mu=None, objective='min_variance', risk_aversion=RISK_AVERSION, max_weight=1.0,
+             initial=None, tol=SOLVER_TOLERANCE, max_iter=SOLVER_MAX_ITER, chunk=CHUNK_PORTFOLIOS):
+    """Optimal weights over each portfolio's own tickers from a daily covariance matrix.
+
+    ``objective`` is one of :data:`OBJECTIVES`; ``mean_variance`` needs
+    ``mu``, annualized expected returns per ticker (:func:`expected_returns`).
+    Weights are long-only and at most ``max_weight`` (not applied to
+    ``risk_parity``, whose weights follow from the budgets). Positions
+    without a price or a covariance row get weight 0. ``initial`` warm-starts
+    the solvers. Portfolios are solved ``chunk`` at a time, which bounds
+    memory at ``chunk x slots x slots`` floats. Returns ``(weights, iterations)``.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}'. Choose from: {list(OBJECTIVES)}")
+    if objective == 'mean_variance' and mu is None:
+        raise ValueError("mean_variance needs expected returns (mu)")
+    columns = book.columns(cov.index)
+    matrix = cov.to_numpy(dtype='float64')
+    mask = book.mask & (columns >= 0)
+    mask[mask] &= np.isfinite(np.diag(matrix))[columns[mask]]
+    expected = np.zeros(book.shares.shape)
+    if objective == 'mean_variance':
+        expected = np.where(mask, pd.Series(mu).reindex(cov.index).fillna(0.0).to_numpy()[columns], 0.0)
+
+    weights = np.zeros(book.shares.shape)
+    iterations = np.zeros(len(book), dtype='int64')
+    for first in range(0, len(book), chunk):
+        rows = slice(first, first + chunk)
+        blocks = covariance_blocks(matrix, columns[rows], mask[rows])
+        start = None if initial is None else initial[rows]
+        if objective == 'risk_parity':
+            weights[rows], iterations[rows] = solve_risk_parity(blocks, mask[rows], start, tol, max_iter)
+        else:
+            aversion = risk_aversion if objective == 'mean_variance' else 1.0
+            weights[rows], iterations[rows] = solve_quadratic(blocks, expected[rows], mask[rows], aversion,
+                                                              max_weight, start, tol, max_iter)
+    return weights, iterations
+
+
+def trade_list(book, weights, cash=0.0, lot_size=1, max_turnover=None):
+    """Trades that move every portfolio of ``book`` towards ``weights``.
+
+    Targets are ``weights x (position value + cash)`` in shares. Constraints:
+
+    * no-short: targets are never below zero, so a sale is at most the position.
+    * ``max_turnover``: traded value (buys plus sales) is at most this
+      fraction of portfolio value; trades are scaled down evenly to fit.
+    * ``lot_size``: trades are whole lots, rounded towards zero, except
+      that a position targeted at zero is sold in full when the trades are
+      not scaled down.
+    * buys never spend more than the cash plus the proceeds of the sales.
+
+    Returns one row per priced position (``Side`` is BUY, SELL or HOLD).
+    """
+    mask = book.mask
+    price = np.where(mask, book.prices, 1.0)
+    current = np.where(mask, book.shares, 0.0)
+    cash = np.broadcast_to(np.asarray(cash, dtype='float64'), len(book))
+    value = book.total_value(cash)
+    wanted = np.where(mask, np.maximum(weights, 0.0), 0.0) * value[:, None] / price
+    trade = np.where(mask, wanted - current, 0.0)
+
+    scale = np.ones(len(book))
+    if max_turnover is not None:
+        traded = (np.abs(trade) * price).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.where(traded > 0, np.minimum(1.0, max_turnover * value / traded), 1.0)
+    trade = trade * scale[:, None]
+    lots = np.trunc(trade / lot_size + 1e-9 * np.sign(trade)) * lot_size
+    exit_all = mask & (wanted == 0) & (scale[:, None] == 1.0) & (current > 0)
+    trade = np.where(exit_all, -current, lots)
+
+    buys = np.where(trade > 0, trade * price, 0.0).sum(axis=1)
+    sells = np.where(trade < 0, -trade * price, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        afford = np.where(buys > cash + sells, (cash + sells) / buys, 1.0)
+    trade = np.where(trade > 0, np.floor(trade * afford[:, None] / lot_size) * lot_size, trade)
+
+    trade = trade + 0.0  # no negative zeros in the output
+    after = current + trade
+    with np.errstate(invalid='ignore', divide='ignore'):
+        to_pct = np.where(value > 0, 100 / value, 0.0)[:, None]
+    rows, slots = np.nonzero(mask)
+    trades = pd.DataFrame({
+        PORTFOLIO_ID: book.portfolio_ids[rows],
+        'Ticker': book.tickers[rows, slots],
+        'Asset_Class': book.asset_classes[rows, slots],
+        'Price': price[rows, slots],
+        'Current_Shares': current[rows, slots],
+        'Target_Shares': wanted[rows, slots],
+        'Trade_Shares': trade[rows, slots],
+        'Side': np.where(trade[rows, slots] > 0, 'BUY', np.where(trade[rows, slots] < 0, 'SELL', 'HOLD')),
+        'Trade_Value': (trade * price)[rows, slots],
+        'Current_Weight_Pct': (current * price * to_pct)[rows, slots],
+        'Target_Weight_Pct': weights[rows, slots] * 100,
+        'Post_Trade_Weight_Pct': (after * price * to_pct)[rows, slots],
+    })
+    return trades[TRADE_COLUMNS]
+
+
+def rebalance_summary(trades, cash=0.0):
+    """Per portfolio: value, buys, sales, turnover (% of value), trade count and cash left."""
+    grouped = trades.assign(
+        Value=trades['Current_Shares'] * trades['Price'],
+        Buy=trades['Trade_Value'].clip(lower=0), Sell=-trades['Trade_Value'].clip(upper=0),
+        Traded=trades['Side'] != 'HOLD').groupby(PORTFOLIO_ID, sort=False)
+    summary = grouped.agg(Portfolio_Value=('Value', 'sum'), Buy_Value=('Buy', 'sum'),
+                          Sell_Value=('Sell', 'sum'), Trades=('Traded', 'sum'))
+    summary['Portfolio_Value'] += cash
+    summary['Turnover_Pct'] = (summary['Buy_Value'] + summary['Sell_Value']) / summary['Portfolio_Value'] * 100
+    summary['Cash_After'] = cash + summary['Sell_Value'] - summary['Buy_Value']
+    return summary.reset_index()[SUMMARY_COLUMNS]
+
+
+def previous_weights(book, state, objective):
+    """Warm start for ``book`` from a saved weights table, or None if it has no rows for ``objective``.
+
+    Slots the saved solution does not cover start at 0; the solvers
+    project the start onto the constraints first. Also returns the
+    number of portfolios that had a saved solution.
+    """
+    if state is None or state.empty:
+        return None, 0
+    state = state[state['Objective'] == objective]
+    if state.empty:
+        return None, 0
+    lookup = state.assign(**{PORTFOLIO_ID: state[PORTFOLIO_ID].astype(str)}).set_index(
+        [PORTFOLIO_ID, 'Ticker'])['Weight']
+    index = pd.MultiIndex.from_arrays([np.repeat(book.portfolio_ids, book.tickers.shape[1]),
+                                       pd.Series(book.tickers.ravel()).fillna('')])
+    initial = lookup.reindex(index).to_numpy(dtype='float64').reshape(book.tickers.shape)
+    found = np.isfinite(initial).any(axis=1)
+    initial = np.nan_to_num(initial)
+    # Portfolios without a saved solution start from their current weights.
+    initial[~found] = book.weights()[~found]
+    return initial, int(found.sum())
+
+
+def weights_state(book, weights, objective, date, state=None):
+    """Saved-weights table with this run's ``objective`` solution replacing the previous one."""
+    rows, slots = np.nonzero(book.mask)
+    fresh = pd.DataFrame({
+        PORTFOLIO_ID: book.portfolio_ids[rows],
+        'Ticker': book.tickers[rows, slots],
+        'Objective': objective,
+        'Weight': weights[rows, slots],
+        'Date': pd.Timestamp(date).strftime('%Y-%m-%d'),
+    })
+    if state is not None and not state.empty:
+        state = state[state['Objective'] != objective]
+        fresh = pd.concat([state.astype({'Date': str}), fresh], ignore_index=True)
+    return fresh[STATE_COLUMNS]
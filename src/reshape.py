@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def read_yfinance_csv(path):
+    """Read a yfinance ``group_by='ticker'`` CSV into a (Ticker, Field) MultiIndex frame."""
+    wide = pd.read_csv(path, header=[0, 1], index_col=0, float_precision='round_trip')
+    wide.columns = wide.columns.set_names(['Ticker', 'Field'])
+    wide.index.name = 'Date'
+    return wide
+
+
+def wide_tickers(wide):
+    """Tickers in the order they first appear in the wide header."""
+    return wide.columns.get_level_values('Ticker').unique().tolist()
+
+
+def wide_to_long(wide, fields=FIELDS):
+    """Stack a (Ticker, Field) wide frame into long Date/Ticker/OHLCV rows.
+
+    Rows are ordered date-major, then by ticker in header order, and rows
+    without a Close are dropped.
+    """
+    wide = wide[wide.index.notna()]
+    tickers = wide_tickers(wide)
+    columns = pd.MultiIndex.from_product([tickers, fields], names=['Ticker', 'Field'])
+    block = wide.reindex(columns=columns).to_numpy(dtype='float64')
+
+    n_dates, n_tickers = len(wide.index), len(tickers)
+    block = block.reshape(n_dates * n_tickers, len(fields))
+
+    long_df = pd.DataFrame(block, columns=fields)
+    long_df.insert(0, 'Ticker', np.tile(np.asarray(tickers, dtype=object), n_dates))
+    long_df.insert(0, 'Date', np.repeat(wide.index.astype(str).to_numpy(dtype=object), n_tickers))
+
+    long_df = long_df[long_df['Close'].notna()].reset_index(drop=True)
+    return long_df
+
+
+def long_to_wide(long_df, tickers=None, fields=FIELDS):
+    """Inverse of :func:`wide_to_long`: pivot long rows back to the yfinance layout."""
+    if tickers is None:
+        tickers = long_df['Ticker'].unique().tolist()
+    wide = long_df.pivot(index='Date', columns='Ticker', values=fields)
+    wide = wide.swaplevel(axis=1)
+    columns = pd.MultiIndex.from_product([tickers, fields], names=['Ticker', 'Price'])
+    wide = wide.reindex(columns=columns).sort_index()
+    wide.index.name = 'Date'
+    return wide
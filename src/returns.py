@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+
+from valuation import parse_dates
+
+DAYS_PER_YEAR = 365
+IRR_TOLERANCE = 1e-10
+IRR_MAX_ITER = 100
+
+PERIOD_COLUMNS = ['Period', 'Start_Date', 'End_Date', 'Start_Value', 'End_Value', 'Net_Flows',
+                  'Time_Weighted_Return_Pct', 'Money_Weighted_Return_Pct']
+
+
+def entry_flows(prices, columns, shares, start):
+    """Row on which each lot enters the NAV and its market value that row.
+
+    ``prices`` is a dates x tickers array, ``columns`` each lot's ticker
+    column and ``start`` its first row on or after the purchase date. A lot
+    enters on the first row from ``start`` on where its ticker has a price;
+    ``rows`` is ``len(prices)`` for a lot that never does (including
+    ``columns`` outside the array, used for tickers without prices).
+    """
+    n_dates, n_tickers = prices.shape
+    known = (columns >= 0) & (columns < n_tickers)
+    used, lot_column = np.unique(columns[known], return_inverse=True)
+    priced = ~np.isnan(prices[:, used])
+    next_row = np.where(priced, np.arange(n_dates, dtype='int32')[:, None], np.int32(n_dates))
+    next_row = np.minimum.accumulate(next_row[::-1], axis=0)[::-1]
+
+    rows = np.full(len(columns), n_dates)
+    inside = start[known] < n_dates
+    lot_rows = rows[known]
+    lot_rows[inside] = next_row[start[known][inside], lot_column[inside]]
+    rows[known] = lot_rows
+
+    values = np.zeros(len(columns))
+    entered = rows < n_dates
+    values[entered] = prices[rows[entered], columns[entered]] * shares[entered]
+    return rows, values
+
+
+def holdings_flows(prices, portfolio, since=None):
+    """External cash flow on each date of a dates x tickers price matrix for a holdings table.
+
+    A holding's market value on the day it enters the NAV is booked as a
+    contribution (an in-kind transfer), so its arrival is not counted as
+    performance. With ``since``, holdings bought on or before that date are
+    treated as already held.
+    """
+    dates = prices.index.to_numpy(dtype='datetime64[ns]')
+    purchase_dates = parse_dates(portfolio['Purchase_Date']).to_numpy(dtype='datetime64[ns]')
+    start = np.searchsorted(dates, purchase_dates)
+    if since is not None:
+        start[purchase_dates <= np.datetime64(pd.Timestamp(since), 'ns')] = len(dates)
+
+    rows, values = entry_flows(prices.to_numpy(dtype='float64'), prices.columns.get_indexer(portfolio['Ticker']),
+                               portfolio['Shares'].to_numpy(dtype='float64'), start)
+    flows = np.zeros(len(dates) + 1)
+    np.add.at(flows, rows, values)
+    return pd.Series(flows[:-1], index=prices.index, name='Net_Flow')
+
+
+def align_flows(flows, dates):
+    """Sum dated flows onto ``dates``; a flow on a non-trading day lands on the next date."""
+    dates = pd.DatetimeIndex(dates)
+    flows = flows[flows != 0]
+    rows = np.searchsorted(dates.to_numpy(dtype='datetime64[ns]'),
+                           pd.DatetimeIndex(flows.index).to_numpy(dtype='datetime64[ns]'))
+    keep = rows < len(dates)
+    aligned = np.zeros(len(dates))
+    np.add.at(aligned, rows[keep], flows.to_numpy(dtype='float64')[keep])
+    return pd.Series(aligned, index=dates, name='Net_Flow')
+
+
+def time_weighted(values, flows=None):
+    """Daily and cumulative time-weighted returns, column-wise for 1-d or 2-d arrays.
+
+    ``values`` is end-of-day portfolio value with NaN where the portfolio is
+    empty; ``flows`` are the external flows on the same rows (positive in).
+    Each day's return is ``(value - flow) / previous value - 1`` against the
+    previous non-empty row, and the cumulative return (in %) chain-links
+    them from the first non-empty row, whose flows form the opening value.
+    """
+    values = np.asarray(values, dtype='float64')
+    flows = np.zeros_like(values) if flows is None else np.asarray(flows, dtype='float64')
+    valid = ~np.isnan(values)
+    rows = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+
+    last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    previous = np.full_like(last_valid, -1)
+    previous[1:] = last_valid[:-1]
+    prior = np.take_along_axis(values, np.maximum(previous, 0), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily = np.where(previous >= 0, (values - flows) / prior - 1, np.nan)
+    growth = np.cumprod(np.where(np.isnan(daily), 1.0, 1.0 + daily), axis=0)
+    cumulative = np.where(valid, (growth - 1) * 100, np.nan)
+    return daily, cumulative
+
+
+def irr(cash_flows, times, guess=0.1, tol=IRR_TOLERANCE, max_iter=IRR_MAX_ITER):
+    """Annual internal rate of return for every row of ``cash_flows``, solved together.
+
+    Row ``i`` solves ``sum_j cash_flows[i, j] * (1 + r) ** -times[i, j] = 0``
+    with ``times`` in years. Every row runs a safeguarded Newton iteration
+    at once: Newton steps while they stay inside a bracket with a sign
+    change, bisection when they would leave it (the same guard as Brent's
+    method), so each row converges even where Newton alone would not. Rows
+    without a sign change (all flows one way) are NaN.
+
+    Each row's non-zero flows are packed to the left first, so a daily
+    grid with a handful of flows costs as much as the handful.
+    """
+    flows = np.atleast_2d(np.asarray(cash_flows, dtype='float64'))
+    times = np.broadcast_to(np.atleast_2d(np.asarray(times, dtype='float64')), flows.shape)
+    nonzero = flows != 0
+    width = max(int(nonzero.sum(axis=1).max(initial=0)), 1)
+    packed = np.argsort(~nonzero, axis=1, kind='stable')[:, :width]
+    flows = np.take_along_axis(flows, packed, axis=1)
+    times = np.take_along_axis(times, packed, axis=1)
+
+    def npv(rate, rows=slice(None)):
+        t, cf = times[rows], flows[rows]
+        discount = (1.0 + rate[:, None]) ** -t
+        value = (cf * discount).sum(axis=1)
+        slope = (-t * cf * discount).sum(axis=1) / (1.0 + rate)
+        return value, slope
+
+    n = len(flows)
+    lo = np.full(n, -0.999999)
+    hi = np.full(n, 1.0)
+    f_lo, _ = npv(lo)
+    f_hi, _ = npv(hi)
+    for _ in range(40):
+        grow = np.sign(f_lo) == np.sign(f_hi)
+        if not grow.any():
+            break
+        hi[grow] *= 4
+        f_hi[grow] = npv(hi[grow], grow)[0]
+    bracketed = np.sign(f_lo) != np.sign(f_hi)
+
+    rate = np.clip(np.full(n, float(guess)), lo, hi)
+    active = bracketed.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        value, slope = npv(rate[active], active)
+        a_lo, a_hi, a_rate = lo[active], hi[active], rate[active]
+        same_as_lo = np.sign(value) == np.sign(f_lo[active])
+        a_lo = np.where(same_as_lo, a_rate, a_lo)
+        a_hi = np.where(same_as_lo, a_hi, a_rate)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            step = value / slope
+        newton = a_rate - step
+        inside = np.isfinite(newton) & (newton > a_lo) & (newton < a_hi)
+        new_rate = np.where(value == 0, a_rate, np.where(inside, newton, 0.5 * (a_lo + a_hi)))
+        done = np.abs(new_rate - a_rate) <= tol * (1.0 + np.abs(a_rate))
+
+        lo[active], hi[active], rate[active] = a_lo, a_hi, new_rate
+        f_lo[active] = np.where(same_as_lo, value, f_lo[active])
+        index = np.flatnonzero(active)
+        active[index[done]] = False
+    return np.where(bracketed, rate, np.nan)
+
+
+def _investor_flows(values, flows, first, last):
+    """Cash flows seen by the investor in each column of a dates x portfolios matrix.
+
+    The opening value is paid on row ``first``, every later flow is paid in
+    (or received, if negative) and the closing value is received on row ``last``.
+    """
+    rows = np.arange(len(values))[:, None]
+    cols = np.arange(values.shape[1])
+    cash = np.where((rows > first) & (rows <= last), -np.nan_to_num(flows), 0.0)
+    cash[first, cols] = -values[first, cols]
+    cash[last, cols] += values[last, cols]
+    return cash
+
+
+def money_weighted(values, flows, dates):
+    """Annualized money-weighted return (IRR, in %) for each column of a dates x portfolios value matrix.
+
+    ``values`` is NaN where a portfolio is empty. The opening value counts
+    as invested on its first non-empty row and the closing value as
+    withdrawn on its last; flows in between are contributions (positive)
+    or withdrawals (negative). All portfolios are solved in one :func:`irr`
+    call. A 1-d ``values`` returns a scalar.
+    """
+    values = np.asarray(values, dtype='float64')
+    flows = np.asarray(flows, dtype='float64')
+    if values.ndim == 1:
+        return money_weighted(values[:, None], flows[:, None], dates)[0]
+    valid = ~np.isnan(values)
+    first = valid.argmax(axis=0)
+    last = len(values) - 1 - valid[::-1].argmax(axis=0)
+
+    cash = _investor_flows(values, flows, first, last).T
+    days = np.asarray(dates, dtype='datetime64[D]').astype('int64')
+    times = (days[None, :] - days[first][:, None]) / DAYS_PER_YEAR
+    return irr(cash, times) * 100
+
+
+def period_returns(nav, flows, freq='M'):
+    """Time- and money-weighted return for every calendar period plus the whole history.
+
+    ``nav`` and ``flows`` are Series on the same dates (flows from
+    :func:`holdings_flows` or :func:`align_flows`); ``freq`` is a pandas
+    period alias ('M' months, 'Q' quarters, 'Y' years). Each period starts from
+    the previous period's closing value; period money-weighted returns are
+    de-annualized so both columns cover the same span. All periods are
+    solved together in one :func:`irr` call.
+    """
+    nav = nav[nav > 0]
+    flows = flows.reindex(nav.index, fill_value=0.0)
+    dates = nav.index
+    daily, _ = time_weighted(nav.to_numpy(), flows.to_numpy())
+    daily = np.nan_to_num(daily)
+
+    labels = dates.to_period(freq)
+    bounds = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1], True])
+    periods = [(max(start - 1, 0), stop - 1, str(labels[start])) for start, stop in zip(bounds[:-1], bounds[1:])]
+    periods.append((0, len(nav) - 1, 'Since_Inception'))
+
+    values = nav.to_numpy(dtype='float64')
+    flow_values = flows.to_numpy(dtype='float64')
+    days = dates.to_numpy(dtype='datetime64[D]').astype('int64')
+    width = max(stop - start + 1 for start, stop, _ in periods)
+    cash = np.zeros((len(periods), width))
+    times = np.zeros((len(periods), width))
+    rows = []
+    for i, (start, stop, label) in enumerate(periods):
+        span = slice(start, stop + 1)
+        cash[i, :stop - start + 1] = _investor_flows(values[span, None], flow_values[span, None],
+                                                     np.array([0]), np.array([stop - start]))[:, 0]
+        times[i, :stop - start + 1] = (days[span] - days[start]) / DAYS_PER_YEAR
+        twr = (np.prod(1 + daily[start + 1:stop + 1]) - 1) * 100
+        rows.append([label, dates[start], dates[stop], values[start], values[stop],
+                     flow_values[start + 1:stop + 1].sum(), twr])
+
+    annual = irr(cash, times)
+    years = np.array([times[i, stop - start] for i, (start, stop, _) in enumerate(periods)])
+    period_mwr = ((1 + annual) ** years - 1) * 100
+    table = pd.DataFrame(rows, columns=PERIOD_COLUMNS[:-1])
+    table['Money_Weighted_Return_Pct'] = period_mwr
+    return table
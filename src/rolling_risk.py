@@ -0,0 +1,158 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from incremental_risk import RISK_FREE_RATE, TRADING_DAYS
+
+WINDOWS = (21, 63, 252)
+PORTFOLIO_KEY = 'PORTFOLIO'
+
+
+def _shift_down(values, periods, fill=0.0):
+    shifted = np.full_like(values, fill)
+    shifted[periods:] = values[:-periods]
+    return shifted
+
+
+def rolling_max_drawdown(values, window):
+    """Worst drawdown inside each trailing ``window``-row window, down each column in O(n).
+
+    Drawdowns are measured from the highest value since the window's start,
+    never from a peak before it. Uses the van Herk/Gil-Werman block scheme,
+    the array form of a monotonic deque: a window ending in block ``k`` is a
+    suffix of block ``k - 1`` plus a prefix of block ``k``, and its max
+    drawdown is the worst of the suffix's, the prefix's and the fall from
+    the suffix's peak to the prefix's trough. NaNs are ignored. Rows before
+    the first full window cover the rows seen so far.
+    """
+    n, m = values.shape
+    n_blocks = -(-n // window)
+    padded = np.full((n_blocks * window, m), np.nan)
+    padded[:n] = values
+    blocks = padded.reshape(n_blocks, window, m)
+    reverse = blocks[:, ::-1]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prefix_min = np.fmin.accumulate(blocks, axis=1)
+        prefix_drawdown = np.fmin.accumulate(blocks / np.fmax.accumulate(blocks, axis=1) - 1, axis=1)
+        suffix_max = np.fmax.accumulate(reverse, axis=1)[:, ::-1]
+        # The worst fall from each row (as the peak) to any later row of its block, then the worst from any row on.
+        suffix_drawdown = np.fmin.accumulate((np.fmin.accumulate(reverse, axis=1) / reverse - 1), axis=1)[:, ::-1]
+        prefix_min, prefix_drawdown, suffix_max, suffix_drawdown = (
+            array.reshape(-1, m)[:n] for array in (prefix_min, prefix_drawdown, suffix_max, suffix_drawdown))
+
+        result = prefix_drawdown.copy()
+        if n >= window:
+            first = np.arange(n - window + 1)
+            cross = np.fmin(suffix_drawdown[first], np.fmin(prefix_drawdown[window - 1:],
+                                                            prefix_min[window - 1:] / suffix_max[first] - 1))
+            # A window starting on a block boundary is that whole block: the suffix alone.
+            aligned = (first % window == 0)[:, None]
+            result[window - 1:] = np.where(aligned, suffix_drawdown[first], cross)
+    return result
+
+
+def rolling_moments(returns, window):
+    """Trailing mean, sample std and observation count per column.
+
+    Moments are streamed as windowed differences of cumulative sums. Each
+    column is centred on its own mean first, which keeps the sums small and
+    the variance stable over long histories.
+    """
+    valid = ~np.isnan(returns)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        center = np.nan_to_num(np.nanmean(returns, axis=0))
+    x = np.where(valid, returns - center, 0.0)
+
+    s1 = np.cumsum(x, axis=0)
+    s2 = np.cumsum(x * x, axis=0)
+    count = np.cumsum(valid, axis=0)
+    s1 = s1 - _shift_down(s1, window)
+    s2 = s2 - _shift_down(s2, window)
+    count = count - _shift_down(count, window, 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s1 / count
+        variance = np.maximum(s2 - s1 * mean, 0.0) / (count - 1)
+    return mean + center, np.sqrt(variance), count
+
+
+def rolling_percentile(returns, window, q):
+    """Trailing-window ``np.percentile(..., q)`` per column (linear interpolation).
+
+    Delegates to pandas' rolling quantile, which keeps each window in an
+    indexable skiplist: every step is one insert, one delete and one rank
+    lookup, O(log window), instead of re-sorting the window.
+    """
+    frame = pd.DataFrame(returns)
+    return frame.rolling(window).quantile(q / 100, interpolation='linear').to_numpy()
+
+
+def rolling_metrics(prices, window, start=0):
+    """Rolling volatility, Sharpe, max drawdown and 95% VaR for every column of ``prices``.
+
+    Returns a dict of dates x columns arrays for the rows from ``start`` on;
+    earlier rows only serve as history for the windows. A value is only
+    reported once the window holds ``window`` daily returns.
+
+    - Volatility: annualized sample std of daily returns, in %.
+    - Sharpe: annualized mean daily return less the risk-free rate, over volatility.
+    - Max drawdown: worst close relative to the highest close before it
+      within the last ``window`` days, in %.
+    - VaR 95: 5th percentile of daily returns, in %.
+    """
+    values = prices.to_numpy(dtype='float64')
+    returns = np.full_like(values, np.nan)
+    returns[1:] = values[1:] / values[:-1] - 1
+
+    mean, std, count = rolling_moments(returns, window)
+    full = count >= window
+    with np.errstate(invalid='ignore', divide='ignore'):
+        volatility = std * np.sqrt(TRADING_DAYS)
+        sharpe = (mean * TRADING_DAYS - RISK_FREE_RATE) / volatility
+
+    max_drawdown = rolling_max_drawdown(values, window)
+
+    # The percentile is the costly metric; it only needs the window behind each reported row.
+    offset = max(start - window + 1, 0)
+    var_95 = rolling_percentile(returns[offset:], window, 5)[start - offset:]
+
+    full = full[start:]
+    return {
+        'Volatility_Pct': np.where(full, volatility[start:] * 100, np.nan),
+        'Sharpe_Ratio': np.where(full, sharpe[start:], np.nan),
+        'Max_Drawdown_Pct': np.where(full, max_drawdown[start:] * 100, np.nan),
+        'VaR_95_Pct': np.where(full, var_95 * 100, np.nan),
+    }
+
+
+def rolling_risk_table(prices, portfolio_value=None, windows=WINDOWS, since=None):
+    """Long Date/Ticker/Window_Days fact table of rolling metrics.
+
+    ``prices`` is a dates x tickers close matrix; ``portfolio_value`` is an
+    optional NAV series added as the ``PORTFOLIO`` column. Rows before the
+    first full window are dropped, and with ``since`` so are rows on or
+    before that date (the history before it still feeds the windows).
+    """
+    if portfolio_value is not None:
+        nav = portfolio_value.reindex(prices.index)
+        prices = prices.assign(**{PORTFOLIO_KEY: nav.to_numpy()})
+
+    start = 0 if since is None else int(prices.index.searchsorted(pd.Timestamp(since), side='right'))
+    dates = prices.index.to_numpy()[start:]
+    tickers = prices.columns.to_numpy(dtype=object)
+    frames = []
+    for window in windows:
+        metrics = rolling_metrics(prices, window, start)
+        frame = pd.DataFrame({
+            'Date': np.repeat(dates, len(tickers)),
+            'Ticker': np.tile(tickers, len(dates)),
+            'Window_Days': window,
+            **{name: values.ravel() for name, values in metrics.items()},
+        })
+        frames.append(frame[frame['Volatility_Pct'].notna()])
+
+    table = pd.concat(frames, ignore_index=True)
+    return table.sort_values(['Ticker', 'Window_Days', 'Date'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,254 @@
+import argparse
+import os
+import warnings
+
+import pandas as pd
+
+from adjustments import (ACTIONS_TABLE, FACTOR_STATE_TABLE, FACTORS_TABLE, VIEWS, AdjustmentFactors,
+                         actions_fingerprint, adjust_prices, read_actions)
+from covariance import BENCHMARK_TICKER, ESTIMATORS, CovarianceCache, return_matrix, risk_contributions
+from fx import (BASE_CURRENCY, RATES_TABLE, load_fx, needs_conversion, rates_fingerprint, read_rates,
+                reporting_currency, reporting_holdings, reporting_market_data, ticker_currencies)
+from incremental_powerbi import STATE_PATH as POWERBI_STATE_PATH, build_state as powerbi_state
+from incremental_risk import STATE_PATH, build_state, build_timeseries, position_risk, save_state, summarize
+from matrix_store import MatrixStore, open_matrix, source_signature
+from monte_carlo import daily_returns, position_values, simulate_var
+from orchestrator import CACHE_DIR, Stage, StageCache, plan, run_pipeline, timing_report
+from portfolio_batch import performance_table
+from powerbi_tables import (DATA_DICTIONARY_PATH, TABLE_LAYOUT, benchmark_facts, build_tables, correlation_fact,
+                            rolling_risk_fact, scenarios_fact, write_data_dictionary, write_tables)
+from reshape import wide_to_long
+from returns import holdings_flows, period_returns
+from storage import POWERBI_STORAGE_ENV, get_store
+from stress import SCENARIOS_PATH
+from valuation import portfolio_nav, price_matrix
+
+HOLDINGS_PATH = 'portfolio_holdings.csv'
+
+
+def load_holdings():
+    return pd.read_csv(HOLDINGS_PATH)
+
+
+def load_raw():
+    return get_store('data/raw').read_wide('market_data')
+
+
+def clean(raw):
+    return wide_to_long(raw)
+
+
+def factor_update(clean):
+    factors, state, _ = AdjustmentFactors().refresh(clean, read_actions())
+    return {'factors': factors, 'state': state}
+
+
+def factors(factor_update):
+    return factor_update['factors']
+
+
+def fx(holdings, currency):
+    return load_fx() if needs_conversion(holdings, currency) else None
+
+
+def prices(clean, factors, holdings, fx, view, currency):
+    prices = adjust_prices(price_matrix(clean.assign(Date=pd.to_datetime(clean['Date']))), factors, view)
+    return prices if fx is None else fx.convert(prices, ticker_currencies(holdings), currency)
+
+
+def book(holdings, fx, currency):
+    return holdings if fx is None else reporting_holdings(holdings, fx, currency)
+
+
+def market(clean, holdings, fx, currency):
+    return clean if fx is None else reporting_market_data(clean, holdings, fx, currency)
+
+
+def performance(book, prices):
+    return performance_table(book, prices)
+
+
+def risk(holdings, prices):
+    nav, flows = portfolio_nav(prices, holdings), holdings_flows(prices, holdings)
+    timeseries = build_timeseries(nav, flows)
+    return {
+        'timeseries': timeseries,
+        'metrics': pd.DataFrame([summarize(timeseries)]),
+        'periods': period_returns(nav, flows),
+        'position_risk': position_risk(prices, holdings['Ticker'].unique()),
+        'state': build_state(timeseries, prices, holdings),
+    }
+
+
+def risk_contribution(holdings, prices, method):
+    universe = [ticker for ticker in dict.fromkeys([*holdings['Ticker'], BENCHMARK_TICKER]) if ticker in prices]
+    cov = CovarianceCache().covariance(return_matrix(prices[universe]), method)
+    return risk_contributions(cov, position_values(holdings, prices[holdings['Ticker'].unique()]))[0]
+
+
+def monte_carlo(holdings, prices, paths, method, seed):
+    held_prices = prices[holdings['Ticker'].unique()]
+    table, _ = simulate_var(daily_returns(held_prices), position_values(holdings, held_prices),
+                            n_paths=paths, method=method, seed=seed)
+    return table
+
+
+def rolling_risk(market, risk, factors):
+    return rolling_risk_fact(market, risk['timeseries'], factors)
+
+
+def correlation(book, market, factors):
+    return correlation_fact(market, book, factors, cache=CovarianceCache())
+
+
+def stress(performance, market, factors):
+    return scenarios_fact(performance, market, factors)
+
+
+def benchmark(book, market, factors):
+    return benchmark_facts(book, market, factors)
+
+
+def powerbi(book, market, performance, risk, rolling_risk, correlation, stress, benchmark, factors):
+    tables = build_tables(book, performance, risk['timeseries'], market, risk['metrics'], rolling=rolling_risk,
+                          factors=factors, correlation=correlation, scenarios=stress, benchmark=benchmark)
+    # High-water marks, so a later `06_prepare_for_powerbi.py --incremental` extends this export.
+    state = powerbi_state(book, risk['timeseries'].assign(Date=pd.to_datetime(risk['timeseries']['Date'])),
+                          market.assign(Date=pd.to_datetime(market['Date'])), factors,
+                          get_store('data/powerbi', env=POWERBI_STORAGE_ENV))
+    return {'tables': tables, 'state': state}
+
+
+def build_stages(mc_paths=100_000, mc_method='parametric', mc_seed=42, price_view='adjusted', currency=BASE_CURRENCY,
+                 cov_method='sample'):
+    """The 03-06 pipeline as a DAG, reading raw data and holdings from disk."""
+    processed = get_store('data/processed')
+    powerbi_store = get_store('data/powerbi', env=POWERBI_STORAGE_ENV)
+    raw_store = get_store('data/raw')
+    raw_path = raw_store.path('market_data')
+    actions_path = raw_store.path(ACTIONS_TABLE)
+    rates_path = raw_store.path(RATES_TABLE)
+
+    def publish_clean(output):
+        processed.write(output, 'market_data_clean', partition_by='year', cluster_by='Ticker')
+        source = source_signature(processed)
+        if source is not None:
+            MatrixStore.build(lambda: [output], source=source)
+
+    def publish_risk(output):
+        processed.write(output['timeseries'], 'portfolio_timeseries')
+        processed.write(output['metrics'], 'risk_metrics')
+        processed.write(output['periods'], 'period_returns')
+        adjustments = f"{price_view}:{actions_fingerprint(read_actions())}"
+        if needs_conversion(load_holdings(), currency):
+            adjustments += f":{currency}:{rates_fingerprint(read_rates())}"
+        save_state({**output['state'], 'adjustments': adjustments})
+
+    def publish_powerbi(output):
+        os.makedirs('data/powerbi', exist_ok=True)
+        write_tables(powerbi_store, output['tables'])
+        write_data_dictionary()
+        save_state(output['state'], POWERBI_STATE_PATH)
+
+    def stored(store, *names):
+        return lambda: all(store.exists(name) for name in names)
+
+    stages = [
+        Stage('holdings', load_holdings, sources=[HOLDINGS_PATH], cache=False),
+        Stage('raw', load_raw, sources=[raw_path], cache=False),
+        Stage('clean', clean, deps=['raw'], publish=publish_clean,
+              published=lambda: processed.exists('market_data_clean') and (
+                  source_signature(processed) is None or open_matrix(processed) is not None)),
+        Stage('factor_update', factor_update, deps=['clean'], sources=[actions_path],
+              publish=lambda output: AdjustmentFactors(processed).save(output['factors'], output['state']),
+              published=stored(processed, FACTORS_TABLE, FACTOR_STATE_TABLE)),
+        Stage('factors', factors, deps=['factor_update'], cache=False),
+        Stage('fx', fx, deps=['holdings'], params={'currency': currency}, sources=[rates_path], cache=False),
+        Stage('prices', prices, deps=['clean', 'factors', 'holdings', 'fx'],
+              params={'view': price_view, 'currency': currency}, cache=False),
+        # Holdings (purchase prices) and long price rows restated in the reporting currency.
+        Stage('book', book, deps=['holdings', 'fx'], params={'currency': currency}, cache=False),
+        Stage('market', market, deps=['clean', 'holdings', 'fx'], params={'currency': currency}, cache=False),
+        Stage('performance', performance, deps=['book', 'prices'],
+              publish=lambda output: processed.write(output, 'portfolio_performance'),
+              published=stored(processed, 'portfolio_performance')),
+        Stage('risk', risk, deps=['holdings', 'prices'], publish=publish_risk,
+              published=lambda: (stored(processed, 'portfolio_timeseries', 'risk_metrics', 'period_returns')()
+                                 and os.path.exists(STATE_PATH))),
+        Stage('risk_contribution', risk_contribution, deps=['holdings', 'prices'], params={'method': cov_method},
+              publish=lambda output: processed.write(output, 'risk_contributions'),
+              published=stored(processed, 'risk_contributions')),
+        Stage('rolling_risk', rolling_risk, deps=['market', 'risk', 'factors']),
+        Stage('correlation', correlation, deps=['book', 'market', 'factors']),
+        Stage('stress', stress, deps=['performance', 'market', 'factors'], sources=[SCENARIOS_PATH]),
+        Stage('benchmark', benchmark, deps=['book', 'market', 'factors']),
+        Stage('powerbi', powerbi,
+              deps=['book', 'market', 'performance', 'risk', 'rolling_risk', 'correlation', 'stress', 'benchmark',
+                    'factors'],
+              publish=publish_powerbi,
+              published=lambda: (stored(powerbi_store, *TABLE_LAYOUT)() and os.path.exists(DATA_DICTIONARY_PATH)
+                                 and os.path.exists(POWERBI_STATE_PATH))),
+    ]
+    if mc_paths > 0:
+        stages.append(Stage('monte_carlo', monte_carlo, deps=['holdings', 'prices'],
+                            params={'paths': mc_paths, 'method': mc_method, 'seed': mc_seed},
+                            publish=lambda output: processed.write(output, 'monte_carlo_var'),
+                            published=stored(processed, 'monte_carlo_var')))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the 03-06 pipeline in one process as a DAG with cached stages.")
+    parser.add_argument('--workers', type=int, default=4, help="stages run concurrently")
+    parser.add_argument('--force', nargs='*', metavar='STAGE',
+                        help="re-run these stages even if cached (no names: all stages)")
+    parser.add_argument('--no-cache', action='store_true', help="neither read nor write the stage cache")
+    parser.add_argument('--dry-run', action='store_true', help="print what would run and exit")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="stage cache directory")
+    parser.add_argument('--prices', choices=list(VIEWS), default='adjusted',
+                        help="price view for NAV and risk: raw, split-adjusted, or total return")
+    parser.add_argument('--currency', help="reporting currency (default: $REPORTING_CURRENCY or USD)")
+    parser.add_argument('--cov-method', choices=ESTIMATORS, default='sample',
+                        help="covariance estimator for risk contributions")
+    parser.add_argument('--mc-paths', type=int, default=100_000, help="Monte Carlo paths (0 to skip)")
+    parser.add_argument('--mc-method', choices=['parametric', 'bootstrap'], default='parametric')
+    parser.add_argument('--mc-seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # valuation.parse_dates silences this per call, but warning filters are not thread-safe.
+    warnings.filterwarnings('ignore', message='Parsing dates in', category=UserWarning)
+
+    print("=" * 70)
+    print(" " * 22 + "PORTFOLIO PIPELINE")
+    print("=" * 70)
+
+    stages = build_stages(args.mc_paths, args.mc_method, args.mc_seed, args.prices,
+                          reporting_currency(args.currency), args.cov_method)
+    cache = None if args.no_cache else StageCache(args.cache_dir)
+    force = [stage.name for stage in stages] if args.force == [] else args.force or []
+
+    if args.dry_run:
+        order, keys, actions = plan(stages, cache, force)
+        print(f"\n{'Stage':<18} {'Action':<7} {'Key':<16}")
+        print("-" * 43)
+        for stage in order:
+            print(f"{stage.name:<18} {actions[stage.name]:<7} {keys[stage.name][:16]}")
+        print()
+        return
+
+    print("\nRunning stages...")
+    _, timings = run_pipeline(stages, cache=cache, workers=args.workers, force=force)
+
+    print("\n" + "=" * 70)
+    print("STAGE TIMINGS")
+    print("=" * 70)
+    print()
+    print(timing_report(timings))
+    print(f"\n{'='*70}")
+    print("✓ Pipeline complete")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
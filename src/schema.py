@@ -0,0 +1,84 @@
+import pandas as pd
+
+# Quotes stay float64. float32 keeps about 7 significant digits, so above $65,536 its spacing is
+# wider than a cent, and rounding the stored quotes would change market_data_clean and every
+# result computed from it.
+PRICE_DTYPE = 'float64'
+# Any datetime64 resolution; strings are parsed once on load instead of in every script.
+DATE_DTYPE = 'datetime64'
+
+# Recorded with incremental exports; bump it when an exported table gains or loses columns
+# so the next export rebuilds instead of appending rows of a different shape.
+SCHEMA_VERSION = 2
+
+MARKET_DATA = {
+    'Date': DATE_DTYPE,
+    'Ticker': 'category',
+    'Open': PRICE_DTYPE,
+    'High': PRICE_DTYPE,
+    'Low': PRICE_DTYPE,
+    'Close': PRICE_DTYPE,
+    'Volume': 'int64',
+}
+
+# One row per held ticker; fact tables refer to it by Ticker instead of repeating it on every row.
+HOLDING_DIMENSION = {
+    'Ticker': 'str',
+    'Asset_Name': 'str',
+    'Asset_Class': 'category',
+    'Shares': 'float64',
+    'Purchase_Price': 'float64',
+    'Purchase_Date': DATE_DTYPE,
+}
+
+# Table name -> dtypes of its repetitive columns; every store casts them on write and read.
+SCHEMAS = {
+    'market_data_clean': MARKET_DATA,
+    'dim_holding': HOLDING_DIMENSION,
+    'fact_stock_history': MARKET_DATA,
+    'fact_rolling_risk': {'Date': DATE_DTYPE, 'Ticker': 'category', 'Window_Days': 'int64'},
+    'fact_scenarios': {'Scenario_ID': 'category', 'Scenario_Type': 'category', 'Ticker': 'category',
+                       'Asset_Class': 'category'},
+    'fact_benchmark_rolling': {'Date': DATE_DTYPE, 'Benchmark': 'category', 'Window_Days': 'int64'},
+}
+
+
+def _matches(values, dtype):
+    if dtype == DATE_DTYPE:
+        return pd.api.types.is_datetime64_any_dtype(values)
+    if dtype == 'str':
+        return pd.api.types.is_string_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype)
+    if dtype == 'category':
+        # Sorting follows category order, so categories are kept sorted whichever reader made them.
+        return isinstance(values.dtype, pd.CategoricalDtype) and values.cat.categories.is_monotonic_increasing
+    return values.dtype == dtype
+
+
+def _cast(values, dtype):
+    if dtype == DATE_DTYPE:
+        return pd.to_datetime(values)
+    if dtype == 'int64':
+        # A bar with a close but no reported volume counts as zero volume.
+        return values.fillna(0).round().astype(dtype)
+    if dtype == 'category' and isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.reorder_categories(values.cat.categories.sort_values())
+    return values.astype(dtype)
+
+
+def conform(df, schema):
+    """``df`` with the columns named in ``schema`` cast to their dtypes; other columns are left alone."""
+    if not schema:
+        return df
+    changed = {column: _cast(df[column], dtype) for column, dtype in schema.items()
+               if column in df.columns and not _matches(df[column], dtype)}
+    return df.assign(**changed) if changed else df
+
+
+def read_dtypes(schema):
+    """The part of ``schema`` a CSV reader can apply while parsing (categories and floats)."""
+    return {column: dtype for column, dtype in (schema or {}).items() if dtype in ('category', PRICE_DTYPE)}
+
+
+def memory_bytes(df):
+    """Deep memory use of ``df``, string contents included."""
+    return int(df.memory_usage(deep=True).sum())
@@ -0,0 +1,241 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from covariance import BENCHMARK_TICKER, covariance, return_matrix
+from rebalance import CHUNK_PORTFOLIOS, PositionBook
+
+SCENARIOS_PATH = 'stress_scenarios.csv'
+TARGET_TYPES = ('Ticker', 'Asset_Class', 'Factor')
+FACTOR_TICKERS = ('SPY', 'AGG')
+BETA_LOOKBACK = 252
+
+# Peak-to-trough windows of the S&P 500 and its price move over each, in %.
+HISTORICAL_WINDOWS = {
+    'GFC_2008': ('2007-10-09', '2009-03-09', -56.8),
+    'COVID_2020': ('2020-02-19', '2020-03-23', -33.9),
+    'Rate_Shock_2022': ('2022-01-03', '2022-10-12', -25.4),
+}
+
+SHOCK_COLUMNS = ['Scenario_ID', 'Target_Type', 'Target', 'Shock_Pct']
+RESULT_COLUMNS = ['Portfolio_ID', 'Scenario_ID', 'Scenario_Type', 'Portfolio_Value', 'Stressed_Value', 'PnL',
+                  'PnL_Pct']
+FACT_COLUMNS = ['Scenario_ID', 'Scenario_Type', 'Ticker', 'Asset_Class', 'Current_Value', 'Shock_Pct',
+                'Stressed_Value', 'PnL', 'PnL_Contribution_Pct']
+
+
+def read_scenarios(path=SCENARIOS_PATH):
+    """Shock definitions: one row per Scenario_ID, Target_Type, Target and Shock_Pct.
+
+    ``Target_Type`` is ``Ticker``, ``Asset_Class`` or ``Factor`` (a ticker
+    whose move is passed on to every position through its beta).
+    """
+    definitions = pd.read_csv(path)
+    missing = [column for column in SHOCK_COLUMNS if column not in definitions]
+    if missing:
+        raise ValueError(f"{path} is missing column(s) {missing}")
+    unknown = sorted(set(definitions['Target_Type']) - set(TARGET_TYPES))
+    if unknown:
+        raise ValueError(f"Unknown Target_Type {unknown}. Choose from: {list(TARGET_TYPES)}")
+    definitions = definitions[SHOCK_COLUMNS].astype({'Scenario_ID': str, 'Target': str})
+    return definitions.astype({'Shock_Pct': 'float64'})
+
+
+def factor_grid(factors=FACTOR_TICKERS, low_pct=-30.0, high_pct=10.0, step_pct=5.0):
+    """Every combination of factor shocks from ``low_pct`` to ``high_pct`` in ``step_pct`` steps.
+
+    Two factors at 1-point steps over -30..+10 give 1,681 scenarios.
+    """
+    levels = np.round(np.arange(low_pct, high_pct + step_pct / 2, step_pct), 6)
+    combos = list(itertools.product(levels, repeat=len(factors)))
+    labels = ['Grid_' + '_'.join(f"{factor}{level:+g}" for factor, level in zip(factors, combo)) for combo in combos]
+    return pd.DataFrame({
+        'Scenario_ID': np.repeat(labels, len(factors)),
+        'Target_Type': 'Factor',
+        'Target': np.tile(list(factors), len(combos)),
+        'Shock_Pct': np.ravel(combos),
+    })
+
+
+def factor_betas(prices, factors=FACTOR_TICKERS, lookback=BETA_LOOKBACK):
+    """Tickers x factors betas of daily returns regressed on the factor tickers' returns.
+
+    From the covariance of the last ``lookback`` returns, ``B = S_ff^-1 S_fx``:
+    a factor ticker's own row is 1 on itself and 0 on the other factors.
+    Factors without prices are dropped; a ticker without enough shared
+    history gets 0.
+    """
+    factors = [factor for factor in dict.fromkeys(factors) if factor in prices.columns]
+    if not factors:
+        return pd.DataFrame(index=prices.columns, dtype='float64')
+    cov = covariance(return_matrix(prices).iloc[-lookback:]).to_numpy()
+    index = prices.columns.get_indexer(factors)
+    betas = np.linalg.lstsq(cov[np.ix_(index, index)], np.nan_to_num(cov[index]), rcond=None)[0].T
+    return pd.DataFrame(betas, index=prices.columns, columns=factors)
+
+
+def _layer(rows, targets, shocks, columns, n_scenarios):
+    """Scenarios x ``columns`` matrix of the shocks aimed at each column, NaN where none is."""
+    layer = np.full((n_scenarios, len(columns)), np.nan)
+    index = pd.Index(columns).get_indexer(targets)
+    hit = index >= 0
+    layer[rows[hit], index[hit]] = shocks[hit]
+    return layer
+
+
+def shock_matrix(definitions, tickers, asset_classes, betas=None):
+    """Scenarios x tickers matrix of returns (decimal) from shock definitions.
+
+    Within a scenario a ticker takes its own ``Ticker`` shock if it has
+    one, else its ``Asset_Class`` shock, else the sum over ``Factor``
+    shocks of its beta to the factor times the shock, else 0. Returns
+    ``(scenario_ids, shocks)``.
+    """
+    scenario_ids = pd.Index(pd.unique(definitions['Scenario_ID']))
+    rows = scenario_ids.get_indexer(definitions['Scenario_ID'])
+    kind = definitions['Target_Type'].to_numpy()
+    targets = definitions['Target'].to_numpy()
+    values = definitions['Shock_Pct'].to_numpy(dtype='float64') / 100
+    shocks = np.zeros((len(scenario_ids), len(tickers)))
+
+    factor = kind == 'Factor'
+    if factor.any():
+        unknown = sorted(set(targets[factor]) - set([] if betas is None else betas.columns))
+        if unknown:
+            raise ValueError(f"No betas for factor(s) {unknown}")
+        moves = np.zeros((len(scenario_ids), len(betas.columns)))
+        np.add.at(moves, (rows[factor], betas.columns.get_indexer(targets[factor])), values[factor])
+        shocks = moves @ betas.reindex(tickers).fillna(0.0).to_numpy().T
+
+    classes, ticker_class = np.unique(np.asarray(asset_classes, dtype=object).astype(str), return_inverse=True)
+    for target_type, columns, gather in (('Asset_Class', classes, ticker_class),
+                                         ('Ticker', tickers, np.arange(len(tickers)))):
+        chosen = kind == target_type
+        if chosen.any():
+            layer = _layer(rows[chosen], targets[chosen], values[chosen], columns, len(scenario_ids))[:, gather]
+            shocks = np.where(np.isnan(layer), shocks, layer)
+    return scenario_ids, shocks
+
+
+def historical_shocks(prices, tickers, betas, windows=HISTORICAL_WINDOWS, proxy=BENCHMARK_TICKER):
+    """Scenarios x tickers returns over historical windows, plus how each scenario was obtained.
+
+    A ticker with prices on or before both ends of a window takes its
+    realized return over it. Tickers the stored history does not cover
+    get the window's S&P 500 move as a ``proxy`` factor shock through
+    ``betas`` (the realized ``proxy`` return when it is covered) and the
+    scenario is marked ``Historical_Proxy``. Returns
+    ``(scenario_ids, scenario_types, shocks)``.
+    """
+    prices = prices.reindex(columns=tickers).ffill()
+    dates = prices.index.to_numpy(dtype='datetime64[ns]')
+    types, shocks = [], np.zeros((len(windows), len(tickers)))
+    for i, (start, end, move_pct) in enumerate(windows.values()):
+        first, last = np.searchsorted(dates, np.array([start, end], dtype='datetime64[ns]'), side='right') - 1
+        realized = np.full(len(tickers), np.nan)
+        if first >= 0:
+            realized = prices.iloc[last].to_numpy() / prices.iloc[first].to_numpy() - 1
+        covered = np.isfinite(realized)
+        if not covered.all():
+            if proxy in tickers and covered[list(tickers).index(proxy)]:
+                move_pct = realized[list(tickers).index(proxy)] * 100
+            _, implied = shock_matrix(pd.DataFrame([('', 'Factor', proxy, move_pct)], columns=SHOCK_COLUMNS),
+                                      tickers, np.full(len(tickers), ''), betas)
+            realized = np.where(covered, realized, implied[0])
+        types.append('Historical' if covered.all() else 'Historical_Proxy')
+        shocks[i] = realized
+    return pd.Index(list(windows)), types, shocks
+
+
+def stress_test(book, tickers, shocks, chunk=CHUNK_PORTFOLIOS):
+    """P&L of every portfolio in a :class:`rebalance.PositionBook` under every scenario.
+
+    Each chunk of portfolios is spread onto a dense portfolios x tickers
+    value matrix and multiplied by the scenarios x tickers ``shocks``: one
+    ``values @ shocks.T`` product for thousands of scenarios at once.
+    Returns a portfolios x scenarios matrix; positions outside ``tickers``
+    are left unshocked.
+    """
+    columns = book.columns(tickers)
+    values = book.values()
+    pnl = np.empty((len(book), len(shocks)))
+    for first in range(0, len(book), chunk):
+        block = columns[first:first + chunk]
+        rows, slots = np.nonzero(block >= 0)
+        dense = np.zeros((len(block), len(tickers)))
+        np.add.at(dense, (rows, block[rows, slots]), values[first + rows, slots])
+        pnl[first:first + len(block)] = dense @ shocks.T
+    return pnl
+
+
+def stress_results(book, scenario_ids, scenario_types, pnl):
+    """Long Portfolio_ID/Scenario_ID table of current value, stressed value and P&L."""
+    value = book.total_value()
+    n_portfolios, n_scenarios = pnl.shape
+    results = pd.DataFrame({
+        'Portfolio_ID': np.repeat(book.portfolio_ids, n_scenarios),
+        'Scenario_ID': np.tile(np.asarray(scenario_ids, dtype=object), n_portfolios),
+        'Scenario_Type': np.tile(np.asarray(scenario_types, dtype=object), n_portfolios),
+        'Portfolio_Value': np.repeat(value, n_scenarios),
+        'PnL': pnl.ravel(),
+    })
+    results['Stressed_Value'] = results['Portfolio_Value'] + results['PnL']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        results['PnL_Pct'] = results['PnL'] / results['Portfolio_Value'] * 100
+    return results[RESULT_COLUMNS]
+
+
+def scenario_set(definitions, prices, tickers, asset_classes, lookback=BETA_LOOKBACK, windows=HISTORICAL_WINDOWS):
+    """Shock definitions plus the historical windows as one scenarios x tickers matrix.
+
+    Betas are estimated on ``prices`` against every factor the definitions
+    use and the S&P 500 proxy. Returns ``(scenario_ids, scenario_types, shocks)``.
+    """
+    definitions = definitions if definitions is not None else pd.DataFrame(columns=SHOCK_COLUMNS)
+    factors = [*definitions.loc[definitions['Target_Type'] == 'Factor', 'Target'], BENCHMARK_TICKER]
+    universe = prices.columns.intersection(pd.Index(tickers).union(pd.Index(factors)))
+    betas = factor_betas(prices[universe], factors, lookback)
+
+    ids, types, shocks = [], [], []
+    if len(definitions):
+        custom_ids, custom = shock_matrix(definitions, tickers, asset_classes, betas)
+        kinds = np.where(custom_ids.str.startswith('Grid_'), 'Grid', 'Custom')
+        ids, types, shocks = [custom_ids], [kinds], [custom]
+    if windows:
+        window_ids, window_types, window_shocks = historical_shocks(prices, tickers, betas, windows)
+        ids.append(window_ids)
+        types.append(np.asarray(window_types))
+        shocks.append(window_shocks)
+    return (pd.Index(np.concatenate(ids)), np.concatenate(types).astype(object),
+            np.vstack(shocks) if shocks else np.zeros((0, len(tickers))))
+
+
+def scenario_positions(positions, scenario_ids, scenario_types, shocks):
+    """Scenario x position table for one portfolio: the shock, stressed value and P&L of every holding.
+
+    ``positions`` is the 04 position table and ``shocks`` has one column per
+    row of it. ``PnL_Contribution_Pct`` is the position's P&L as a share of
+    the whole portfolio's value, so it adds up to the portfolio's move.
+    """
+    value = positions['Current_Value'].to_numpy(dtype='float64')
+    n_scenarios, n_positions = shocks.shape
+    table = pd.DataFrame({
+        'Scenario_ID': np.repeat(np.asarray(scenario_ids, dtype=object), n_positions),
+        'Scenario_Type': np.repeat(np.asarray(scenario_types, dtype=object), n_positions),
+        'Ticker': np.tile(positions['Ticker'].to_numpy(dtype=object), n_scenarios),
+        'Asset_Class': np.tile(positions['Asset_Class'].to_numpy(dtype=object), n_scenarios),
+        'Current_Value': np.tile(value, n_scenarios),
+        'Shock_Pct': shocks.ravel() * 100,
+        'PnL': (shocks * value).ravel(),
+    })
+    table['Stressed_Value'] = table['Current_Value'] + table['PnL']
+    table['PnL_Contribution_Pct'] = table['PnL'] / np.nansum(value) * 100
+    return table[FACT_COLUMNS]
+
+
+def position_book(positions):
+    """:class:`rebalance.PositionBook` of ``positions`` with its priced tickers and their asset classes."""
+    book = PositionBook.from_table(positions)
+    tickers, first = np.unique(book.tickers[book.mask].astype(str), return_index=True)
+    return book, pd.Index(tickers), book.asset_classes[book.mask][first]
@@ -0,0 +1,307 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from valuation import parse_dates
+
+METHODS = ('fifo', 'lifo', 'hifo', 'specific')
+TRANSACTION_TYPES = ('BUY', 'SELL', 'SPLIT', 'DIVIDEND')
+LONG_TERM_DAYS = 365
+EPSILON = 1e-9
+
+LEDGER_COLUMNS = ['Transaction_ID', 'Date', 'Ticker', 'Type', 'Shares', 'Price', 'Lot_ID',
+                  'Asset_Name', 'Asset_Class']
+REALIZED_COLUMNS = ['Date', 'Ticker', 'Lot_ID', 'Purchase_Date', 'Shares', 'Purchase_Price', 'Sale_Price',
+                    'Cost_Basis', 'Proceeds', 'Realized_Gain', 'Holding_Days', 'Term']
+HISTORY_COLUMNS = ['Date', 'Ticker', 'Shares', 'Cost_Basis', 'Close', 'Market_Value', 'Unrealized_Gain',
+                   'Realized_Gain', 'Dividend_Income', 'Avg_Holding_Days']
+
+
+def read_ledger(path):
+    """Load a transaction ledger CSV and fill in the optional columns.
+
+    Required: Date, Ticker, Type (BUY/SELL/SPLIT/DIVIDEND), Shares, Price.
+    For SPLIT rows ``Shares`` is the ratio of new to old shares (4 for a
+    4-for-1 split); for DIVIDEND rows ``Price`` is the cash paid per share.
+    ``Lot_ID`` on a SELL picks the lot to sell (specific identification).
+    """
+    return normalize_ledger(pd.read_csv(path))
+
+
+def normalize_ledger(ledger):
+    ledger = ledger.copy()
+    ledger['Type'] = ledger['Type'].str.upper()
+    unknown = sorted(set(ledger['Type']) - set(TRANSACTION_TYPES))
+    if unknown:
+        raise ValueError(f"Unknown transaction type(s) {unknown}. Use one of {list(TRANSACTION_TYPES)}.")
+    if 'Transaction_ID' not in ledger:
+        ledger['Transaction_ID'] = np.arange(1, len(ledger) + 1)
+    for column in ['Price', 'Lot_ID', 'Asset_Name', 'Asset_Class']:
+        if column not in ledger:
+            ledger[column] = np.nan
+    ledger['Asset_Name'] = ledger['Asset_Name'].fillna(ledger['Ticker'])
+    ledger['Asset_Class'] = ledger['Asset_Class'].fillna('Equity')
+    return ledger[LEDGER_COLUMNS + [c for c in ledger.columns if c not in LEDGER_COLUMNS]]
+
+
+class Lot:
+    """An open tax lot.
+
+    Shares are held in split-adjusted base units: the lot's actual share
+    count is ``base_shares * factor`` for its ticker's cumulative split
+    factor, so a split is O(1) for the ticker instead of touching every lot.
+    """
+
+    __slots__ = ('lot_id', 'ticker', 'date', 'date_label', 'base_shares', 'base_cost', 'asset_name',
+                 'asset_class', 'row')
+
+    def __init__(self, lot_id, ticker, date, date_label, base_shares, base_cost, asset_name, asset_class, row):
+        self.lot_id = lot_id
+        self.ticker = ticker
+        self.date = date
+        self.date_label = date_label
+        self.base_shares = base_shares
+        self.base_cost = base_cost
+        self.asset_name = asset_name
+        self.asset_class = asset_class
+        self.row = row
+
+
+class TickerBook:
+    """Open lots of one ticker in a heap ordered by the matching method, plus running totals."""
+
+    def __init__(self, method):
+        self.method = method
+        self.heap = []
+        self.factor = 1.0
+        self.shares = 0.0
+        self.cost = 0.0
+        self.share_days = 0.0
+        self.realized = 0.0
+        self.dividends = 0.0
+
+    def order_key(self, lot, seq):
+        if self.method == 'lifo':
+            return (-lot.date, -seq)
+        if self.method == 'hifo':
+            return (-lot.base_cost, seq)
+        return (lot.date, seq)
+
+    def push(self, lot, seq):
+        heapq.heappush(self.heap, (self.order_key(lot, seq), seq, lot))
+
+    def next_lot(self):
+        """Next lot in matching order, dropping lots emptied by specific-ID sales."""
+        while self.heap and self.heap[0][2].base_shares <= EPSILON:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return self.heap[0][2]
+
+
+class LotLedger:
+    """Tax-lot matching engine.
+
+    Transactions are applied in date order. Each ticker keeps its open lots
+    in a heap keyed by the matching method (oldest first for FIFO, newest
+    for LIFO, highest cost per share for HIFO), so every buy and every lot
+    consumed by a sell costs O(log lots). A SELL with a ``Lot_ID`` is
+    matched to that lot directly (specific identification); with
+    ``method='specific'`` every SELL must name its lot. Splits rescale a
+    per-ticker factor; dividends accrue cash income on the shares held.
+    Buys, sale proceeds and dividends paid out are also recorded as
+    external cash flows for :meth:`cash_flows`.
+    """
+
+    def __init__(self, method='fifo'):
+        method = method.lower()
+        if method not in METHODS:
+            raise ValueError(f"Unknown lot method '{method}'. Choose from: {list(METHODS)}")
+        self.method = method
+        self.books = {}
+        self.lots = {}
+        self.realized = []
+        self.snapshots = []
+        self.flows = []
+        self.seq = 0
+
+    def book(self, ticker):
+        if ticker not in self.books:
+            self.books[ticker] = TickerBook('fifo' if self.method == 'specific' else self.method)
+        return self.books[ticker]
+
+    def run(self, ledger):
+        """Apply every transaction of a normalized ledger; returns ``self``."""
+        dates = parse_dates(ledger['Date']).to_numpy(dtype='datetime64[D]')
+        order = np.argsort(dates, kind='stable')
+        lot_ids = ledger['Lot_ID'].astype(object).where(ledger['Lot_ID'].notna(), None)
+        rows = zip(order.tolist(), dates.astype('int64')[order].tolist(),
+                   *(ledger[c].to_numpy()[order].tolist() for c in ['Transaction_ID', 'Date', 'Ticker', 'Type']),
+                   ledger['Shares'].to_numpy(dtype='float64')[order].tolist(),
+                   ledger['Price'].to_numpy(dtype='float64')[order].tolist(),
+                   lot_ids.to_numpy()[order].tolist(),
+                   ledger['Asset_Name'].to_numpy()[order].tolist(),
+                   ledger['Asset_Class'].to_numpy()[order].tolist())
+        for i, day, txn_id, label, ticker, kind, shares, price, lot_id, asset_name, asset_class in rows:
+            if kind == 'BUY':
+                self.buy(ticker, day, label, shares, price, txn_id if lot_id is None else lot_id,
+                         asset_name, asset_class, row=i)
+            elif kind == 'SELL':
+                self.sell(ticker, day, shares, price, lot_id)
+            elif kind == 'SPLIT':
+                self.split(ticker, shares)
+            else:
+                self.dividend(ticker, day, price)
+            book = self.books[ticker]
+            self.snapshots.append((day, ticker, book.shares, book.cost, book.realized, book.dividends,
+                                   book.share_days))
+        return self
+
+    def buy(self, ticker, day, label, shares, price, lot_id, asset_name, asset_class, row=None):
+        book = self.book(ticker)
+        if lot_id in self.lots:
+            raise ValueError(f"Duplicate lot id '{lot_id}'")
+        self.seq += 1
+        lot = Lot(lot_id, ticker, day, label, shares / book.factor, price * book.factor, asset_name, asset_class,
+                  self.seq if row is None else row)
+        self.lots[lot_id] = lot
+        book.push(lot, self.seq)
+        book.shares += shares
+        book.cost += shares * price
+        book.share_days += shares * day
+        self.flows.append((day, shares * price))
+
+    def sell(self, ticker, day, shares, price, lot_id=None):
+        book = self.book(ticker)
+        if shares > book.shares + EPSILON:
+            raise ValueError(f"SELL of {shares:g} {ticker} on day {day} exceeds the {book.shares:g} shares held")
+        if lot_id is None and self.method == 'specific':
+            raise ValueError(f"SELL of {ticker} needs a Lot_ID with the 'specific' lot method")
+
+        remaining = shares / book.factor
+        while remaining > EPSILON:
+            if lot_id is not None:
+                lot = self.lots.get(lot_id)
+                if lot is None or lot.ticker != ticker or lot.base_shares <= EPSILON:
+                    raise ValueError(f"Lot '{lot_id}' is not an open {ticker} lot")
+                if remaining > lot.base_shares + EPSILON:
+                    raise ValueError(f"SELL of {shares:g} {ticker} exceeds the shares left in lot '{lot_id}'")
+            else:
+                lot = book.next_lot()
+            taken = min(remaining, lot.base_shares)
+            lot.base_shares -= taken
+            remaining -= taken
+            self.close(book, lot, day, taken, price)
+        if book.shares <= EPSILON:
+            book.shares = book.cost = book.share_days = 0.0
+
+    def close(self, book, lot, day, base_shares, price):
+        shares = base_shares * book.factor
+        cost = base_shares * lot.base_cost
+        proceeds = shares * price
+        book.shares -= shares
+        book.cost -= cost
+        book.share_days -= shares * lot.date
+        book.realized += proceeds - cost
+        self.flows.append((day, -proceeds))
+        holding_days = day - lot.date
+        self.realized.append((day, lot.ticker, lot.lot_id, lot.date_label, shares, lot.base_cost / book.factor,
+                              price, cost, proceeds, proceeds - cost, holding_days,
+                              'Long' if holding_days > LONG_TERM_DAYS else 'Short'))
+
+    def split(self, ticker, ratio):
+        book = self.book(ticker)
+        book.factor *= ratio
+        book.shares *= ratio
+        book.share_days *= ratio
+
+    def dividend(self, ticker, day, amount):
+        book = self.book(ticker)
+        book.dividends += book.shares * amount
+        self.flows.append((day, -book.shares * amount))
+
+    def realized_gains(self):
+        """One row per lot (or part of a lot) closed by a sale."""
+        realized = pd.DataFrame(self.realized, columns=REALIZED_COLUMNS)
+        realized['Date'] = pd.to_datetime(realized['Date'].to_numpy(dtype='int64').astype('datetime64[D]'))
+        return realized
+
+    def cash_flows(self):
+        """Net external cash flow per transaction date, positive into the portfolio.
+
+        Buys bring cash in; sale proceeds and dividends leave it, since the
+        ledger's market value does not hold cash. Pass the result through
+        :func:`returns.align_flows` to put it on price dates.
+        """
+        flows = pd.DataFrame(self.flows, columns=['Day', 'Net_Flow'])
+        flows = flows.groupby('Day')['Net_Flow'].sum()
+        flows.index = pd.to_datetime(flows.index.to_numpy(dtype='int64').astype('datetime64[D]'))
+        return flows.rename_axis('Date')
+
+    def open_lots(self):
+        """Open lots in the ``portfolio_holdings.csv`` layout, with a ``Lot_ID`` column.
+
+        Lots keep their ledger order. ``Shares`` and ``Purchase_Price`` are
+        split-adjusted, so the table can be valued exactly like the holdings file.
+        """
+        rows = []
+        for lot in sorted(self.lots.values(), key=lambda lot: lot.row):
+            if lot.base_shares > EPSILON:
+                factor = self.books[lot.ticker].factor
+                rows.append((lot.ticker, lot.asset_name, lot.asset_class, lot.base_shares * factor,
+                             lot.date_label, lot.base_cost / factor, lot.lot_id))
+        return pd.DataFrame(rows, columns=['Ticker', 'Asset_Name', 'Asset_Class', 'Shares', 'Purchase_Date',
+                                           'Purchase_Price', 'Lot_ID'])
+
+    def position_history(self, prices):
+        """Positions and P&L per ticker for every date of a dates x tickers price matrix.
+
+        Holdings only change on transaction dates, so the state after each
+        day's last transaction is carried forward to every later price date.
+        ``Avg_Holding_Days`` is the share-weighted age of the open lots.
+        """
+        fields = ['Shares', 'Cost_Basis', 'Realized_Gain', 'Dividend_Income', 'Share_Days']
+        snapshots = pd.DataFrame(self.snapshots, columns=['Day', 'Ticker'] + fields)
+        snapshots = snapshots.drop_duplicates(['Day', 'Ticker'], keep='last')
+        snapshots['Date'] = pd.to_datetime(snapshots['Day'].to_numpy(dtype='int64').astype('datetime64[D]'))
+
+        dates = pd.DatetimeIndex(prices.index)
+        tickers = list(self.books)
+        frames = {}
+        for field in fields:
+            matrix = snapshots.pivot(index='Date', columns='Ticker', values=field).reindex(columns=tickers)
+            matrix = matrix.reindex(matrix.index.union(dates)).ffill().reindex(dates)
+            frames[field] = matrix.to_numpy()
+
+        close = prices.reindex(columns=tickers).to_numpy(dtype='float64')
+        shares = frames['Shares']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            market_value = shares * close
+            today = dates.to_numpy(dtype='datetime64[D]').astype('int64')[:, None]
+            avg_days = np.where(shares > EPSILON, today - frames['Share_Days'] / shares, np.nan)
+
+        started = ~np.isnan(shares)
+        history = pd.DataFrame({
+            'Date': np.repeat(dates, len(tickers)),
+            'Ticker': np.tile(np.array(tickers, dtype=object), len(dates)),
+            'Shares': shares.ravel(),
+            'Cost_Basis': frames['Cost_Basis'].ravel(),
+            'Close': close.ravel(),
+            'Market_Value': market_value.ravel(),
+            'Unrealized_Gain': (market_value - frames['Cost_Basis']).ravel(),
+            'Realized_Gain': frames['Realized_Gain'].ravel(),
+            'Dividend_Income': frames['Dividend_Income'].ravel(),
+            'Avg_Holding_Days': avg_days.ravel(),
+        })
+        return history[started.ravel()].reset_index(drop=True)
+
+
+def history_nav(history, dates):
+    """Daily portfolio value on ``dates`` from :meth:`LotLedger.position_history`.
+
+    Like :func:`valuation.portfolio_nav`, missing prices and dates before the
+    first transaction count as zero.
+    """
+    nav = history['Market_Value'].fillna(0.0).groupby(history['Date']).sum()
+    return nav.reindex(dates, fill_value=0.0).rename('Portfolio_Value')
@@ -0,0 +1,72 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 1024
+
+
+def parse_dates(values):
+    """Parse date strings once per distinct value.
+
+    Each distinct string resolves exactly as scalar ``pd.to_datetime`` did in
+    the original per-row loops, so ambiguous holdings dates such as
+    ``01/02/2025`` resolve the same way they always have: month first when
+    that is a valid date, day first otherwise. Both readings, and ISO
+    ``YYYY-MM-DD``, are parsed as whole arrays; only strings in none of these
+    forms fall back to the scalar parser.
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques)
+    parsed = pd.to_datetime(uniques, format='%m/%d/%Y', errors='coerce')
+    parsed = parsed.fillna(pd.to_datetime(uniques, format='%d/%m/%Y', errors='coerce'))
+    parsed = parsed.fillna(pd.to_datetime(uniques, format='%Y-%m-%d', errors='coerce'))
+    rest = parsed.isna().to_numpy()
+    if rest.any():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            parsed[rest] = [pd.to_datetime(value) for value in uniques[rest]]
+    parsed = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(parsed[codes], index=values.index)
+
+
+def price_matrix(market_data, field='Close'):
+    """Pivot long Date/Ticker rows into a sorted, float64 dates x tickers matrix."""
+    prices = market_data.pivot(index='Date', columns='Ticker', values=field).astype('float64')
+    prices.index = pd.to_datetime(prices.index)
+    # Categorical tickers (see schema.py) would pivot into a CategoricalIndex that rejects new columns.
+    prices.columns = pd.Index(prices.columns.astype(str), name='Ticker')
+    return prices.sort_index()
+
+
+def held_mask(dates, purchase_dates):
+    """Boolean dates x positions mask, True once each position has been bought."""
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    purchase_dates = np.asarray(purchase_dates, dtype='datetime64[ns]')
+    return dates[:, None] >= purchase_dates[None, :]
+
+
+def portfolio_nav(prices, portfolio, chunk_rows=CHUNK_ROWS):
+    """Daily portfolio value as a masked matrix-vector product.
+
+    ``prices`` is a dates x tickers matrix from :func:`price_matrix`. Each
+    position contributes ``Shares * Close`` from its purchase date on;
+    missing prices contribute nothing. Dates are processed in blocks of
+    ``chunk_rows`` so memory stays bounded for long histories.
+    """
+    tickers = portfolio['Ticker'].to_numpy()
+    shares = portfolio['Shares'].to_numpy(dtype='float64')
+    purchase_dates = parse_dates(portfolio['Purchase_Date']).to_numpy()
+
+    dates = prices.index.to_numpy()
+
+    nav = np.empty(len(dates))
+    for start in range(0, len(dates), chunk_rows):
+        stop = start + chunk_rows
+        mask = held_mask(dates[start:stop], purchase_dates)
+        block = prices.iloc[start:stop].reindex(columns=tickers).to_numpy(dtype='float64')
+        block = np.where(mask & ~np.isnan(block), block, 0.0)
+        nav[start:stop] = block @ shares
+
+    return pd.Series(nav, index=prices.index, name='Portfolio_Value')